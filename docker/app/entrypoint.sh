@@ -23,12 +23,22 @@ if [ $RETRY_COUNT -eq $MAX_RETRIES ]; then
     echo "⚠️  警告: vLLM 服务未就绪，但继续启动 App 服务"
 fi
 
+# CPU 线程预算：可用核心在 API_WORKERS 个 worker 之间平分（见 src/core/thread_budget.py）
+export THREAD_BUDGET_WORKERS=${THREAD_BUDGET_WORKERS:-${API_WORKERS:-1}}
+
+# 可选：启动本地模型服务（后台），所有 FastAPI worker 共用一份嵌入 / 重排序模型
+if [ "${MODEL_SERVER_ENABLED:-0}" = "1" ]; then
+    export MODEL_SERVER_SOCKET=${MODEL_SERVER_SOCKET:-"/tmp/legalflash-models.sock"}
+    echo "🚀 启动本地模型服务..."
+    bash scripts/model_server.sh &
+fi
+
 # 启动 FastAPI 服务（后台）
 echo "🚀 启动 FastAPI 服务..."
 uvicorn src.api.main:app \
     --host 0.0.0.0 \
     --port 8080 \
-    --workers 1 \
+    --workers ${API_WORKERS:-1} \
     &
 
 # 等待 FastAPI 启动
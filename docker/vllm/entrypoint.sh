@@ -11,6 +11,13 @@ DTYPE=${DTYPE:-"bfloat16"}
 GPU_MEMORY_UTILIZATION=${GPU_MEMORY_UTILIZATION:-0.85}
 MAX_MODEL_LEN=${MAX_MODEL_LEN:-4096}
 MAX_NUM_SEQS=${MAX_NUM_SEQS:-128}
+# 前缀缓存：复用相同提示词前缀的 KV 缓存（API 的 prefix_cache 提示词布局依赖此项），设为 0 关闭
+ENABLE_PREFIX_CACHING=${ENABLE_PREFIX_CACHING:-1}
+
+EXTRA_ARGS=()
+if [ "$ENABLE_PREFIX_CACHING" = "1" ]; then
+    EXTRA_ARGS+=(--enable-prefix-caching)
+fi
 
 echo "🚀 启动 vLLM 服务..."
 echo "📁 模型路径: $MODEL_PATH"
@@ -31,5 +38,6 @@ exec vllm serve \
     --dtype "$DTYPE" \
     --gpu-memory-utilization "$GPU_MEMORY_UTILIZATION" \
     --max-model-len "$MAX_MODEL_LEN" \
-    --max-num-seqs "$MAX_NUM_SEQS"
+    --max-num-seqs "$MAX_NUM_SEQS" \
+    "${EXTRA_ARGS[@]}"
 
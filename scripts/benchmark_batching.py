@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+按长度分桶批处理评估脚本
+功能：在同一知识库上对比
+  - 固定批次（按输入顺序每 --max-batch-size 个一批，旧行为）
+  - 按长度分桶（每批填充比例不超过 --max-padding-ratio）
+的重排序推理（查询 + 随机抽取的 --pool 个候选文档块）和文档块批量嵌入（随机抽取的 --embed-chunks 个文档块），
+按填充后长度区间（≤64 / ≤128 / ≤256 / ≤512 / >512）输出填充比例和吞吐量，并检查两种方式的分数 / 向量是否一致
+
+使用方法：
+    python scripts/benchmark_batching.py --kb-dir chroma_db_judgement --num-queries 30 --pool 50 --embed-chunks 2000
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.batching import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_PADDING_RATIO,
+    LENGTH_BUCKETS,
+    BucketedEmbeddings,
+    LengthBucketer,
+    bucket_label,
+)
+from src.core.kb_registry import resolve_kb_path
+from src.core.kb_snapshot import read_knowledge_base
+from src.core.rerank_tokens import DEFAULT_RERANK_MODEL
+
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-zh-v1.5"
+
+
+def sample_queries(texts, num_queries: int, rng):
+    """从随机文档块中抽取一个 8~40 字的分句作为查询"""
+    queries = []
+    for row in rng.permutation(len(texts)):
+        clauses = [c.strip() for c in re.split(r"[。；！？\n]", texts[row]) if 8 <= len(c.strip()) <= 40]
+        if clauses:
+            queries.append(clauses[int(rng.integers(len(clauses)))])
+        if len(queries) >= num_queries:
+            break
+    return queries
+
+
+def print_report(title: str, reports: dict):
+    """逐区间输出两种方式的批次数、填充比例和吞吐量"""
+    print(f"\n{title}")
+    print(f"{'区间':<8}{'方式':<10}{'批次':>8}{'序列':>8}{'填充比例':>10}{'序列/s':>10}{'token/s':>12}")
+    labels = [bucket_label(limit) for limit in LENGTH_BUCKETS] + [bucket_label(LENGTH_BUCKETS[-1] + 1), "all"]
+    for label in labels:
+        for name, report in reports.items():
+            stats = report.get(label)
+            if stats:
+                print(f"{label:<8}{name:<10}{stats['batches']:>8}{stats['sequences']:>8}{stats['padding_ratio']:>10.1%}"
+                      f"{stats['sequences_per_second']:>10.1f}{stats['tokens_per_second']:>12.0f}")
+    base, bucketed = reports["固定批次"].get("all"), reports["分桶"].get("all")
+    if base and bucketed:
+        print(f"总吞吐量（token/s）变化 {bucketed['tokens_per_second'] / max(base['tokens_per_second'], 1e-12) - 1:+.1%}，"
+              f"填充比例 {base['padding_ratio']:.1%} → {bucketed['padding_ratio']:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按长度分桶批处理的填充比例与吞吐量对比")
+    parser.add_argument("--kb-dir", type=str, required=True, help="知识库根目录或版本目录")
+    parser.add_argument("--rerank-model", type=str, default=DEFAULT_RERANK_MODEL, help="重排序模型")
+    parser.add_argument("--embedding-model", type=str, default=EMBEDDING_MODEL_NAME, help="嵌入模型")
+    parser.add_argument("--num-queries", type=int, default=30)
+    parser.add_argument("--pool", type=int, default=50, help="每个查询的候选文档块数量")
+    parser.add_argument("--embed-chunks", type=int, default=2000, help="批量嵌入的文档块数量（0 表示跳过）")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-padding-ratio", type=float, default=DEFAULT_MAX_PADDING_RATIO)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from src.core.reranker import create_reranker
+
+    rng = np.random.default_rng(args.seed)
+    path, version = resolve_kb_path(args.kb_dir)
+    ids, texts, _, _ = read_knowledge_base(args.kb_dir, include_updates=False)
+    print(f"📂 知识库: {path}（版本: {version or '未分版本'}），{len(ids)} 个文档块")
+    bucketers = {
+        "固定批次": LengthBucketer(args.max_batch_size, args.max_padding_ratio, sort_by_length=False),
+        "分桶": LengthBucketer(args.max_batch_size, args.max_padding_ratio, sort_by_length=True),
+    }
+
+    # 重排序：同一组查询与候选分别用两种方式推理
+    reranker = create_reranker(model_name=args.rerank_model)
+    if not reranker.pretokenized:
+        print("⚠️  当前重排序模型无法直接使用分词器和底层模型，跳过重排序对比")
+    else:
+        queries = sample_queries(texts, args.num_queries, rng)
+        print(f"📝 重排序: {len(queries)} 条查询，每条 {args.pool} 个候选")
+        reranker.score_tokens(queries[0], texts[:4])  # 预热
+        reports, max_diff = {}, 0.0
+        rows = [rng.choice(len(ids), size=min(args.pool, len(ids)), replace=False) for _ in queries]
+        scores = {}
+        for name, bucketer in bucketers.items():
+            reranker.bucketer = bucketer
+            reranker.batch_stats.reset()
+            scores[name] = [reranker.score_tokens(query, [texts[row] for row in pool])
+                            for query, pool in zip(queries, rows)]
+            reports[name] = reranker.batch_stats.report()
+        for base, bucketed in zip(scores["固定批次"], scores["分桶"]):
+            max_diff = max(max_diff, float(np.max(np.abs(np.asarray(base) - np.asarray(bucketed)))))
+        print_report("🔁 重排序推理", reports)
+        print(f"两种方式的最大分数差 {max_diff:.2e}")
+
+    # 批量嵌入：同一组文档块分别用两种方式编码
+    if args.embed_chunks > 0:
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        base = HuggingFaceEmbeddings(model_name=args.embedding_model)
+        chunks = [texts[row] for row in rng.choice(len(texts), size=min(args.embed_chunks, len(texts)), replace=False)]
+        print(f"\n📝 批量嵌入: {len(chunks)} 个文档块（模型: {args.embedding_model}）")
+        reports, vectors = {}, {}
+        for name, bucketer in bucketers.items():
+            embeddings = BucketedEmbeddings(base, bucketer)
+            if embeddings._client is None:
+                print("⚠️  嵌入模型不是 SentenceTransformer，跳过批量嵌入对比")
+                break
+            embeddings.embed_documents(chunks[:4])  # 预热
+            embeddings.stats.reset()
+            start = time.perf_counter()
+            vectors[name] = np.asarray(embeddings.embed_documents(chunks))
+            print(f"  {name}: {time.perf_counter() - start:.1f}s")
+            reports[name] = embeddings.stats.report()
+        if len(reports) == len(bucketers):
+            print_report("🧮 批量嵌入", reports)
+            print(f"两种方式的最大向量差 {float(np.max(np.abs(vectors['固定批次'] - vectors['分桶']))):.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+级联重排序评估脚本
+功能：在同一知识库上，向量检索取较大的候选池（如 100）后对比
+  - 单级：bge-reranker 为全部候选打分（基线）
+  - 级联（固定 M）：小 Cross-Encoder 为全部候选打分，前 M 个送入 bge-reranker
+  - 级联（自适应 M）：M 按第一级分数分布决定（见 CascadeReranker）
+的各级延迟（第一级 / 第二级 / 总计的 p50 / p95）、送入第二级的候选数、重排序后的 recall@5，
+以及最终 Top 5 与单级结果的重合率
+
+查询来源（与 benchmark_hybrid.py 相同）：
+  - --labeled：标注查询 JSONL，每行 {"query": "...", "relevant": ["文档块 ID", ...]}
+  - 默认：从知识库随机抽取文档块，取其中一个分句作为查询、该文档块作为相关文档
+
+使用方法：
+    python scripts/benchmark_cascade.py --kb-dir chroma_db_judgement --num-queries 100 --pool 100
+    python scripts/benchmark_cascade.py --kb-dir chroma_db --labeled data/hybrid_queries.jsonl --fixed-m 10,20,40
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.kb_registry import resolve_kb_path
+from src.core.kb_snapshot import read_knowledge_base
+from src.core.retrieval import ChunkFetcher, retrieve_candidates
+from src.core.vector_store import load_vector_store
+
+KB = "kb"
+
+
+def percentile(values, p):
+    """计算百分位数（与监控模块保持一致的取法）"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def sample_queries(ids, texts, num_queries: int, rng):
+    """从随机文档块中抽取一个 8~40 字的分句作为查询"""
+    queries = []
+    for row in rng.permutation(len(ids)):
+        clauses = [c.strip() for c in re.split(r"[。；！？\n]", texts[row]) if 8 <= len(c.strip()) <= 40]
+        if clauses:
+            queries.append((clauses[int(rng.integers(len(clauses)))], {ids[row]}))
+        if len(queries) >= num_queries:
+            break
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="级联重排序与单级重排序的延迟和召回率对比")
+    parser.add_argument("--kb-dir", type=str, required=True, help="知识库根目录或版本目录")
+    parser.add_argument("--labeled", type=str, default=None, help="标注查询 JSONL（{\"query\", \"relevant\"}）")
+    parser.add_argument("--num-queries", type=int, default=100, help="自动生成的查询数量")
+    parser.add_argument("--pool", type=int, default=100, help="向量检索的候选池大小（全部送入重排序）")
+    parser.add_argument("--first-model", type=str, default="cross-encoder/ms-marco-MiniLM-L-6-v2", help="第一级模型")
+    parser.add_argument("--second-model", type=str, default="BAAI/bge-reranker-base", help="第二级模型")
+    parser.add_argument("--fixed-m", type=str, default="10,20,30", help="固定 M 的级联配置")
+    parser.add_argument("--min-candidates", type=int, default=10, help="自适应 M 的下限")
+    parser.add_argument("--max-candidates", type=int, default=30, help="自适应 M 的上限")
+    parser.add_argument("--mass", type=str, default="0.8,0.9,0.95", help="自适应 M 覆盖的第一级概率质量")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from src.core.ingest import EMBEDDING_MODEL_NAME
+    from src.core.reranker import CascadeReranker, create_reranker
+
+    rng = np.random.default_rng(args.seed)
+    path, version = resolve_kb_path(args.kb_dir)
+    ids, texts, _, _ = read_knowledge_base(args.kb_dir, include_updates=False)
+    print(f"📂 知识库: {path}（版本: {version or '未分版本'}），{len(ids)} 个文档块")
+
+    if args.labeled:
+        with open(args.labeled, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        queries = [(row["query"], set(row["relevant"])) for row in rows]
+    else:
+        queries = sample_queries(ids, texts, args.num_queries, rng)
+    print(f"📝 {len(queries)} 条查询，候选池 {args.pool}")
+
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    store = load_vector_store(str(path), embeddings)
+    query_vectors = embeddings.embed_documents([query for query, _ in queries])
+    pools = []
+    for (query, _), vector in zip(queries, query_vectors):
+        fetcher = ChunkFetcher({KB: store})
+        candidates = retrieve_candidates(KB, store, [vector], args.pool, fetcher)[0]
+        pools.append((candidates, fetcher.texts(candidates)))
+
+    second = create_reranker(model_name=args.second_model)
+    first = create_reranker(model_name=args.first_model)
+    for model in (first, second):
+        model.score_tokens(queries[0][0], pools[0][1][:4])  # 预热
+
+    configs = [("单级", second)]
+    configs += [(f"级联 M={m}", CascadeReranker(first, second, min_candidates=m, max_candidates=m))
+                for m in (int(value) for value in args.fixed_m.split(","))]
+    configs += [(f"级联 自适应 {mass}", CascadeReranker(first, second, min_candidates=args.min_candidates,
+                                                     max_candidates=args.max_candidates, mass=float(mass)))
+                for mass in args.mass.split(",")]
+
+    baseline_tops = None
+    print(f"\n{'方式':<18}{'第二级 M':>10}{'第一级 p50':>12}{'第二级 p50':>12}{'总计 p50':>12}{'总计 p95':>12}"
+          f"{'R@5':>8}{'与单级重合':>12}")
+    for label, model in configs:
+        first_seconds, second_seconds, totals, kept, hits, tops = [], [], [], [], [], []
+        for (query, relevant), (candidates, documents) in zip(queries, pools):
+            timings, info = {}, {}
+            start = time.perf_counter()
+            top = model.rerank_ids(query=query, ids=candidates, documents=documents, top_k=5,
+                                   timings=timings, info=info)
+            totals.append(time.perf_counter() - start)
+            first_seconds.append(timings.get("first_stage", 0.0))
+            second_seconds.append(timings.get("tokenize", 0.0) + timings.get("inference", 0.0))
+            kept.append(info["second_stage"])
+            found = {candidate.chunk_id for candidate, _ in top}
+            hits.append(len(found & relevant) / len(relevant))
+            tops.append(found)
+        if baseline_tops is None:
+            baseline_tops = tops
+        overlap = np.mean([len(a & b) / max(len(b), 1) for a, b in zip(tops, baseline_tops)])
+        print(f"{label:<18}{np.mean(kept):>10.1f}{percentile(first_seconds, 0.5) * 1000:>9.1f} ms"
+              f"{percentile(second_seconds, 0.5) * 1000:>9.1f} ms{percentile(totals, 0.5) * 1000:>9.1f} ms"
+              f"{percentile(totals, 0.95) * 1000:>9.1f} ms{np.mean(hits):>8.3f}{overlap:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
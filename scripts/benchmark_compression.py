@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+上下文压缩评估脚本
+功能：在压测问题集上分别以 compress=false / true 调用 RAG 接口（非流式），对比
+  - 提示词 token 数（decisions.context.prompt_tokens）的平均值 / p95 及减少比例
+  - 压缩去掉的句子数，以及上下文组装（含句子打分）的耗时
+  - 端到端延迟 p50 / p95（客户端测得，包含生成）
+API 需以 CONTEXT_COMPRESSION=cross_encoder 或 embedding 启动，否则 compress=true 不生效
+
+使用方法：
+    CONTEXT_COMPRESSION=cross_encoder bash scripts/fastapi.sh
+    python scripts/benchmark_compression.py --api-url http://localhost:8080 --repeats 2 --max-tokens 256
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import requests
+
+# 压测问题集（与 tests/locustfile.py 的 TEST_QUERIES 相同）
+TEST_QUERIES = [
+    "什么是合同违约？",
+    "如何申请劳动仲裁？",
+    "离婚财产如何分割？",
+    "交通事故责任如何认定？",
+    "如何申请强制执行？",
+    "什么是正当防卫？",
+    "如何申请法律援助？",
+    "合同无效的情形有哪些？",
+    "如何计算违约金？",
+    "什么是不可抗力？",
+    "如何申请行政复议？",
+    "什么是诉讼时效？",
+    "如何申请财产保全？",
+    "什么是格式条款？",
+    "如何申请执行异议？",
+]
+
+
+def percentile(values, p):
+    """计算百分位数（与监控模块保持一致的取法）"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def run_mode(api_url: str, queries, compress: bool, max_tokens: int, timeout: float) -> dict:
+    prompt_tokens, compressed, build_seconds, latencies = [], [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        response = requests.post(
+            f"{api_url}/api/rag/chat",
+            json={"query": query, "max_tokens": max_tokens, "stream": False, "compress": compress},
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        latency = time.perf_counter() - start
+        decisions = response.json().get("decisions")
+        if not decisions or not decisions.get("context"):
+            print(f"⚠️  请求失败: {query}")
+            continue
+        latencies.append(latency)
+        prompt_tokens.append(decisions["context"]["prompt_tokens"])
+        compressed.append(decisions["context"].get("compressed_sentences", 0))
+        build_seconds.append(decisions["timings"].get("context_build", 0.0))
+    return {
+        "prompt_tokens": prompt_tokens,
+        "compressed": compressed,
+        "build_seconds": build_seconds,
+        "latencies": latencies,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抽取式上下文压缩的提示词 token 与端到端延迟评估")
+    parser.add_argument("--api-url", type=str, default="http://localhost:8080")
+    parser.add_argument("--repeats", type=int, default=1, help="问题集重复的次数")
+    parser.add_argument("--max-tokens", type=int, default=256, help="生成的最大 token 数")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", type=str, default=None, help="保存逐请求结果的 JSON 文件")
+    args = parser.parse_args()
+
+    queries = TEST_QUERIES * args.repeats
+    print(f"📝 {len(queries)} 个请求，API: {args.api_url}")
+    results = {}
+    for compress in (False, True):
+        start = time.time()
+        results[compress] = run_mode(args.api_url, queries, compress, args.max_tokens, args.timeout)
+        print(f"  compress={str(compress).lower()} 完成（{time.time() - start:.1f}s）")
+
+    print(f"\n{'模式':<8}{'请求数':>8}{'提示词均值':>12}{'p95':>8}{'压缩句数':>10}{'组装耗时':>12}"
+          f"{'延迟 p50':>12}{'延迟 p95':>12}")
+    for compress, label in ((False, "不压缩"), (True, "压缩")):
+        r = results[compress]
+        if not r["latencies"]:
+            print(f"{label:<8}{0:>8}")
+            continue
+        print(f"{label:<8}{len(r['latencies']):>8}{np.mean(r['prompt_tokens']):>12.0f}"
+              f"{percentile(r['prompt_tokens'], 0.95):>8}{np.mean(r['compressed']):>10.1f}"
+              f"{np.mean(r['build_seconds']) * 1000:>9.1f} ms"
+              f"{percentile(r['latencies'], 0.5) * 1000:>9.0f} ms{percentile(r['latencies'], 0.95) * 1000:>9.0f} ms")
+    base, compressed = results[False], results[True]
+    if base["prompt_tokens"] and compressed["prompt_tokens"]:
+        reduction = 1 - np.mean(compressed["prompt_tokens"]) / np.mean(base["prompt_tokens"])
+        delta = (np.mean(compressed["latencies"]) - np.mean(base["latencies"])) * 1000
+        print(f"\n提示词 token 减少 {reduction:.1%}，端到端延迟均值变化 {delta:+.0f} ms")
+        if not any(compressed["compressed"]):
+            print("⚠️  没有句子被压缩，请确认 API 以 CONTEXT_COMPRESSION=cross_encoder / embedding 启动")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({str(k).lower(): v for k, v in results.items()}, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
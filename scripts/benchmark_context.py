@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+上下文 token 预算评估脚本
+功能：读取 API 的决策日志（ADAPTIVE_DECISION_LOG，JSONL，记录了每个请求的问题和最终文档块），
+按日志中的文档块重新组装上下文，对比
+  - 原样拼接（旧行为）
+  - 只合并相邻 / 重叠的文档块
+  - 合并 + 不同的 token 预算
+的上下文 token 数（平均 / p95）、合并与裁剪情况，以及保留的原文比例（上下文中保留的字数 / 去重后的原文字数）
+（完整提示词的 token 数由 API 按请求记录：/metrics 的 values.prompt_tokens）
+
+使用方法：
+    ADAPTIVE_DECISION_LOG=logs/decisions.jsonl bash scripts/fastapi.sh   # 先用压测问题集跑一遍
+    python scripts/benchmark_context.py --log logs/decisions.jsonl --budgets 1024,1536,2048 \
+        --tokenizer output/llama3-law-merged
+"""
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.context_builder import ContextBuilder, TokenCounter
+from src.core.kb_registry import resolve_kb_path
+from src.core.retrieval import Candidate, ChunkFetcher
+from src.core.vector_store import load_vector_store
+
+KB_DIRS = {
+    "law": project_root / "chroma_db",
+    "case": project_root / "chroma_db_case",
+    "judgement": project_root / "chroma_db_judgement",
+}
+
+
+def percentile(values, p):
+    """计算百分位数（与监控模块保持一致的取法）"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def content_chars(text: str) -> int:
+    return len(re.sub(r"\s|\[文档[^\]]*\]", "", text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上下文 token 预算与相邻文档块合并评估")
+    parser.add_argument("--log", type=str, required=True, help="决策日志（ADAPTIVE_DECISION_LOG）")
+    parser.add_argument("--budgets", type=str, default="1024,1536,2048", help="对比的 token 预算")
+    parser.add_argument("--tokenizer", type=str, default=str(project_root / "output" / "llama3-law-merged"),
+                        help="服务模型的分词器路径（加载失败时按字数估算）")
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from src.core.ingest import EMBEDDING_MODEL_NAME
+
+    counter = TokenCounter(args.tokenizer)
+    print(f"🔢 token 计数: {counter.name}")
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    stores = {kb: load_vector_store(str(resolve_kb_path(path)[0]), embeddings)
+              for kb, path in KB_DIRS.items() if path.exists()}
+    fetcher = ChunkFetcher(stores)
+
+    requests = []
+    with open(args.log, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            candidates = [Candidate(source["kb"], source["id"], 0.0)
+                          for source in json.loads(line).get("sources", []) if source["kb"] in stores]
+            docs = fetcher.documents(candidates)
+            if docs and all(doc is not None for doc in docs):
+                requests.append(([doc.page_content for doc in docs], [doc.metadata for doc in docs],
+                                 [candidate.kb for candidate in candidates]))
+    print(f"📝 {len(requests)} 条请求（文档块均能在当前知识库中找到）")
+    if not requests:
+        return
+
+    configs = [("原样拼接", 0, False), ("合并相邻块", 0, True)] + \
+              [(f"合并 + 预算 {budget}", int(budget), True) for budget in args.budgets.split(",")]
+    # 去重后的原文字数（合并相邻块不损失内容）作为保留比例的分母
+    baseline = [content_chars(ContextBuilder(counter, 0, True).build(*request).context) for request in requests]
+    print(f"\n{'方式':<16}{'平均 tokens':>12}{'p95':>8}{'合并块':>8}{'裁剪句':>8}{'丢弃文档':>10}{'保留原文':>10}")
+    for label, budget, merge in configs:
+        builder = ContextBuilder(counter, token_budget=budget, merge_chunks=merge)
+        results = [builder.build(*request) for request in requests]
+        tokens = [result.tokens for result in results]
+        kept = np.mean([min(1.0, content_chars(result.context) / max(1, total))
+                        for result, total in zip(results, baseline)])
+        print(f"{label:<16}{np.mean(tokens):>12.0f}{percentile(tokens, 0.95):>8}"
+              f"{np.mean([r.merged for r in results]):>8.2f}{np.mean([r.trimmed_sentences for r in results]):>8.2f}"
+              f"{np.mean([r.dropped for r in results]):>10.2f}{kept:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
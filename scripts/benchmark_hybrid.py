@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+混合检索评估脚本
+功能：在同一知识库上对比
+  - 只用向量检索、取较大的候选池（如 20 / 50）送入重排序
+  - 向量 + BM25 倒数排名融合（RRF）、取较小的候选池（如 5 / 10）
+两种方式的候选池召回率（相关文档块是否进入候选池）、检索延迟，以及（--rerank）重排序延迟和重排序后的 recall@5
+
+查询来源：
+  - --labeled：标注查询 JSONL，每行 {"query": "...", "relevant": ["文档块 ID", ...]}
+  - 默认：从知识库随机抽取文档块，取其中一个分句作为查询、该文档块作为相关文档
+    （分句与原文字面一致，结果偏向词法检索，结论以标注查询为准）
+
+使用方法：
+    python scripts/benchmark_hybrid.py --kb-dir chroma_db --num-queries 200
+    python scripts/benchmark_hybrid.py --kb-dir chroma_db --labeled data/hybrid_queries.jsonl --rerank
+"""
+
+import argparse
+import json
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.bm25_index import BM25Index, build_bm25_index
+from src.core.kb_registry import resolve_kb_path
+from src.core.kb_snapshot import read_knowledge_base
+from src.core.retrieval import ChunkFetcher, reciprocal_rank_fusion, retrieve_candidates
+from src.core.vector_store import load_vector_store
+
+KB = "kb"
+
+
+def percentile(values, p):
+    """计算百分位数（与监控模块保持一致的取法）"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def sample_queries(ids, texts, num_queries: int, rng):
+    """从随机文档块中抽取一个 8~40 字的分句作为查询"""
+    queries = []
+    for row in rng.permutation(len(ids)):
+        clauses = [c.strip() for c in re.split(r"[。；！？\n]", texts[row]) if 8 <= len(c.strip()) <= 40]
+        if clauses:
+            queries.append((clauses[int(rng.integers(len(clauses)))], {ids[row]}))
+        if len(queries) >= num_queries:
+            break
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="混合检索（向量 + BM25）与纯向量检索对比")
+    parser.add_argument("--kb-dir", type=str, required=True, help="知识库根目录或版本目录")
+    parser.add_argument("--labeled", type=str, default=None, help="标注查询 JSONL（{\"query\", \"relevant\"}）")
+    parser.add_argument("--num-queries", type=int, default=200, help="自动生成的查询数量")
+    parser.add_argument("--vector-pools", type=str, default="5,10,20,50", help="纯向量检索的候选池大小")
+    parser.add_argument("--hybrid-pools", type=str, default="5,10", help="混合检索的候选池大小")
+    parser.add_argument("--depth", type=int, default=4, help="混合检索每一路取 候选池 × depth 个结果再融合")
+    parser.add_argument("--rerank", action="store_true", help="同时测量重排序延迟和重排序后的 recall@5")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from src.core.ingest import EMBEDDING_MODEL_NAME
+
+    rng = np.random.default_rng(args.seed)
+    path, version = resolve_kb_path(args.kb_dir)
+    ids, texts, _, _ = read_knowledge_base(args.kb_dir, include_updates=False)
+    print(f"📂 知识库: {path}（版本: {version or '未分版本'}），{len(ids)} 个文档块")
+
+    bm25 = BM25Index.load(path)
+    if bm25 is None:
+        tmp_dir = tempfile.mkdtemp(prefix="bm25-")
+        config = build_bm25_index(tmp_dir, ids, texts)
+        bm25 = BM25Index(tmp_dir)
+        print(f"🔤 知识库没有 BM25 索引，临时构建: {config['terms']} 个词（分词: {config['tokenizer']}）")
+
+    if args.labeled:
+        with open(args.labeled, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        queries = [(row["query"], set(row["relevant"])) for row in rows]
+    else:
+        queries = sample_queries(ids, texts, args.num_queries, rng)
+    print(f"📝 {len(queries)} 条查询")
+
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    store = load_vector_store(str(path), embeddings)
+    query_vectors = embeddings.embed_documents([query for query, _ in queries])
+    reranker = None
+    if args.rerank:
+        from src.core.reranker import create_reranker
+        reranker = create_reranker(model_name="BAAI/bge-reranker-base")
+
+    configs = [("向量", int(p)) for p in args.vector_pools.split(",")] + \
+              [("向量 + BM25", int(p)) for p in args.hybrid_pools.split(",")]
+    print(f"\n{'方式':<14}{'候选池':>8}{'池召回率':>10}{'检索 p50':>12}{'检索 p99':>12}"
+          f"{'重排序 p50':>12}{'重排后 R@5':>12}")
+    for mode, pool in configs:
+        hits, reranked_hits = [], []
+        latencies, rerank_latencies = [], []
+        for (query, relevant), vector in zip(queries, query_vectors):
+            fetcher = ChunkFetcher({KB: store})
+            start = time.perf_counter()
+            if mode == "向量":
+                candidates = retrieve_candidates(KB, store, [vector], pool, fetcher)[0]
+            else:
+                depth = pool * args.depth
+                candidates = reciprocal_rank_fusion([
+                    retrieve_candidates(KB, store, [vector], depth, fetcher)[0],
+                    bm25.search_candidates(KB, query, depth),
+                ], top_k=pool)
+            latencies.append(time.perf_counter() - start)
+            found = {candidate.chunk_id for candidate in candidates}
+            hits.append(len(found & relevant) / len(relevant))
+            if reranker is not None:
+                documents = fetcher.texts(candidates)
+                start = time.perf_counter()
+                top = reranker.rerank_ids(query=query, ids=candidates, documents=documents, top_k=5)
+                rerank_latencies.append(time.perf_counter() - start)
+                reranked_hits.append(len({c.chunk_id for c, _ in top} & relevant) / len(relevant))
+        rerank_p50 = f"{percentile(rerank_latencies, 0.5) * 1000:.1f} ms" if rerank_latencies else "-"
+        reranked_recall = f"{np.mean(reranked_hits):.3f}" if reranked_hits else "-"
+        print(f"{mode:<14}{pool:>8}{np.mean(hits):>10.3f}{percentile(latencies, 0.5) * 1000:>9.2f} ms"
+              f"{percentile(latencies, 0.99) * 1000:>9.2f} ms{rerank_p50:>12}{reranked_recall:>12}")
+
+
+if __name__ == "__main__":
+    main()
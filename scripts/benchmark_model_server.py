@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+模型服务评估脚本
+功能：模拟一个 API worker，在同一组请求上对比
+  - 进程内：worker 自己加载重排序 / 嵌入模型，在线程池中推理（旧行为）
+  - 模型服务：worker 只作为客户端，通过 Unix socket 调用 src/core/model_server.py（服务端动态合批）
+--concurrency 个协程并发发送请求（每个请求嵌入一条查询 + 重排序 --pool 个文档块），输出
+  - 吞吐量（请求 / 秒）和请求延迟 p50 / p95
+  - 事件循环延迟（每 10ms 的心跳实际间隔超出 10ms 的部分）p95 / 最大值：反映模型推理对事件循环的影响
+  - 本进程的常驻内存（RSS）：进程内模式每个 worker 都有一份模型权重，模型服务模式只有服务端一份
+每次只测一种方式（模型权重加载后不会释放，进程内与模型服务的内存需分别运行对比）
+
+使用方法：
+    python src/core/model_server.py --socket /tmp/legalflash-models.sock &
+    python scripts/benchmark_model_server.py --kb-dir chroma_db_judgement --mode inprocess
+    python scripts/benchmark_model_server.py --kb-dir chroma_db_judgement --mode server --socket /tmp/legalflash-models.sock
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import psutil
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.kb_snapshot import read_knowledge_base
+from src.core.model_server import DEFAULT_EMBEDDING_MODEL, DEFAULT_RERANK_MODEL, DEFAULT_SOCKET_PATH
+
+HEARTBEAT_INTERVAL = 0.01
+
+
+def percentile(values, p):
+    """计算百分位数（与监控模块保持一致的取法）"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def sample_queries(texts, num_queries: int, rng):
+    """从随机文档块中抽取一个 8~40 字的分句作为查询"""
+    queries = []
+    for row in rng.permutation(len(texts)):
+        clauses = [c.strip() for c in re.split(r"[。；！？\n]", texts[row]) if 8 <= len(c.strip()) <= 40]
+        if clauses:
+            queries.append(clauses[int(rng.integers(len(clauses)))])
+        if len(queries) >= num_queries:
+            break
+    return queries
+
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / 1024 ** 2
+
+
+async def heartbeat(lags: list, stop: asyncio.Event):
+    """每 HEARTBEAT_INTERVAL 秒醒来一次，记录实际间隔超出的部分（事件循环被阻塞的时间）"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(max(time.perf_counter() - start - HEARTBEAT_INTERVAL, 0.0))
+
+
+async def run_load(embeddings, reranker, requests, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, lags = [], []
+
+    async def one(query, documents):
+        async with semaphore:
+            start = time.perf_counter()
+            # 与 API 相同：模型调用在线程池中进行
+            await asyncio.to_thread(embeddings.embed_query, query)
+            await asyncio.to_thread(reranker.rerank_ids, query, list(range(len(documents))), documents, 5)
+            latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(query, documents) for query, documents in requests))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    return elapsed, latencies, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description="进程内模型与本地模型服务的吞吐量、事件循环延迟和内存对比")
+    parser.add_argument("--kb-dir", type=str, required=True, help="知识库根目录或版本目录（提供查询和文档块）")
+    parser.add_argument("--mode", choices=("inprocess", "server"), required=True)
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET_PATH, help="模型服务的 Unix socket")
+    parser.add_argument("--embedding-model", type=str, default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--rerank-model", type=str, default=DEFAULT_RERANK_MODEL)
+    parser.add_argument("--num-requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--pool", type=int, default=20, help="每个请求重排序的文档块数量")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    _, texts, _, _ = read_knowledge_base(args.kb_dir, include_updates=False)
+    queries = sample_queries(texts, args.num_requests, rng)
+    requests = [(query, [texts[row] for row in rng.choice(len(texts), size=min(args.pool, len(texts)), replace=False)])
+                for query in queries]
+    base_rss = rss_mb()
+
+    if args.mode == "server":
+        from src.core.model_server import RemoteEmbeddings, RemoteReranker, connect_model_server
+
+        client = connect_model_server(args.socket)
+        embeddings = RemoteEmbeddings(client, args.embedding_model)
+        reranker = RemoteReranker(client, args.rerank_model)
+        print(f"🔌 模型服务: {args.socket}（pid {client.info()['pid']}）")
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from src.core.batching import BucketedEmbeddings
+        from src.core.reranker import create_reranker
+
+        embeddings = BucketedEmbeddings(HuggingFaceEmbeddings(model_name=args.embedding_model))
+        reranker = create_reranker(model_name=args.rerank_model)
+    # 预热
+    embeddings.embed_query(queries[0])
+    reranker.rerank_ids(queries[0], list(range(len(requests[0][1]))), requests[0][1], 5)
+
+    print(f"📝 {len(requests)} 个请求，并发 {args.concurrency}，每个请求重排序 {args.pool} 个文档块")
+    elapsed, latencies, lags = asyncio.run(run_load(embeddings, reranker, requests, args.concurrency))
+    print(f"\n{'方式':<10}{'吞吐量':>12}{'延迟 p50':>12}{'延迟 p95':>12}{'循环延迟 p95':>14}{'循环延迟最大':>14}{'RSS':>12}")
+    print(f"{args.mode:<10}{len(latencies) / elapsed:>8.1f} r/s{percentile(latencies, 0.5) * 1000:>9.1f} ms"
+          f"{percentile(latencies, 0.95) * 1000:>9.1f} ms{percentile(lags, 0.95) * 1000:>11.1f} ms"
+          f"{max(lags) * 1000:>11.1f} ms{rss_mb():>9.0f} MB")
+    print(f"（模型加载前 RSS {base_rss:.0f} MB）")
+    if args.mode == "server":
+        print(f"动态批处理: {client.stats()['dynamic_batching']}")
+
+
+if __name__ == "__main__":
+    main()
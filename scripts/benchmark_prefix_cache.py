@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+提示词前缀缓存评估脚本
+功能：分别以 prompt_layout=ranked / prefix_cache 向 RAG 接口发送一批重复话题的问题（流式输出），报告
+  - vLLM 前缀缓存命中率：读取 vLLM 的 /metrics，按每种布局前后的差值计算
+    （V1 引擎的 vllm:prefix_cache_hits / vllm:prefix_cache_queries，按 token 计；旧引擎只有瞬时的
+    vllm:gpu_prefix_cache_hit_rate，取运行结束时的值）
+  - 客户端测得的首个 token 延迟（TTFT，从发出请求到收到第一个文本块）的 p50 / p95
+命中率包含同一时间段内查询改写的 vLLM 请求；vLLM 需以 --enable-prefix-caching 启动（scripts/vllm.sh 已开启）
+
+使用方法：
+    python scripts/benchmark_prefix_cache.py --api-url http://localhost:8080 --vllm-url http://localhost:8000 --repeats 3
+    python scripts/benchmark_prefix_cache.py --queries data/sample_queries.txt --layouts prefix_cache
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+
+import numpy as np
+import requests
+
+# 默认问题集（与压测脚本相同的话题），每个问题重复 --repeats 次以模拟重复话题
+DEFAULT_QUERIES = [
+    "什么是合同违约？",
+    "如何申请劳动仲裁？",
+    "离婚财产如何分割？",
+    "交通事故责任如何认定？",
+    "如何申请强制执行？",
+    "什么是正当防卫？",
+    "如何申请法律援助？",
+    "合同无效的情形有哪些？",
+    "如何计算违约金？",
+    "什么是不可抗力？",
+]
+
+_METRIC_LINE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+([0-9.eE+-]+|NaN)")
+
+
+def percentile(values, p):
+    """计算百分位数（与监控模块保持一致的取法）"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def load_queries(path):
+    if not path:
+        return list(DEFAULT_QUERIES)
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+    return queries
+
+
+def scrape_vllm(vllm_url: str) -> dict:
+    """读取 vLLM 的 Prometheus 指标，同名指标（不同标签）求和"""
+    response = requests.get(f"{vllm_url.rstrip('/')}/metrics", timeout=10)
+    response.raise_for_status()
+    values = {}
+    for line in response.text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if match and match.group(3) != "NaN":
+            name = match.group(1)
+            if name.endswith("_total"):
+                name = name[:-len("_total")]
+            values[name] = values.get(name, 0.0) + float(match.group(3))
+    return values
+
+
+def cache_hit_rate(before: dict, after: dict):
+    """按指标差值计算前缀缓存命中率，没有相关指标时返回 None"""
+    for hits, queries in (("vllm:prefix_cache_hits", "vllm:prefix_cache_queries"),
+                          ("vllm:gpu_prefix_cache_hits", "vllm:gpu_prefix_cache_queries")):
+        if queries in after:
+            total = after[queries] - before.get(queries, 0.0)
+            return (after.get(hits, 0.0) - before.get(hits, 0.0)) / total if total > 0 else 0.0
+    return after.get("vllm:gpu_prefix_cache_hit_rate")
+
+
+def stream_ttft(api_url: str, query: str, layout: str, max_tokens: int, timeout: float):
+    """流式请求，返回首个文本块的延迟（秒），失败时返回 None"""
+    start = time.perf_counter()
+    with requests.post(
+        f"{api_url}/api/rag/chat",
+        json={"query": query, "max_tokens": max_tokens, "stream": True, "prompt_layout": layout},
+        stream=True,
+        timeout=timeout,
+    ) as response:
+        response.raise_for_status()
+        ttft = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event.get("type") == "chunk" and ttft is None:
+                ttft = time.perf_counter() - start
+            elif "error" in event:
+                print(f"⚠️  请求失败: {query} -> {event.get('error')}")
+                return None
+        return ttft
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提示词布局对 vLLM 前缀缓存命中率和首 token 延迟的影响")
+    parser.add_argument("--api-url", type=str, default="http://localhost:8080")
+    parser.add_argument("--vllm-url", type=str, default="http://localhost:8000")
+    parser.add_argument("--queries", type=str, default=None, help="问题文件（每行一个问题或 JSONL）")
+    parser.add_argument("--repeats", type=int, default=3, help="每个问题重复的次数（打乱顺序）")
+    parser.add_argument("--layouts", type=str, default="ranked,prefix_cache", help="对比的提示词布局")
+    parser.add_argument("--max-tokens", type=int, default=16, help="生成的 token 数（只关心首 token 延迟）")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) * args.repeats
+    random.Random(args.seed).shuffle(queries)
+    print(f"📝 {len(queries)} 个请求，API: {args.api_url}，vLLM: {args.vllm_url}")
+
+    results = {}
+    for layout in args.layouts.split(","):
+        before = scrape_vllm(args.vllm_url)
+        start = time.time()
+        ttfts = [ttft for ttft in (stream_ttft(args.api_url, query, layout, args.max_tokens, args.timeout)
+                                   for query in queries) if ttft is not None]
+        results[layout] = (cache_hit_rate(before, scrape_vllm(args.vllm_url)), ttfts)
+        print(f"  {layout} 完成（{time.time() - start:.1f}s）")
+
+    print(f"\n{'布局':<14}{'请求数':>8}{'前缀缓存命中率':>16}{'TTFT p50':>12}{'TTFT p95':>12}")
+    for layout, (hit_rate, ttfts) in results.items():
+        rate = f"{hit_rate:.1%}" if hit_rate is not None else "-"
+        p50 = f"{percentile(ttfts, 0.5) * 1000:.0f} ms" if ttfts else "-"
+        p95 = f"{percentile(ttfts, 0.95) * 1000:.0f} ms" if ttfts else "-"
+        print(f"{layout:<14}{len(ttfts):>8}{rate:>16}{p50:>12}{p95:>12}")
+    if all(hit_rate is None for hit_rate, _ in results.values()):
+        print("\n⚠️  vLLM /metrics 中没有前缀缓存指标，请确认 vLLM 以 --enable-prefix-caching 启动")
+    if len(results) == 2 and all(ttfts for _, ttfts in results.values()):
+        (_, base), (_, new) = results.values()
+        print(f"\nTTFT 均值变化: {(np.mean(new) - np.mean(base)) * 1000:+.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+重排序分词缓存评估脚本
+功能：在同一知识库上对比重排序阶段
+  - 现场分词（查询和所有候选文档块每次都重新切分，旧行为）
+  - 使用 ingest 预先切分的文档块 token ID（只对查询分词）
+的分词耗时、推理耗时和总耗时（每个请求的平均值 / p95），并检查两者与 CrossEncoder.predict 的分数是否一致
+
+查询与候选：从知识库随机抽取文档块，取其中一个分句作为查询，候选为随机抽取的 --pool 个文档块（只测量耗时）
+知识库版本目录下没有分词缓存（或分词器与 --model 不一致）时临时构建一份
+
+使用方法：
+    python scripts/benchmark_rerank_tokens.py --kb-dir chroma_db_judgement --num-queries 50 --pool 20
+"""
+
+import argparse
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.kb_registry import resolve_kb_path
+from src.core.kb_snapshot import read_knowledge_base
+from src.core.rerank_tokens import DEFAULT_RERANK_MODEL, RerankTokenCache, build_rerank_tokens
+
+
+def percentile(values, p):
+    """计算百分位数（与监控模块保持一致的取法）"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def sample_queries(texts, num_queries: int, rng):
+    """从随机文档块中抽取一个 8~40 字的分句作为查询"""
+    queries = []
+    for row in rng.permutation(len(texts)):
+        clauses = [c.strip() for c in re.split(r"[。；！？\n]", texts[row]) if 8 <= len(c.strip()) <= 40]
+        if clauses:
+            queries.append(clauses[int(rng.integers(len(clauses)))])
+        if len(queries) >= num_queries:
+            break
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重排序分词缓存的分词耗时对比")
+    parser.add_argument("--kb-dir", type=str, required=True, help="知识库根目录或版本目录")
+    parser.add_argument("--model", type=str, default=DEFAULT_RERANK_MODEL, help="重排序模型")
+    parser.add_argument("--num-queries", type=int, default=50)
+    parser.add_argument("--pool", type=int, default=20, help="每个查询的候选文档块数量")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from src.core.reranker import create_reranker
+
+    rng = np.random.default_rng(args.seed)
+    path, version = resolve_kb_path(args.kb_dir)
+    ids, texts, _, _ = read_knowledge_base(args.kb_dir, include_updates=False)
+    print(f"📂 知识库: {path}（版本: {version or '未分版本'}），{len(ids)} 个文档块")
+
+    reranker = create_reranker(model_name=args.model)
+    if not reranker.pretokenized:
+        print("⚠️  当前重排序模型无法直接使用分词器和底层模型，分词缓存不生效")
+        return
+    cache = RerankTokenCache.load(path)
+    if cache is None or cache.tokenizer != reranker.model_name:
+        tmp_dir = tempfile.mkdtemp(prefix="rerank-tokens-")
+        start = time.perf_counter()
+        config = build_rerank_tokens(tmp_dir, ids, texts, reranker.model_name)
+        cache = RerankTokenCache(tmp_dir)
+        print(f"🧩 知识库没有可用的分词缓存，临时构建: {config['tokens']} 个 token（{time.perf_counter() - start:.1f}s）")
+
+    queries = sample_queries(texts, args.num_queries, rng)
+    print(f"📝 {len(queries)} 条查询，每条 {args.pool} 个候选")
+    results = {"现场分词": [], "分词缓存": []}
+    max_diff = 0.0
+    for query in queries:
+        rows = rng.choice(len(ids), size=min(args.pool, len(ids)), replace=False)
+        documents = [texts[row] for row in rows]
+        baseline = reranker.model.predict([[query, doc] for doc in documents])
+        for label, token_ids in (("现场分词", None), ("分词缓存", cache.lookup([ids[row] for row in rows]))):
+            timings = {}
+            start = time.perf_counter()
+            scores = reranker.score_tokens(query, documents, token_ids=token_ids, timings=timings)
+            timings["total"] = time.perf_counter() - start
+            results[label].append(timings)
+            max_diff = max(max_diff, float(np.max(np.abs(np.asarray(scores) - baseline))))
+
+    print(f"\n{'方式':<10}{'分词均值':>12}{'分词 p95':>12}{'推理均值':>12}{'总耗时均值':>12}{'总耗时 p95':>12}")
+    for label, rows in results.items():
+        tokenize = [row["tokenize"] * 1000 for row in rows]
+        inference = [row["inference"] * 1000 for row in rows]
+        total = [row["total"] * 1000 for row in rows]
+        print(f"{label:<10}{np.mean(tokenize):>9.2f} ms{percentile(tokenize, 0.95):>9.2f} ms"
+              f"{np.mean(inference):>9.1f} ms{np.mean(total):>9.1f} ms{percentile(total, 0.95):>9.1f} ms")
+    before = np.mean([row["tokenize"] for row in results["现场分词"]])
+    after = np.mean([row["tokenize"] for row in results["分词缓存"]])
+    print(f"\n分词耗时减少 {1 - after / max(before, 1e-12):.1%}，与 CrossEncoder.predict 的最大分数差 {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
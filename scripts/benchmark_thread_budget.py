@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+CPU 线程预算评估脚本
+功能：模拟同一台 CPU 机器上的多个 API worker，对比不同线程预算下重排序的总吞吐量和延迟。
+每种预算写作 “worker 数 x 每个 worker 的 torch 线程数”，可加 +pin 后缀表示绑核，例如
+  - 1x8：单个 worker 使用 8 个线程
+  - 4x8：4 个 worker 各自使用 8 个线程（未设置预算时的默认行为，超额订阅）
+  - 4x2+pin：4 个 worker 各 2 个线程，并各自绑定到不重叠的 2 个核心
+每个 worker 是一个独立进程（线程预算须在导入 torch 之前应用），通过环境变量设置预算（与 API 相同，见 thread_budget），
+加载重排序模型后等待所有 worker 就绪再同时开始；每个 worker 内 --concurrency 个线程持续发送请求（查询 + --pool 个文档块），
+持续 --duration 秒。输出每种预算的总吞吐量（请求 / 秒）和请求延迟 p50 / p95
+
+使用方法：
+    python scripts/benchmark_thread_budget.py --kb-dir chroma_db_judgement --budgets 1x8,2x4,4x2,4x8,4x2+pin
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.kb_snapshot import read_knowledge_base
+from src.core.rerank_tokens import DEFAULT_RERANK_MODEL
+
+
+def percentile(values, p):
+    """计算百分位数（与监控模块保持一致的取法）"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def sample_queries(texts, num_queries: int, rng):
+    """从随机文档块中抽取一个 8~40 字的分句作为查询"""
+    queries = []
+    for row in rng.permutation(len(texts)):
+        clauses = [c.strip() for c in re.split(r"[。；！？\n]", texts[row]) if 8 <= len(c.strip()) <= 40]
+        if clauses:
+            queries.append(clauses[int(rng.integers(len(clauses)))])
+        if len(queries) >= num_queries:
+            break
+    return queries
+
+
+def parse_budget(spec: str):
+    """解析 “WxT[+pin]” 形式的预算"""
+    match = re.fullmatch(r"(\d+)x(\d+)(\+pin)?", spec.strip())
+    if not match:
+        raise ValueError(f"无法解析的线程预算: {spec}（格式: worker 数 x torch 线程数，可加 +pin）")
+    return int(match.group(1)), int(match.group(2)), bool(match.group(3))
+
+
+def run_worker(args):
+    """单个 worker 进程：应用线程预算（环境变量由父进程设置）、加载模型、等待开始信号后持续发送请求"""
+    from src.core.thread_budget import apply_thread_budget_from_env, applied_thread_budget
+
+    apply_thread_budget_from_env()
+    from src.core.reranker import create_reranker
+
+    rng = np.random.default_rng(args.seed + args.worker_index)
+    _, texts, _, _ = read_knowledge_base(args.kb_dir, include_updates=False)
+    requests = [(query, [texts[row] for row in rng.choice(len(texts), size=min(args.pool, len(texts)), replace=False)])
+                for query in sample_queries(texts, args.num_requests, rng)]
+    reranker = create_reranker(model_name=args.rerank_model)
+    reranker.rerank_ids(requests[0][0], list(range(len(requests[0][1]))), requests[0][1], 5)  # 预热
+
+    sync_dir = Path(args.sync_dir)
+    (sync_dir / f"ready-{args.worker_index}").touch()
+    while not (sync_dir / "go").exists():
+        time.sleep(0.01)
+
+    deadline = time.perf_counter() + args.duration
+    latencies, lock = [], threading.Lock()
+
+    def loop(offset: int):
+        position = offset
+        while time.perf_counter() < deadline:
+            query, documents = requests[position % len(requests)]
+            start = time.perf_counter()
+            reranker.rerank_ids(query, list(range(len(documents))), documents, 5)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+            position += args.concurrency
+
+    threads = [threading.Thread(target=loop, args=(offset,)) for offset in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps({"latencies": latencies, "budget": applied_thread_budget()}), flush=True)
+
+
+def run_budget(args, spec: str):
+    """按一种预算启动全部 worker 进程，汇总吞吐量和延迟"""
+    workers, threads, pin = parse_budget(spec)
+    with tempfile.TemporaryDirectory() as sync_dir:
+        env = dict(os.environ,
+                   THREAD_BUDGET_ENABLED="1",
+                   THREAD_BUDGET_WORKERS=str(workers),
+                   TORCH_NUM_THREADS=str(threads),
+                   CPU_PINNING="1" if pin else "0",
+                   THREAD_BUDGET_LOCK_DIR=sync_dir)
+        if args.tokenizers_parallelism != "auto":
+            env["TOKENIZERS_PARALLELISM"] = args.tokenizers_parallelism
+        else:
+            env.pop("TOKENIZERS_PARALLELISM", None)
+        command = [sys.executable, __file__, "--worker-index", "{index}", "--sync-dir", sync_dir,
+                   "--kb-dir", args.kb_dir, "--rerank-model", args.rerank_model, "--num-requests", str(args.num_requests),
+                   "--pool", str(args.pool), "--concurrency", str(args.concurrency),
+                   "--duration", str(args.duration), "--seed", str(args.seed)]
+        processes = [subprocess.Popen([str(index) if part == "{index}" else part for part in command],
+                                      env=env, stdout=subprocess.PIPE, text=True)
+                     for index in range(workers)]
+        while sum(1 for _ in Path(sync_dir).glob("ready-*")) < workers:
+            if any(process.poll() is not None for process in processes):
+                raise RuntimeError(f"预算 {spec} 的 worker 启动失败")
+            time.sleep(0.05)
+        (Path(sync_dir) / "go").touch()
+        results = []
+        for process in processes:
+            output, _ = process.communicate()
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    latencies = [value for result in results for value in result["latencies"]]
+    return workers, latencies, [result["budget"] for result in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="不同 CPU 线程预算下的重排序吞吐量对比")
+    parser.add_argument("--kb-dir", type=str, required=True, help="知识库根目录或版本目录（提供查询和文档块）")
+    parser.add_argument("--rerank-model", type=str, default=DEFAULT_RERANK_MODEL)
+    parser.add_argument("--budgets", type=str, default="1x8,2x4,4x2,4x8",
+                        help="逗号分隔的预算：worker 数 x 每个 worker 的 torch 线程数，可加 +pin 表示绑核")
+    parser.add_argument("--tokenizers-parallelism", choices=("auto", "true", "false"), default="auto",
+                        help="auto 表示按线程预算的默认值（只有单个 worker 时并行）")
+    parser.add_argument("--concurrency", type=int, default=4, help="每个 worker 内并发请求的线程数")
+    parser.add_argument("--duration", type=float, default=20.0, help="每种预算的压测时长（秒）")
+    parser.add_argument("--num-requests", type=int, default=100, help="每个 worker 预先生成的请求数（循环使用）")
+    parser.add_argument("--pool", type=int, default=20, help="每个请求重排序的文档块数量")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker-index", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--sync-dir", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_index is not None:
+        run_worker(args)
+        return
+
+    print(f"🖥️  可用核心 {len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}，"
+          f"每个 worker {args.concurrency} 个并发线程，每种预算 {args.duration:.0f}s")
+    rows = []
+    for spec in args.budgets.split(","):
+        print(f"🔄 预算 {spec.strip()}...")
+        workers, latencies, budgets = run_budget(args, spec)
+        rows.append((spec.strip(), workers, latencies, budgets))
+        pinned = [budget["cpus"] for budget in budgets if budget and budget["cpus"]]
+        if pinned:
+            print(f"   绑核: {pinned}")
+
+    print(f"\n{'预算':<12}{'worker':>8}{'请求数':>8}{'吞吐量':>12}{'延迟 p50':>12}{'延迟 p95':>12}")
+    for spec, workers, latencies, _ in rows:
+        if not latencies:
+            print(f"{spec:<12}{workers:>8}{0:>8}（压测时间内没有完成的请求）")
+            continue
+        print(f"{spec:<12}{workers:>8}{len(latencies):>8}{len(latencies) / args.duration:>8.1f} r/s"
+              f"{percentile(latencies, 0.5) * 1000:>9.1f} ms{percentile(latencies, 0.95) * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+向量库基准测试脚本
+功能：
+1. 等价性测试：在同一语料上分别构建 Chroma 与 faiss（FlashVectorStore）向量库，
+   比较两者 Top-K 结果的重合度（以 Chroma 结果为基准的 recall@k）
+2. 延迟测试：使用随机向量构建大规模 HNSW 索引（如 100 万条），
+   统计单查询 Top-K 检索延迟与相对暴力检索的召回率（无需加载嵌入模型），
+   并对比 NumPy 暴力检索（ExactIndex）的单查询与批量检索延迟
+3. 压缩报告：对比 none / fp16 / pq / ivfpq 四种压缩方式的
+   每百万文档块常驻内存与相对未压缩索引的 recall@k
+4. 多 worker 内存：启动多个进程加载同一个 faiss 向量库，
+   对比 mmap 与整体读入两种方式下每个进程的独占内存（USS）
+5. 在线更新：多个线程持续检索的同时批量写入文档块（更新日志 + 叠加层原子替换），
+   分别报告写入吞吐与有 / 无写入时的检索 p50 / p99
+6. 分片：将同一批向量切分为 1 / 2 / 4 ... 个分片，每个分片一个检索进程，
+   多个客户端线程并发检索，报告聚合 QPS、p50 / p99 以及停掉一个分片后的降级结果
+
+使用方法：
+    # 等价性测试（需要 chromadb 和嵌入模型；默认分别测试 exact 与 hnsw 两种索引）
+    python scripts/benchmark_vector_store.py equivalence --docs-path data/docs/legal_docs.txt --k 50 --index-types exact,hnsw
+
+    # 大规模延迟测试（100 万条 384 维向量）
+    python scripts/benchmark_vector_store.py latency --num-vectors 1000000 --k 50
+
+    # 压缩报告（可用 --vectors 指定真实嵌入向量 .npy 文件）
+    python scripts/benchmark_vector_store.py compression --num-vectors 200000 --k 10
+
+    # 多 worker 内存（需要已构建的 faiss 向量库）
+    python scripts/benchmark_vector_store.py workers --store-dir chroma_db_judgement --workers 4
+
+    # 在线更新对检索延迟的影响（随机向量，无需嵌入模型）
+    python scripts/benchmark_vector_store.py live-updates --num-vectors 200000 --batch-size 32
+
+    # 分片扩展性（随机向量，每个分片一个进程）
+    python scripts/benchmark_vector_store.py shards --num-vectors 1000000 --shard-counts 1,2,4 --clients 8
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.vector_index import (
+    ExactIndex,
+    HNSWIndex,
+    COMPRESSION_TYPES,
+    create_index,
+    normalize_vectors,
+    DEFAULT_HNSW_M,
+    DEFAULT_EF_CONSTRUCTION,
+    DEFAULT_EF_SEARCH,
+)
+
+# 默认测试问题（与压测脚本保持一致的法律问题）
+DEFAULT_QUERIES = [
+    "什么是合同违约？",
+    "如何申请劳动仲裁？",
+    "离婚财产如何分割？",
+    "交通事故责任如何认定？",
+    "如何申请强制执行？",
+    "什么是正当防卫？",
+    "如何申请法律援助？",
+    "合同无效的情形有哪些？",
+    "如何计算违约金？",
+    "什么是不可抗力？",
+    "甲方逾期支付本金需要承担什么责任？",
+    "借款利率是多少？",
+]
+
+
+def percentile(values, p):
+    """计算百分位数（与监控模块保持一致的取法）"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def run_equivalence(args) -> bool:
+    """在同一语料上比较 Chroma 与 FlashVectorStore 的 Top-K 结果"""
+    from langchain_community.document_loaders import TextLoader
+    from langchain_community.vectorstores import Chroma
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from src.core.ingest import split_documents, EMBEDDING_MODEL_NAME
+    from src.core.vector_store import FlashVectorStore
+
+    documents = TextLoader(str(args.docs_path), encoding="utf-8").load()
+    chunks = split_documents(documents, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    ids = [str(i) for i in range(len(chunks))]
+    print(f"📄 语料: {args.docs_path}，共 {len(chunks)} 个文档块")
+
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        queries = [line.strip() for line in open(args.queries, encoding="utf-8") if line.strip()]
+    query_vectors = embeddings.embed_documents(queries)
+
+    index_types = [name.strip() for name in args.index_types.split(",") if name.strip()]
+    k = min(args.k, len(chunks))
+    passed = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        chroma_db = Chroma.from_documents(
+            documents=chunks, embedding=embeddings, ids=ids,
+            persist_directory=str(Path(tmp_dir) / "chroma")
+        )
+        chroma_results, chroma_latencies = [], []
+        for vector in query_vectors:
+            t0 = time.perf_counter()
+            chroma_results.append({doc.id for doc in chroma_db.similarity_search_by_vector(vector, k=k)})
+            chroma_latencies.append(time.perf_counter() - t0)
+        print(f"Chroma 检索延迟: p50 {percentile(chroma_latencies, 0.5) * 1000:.3f} ms, "
+              f"p99 {percentile(chroma_latencies, 0.99) * 1000:.3f} ms")
+
+        # 显式指定索引类型（默认 auto 在小语料上会选择暴力检索，测不到 HNSW）
+        for index_type in index_types:
+            store_dir = str(Path(tmp_dir) / f"faiss-{index_type}")
+            FlashVectorStore.from_documents(
+                documents=chunks, embedding=embeddings, ids=ids, persist_directory=store_dir,
+                index_type=index_type, M=args.hnsw_m, ef_construction=args.ef_construction, ef_search=args.ef_search
+            )
+            # 从磁盘重新加载，同时验证持久化格式
+            flash_db = FlashVectorStore.load(store_dir, embeddings)
+
+            recalls, flash_latencies = [], []
+            for query, vector, expected in zip(queries, query_vectors, chroma_results):
+                t0 = time.perf_counter()
+                flash_docs = flash_db.similarity_search_by_vector(vector, k=k)
+                flash_latencies.append(time.perf_counter() - t0)
+
+                actual = {doc.id for doc in flash_docs}
+                recall = len(expected & actual) / len(expected) if expected else 1.0
+                recalls.append(recall)
+                if recall < args.min_recall:
+                    print(f"⚠️  [{index_type}] recall@{k}={recall:.3f} 低于阈值: {query}")
+
+            print(f"\n=== 等价性测试结果（索引 {flash_db.index.index_type}, k={k}, 查询数={len(queries)}）===")
+            print(f"recall@{k}（以 Chroma 为基准）: 平均 {statistics.mean(recalls):.4f}, 最低 {min(recalls):.4f}")
+            print(f"faiss  检索延迟: p50 {percentile(flash_latencies, 0.5) * 1000:.3f} ms, "
+                  f"p99 {percentile(flash_latencies, 0.99) * 1000:.3f} ms")
+            passed = passed and min(recalls) >= args.min_recall
+
+    print("✅ 等价性测试通过" if passed else f"❌ 等价性测试未通过（阈值 {args.min_recall}）")
+    return passed
+
+
+def run_latency(args) -> bool:
+    """使用随机向量测试大规模 HNSW 索引的检索延迟与召回率"""
+    rng = np.random.default_rng(args.seed)
+    print(f"🔄 生成 {args.num_vectors} 条 {args.dim} 维随机向量...")
+    vectors = normalize_vectors(rng.standard_normal((args.num_vectors, args.dim), dtype=np.float32))
+    # 查询取自语料附近的扰动向量，模拟真实查询分布
+    picks = rng.integers(0, args.num_vectors, size=args.num_queries)
+    queries = normalize_vectors(vectors[picks] + 0.3 * rng.standard_normal((args.num_queries, args.dim), dtype=np.float32))
+
+    print(f"🔄 构建 HNSW 索引（M={args.hnsw_m}, ef_construction={args.ef_construction}）...")
+    t0 = time.perf_counter()
+    index = HNSWIndex(args.dim, M=args.hnsw_m, ef_construction=args.ef_construction, ef_search=args.ef_search)
+    index.add(vectors)
+    print(f"✅ 构建完成，用时 {time.perf_counter() - t0:.1f} s")
+
+    latencies = []
+    recalls = []
+    for query in queries:
+        query = query[np.newaxis, :]
+        t0 = time.perf_counter()
+        _, ids = index.search(query, args.k)
+        latencies.append(time.perf_counter() - t0)
+
+        exact = np.argpartition(-(vectors @ query[0]), args.k)[:args.k]
+        recalls.append(len(set(ids[0].tolist()) & set(exact.tolist())) / args.k)
+
+    exact_index = ExactIndex(args.dim, vectors)
+    exact_latencies = []
+    for query in queries:
+        t0 = time.perf_counter()
+        exact_index.search(query[np.newaxis, :], args.k)
+        exact_latencies.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    exact_index.search(queries, args.k)
+    batch_ms = (time.perf_counter() - t0) / len(queries) * 1000
+
+    print(f"\n=== 延迟测试结果（N={args.num_vectors}, k={args.k}, ef_search={args.ef_search}）===")
+    print(f"HNSW 单查询延迟: p50 {percentile(latencies, 0.5) * 1000:.3f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.3f} ms")
+    print(f"HNSW recall@{args.k}（相对暴力检索）: {statistics.mean(recalls):.4f}")
+    print(f"暴力检索单查询延迟: p50 {percentile(exact_latencies, 0.5) * 1000:.3f} ms, "
+          f"p99 {percentile(exact_latencies, 0.99) * 1000:.3f} ms")
+    print(f"暴力检索批量（{len(queries)} 条一次矩阵乘法）: 平均 {batch_ms:.3f} ms/查询")
+    return True
+
+
+def make_clustered_vectors(rng, num_vectors, dim, num_clusters=1000):
+    """生成带聚类结构的随机向量（比均匀随机向量更接近真实嵌入分布）"""
+    centers = rng.standard_normal((num_clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, num_clusters, size=num_vectors)
+    noise = 0.5 * rng.standard_normal((num_vectors, dim), dtype=np.float32)
+    return normalize_vectors(centers[labels] + noise)
+
+
+def run_compression(args) -> bool:
+    """对比各压缩方式的内存占用与召回率"""
+    rng = np.random.default_rng(args.seed)
+    if args.vectors:
+        vectors = normalize_vectors(np.load(args.vectors))
+        print(f"📄 使用真实向量: {args.vectors}，共 {len(vectors)} 条 {vectors.shape[1]} 维")
+    else:
+        print(f"🔄 生成 {args.num_vectors} 条 {args.dim} 维聚类随机向量...")
+        vectors = make_clustered_vectors(rng, args.num_vectors, args.dim)
+    num_vectors, dim = vectors.shape
+    picks = rng.integers(0, num_vectors, size=args.num_queries)
+    queries = normalize_vectors(vectors[picks] + 0.1 * rng.standard_normal((args.num_queries, dim), dtype=np.float32))
+
+    reference_ids = None
+    rows = []
+    for compression in COMPRESSION_TYPES:
+        t0 = time.perf_counter()
+        index = create_index(dim, num_vectors, index_type="hnsw", compression=compression, M=args.hnsw_m,
+                             ef_construction=args.ef_construction, ef_search=args.ef_search,
+                             nprobe=args.nprobe, rescore_factor=args.rescore_factor)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        _, ids = index.search(queries, args.k)
+        search_ms = (time.perf_counter() - t0) / len(queries) * 1000
+
+        if reference_ids is None:
+            # 第一个为未压缩索引，作为召回率基准
+            reference_ids = ids
+        recall = statistics.mean(
+            len(set(ref.tolist()) & set(got.tolist())) / args.k
+            for ref, got in zip(reference_ids, ids)
+        )
+        resident_mb = index.memory_bytes() / 1024 ** 2 * 1_000_000 / num_vectors
+        # pq / ivfpq 的 float16 精排向量以内存映射方式按需读取，单独列出
+        mmap_mb = num_vectors * dim * 2 / 1024 ** 2 * 1_000_000 / num_vectors if compression in ("pq", "ivfpq") else 0.0
+        rows.append((compression, resident_mb, mmap_mb, recall, search_ms, build_seconds))
+
+    print(f"\n=== 压缩报告（N={num_vectors}, dim={dim}, k={args.k}）===")
+    print(f"{'压缩方式':<8}{'常驻内存/百万块':>16}{'mmap 精排向量/百万块':>22}{'recall@k':>10}{'检索/查询':>12}{'构建':>10}")
+    for compression, resident_mb, mmap_mb, recall, search_ms, build_seconds in rows:
+        print(f"{compression:<8}{resident_mb:>13.0f} MB{mmap_mb:>19.0f} MB{recall:>10.4f}"
+              f"{search_ms:>9.3f} ms{build_seconds:>8.1f} s")
+    print("注：recall@k 以未压缩（none）索引的结果为基准；mmap 精排向量由所有 worker 共享页缓存")
+    return True
+
+
+def _worker_memory(store_dir, use_mmap, num_queries, k, queue):
+    """子进程：加载向量库并执行若干检索后上报独占内存"""
+    import psutil
+    from src.core.kb_registry import resolve_kb_path
+    from src.core.vector_store import FlashVectorStore
+
+    # 知识库根目录按 CURRENT 解析到当前版本
+    store = FlashVectorStore.load(str(resolve_kb_path(store_dir)[0]), embedding=None, mmap=use_mmap)
+    rng = np.random.default_rng()
+    for _ in range(num_queries):
+        store.similarity_search_by_vector(rng.standard_normal(store.index.dim), k=k)
+    memory = psutil.Process().memory_full_info()
+    queue.put((memory.uss, getattr(memory, "pss", 0)))
+
+
+def run_workers(args) -> bool:
+    """对比 mmap 与整体读入时，多个 worker 加载同一向量库的内存占用"""
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"=== 多 worker 内存（{args.store_dir}, workers={args.workers}）===")
+    for use_mmap in (False, True):
+        queue = ctx.Queue()
+        processes = [
+            ctx.Process(target=_worker_memory, args=(args.store_dir, use_mmap, args.num_queries, args.k, queue))
+            for _ in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        results = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+        uss = [r[0] / 1024 ** 2 for r in results]
+        pss = [r[1] / 1024 ** 2 for r in results]
+        mode = "mmap" if use_mmap else "整体读入"
+        print(f"{mode:<8} 每个 worker USS 平均 {statistics.mean(uss):.0f} MB，"
+              f"PSS 合计 {sum(pss):.0f} MB")
+    print("注：USS 为进程独占内存；mmap 方式下向量与文档块位于共享页缓存，不计入 USS")
+    return True
+
+
+def run_live_updates(args) -> bool:
+    """持续检索的同时批量写入，分别报告写入吞吐与检索延迟"""
+    import threading
+    from langchain_core.documents import Document
+    from src.core.kb_registry import KnowledgeBaseRegistry, activate_version, version_path
+    from src.core.live_updates import make_upsert_record
+    from src.core.retrieval import ChunkFetcher, retrieve_candidates
+    from src.core.vector_store import FlashVectorStore
+
+    rng = np.random.default_rng(args.seed)
+    print(f"🔄 生成 {args.num_vectors} 条 {args.dim} 维聚类随机向量...")
+    vectors = make_clustered_vectors(rng, args.num_vectors, args.dim)
+    num_docs = max(1, args.num_vectors // 10)
+    queries = make_clustered_vectors(rng, 512, args.dim)
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        index = create_index(args.dim, len(vectors), M=args.hnsw_m, ef_construction=args.ef_construction,
+                             ef_search=args.ef_search)
+        store = FlashVectorStore(None, index)
+        store._add_vectors(
+            vectors,
+            [f"chunk {i}" for i in range(len(vectors))],
+            [{"source": f"doc{i % num_docs}"} for i in range(len(vectors))],
+            [f"c{i}" for i in range(len(vectors))],
+        )
+        store.persist(str(version_path(base_dir, "v1")))
+        activate_version(base_dir, "v1")
+        registry = KnowledgeBaseRegistry(lambda path: FlashVectorStore.load(path, None))
+        registry.register("kb", base_dir, args.k)
+
+        def reader(stop, latencies):
+            i = 0
+            while not stop.is_set():
+                query = queries[i % len(queries)]
+                i += 1
+                t0 = time.perf_counter()
+                with registry.snapshot() as snapshot:
+                    kb = snapshot.get("kb")
+                    fetcher = ChunkFetcher({"kb": kb.vectorstore})
+                    candidates = retrieve_candidates("kb", kb.vectorstore, [query], args.k, fetcher)[0]
+                    fetcher.texts(candidates[:5])
+                latencies.append(time.perf_counter() - t0)
+
+        def writer(stop, batch_latencies, written):
+            batch = 0
+            while not stop.is_set():
+                # 替换随机选取的已有文档（删除旧文档块 + 写入新文档块）
+                doc_ids = [f"doc{d}" for d in rng.integers(0, num_docs, size=max(1, args.batch_size // 4))]
+                chunks = [
+                    Document(page_content=f"live {batch}-{j}", metadata={"source": doc_ids[j % len(doc_ids)]},
+                             id=f"live-{batch}-{j}")
+                    for j in range(args.batch_size)
+                ]
+                new_vectors = make_clustered_vectors(rng, args.batch_size, args.dim)
+                t0 = time.perf_counter()
+                registry.write_update("kb", make_upsert_record(doc_ids, chunks, new_vectors))
+                batch_latencies.append(time.perf_counter() - t0)
+                written.append(args.batch_size)
+                batch += 1
+                if args.write_interval > 0:
+                    time.sleep(args.write_interval)
+
+        print(f"\n=== 在线更新（N={args.num_vectors}, 读线程={args.readers}, 每批 {args.batch_size} 个文档块）===")
+        print(f"{'阶段':<10}{'读 QPS':>10}{'读 p50 (ms)':>14}{'读 p99 (ms)':>14}{'写入 块/s':>12}{'写批次 p99 (ms)':>18}")
+        for with_writes in (False, True):
+            stop = threading.Event()
+            latencies, batch_latencies, written = [], [], []
+            threads = [threading.Thread(target=reader, args=(stop, latencies)) for _ in range(args.readers)]
+            if with_writes:
+                threads.append(threading.Thread(target=writer, args=(stop, batch_latencies, written)))
+            for thread in threads:
+                thread.start()
+            time.sleep(args.duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+            label = "读 + 写" if with_writes else "只读"
+            write_rate = sum(written) / args.duration
+            write_p99 = f"{percentile(batch_latencies, 0.99) * 1000:.2f}" if batch_latencies else "-"
+            print(f"{label:<10}{len(latencies) / args.duration:>10.1f}"
+                  f"{percentile(latencies, 0.5) * 1000:>14.3f}{percentile(latencies, 0.99) * 1000:>14.3f}"
+                  f"{write_rate:>12.1f}{write_p99:>18}")
+        print(f"叠加层状态: {registry.get('kb').vectorstore.stats()}")
+    return True
+
+
+def run_shards(args) -> bool:
+    """不同分片数下的聚合 QPS，以及单个分片不可用时的降级结果"""
+    import threading
+    from src.core.shards import ShardedVectorStore, build_shards, start_shard_servers, wait_for_shards
+    from src.core.vector_store import FlashVectorStore
+
+    rng = np.random.default_rng(args.seed)
+    print(f"🔄 生成 {args.num_vectors} 条 {args.dim} 维聚类随机向量...")
+    vectors = make_clustered_vectors(rng, args.num_vectors, args.dim)
+    queries = make_clustered_vectors(rng, 512, args.dim)
+    shard_counts = [int(n) for n in args.shard_counts.split(",")]
+    index_params = {"index_type": args.index_type, "M": args.hnsw_m,
+                    "ef_construction": args.ef_construction, "ef_search": args.ef_search}
+
+    def run_clients(store, duration):
+        stop = threading.Event()
+        latencies = []
+
+        def client(offset):
+            i = offset
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                store.search_ids_by_vectors([queries[i % len(queries)]], args.k)
+                latencies.append(time.perf_counter() - t0)
+                i += args.clients
+
+        threads = [threading.Thread(target=client, args=(c,)) for c in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return latencies
+
+    rows = []
+    with tempfile.TemporaryDirectory() as base_dir:
+        source = Path(base_dir) / "source"
+        store = FlashVectorStore(None, create_index(args.dim, len(vectors), index_type="exact"))
+        store._add_vectors(vectors, [f"chunk {i}" for i in range(len(vectors))],
+                           [{"source": f"doc{i}"} for i in range(len(vectors))],
+                           [f"c{i}" for i in range(len(vectors))])
+        store.persist(str(source))
+        del store
+
+        reference = None
+        for num_shards in shard_counts:
+            shard_dir = Path(base_dir) / f"shards-{num_shards}"
+            print(f"🧩 切分为 {num_shards} 个分片...")
+            build_shards(source, shard_dir, num_shards, **index_params)
+            processes = start_shard_servers(shard_dir, threads=args.threads_per_shard)
+            try:
+                if not wait_for_shards(shard_dir, timeout=120):
+                    print("❌ 分片检索进程启动超时")
+                    return False
+                sharded = ShardedVectorStore.load(str(shard_dir), embedding=None)
+                run_clients(sharded, min(2.0, args.duration))  # 预热（页缓存、连接池）
+                latencies = run_clients(sharded, args.duration)
+                results = [set(cid for cid, _ in row) for row in sharded.search_ids_by_vectors(list(queries[:50]), args.k)]
+                if reference is None:
+                    reference = results
+                recall = np.mean([len(a & b) / max(1, len(b)) for a, b in zip(results, reference)])
+
+                degraded = ""
+                if num_shards > 1:
+                    processes[0].terminate()
+                    processes[0].join()
+                    rows_degraded = sharded.search_ids_by_vectors(list(queries[:50]), args.k)
+                    degraded = f"{np.mean([len(set(cid for cid, _ in row) & full) / max(1, len(full)) for row, full in zip(rows_degraded, results)]):.3f}"
+                rows.append((num_shards, len(latencies) / args.duration, percentile(latencies, 0.5),
+                             percentile(latencies, 0.99), recall, degraded))
+                sharded.close()
+            finally:
+                for process in processes:
+                    process.terminate()
+
+    base_qps = rows[0][1]
+    print(f"\n=== 分片扩展性（N={args.num_vectors}, 客户端线程={args.clients}, 每分片线程={args.threads_per_shard}）===")
+    print(f"{'分片数':<8}{'QPS':>10}{'加速比':>8}{'p50 (ms)':>12}{'p99 (ms)':>12}{'一致率':>8}{'停 1 个分片召回':>14}")
+    for num_shards, qps, p50, p99, recall, degraded in rows:
+        print(f"{num_shards:<8}{qps:>10.1f}{qps / base_qps:>8.2f}{p50 * 1000:>12.2f}{p99 * 1000:>12.2f}"
+              f"{recall:>8.3f}{degraded or '-':>14}")
+    print("注：一致率为相对第一行（分片数最少）的 Top K 重合度；停 1 个分片召回为降级结果相对完整结果的 Top K 重合度")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量库基准测试（Chroma 等价性 / HNSW 延迟）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    eq_parser = subparsers.add_parser("equivalence", help="Chroma 与 faiss 后端的等价性测试")
+    eq_parser.add_argument("--docs-path", type=Path, default=project_root / "data" / "docs" / "legal_docs.txt")
+    eq_parser.add_argument("--queries", type=str, default=None, help="查询文件（每行一个问题）")
+    eq_parser.add_argument("--chunk-size", type=int, default=500)
+    eq_parser.add_argument("--chunk-overlap", type=int, default=50)
+    eq_parser.add_argument("--min-recall", type=float, default=0.95, help="单查询 recall@k 下限")
+    eq_parser.add_argument("--index-types", type=str, default="exact,hnsw", help="逗号分隔的 faiss 索引类型（分别与 Chroma 比较）")
+
+    lat_parser = subparsers.add_parser("latency", help="大规模随机向量的 HNSW 延迟测试")
+    lat_parser.add_argument("--num-vectors", type=int, default=1_000_000)
+    lat_parser.add_argument("--dim", type=int, default=384)
+    lat_parser.add_argument("--num-queries", type=int, default=200)
+    lat_parser.add_argument("--seed", type=int, default=42)
+
+    comp_parser = subparsers.add_parser("compression", help="各压缩方式的内存占用与召回率报告")
+    comp_parser.add_argument("--vectors", type=str, default=None, help="真实嵌入向量 .npy 文件（默认使用随机向量）")
+    comp_parser.add_argument("--num-vectors", type=int, default=200_000)
+    comp_parser.add_argument("--dim", type=int, default=384)
+    comp_parser.add_argument("--num-queries", type=int, default=200)
+    comp_parser.add_argument("--seed", type=int, default=42)
+    comp_parser.add_argument("--nprobe", type=int, default=16)
+    comp_parser.add_argument("--rescore-factor", type=int, default=4)
+
+    workers_parser = subparsers.add_parser("workers", help="多 worker 加载同一向量库的内存对比")
+    workers_parser.add_argument("--store-dir", type=str, required=True, help="faiss 向量库目录")
+    workers_parser.add_argument("--workers", type=int, default=4)
+    workers_parser.add_argument("--num-queries", type=int, default=200)
+
+    live_parser = subparsers.add_parser("live-updates", help="在线更新时的写入吞吐与检索延迟")
+    live_parser.add_argument("--num-vectors", type=int, default=200_000)
+    live_parser.add_argument("--dim", type=int, default=384)
+    live_parser.add_argument("--readers", type=int, default=4, help="并发检索线程数")
+    live_parser.add_argument("--batch-size", type=int, default=32, help="每批写入的文档块数")
+    live_parser.add_argument("--write-interval", type=float, default=0.0, help="两批写入之间的间隔（秒）")
+    live_parser.add_argument("--duration", type=float, default=10.0, help="每个阶段的持续时间（秒）")
+    live_parser.add_argument("--seed", type=int, default=42)
+
+    shards_parser = subparsers.add_parser("shards", help="分片检索的聚合 QPS 与降级测试")
+    shards_parser.add_argument("--num-vectors", type=int, default=1_000_000)
+    shards_parser.add_argument("--dim", type=int, default=384)
+    shards_parser.add_argument("--shard-counts", type=str, default="1,2,4", help="逗号分隔的分片数")
+    shards_parser.add_argument("--clients", type=int, default=8, help="并发检索线程数")
+    shards_parser.add_argument("--threads-per-shard", type=int, default=1)
+    shards_parser.add_argument("--index-type", type=str, default="exact", help="各分片的索引类型")
+    shards_parser.add_argument("--duration", type=float, default=10.0, help="每种分片数的测试时长（秒）")
+    shards_parser.add_argument("--seed", type=int, default=42)
+
+    for sub in (eq_parser, lat_parser, comp_parser, workers_parser, live_parser, shards_parser):
+        sub.add_argument("--k", type=int, default=50)
+        sub.add_argument("--hnsw-m", type=int, default=DEFAULT_HNSW_M)
+        sub.add_argument("--ef-construction", type=int, default=DEFAULT_EF_CONSTRUCTION)
+        sub.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH)
+
+    args = parser.parse_args()
+    if args.command == "equivalence":
+        passed = run_equivalence(args)
+    elif args.command == "compression":
+        passed = run_compression(args)
+    elif args.command == "workers":
+        passed = run_workers(args)
+    elif args.command == "live-updates":
+        passed = run_live_updates(args)
+    elif args.command == "shards":
+        passed = run_shards(args)
+    else:
+        passed = run_latency(args)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+查询路由器构建脚本
+功能：
+1. 为查询路由的质心分类器生成各知识库的质心（data/router_centroids.npz）
+   - 默认使用各知识库文档块向量的均值
+   - 提供标注查询（JSONL，每行 {"query": "...", "kb": "law"}）时，优先使用该知识库标注查询向量的均值
+2. 在标注查询的验证集上对比 规则 / 分类器 / 规则 + 分类器 三种路由方式：
+   准确率（最高概率的知识库与标注一致）、回退率、平均检索的知识库数量
+
+使用方法：
+    # 只用知识库文档块生成质心
+    python scripts/build_router.py
+
+    # 使用标注查询生成质心并评估
+    python scripts/build_router.py --labeled data/router_queries.jsonl --output data/router_centroids.npz
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.kb_snapshot import read_knowledge_base
+from src.core.query_router import DEFAULT_TEMPERATURE, QueryRouter
+from src.core.vector_index import normalize_vectors
+
+DEFAULT_KNOWLEDGE_BASES = {
+    "law": project_root / "chroma_db",
+    "case": project_root / "chroma_db_case",
+    "judgement": project_root / "chroma_db_judgement",
+}
+DEFAULT_BUDGETS = {"law": 2, "case": 2, "judgement": 1}
+
+
+def kb_centroid(kb_dir, sample: int, rng) -> np.ndarray:
+    """知识库文档块向量（抽样）的均值"""
+    _, _, _, vectors = read_knowledge_base(kb_dir, include_updates=False)
+    if len(vectors) > sample:
+        vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+    return normalize_vectors([vectors.mean(axis=0)])[0]
+
+
+def evaluate(router: QueryRouter, rows, vectors, budgets) -> dict:
+    correct = fallbacks = searched = 0
+    for row, vector in zip(rows, vectors):
+        decision = router.route(row["query"], budgets, query_vector=vector)
+        correct += max(decision.probabilities, key=decision.probabilities.get) == row["kb"]
+        fallbacks += decision.fallback
+        searched += len(decision.budgets)
+    n = max(1, len(rows))
+    return {"accuracy": correct / n, "fallback_rate": fallbacks / n, "kbs_searched": searched / n}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询路由器构建与评估")
+    parser.add_argument("--kb", action="append", default=None, metavar="NAME=DIR",
+                        help="知识库名称和目录（可重复，默认 law / case / judgement）")
+    parser.add_argument("--labeled", type=str, default=None, help="标注查询 JSONL（{\"query\", \"kb\"}）")
+    parser.add_argument("--sample", type=int, default=20000, help="每个知识库用于计算质心的文档块数量")
+    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE)
+    parser.add_argument("--min-confidence", type=float, default=0.6)
+    parser.add_argument("--val-ratio", type=float, default=0.3, help="标注查询中用于评估的比例")
+    parser.add_argument("--output", type=str, default=str(project_root / "data" / "router_centroids.npz"))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    knowledge_bases = dict(kb.split("=", 1) for kb in args.kb) if args.kb else DEFAULT_KNOWLEDGE_BASES
+
+    rows, vectors = [], np.zeros((0, 0), dtype=np.float32)
+    if args.labeled:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from src.core.ingest import EMBEDDING_MODEL_NAME
+
+        with open(args.labeled, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        rows = [row for row in rows if row.get("kb") in knowledge_bases]
+        print(f"🔄 嵌入 {len(rows)} 条标注查询...")
+        vectors = normalize_vectors(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME).embed_documents(
+            [row["query"] for row in rows]
+        ))
+    order = rng.permutation(len(rows))
+    num_val = int(len(rows) * args.val_ratio)
+    val_idx, train_idx = order[:num_val], order[num_val:]
+
+    names, centroids = [], []
+    for name, kb_dir in knowledge_bases.items():
+        labeled = [i for i in train_idx if rows[i]["kb"] == name]
+        if labeled:
+            centroid = normalize_vectors([vectors[labeled].mean(axis=0)])[0]
+            source = f"{len(labeled)} 条标注查询"
+        else:
+            centroid = kb_centroid(kb_dir, args.sample, rng)
+            source = f"知识库文档块 {kb_dir}"
+        names.append(name)
+        centroids.append(centroid)
+        print(f"  {name}: {source}")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(output, names=np.array(names), centroids=np.stack(centroids).astype(np.float32),
+             temperature=np.float32(args.temperature))
+    print(f"✅ 质心已写入: {output}")
+
+    if num_val:
+        params = {"min_confidence": args.min_confidence, "temperature": args.temperature}
+        routers = {
+            "规则": QueryRouter(None, **params),
+            "分类器": QueryRouter(dict(zip(names, centroids)), rules=[], **params),
+            "规则 + 分类器": QueryRouter(dict(zip(names, centroids)), **params),
+        }
+        budgets = {name: DEFAULT_BUDGETS.get(name, 2) for name in names}
+        val_rows = [rows[i] for i in val_idx]
+        val_vectors = vectors[val_idx]
+        print(f"\n=== 路由评估（验证集 {num_val} 条，共 {len(names)} 个知识库）===")
+        print(f"{'方式':<16}{'准确率':>10}{'回退率':>10}{'平均检索知识库数':>18}")
+        for label, router in routers.items():
+            result = evaluate(router, val_rows, val_vectors, budgets)
+            print(f"{label:<16}{result['accuracy']:>10.3f}{result['fallback_rate']:>10.3f}"
+                  f"{result['kbs_searched']:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+法条索引构建脚本
+功能：
+1. 为已有知识库版本补建法条倒排索引（statute_index.json，新构建的知识库由 ingest 自动生成）
+2. 在查询文件（每行一个问题）上统计法条查询快速通道的命中率和查找耗时
+
+使用方法：
+    # 为法条型知识库当前版本补建索引（运行中的 API 需 /admin/kb/law/swap 重新加载后生效）
+    python scripts/build_statute_index.py --kb-dir chroma_db
+
+    # 只统计命中率
+    python scripts/build_statute_index.py --kb-dir chroma_db --queries data/statute_queries.txt --skip-build
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.kb_registry import resolve_kb_path
+from src.core.kb_snapshot import read_knowledge_base
+from src.core.statute_index import StatuteIndex, write_statute_index
+
+# 与 API 的 STATUTE_FASTPATH_MAX_RESIDUAL 默认值一致
+DEFAULT_MAX_RESIDUAL = 6
+
+
+def evaluate(index: StatuteIndex, queries, max_residual: int) -> dict:
+    """统计法条查询占比、命中率（不读取文档块，删除的文档块按命中计）和单次查找耗时"""
+    statute = hits = 0
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        match = index.match(query)
+        latencies.append(time.perf_counter() - start)
+        if not match.articles:
+            continue
+        statute += 1
+        hits += match.resolved and match.residual <= max_residual
+    latencies = np.array(latencies or [0.0]) * 1000
+    return {
+        "queries": len(queries),
+        "statute_queries": statute,
+        "hits": hits,
+        "hit_rate": hits / statute if statute else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="法条索引构建与命中率统计")
+    parser.add_argument("--kb-dir", type=str, required=True, help="知识库根目录或版本目录")
+    parser.add_argument("--queries", type=str, default=None, help="查询文件（每行一个问题）")
+    parser.add_argument("--skip-build", action="store_true", help="不重建，使用版本目录下已有的索引")
+    parser.add_argument("--max-residual", type=int, default=DEFAULT_MAX_RESIDUAL,
+                        help="法条引用之外允许剩余的字数（与 STATUTE_FASTPATH_MAX_RESIDUAL 一致）")
+    args = parser.parse_args()
+
+    path, version = resolve_kb_path(args.kb_dir)
+    if args.skip_build:
+        index = StatuteIndex.load(path)
+    else:
+        # 在线更新由 API 加载时重放并追加到索引，这里只索引基础版本
+        ids, texts, metadatas, _ = read_knowledge_base(args.kb_dir, include_updates=False)
+        index = write_statute_index(path, ids, texts, metadatas) or StatuteIndex()
+        print(f"📑 {path}（版本: {version or '未分版本'}）: {len(ids)} 个文档块")
+    print(f"✅ 法条索引: {len(index)} 条条文，{len(index.laws)} 部法律")
+    if not len(index):
+        print("⚠️  没有识别到条文标题（行首的「《法律名称》第X条」），API 不会启用快速通道")
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+        result = evaluate(index, queries, args.max_residual)
+        print(f"\n=== 快速通道命中率（{result['queries']} 条查询）===")
+        print(f"法条查询: {result['statute_queries']}  命中: {result['hits']}  命中率: {result['hit_rate']:.1%}")
+        print(f"查找耗时: p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
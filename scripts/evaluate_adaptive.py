@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+自适应流水线评估脚本
+功能：在标注查询集上分别以 adaptive=true / false 调用 RAG 接口（非流式、max_tokens 很小，只比较检索阶段），
+对比两种模式的检索阶段延迟（改写 + 检索 + 重排序，取接口返回的 decisions.timings）、
+最终 Top 5 的召回率，以及跳过改写 / 提前停止 / 跳过或缩小重排序的比例
+
+标注查询 JSONL：每行 {"query": "...", "relevant": ["文档块 ID", ...]}（文档块 ID 即接口 sources 中的 id）
+
+使用方法：
+    python scripts/evaluate_adaptive.py --labeled data/adaptive_queries.jsonl --api-url http://localhost:8080
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import requests
+
+
+def percentile(values, p):
+    """计算百分位数（与监控模块保持一致的取法）"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def run_mode(api_url: str, rows, adaptive: bool, timeout: float) -> dict:
+    latencies, recalls = [], []
+    counts = {"rewrite_skipped": 0, "early_stop": 0, "rerank_skip": 0, "rerank_shrink": 0, "fastpath": 0}
+    for row in rows:
+        response = requests.post(
+            f"{api_url}/api/rag/chat",
+            json={"query": row["query"], "max_tokens": 1, "stream": False, "adaptive": adaptive},
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        body = response.json()
+        decisions = body.get("decisions")
+        if decisions is None:
+            print(f"⚠️  请求失败: {row['query']} -> {body.get('response')}")
+            continue
+        latencies.append(decisions["timings"].get("retrieval", 0.0))
+        relevant = set(row["relevant"])
+        found = {source["id"] for source in body.get("sources", [])}
+        recalls.append(len(found & relevant) / len(relevant) if relevant else 1.0)
+        counts["rewrite_skipped"] += decisions["rewrite"] == "skipped" and decisions["path"] == "full"
+        counts["early_stop"] += bool(decisions["kbs_skipped"])
+        counts["rerank_skip"] += decisions["rerank"] == "skip"
+        counts["rerank_shrink"] += decisions["rerank"] == "shrink"
+        counts["fastpath"] += decisions["path"] == "fastpath"
+    n = max(1, len(latencies))
+    return {
+        "requests": len(latencies),
+        "mean_ms": float(np.mean(latencies)) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000 if latencies else 0.0,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else 0.0,
+        "recall": float(np.mean(recalls)) if recalls else 0.0,
+        **{key: value / n for key, value in counts.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自适应流水线延迟与质量评估")
+    parser.add_argument("--labeled", type=str, required=True, help="标注查询 JSONL（{\"query\", \"relevant\"}）")
+    parser.add_argument("--api-url", type=str, default="http://localhost:8080")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    with open(args.labeled, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    print(f"📝 {len(rows)} 条标注查询，API: {args.api_url}")
+
+    results = {}
+    for adaptive in (False, True):
+        start = time.time()
+        results[adaptive] = run_mode(args.api_url, rows, adaptive, args.timeout)
+        print(f"  adaptive={str(adaptive).lower()} 完成（{time.time() - start:.1f}s）")
+
+    print(f"\n{'模式':<10}{'检索均值':>12}{'p50':>12}{'p99':>12}{'Recall@5':>10}"
+          f"{'跳过改写':>10}{'提前停止':>10}{'跳过重排':>10}{'缩小重排':>10}")
+    for adaptive, label in ((False, "固定流程"), (True, "自适应")):
+        r = results[adaptive]
+        print(f"{label:<10}{r['mean_ms']:>9.1f} ms{r['p50_ms']:>9.1f} ms{r['p99_ms']:>9.1f} ms{r['recall']:>10.3f}"
+              f"{r['rewrite_skipped']:>10.1%}{r['early_stop']:>10.1%}{r['rerank_skip']:>10.1%}{r['rerank_shrink']:>10.1%}")
+    saved = results[False]["mean_ms"] - results[True]["mean_ms"]
+    loss = results[False]["recall"] - results[True]["recall"]
+    print(f"\n节省检索阶段延迟 {saved:.1f} ms/请求，Recall@5 变化 {-loss:+.3f}")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+词典查询改写评估脚本
+功能：在样本问题上同时运行本地词典改写和 LLM 改写（直接调用 vLLM 的 completions 接口，读取返回的 usage），报告
+  - 词典覆盖率分布，以及 auto 模式下由词典直接改写（不调用 vLLM）的问题比例
+  - 与 LLM 改写结果的一致性：术语重合率（完全相同的术语）和二元组 F1（字面相近的术语也计入）
+  - 节省的 vLLM token：auto 模式下由词典改写的问题本需消耗的提示词 + 生成 token 占全部改写 token 的比例
+  - 两种改写的延迟
+  - 覆盖率不足的问题（用于补充词典，见 lexicon_rewriter 的补充词典 JSON 格式）
+
+样本问题：--queries 指定的文件（每行一个问题，或 JSONL 的 "query" 字段），默认使用内置的样本问题
+
+使用方法：
+    python scripts/evaluate_rewriter.py --vllm-url http://localhost:8000
+    python scripts/evaluate_rewriter.py --queries data/sample_queries.txt --min-coverage 0.6 --verbose
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.bm25_index import tokenize
+from src.core.lexicon_rewriter import DEFAULT_MIN_COVERAGE, create_lexicon_rewriter
+from src.core.query_rewriter import QueryRewriter
+
+# 内置样本问题（口语化问题 + 压测问题集中的术语型问题）
+SAMPLE_QUERIES = [
+    "他不还钱咋办？",
+    "朋友借了我五万块钱一直拖着不还怎么办",
+    "借条上没写利息，能要利息吗",
+    "合同到期了还能续签吗？",
+    "工伤怎么赔偿？",
+    "公司拖欠工资三个月了怎么办",
+    "我被公司辞退了，没签劳动合同，能要多少赔偿",
+    "试用期被开除有补偿吗",
+    "加班不给加班费合法吗",
+    "离婚后孩子归谁",
+    "老公出轨了离婚财产怎么分",
+    "彩礼离婚要退吗",
+    "父母去世没有遗嘱遗产怎么分",
+    "房东不退押金怎么办",
+    "买了二手房卖家不给过户",
+    "邻居家漏水把我家泡了谁赔",
+    "被车撞了对方全责怎么赔",
+    "酒驾会坐牢吗",
+    "在网上被人造谣怎么办",
+    "买到假货可以退一赔三吗",
+    "被人打了可以要求赔偿吗",
+    "被电信诈骗了钱还能追回来吗",
+    "正当防卫的条件是什么",
+    "公司倒闭了工资找谁要",
+    "判决了对方不给钱怎么办",
+    "什么是合同违约？",
+    "如何申请劳动仲裁？",
+    "离婚财产如何分割？",
+    "交通事故责任如何认定？",
+    "如何申请强制执行？",
+    "什么是正当防卫？",
+    "如何申请法律援助？",
+    "合同无效的情形有哪些？",
+    "如何计算违约金？",
+    "什么是不可抗力？",
+    "如何申请行政复议？",
+    "什么是诉讼时效？",
+    "如何申请财产保全？",
+    "什么是格式条款？",
+    "如何申请执行异议？",
+    "公司要我签一份保密协议，有什么风险",
+    "网购的东西坏了商家不管",
+]
+
+
+def load_queries(path):
+    if not path:
+        return list(SAMPLE_QUERIES)
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+    return queries
+
+
+def split_terms(text: str):
+    return {term for term in re.split(r"[\s,，、;；]+", text.strip()) if term}
+
+
+def bigram_f1(a: str, b: str) -> float:
+    """二元组 F1（与 BM25 的 bigram 分词一致）"""
+    x, y = set(tokenize(a)), set(tokenize(b))
+    if not x or not y:
+        return 0.0
+    overlap = len(x & y)
+    if overlap == 0:
+        return 0.0
+    precision, recall = overlap / len(x), overlap / len(y)
+    return 2 * precision * recall / (precision + recall)
+
+
+def llm_rewrite(api_url: str, prompt: str, max_tokens: int, timeout: float):
+    """调用 vLLM 改写，返回 (改写结果, 提示词 token 数, 生成 token 数, 耗时)"""
+    start = time.perf_counter()
+    response = requests.post(api_url, json={"prompt": prompt, "max_tokens": max_tokens, "temperature": 0.1},
+                             timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    seconds = time.perf_counter() - start
+    # 与 QueryRewriter 相同的清理方式
+    text = data["choices"][0]["text"].strip().strip('"').strip("'").strip()
+    if len(text) > 100:
+        text = text.split("\n")[0].strip()[:100]
+    usage = data.get("usage", {})
+    return text, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="词典查询改写与 LLM 改写对比")
+    parser.add_argument("--queries", type=str, default=None, help="样本问题文件（每行一个问题或 JSONL）")
+    parser.add_argument("--vllm-url", type=str, default="http://localhost:8000", help="vLLM 服务地址")
+    parser.add_argument("--lexicon", type=str, default=str(project_root / "data" / "rewrite_lexicon.json"),
+                        help="补充词典 JSON 文件（不存在时只使用内置词典）")
+    parser.add_argument("--min-coverage", type=float, default=DEFAULT_MIN_COVERAGE, help="auto 模式的覆盖率阈值")
+    parser.add_argument("--max-tokens", type=int, default=1024, help="LLM 改写的最大生成 token 数（与 CustomVLLM 一致）")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--verbose", action="store_true", help="输出每个问题的改写结果")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    lexicon = create_lexicon_rewriter(args.lexicon)
+    # 只借用提示词模板，LLM 请求由本脚本直接发出以读取 token 用量
+    template = QueryRewriter(llm=object(), mode="llm").rewrite_prompt_template
+    api_url = f"{args.vllm_url.rstrip('/')}/v1/completions"
+    print(f"📝 {len(queries)} 条样本问题，vLLM: {api_url}，覆盖率阈值: {args.min_coverage}")
+
+    rows = []
+    for query in queries:
+        start = time.perf_counter()
+        local = lexicon.rewrite(query)
+        lexicon_seconds = time.perf_counter() - start
+        llm_text, prompt_tokens, completion_tokens, llm_seconds = llm_rewrite(
+            api_url, template.format(query=query), args.max_tokens, args.timeout)
+        llm_terms = split_terms(llm_text)
+        rows.append({
+            "query": query,
+            "lexicon": local.text,
+            "llm": llm_text,
+            "coverage": local.coverage,
+            "local": bool(local.text) and local.coverage >= args.min_coverage,
+            "term_overlap": len(set(local.terms) & llm_terms) / len(llm_terms) if llm_terms else 0.0,
+            "bigram_f1": bigram_f1(local.text, llm_text),
+            "tokens": prompt_tokens + completion_tokens,
+            "lexicon_seconds": lexicon_seconds,
+            "llm_seconds": llm_seconds,
+        })
+        if args.verbose:
+            flag = "词典" if rows[-1]["local"] else "LLM "
+            print(f"  [{flag}] 覆盖率 {local.coverage:.2f} | {query}\n"
+                  f"         词典: {local.text or '-'}\n         LLM : {llm_text}")
+
+    local_rows = [row for row in rows if row["local"]]
+    total_tokens = sum(row["tokens"] for row in rows)
+    saved_tokens = sum(row["tokens"] for row in local_rows)
+    print(f"\n{'':<16}{'问题数':>8}{'术语重合率':>12}{'二元组 F1':>12}")
+    for label, subset in (("全部", rows), ("词典直接改写", local_rows)):
+        if subset:
+            print(f"{label:<16}{len(subset):>8}{np.mean([r['term_overlap'] for r in subset]):>12.3f}"
+                  f"{np.mean([r['bigram_f1'] for r in subset]):>12.3f}")
+    print(f"\n词典直接改写比例: {len(local_rows) / len(rows):.1%}"
+          f"（覆盖率中位数 {np.median([r['coverage'] for r in rows]):.2f}）")
+    print(f"节省 vLLM token: {saved_tokens} / {total_tokens}（{saved_tokens / max(1, total_tokens):.1%}），"
+          f"平均每个改写请求 {total_tokens / len(rows):.0f} token")
+    print(f"改写延迟: 词典 {np.mean([r['lexicon_seconds'] for r in rows]) * 1e6:.0f} µs，"
+          f"LLM {np.mean([r['llm_seconds'] for r in rows]) * 1000:.0f} ms")
+    uncovered = [row for row in rows if not row["local"]]
+    if uncovered:
+        print(f"\n覆盖率不足、需要 LLM 改写的问题（可据此补充词典）:")
+        for row in sorted(uncovered, key=lambda r: r["coverage"]):
+            print(f"  {row['coverage']:.2f}  {row['query']}  →  LLM: {row['llm']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+分片知识库工具
+功能：
+1. build：将知识库（Chroma 或 faiss 后端）按文档块 ID 哈希切分为 N 个分片，写入新版本目录
+2. serve：在本机为分片知识库启动检索进程（每个分片一个进程），API 通过 Unix socket 连接
+3. status：检查各分片检索进程是否可用
+
+使用方法：
+    # 将判决书型知识库切分为 4 个分片，作为新版本（暂不上线）
+    python scripts/kb_shards.py build --kb-dir chroma_db_judgement --num-shards 4 --version v-sharded
+
+    # 启动分片检索进程（在 API 之前启动，前台运行）
+    python scripts/kb_shards.py serve --kb-dir chroma_db_judgement --version v-sharded --threads 1
+
+    # 上线分片版本
+    curl -X POST http://localhost:8080/admin/kb/judgement/swap -H 'Content-Type: application/json' -d '{"version": "v-sharded"}'
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.kb_registry import activate_version, new_version_name, resolve_kb_path, version_path
+from src.core.shards import (
+    ShardedVectorStore,
+    build_shards,
+    is_sharded_store,
+    read_manifest,
+    start_shard_servers,
+    wait_for_shards,
+)
+from src.core.vector_index import COMPRESSION_TYPES, INDEX_TYPES
+
+
+def _store_dir(args) -> Path:
+    """分片知识库目录：指定版本，或 CURRENT 指向的版本"""
+    if args.version:
+        return version_path(args.kb_dir, args.version)
+    path, _ = resolve_kb_path(args.kb_dir)
+    return path
+
+
+def run_build(args) -> bool:
+    version = args.version or new_version_name()
+    target = version_path(args.kb_dir, version)
+    if target.exists():
+        print(f"❌ 版本已存在: {target}")
+        return False
+    print(f"🧩 切分知识库 {args.kb_dir} -> {target}（{args.num_shards} 个分片）")
+    manifest = build_shards(
+        args.kb_dir,
+        target,
+        args.num_shards,
+        include_updates=not args.skip_updates,
+        index_type=args.index_type,
+        compression=args.compression,
+        M=args.hnsw_m,
+        ef_construction=args.ef_construction,
+        ef_search=args.ef_search,
+    )
+    print(f"✅ 分片完成: 共 {manifest['count']} 个文档块，版本 {version}")
+    if args.activate:
+        activate_version(args.kb_dir, version)
+        print("🔀 已切换 CURRENT（请先启动分片检索进程）")
+    return True
+
+
+def run_serve(args) -> bool:
+    store_dir = _store_dir(args)
+    if not is_sharded_store(store_dir):
+        print(f"❌ 不是分片知识库: {store_dir}")
+        return False
+    shard_ids = [int(s) for s in args.shards.split(",")] if args.shards else None
+    processes = start_shard_servers(store_dir, shard_ids=shard_ids, threads=args.threads)
+    print(f"🚀 已启动 {len(processes)} 个分片检索进程: {store_dir}")
+    try:
+        while all(process.is_alive() for process in processes):
+            time.sleep(1)
+        print("❌ 有分片检索进程退出")
+        return False
+    except KeyboardInterrupt:
+        return True
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+def run_status(args) -> bool:
+    store_dir = _store_dir(args)
+    if not is_sharded_store(store_dir):
+        print(f"❌ 不是分片知识库: {store_dir}")
+        return False
+    manifest = read_manifest(store_dir)
+    if args.wait:
+        wait_for_shards(store_dir, timeout=args.wait)
+    store = ShardedVectorStore.load(str(store_dir), embedding=None)
+    counts = store.ping()
+    for shard_id, shard in enumerate(manifest["shards"]):
+        state = f"✅ {counts[shard_id]} 个文档块" if shard_id in counts else "❌ 不可用"
+        print(f"分片 {shard_id} ({shard['path']}): {state}")
+    store.close()
+    return len(counts) == len(manifest["shards"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片知识库工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="切分知识库")
+    build_parser.add_argument("--num-shards", type=int, required=True)
+    build_parser.add_argument("--activate", action="store_true", help="完成后切换 CURRENT")
+    build_parser.add_argument("--skip-updates", action="store_true", help="不合并当前版本的在线更新")
+    build_parser.add_argument("--index-type", type=str, choices=list(INDEX_TYPES), default=None)
+    build_parser.add_argument("--compression", type=str, choices=list(COMPRESSION_TYPES), default=None)
+    build_parser.add_argument("--hnsw-m", type=int, default=None)
+    build_parser.add_argument("--ef-construction", type=int, default=None)
+    build_parser.add_argument("--ef-search", type=int, default=None)
+
+    serve_parser = subparsers.add_parser("serve", help="启动分片检索进程")
+    serve_parser.add_argument("--shards", type=str, default=None, help="只启动指定分片（逗号分隔，多节点部署使用）")
+    serve_parser.add_argument("--threads", type=int, default=1, help="每个分片进程的检索线程数")
+
+    status_parser = subparsers.add_parser("status", help="检查分片检索进程")
+    status_parser.add_argument("--wait", type=float, default=0, help="最多等待分片可用的秒数")
+
+    for sub in (build_parser, serve_parser, status_parser):
+        sub.add_argument("--kb-dir", type=str, required=True, help="知识库根目录")
+        sub.add_argument("--version", type=str, default=None, help="分片版本（默认 build 按时间生成，其他为 CURRENT）")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        passed = run_build(args)
+    elif args.command == "serve":
+        passed = run_serve(args)
+    else:
+        passed = run_status(args)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+知识库快照工具
+功能：
+1. export：将知识库（Chroma 或 faiss 后端）导出为紧凑、自描述的快照（目录或不压缩的 .tar）
+2. import：校验快照并导入为目标知识库的新版本（默认切换 CURRENT，运行中的 API 自动热切换）
+3. verify：按清单校验快照中每个文件的大小与 SHA-256
+4. load-time：在新进程中分别测量原知识库与快照的冷加载 + 首次检索耗时
+
+使用方法：
+    # 导出判决书型知识库（Chroma 知识库会转换为 faiss 格式，可指定索引参数）
+    python scripts/kb_snapshot.py export --kb-dir chroma_db_judgement --output snapshots/judgement.tar --archive
+
+    # 在其他 API 节点导入
+    python scripts/kb_snapshot.py import --snapshot snapshots/judgement.tar --kb-dir chroma_db_judgement
+
+    # 对比冷加载耗时
+    python scripts/kb_snapshot.py load-time --kb-dir chroma_db_judgement --snapshot snapshots/judgement
+"""
+
+import argparse
+import multiprocessing
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.kb_registry import resolve_kb_path
+from src.core.kb_snapshot import export_snapshot, import_snapshot, measure_load, verify_snapshot
+from src.core.vector_index import COMPRESSION_TYPES, INDEX_TYPES
+from src.core.vector_store import is_flash_store
+
+
+def _measure_in_subprocess(directory, backend, k, queue):
+    queue.put(measure_load(directory, backend, k))
+
+
+def measure_cold_load(directory, backend: str, k: int) -> dict:
+    """在新进程中测量加载耗时（包含模块导入之外的全部冷启动开销）"""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_measure_in_subprocess, args=(str(directory), backend, k, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def run_export(args) -> bool:
+    from src.core.ingest import EMBEDDING_MODEL_NAME
+
+    # 只传递命令行中指定的参数，其余沿用源知识库保存的索引配置
+    index_params = {
+        key: value
+        for key, value in (("index_type", args.index_type), ("compression", args.compression), ("M", args.hnsw_m),
+                           ("ef_construction", args.ef_construction), ("ef_search", args.ef_search))
+        if value is not None
+    }
+    print(f"📦 导出知识库: {args.kb_dir}")
+    output = export_snapshot(
+        args.kb_dir,
+        args.output,
+        include_updates=not args.skip_updates,
+        rebuild=args.rebuild,
+        embedding_model=EMBEDDING_MODEL_NAME,
+        archive=args.archive,
+        **index_params
+    )
+    size = output.stat().st_size if output.is_file() else sum(p.stat().st_size for p in output.iterdir())
+    print(f"✅ 快照已写入: {output}（{size / 1024 ** 2:.1f} MB）")
+    return True
+
+
+def run_import(args) -> bool:
+    print(f"📥 导入快照: {args.snapshot} -> {args.kb_dir}")
+    try:
+        version, target = import_snapshot(
+            args.snapshot, args.kb_dir, version=args.version,
+            activate=not args.no_activate, verify=not args.no_verify
+        )
+    except (ValueError, FileExistsError) as e:
+        print(f"❌ 导入失败: {e}")
+        return False
+    print(f"✅ 已导入为版本 {version}: {target}")
+    if args.no_activate:
+        print(f"ℹ️  未切换版本，可调用 /admin/kb/{{name}}/swap 并指定 version={version} 上线")
+    return True
+
+
+def run_verify(args) -> bool:
+    snapshot = Path(args.snapshot)
+    if snapshot.is_file():
+        with tempfile.TemporaryDirectory() as tmp:
+            with tarfile.open(snapshot, "r") as tar:
+                tar.extractall(tmp, filter="data")
+            errors = verify_snapshot(tmp)
+    else:
+        errors = verify_snapshot(snapshot)
+    if errors:
+        for error in errors:
+            print(f"❌ {error}")
+        return False
+    print(f"✅ 快照校验通过: {snapshot}")
+    return True
+
+
+def run_load_time(args) -> bool:
+    rows = []
+    if args.kb_dir:
+        path, _ = resolve_kb_path(args.kb_dir)
+        backend = "faiss" if is_flash_store(path) else "chroma"
+        rows.append((f"原知识库（{backend}）", measure_cold_load(path, backend, args.k)))
+    if args.snapshot:
+        rows.append(("快照（mmap）", measure_cold_load(args.snapshot, "faiss", args.k)))
+
+    print(f"\n=== 冷加载耗时（k={args.k}）===")
+    print(f"{'来源':<16}{'文档块数':>12}{'加载 (s)':>12}{'首次检索 (s)':>16}")
+    for label, result in rows:
+        print(f"{label:<16}{result['count']:>12}{result['load_seconds']:>12.3f}{result['first_query_seconds']:>16.3f}")
+    print("注：页缓存已预热时结果偏乐观，测量真实冷启动前可先清空页缓存（echo 3 > /proc/sys/vm/drop_caches）")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识库快照导出 / 导入工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="导出知识库快照")
+    export_parser.add_argument("--kb-dir", type=str, required=True, help="知识库根目录或版本目录")
+    export_parser.add_argument("--output", type=str, required=True, help="快照输出目录（--archive 时为 .tar 文件）")
+    export_parser.add_argument("--archive", action="store_true", help="打包为不压缩的 .tar")
+    export_parser.add_argument("--skip-updates", action="store_true", help="不合并当前版本的在线更新")
+    export_parser.add_argument("--rebuild", action="store_true", help="faiss 知识库也按下列参数重建索引")
+    export_parser.add_argument("--index-type", type=str, choices=list(INDEX_TYPES), default=None)
+    export_parser.add_argument("--compression", type=str, choices=list(COMPRESSION_TYPES), default=None)
+    export_parser.add_argument("--hnsw-m", type=int, default=None)
+    export_parser.add_argument("--ef-construction", type=int, default=None)
+    export_parser.add_argument("--ef-search", type=int, default=None)
+
+    import_parser = subparsers.add_parser("import", help="导入快照为知识库新版本")
+    import_parser.add_argument("--snapshot", type=str, required=True, help="快照目录或 .tar 文件")
+    import_parser.add_argument("--kb-dir", type=str, required=True, help="目标知识库根目录")
+    import_parser.add_argument("--version", type=str, default=None, help="版本名（默认按时间生成）")
+    import_parser.add_argument("--no-activate", action="store_true", help="导入后不切换 CURRENT")
+    import_parser.add_argument("--no-verify", action="store_true", help="跳过校验和检查")
+
+    verify_parser = subparsers.add_parser("verify", help="校验快照")
+    verify_parser.add_argument("--snapshot", type=str, required=True, help="快照目录或 .tar 文件")
+
+    load_parser = subparsers.add_parser("load-time", help="对比原知识库与快照的冷加载耗时")
+    load_parser.add_argument("--kb-dir", type=str, default=None, help="原知识库根目录或版本目录")
+    load_parser.add_argument("--snapshot", type=str, default=None, help="快照目录（需先解包）")
+    load_parser.add_argument("--k", type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        passed = run_export(args)
+    elif args.command == "import":
+        passed = run_import(args)
+    elif args.command == "verify":
+        passed = run_verify(args)
+    else:
+        passed = run_load_time(args)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+#!/bin/bash
+# 本地模型服务启动脚本（嵌入 + 重排序模型只加载一份，API worker 通过 Unix socket 调用）
+# 使用方式: bash scripts/model_server.sh
+#   之后以 MODEL_SERVER_SOCKET=/tmp/legalflash-models.sock 启动 FastAPI（可使用多个 worker）
+#   级联重排序时同时加载第一级模型: RERANKERS="BAAI/bge-reranker-base cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PROJECT_ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
+cd "$PROJECT_ROOT"
+
+MODEL_SERVER_SOCKET=${MODEL_SERVER_SOCKET:-"/tmp/legalflash-models.sock"}
+RERANKERS=${RERANKERS:-"BAAI/bge-reranker-base"}
+MAX_WAIT_MS=${MAX_WAIT_MS:-5}
+
+RERANKER_ARGS=()
+for model in $RERANKERS; do
+    RERANKER_ARGS+=(--reranker "$model")
+done
+
+echo "🚀 启动本地模型服务..."
+echo "🔌 Socket: $MODEL_SERVER_SOCKET"
+echo "🎯 重排序模型: $RERANKERS"
+
+python src/core/model_server.py \
+    --socket "$MODEL_SERVER_SOCKET" \
+    --max-wait-ms "$MAX_WAIT_MS" \
+    "${RERANKER_ARGS[@]}"
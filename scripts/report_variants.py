@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+查询变体贡献报告
+功能：读取 API 的决策日志（ADAPTIVE_DECISION_LOG，JSONL），统计多变体改写（QUERY_REWRITE_VARIANTS > 1）时
+各查询变体对最终 Top 5 的贡献：
+  - 命中：该变体检索到、且进入最终 Top 5 的文档块数量（多个变体检索到同一文档块时都计入）
+  - 独有：只有该变体检索到的数量（去掉该变体会丢失的结果）
+推测检索模式下第 1 个查询是原始问题（单独统计），其余按变体序号统计
+
+使用方法：
+    ADAPTIVE_DECISION_LOG=logs/decisions.jsonl QUERY_REWRITE_VARIANTS=3 bash scripts/fastapi.sh
+    python scripts/report_variants.py --log logs/decisions.jsonl
+"""
+
+import argparse
+import json
+from collections import defaultdict
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多变体查询改写的变体贡献报告")
+    parser.add_argument("--log", type=str, required=True, help="决策日志（ADAPTIVE_DECISION_LOG）")
+    args = parser.parse_args()
+
+    hits, unique, requests = defaultdict(int), defaultdict(int), defaultdict(int)
+    total = multi = 0
+    with open(args.log, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            total += 1
+            variants = record.get("variants", [])
+            if len(variants) <= 1:
+                continue
+            multi += 1
+            # 推测检索时第 1 个查询是原始问题
+            raw_first = record.get("rewrite") in ("speculative", "timeout")
+            for i, (hit, only) in enumerate(zip(record["variant_hits"], record["variant_unique_hits"])):
+                role = "原始问题" if raw_first and i == 0 else f"变体 {i if raw_first else i + 1}"
+                hits[role] += hit
+                unique[role] += only
+                requests[role] += 1
+
+    print(f"📝 {total} 条请求，其中 {multi} 条使用了多个查询")
+    if not multi:
+        return
+    print(f"\n{'查询':<12}{'请求数':>8}{'平均命中':>10}{'平均独有':>10}{'独有占比':>10}")
+    for role in sorted(requests, key=lambda role: (role != "原始问题", role)):
+        n = requests[role]
+        share = unique[role] / hits[role] if hits[role] else 0.0
+        print(f"{role:<12}{n:>8}{hits[role] / n:>10.2f}{unique[role] / n:>10.2f}{share:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,7 @@ fi
 echo "🚀 启动 vLLM 服务..."
 echo "📁 模型路径: $MODEL_PATH"
 
+# --enable-prefix-caching: 复用相同提示词前缀的 KV 缓存（API 的 prefix_cache 提示词布局依赖此项）
 vllm serve \
     "$MODEL_PATH" \
     --host 0.0.0.0 \
@@ -26,4 +27,5 @@ vllm serve \
     --dtype bfloat16 \
     --gpu-memory-utilization 0.85 \
     --max-model-len 4096 \
-    --max-num-seqs 128
\ No newline at end of file
+    --max-num-seqs 128 \
+    --enable-prefix-caching
\ No newline at end of file
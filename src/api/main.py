@@ -1,28 +1,46 @@
 import os
+import sys
+from pathlib import Path
 # 设置 HuggingFace 镜像环境变量（解决网络连接问题）
 os.environ["HF_ENDPOINT"] = "https://hf-mirror.com"
 
-from fastapi import FastAPI
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+# CPU 线程预算：须在加载模型之前应用，每个 worker 的 torch 线程数、tokenizers 并行、线程池大小和绑核
+# 由同一份配置决定（见 src/core/thread_budget.py）
+from src.core.thread_budget import applied_thread_budget, apply_thread_budget_from_env, configure_executors
+thread_budget = apply_thread_budget_from_env()
+
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import json
-from langchain_community.vectorstores import Chroma
+import asyncio
+import threading
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_classic.chains import RetrievalQA
 from langchain_core.prompts import PromptTemplate
-import sys
-from pathlib import Path
-from typing import Optional, List, Iterator
+from langchain_core.documents import Document
+from typing import Optional, List, Iterator, Tuple
 from datetime import datetime
 
-# 添加项目根目录到路径
-project_root = Path(__file__).parent.parent.parent
-sys.path.insert(0, str(project_root))
-
 from src.core.CustomVLLM import CustomVLLM
-from src.core.query_rewriter import QueryRewriter, create_query_rewriter
-from src.core.reranker import Reranker, create_reranker
+from src.core.query_rewriter import create_query_rewriter
+from src.core.reranker import CascadeReranker, create_reranker
+from src.core.model_server import ModelServerError, RemoteEmbeddings, RemoteReranker, connect_model_server
+from src.core.batching import BucketedEmbeddings, LengthBucketer
+from src.core.query_router import RoutingDecision, create_query_router
+from src.core.adaptive import AdaptiveController, AdaptiveDecisions, create_adaptive_controller, interleave
+from src.core.context_builder import create_context_builder
+from src.core.context_compressor import create_context_compressor
 from src.api.monitoring import get_metrics_collector
+from src.core.vector_store import load_vector_store
+from src.core.kb_registry import KnowledgeBaseRegistry, KnowledgeBaseSnapshot
+from src.core.bm25_index import BM25Index
+from src.core.live_updates import make_delete_record, make_upsert_record
+from src.core.ingest import split_documents
+from src.core.retrieval import Candidate, ChunkFetcher, merge_candidate_lists, reciprocal_rank_fusion, retrieve_candidates
 import time
 
 # 配置
@@ -30,13 +48,133 @@ LAW_DB_DIR = str(project_root / "chroma_db")  # 法条型知识库
 CASE_DB_DIR = str(project_root / "chroma_db_case")  # 案例型知识库
 JUDGEMENT_DB_DIR = str(project_root / "chroma_db_judgement")  # 判决书型知识库
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# faiss 后端检索时的 ef_search（未设置则沿用构建时保存的值）
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "0")) or None
+# ivfpq 压缩索引检索时访问的聚类数（未设置则沿用构建时保存的值）
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "0")) or None
+# faiss 后端以只读 mmap 方式加载（多个 uvicorn worker 共享页缓存），以及是否在启动时预读到页缓存
+KB_MMAP = os.getenv("KB_MMAP", "1") == "1"
+KB_PREFETCH = os.getenv("KB_PREFETCH", "0") == "1"
+# 分片知识库（见 scripts/kb_shards.py）单个分片的检索超时（秒），超时的分片跳过并返回降级结果
+KB_SHARD_TIMEOUT = float(os.getenv("KB_SHARD_TIMEOUT", "2"))
+VECTOR_STORE_LOAD_KWARGS = {
+    "ef_search": HNSW_EF_SEARCH,
+    "nprobe": IVF_NPROBE,
+    "mmap": KB_MMAP,
+    "prefetch": KB_PREFETCH,
+    "shard_timeout": KB_SHARD_TIMEOUT,
+}
+# 知识库热切换：后台检查 CURRENT 指针的间隔（秒），0 表示只通过管理接口切换
+KB_WATCH_INTERVAL = float(os.getenv("KB_WATCH_INTERVAL", "5"))
+# 按需加载的知识库（逗号分隔，第一次使用时加载），以及已加载知识库的总内存预算（MB，0 表示不限制）
+# 和空闲释放时间（秒，0 表示不释放）；超出预算或空闲时按最久未访问优先释放按需加载的知识库
+KB_LAZY = [name.strip() for name in os.getenv("KB_LAZY", "judgement").split(",") if name.strip()]
+KB_MEMORY_BUDGET_MB = float(os.getenv("KB_MEMORY_BUDGET_MB", "0"))
+KB_IDLE_TIMEOUT = float(os.getenv("KB_IDLE_TIMEOUT", "1800"))
+# 查询路由：检索前判断需要检索的知识库（规则 + 可选的质心分类器，见 scripts/build_router.py），
+# 最高概率低于 QUERY_ROUTER_MIN_CONFIDENCE 时检索全部知识库
+QUERY_ROUTER_ENABLED = os.getenv("QUERY_ROUTER_ENABLED", "1") == "1"
+QUERY_ROUTER_CENTROIDS = os.getenv("QUERY_ROUTER_CENTROIDS", str(project_root / "data" / "router_centroids.npz"))
+QUERY_ROUTER_MIN_CONFIDENCE = float(os.getenv("QUERY_ROUTER_MIN_CONFIDENCE", "0.6"))
+# 法条查询快速通道："民法典第577条"这类明确的法条查询直接按法条索引（ingest 时构建）取文档块，
+# 跳过查询改写、嵌入、向量检索和重排序；查询在法条引用之外剩余的字数超过
+# STATUTE_FASTPATH_MAX_RESIDUAL 时（还带有具体案情等）仍走完整流程
+STATUTE_FASTPATH_ENABLED = os.getenv("STATUTE_FASTPATH_ENABLED", "1") == "1"
+STATUTE_FASTPATH_KBS = [name.strip() for name in os.getenv("STATUTE_FASTPATH_KBS", "law").split(",") if name.strip()]
+STATUTE_FASTPATH_MAX_RESIDUAL = int(os.getenv("STATUTE_FASTPATH_MAX_RESIDUAL", "6"))
+# 混合检索：知识库带有 BM25 索引（ingest 时构建）时，向量检索和 BM25 各取 k × HYBRID_CANDIDATE_DEPTH 个候选，
+# 按倒数排名融合（RRF）后保留 k 个进入重排序
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "1") == "1"
+HYBRID_CANDIDATE_DEPTH = int(os.getenv("HYBRID_CANDIDATE_DEPTH", "4"))
+# 自适应流水线：问题已是专业关键词时跳过改写；高置信命中已够时不再检索其余知识库；
+# 向量分数第 1 名与第 5 名的差距 ≥ ADAPTIVE_SKIP_MARGIN 时跳过重排序，≥ ADAPTIVE_SHRINK_MARGIN 时只重排序
+# 前 ADAPTIVE_SHRINK_POOL 个候选；每个请求的决策可写入 ADAPTIVE_DECISION_LOG（JSONL）用于离线评估
+ADAPTIVE_PIPELINE_ENABLED = os.getenv("ADAPTIVE_PIPELINE_ENABLED", "1") == "1"
+ADAPTIVE_SKIP_MARGIN = float(os.getenv("ADAPTIVE_SKIP_MARGIN", "0.2"))
+ADAPTIVE_SHRINK_MARGIN = float(os.getenv("ADAPTIVE_SHRINK_MARGIN", "0.1"))
+ADAPTIVE_SHRINK_POOL = int(os.getenv("ADAPTIVE_SHRINK_POOL", "8"))
+ADAPTIVE_HIGH_CONFIDENCE = float(os.getenv("ADAPTIVE_HIGH_CONFIDENCE", "0.75"))
+ADAPTIVE_DECISION_LOG = os.getenv("ADAPTIVE_DECISION_LOG", "")
+# 查询改写模式：llm（总是调用 vLLM）/ lexicon（只用本地词典）/ auto（词典覆盖率低于 QUERY_REWRITE_MIN_COVERAGE 时才调用 vLLM）
+QUERY_REWRITE_MODE = os.getenv("QUERY_REWRITE_MODE", "auto")
+QUERY_REWRITE_LEXICON = os.getenv("QUERY_REWRITE_LEXICON", str(project_root / "data" / "rewrite_lexicon.json"))
+QUERY_REWRITE_MIN_COVERAGE = float(os.getenv("QUERY_REWRITE_MIN_COVERAGE", "0.6"))
+# LLM 改写一次生成的变体数量（>1 时各变体的查询向量在每个知识库上一次批量检索，结果融合后再重排序）
+QUERY_REWRITE_VARIANTS = int(os.getenv("QUERY_REWRITE_VARIANTS", "1"))
+# 推测检索：LLM 改写的同时用原始问题检索，改写返回后只补充检索改写后的问题，两路候选在重排序前合并；
+# 改写超过截止时间（秒，从改写开始计时）时不再等待，只使用原始问题的检索结果
+SPECULATIVE_RETRIEVAL_ENABLED = os.getenv("SPECULATIVE_RETRIEVAL_ENABLED", "1") == "1"
+REWRITE_DEADLINE = float(os.getenv("REWRITE_DEADLINE", "1.5"))
+# 上下文组装：按服务模型的分词器计数，合并同一来源中相邻 / 重叠的文档块，超出 token 预算（0 表示不限制）时
+# 先裁剪排名靠后文档的末尾句子
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", str(project_root / "output" / "llama3-law-merged"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2048"))
+CONTEXT_MERGE_CHUNKS = os.getenv("CONTEXT_MERGE_CHUNKS", "1") == "1"
+# 重排序分词缓存：知识库版本目录中有 ingest 预先切分的文档块 token ID（且分词器与重排序模型一致）时，
+# 重排序只对查询分词
+RERANK_TOKEN_CACHE_ENABLED = os.getenv("RERANK_TOKEN_CACHE_ENABLED", "1") == "1"
+# 级联重排序：小 Cross-Encoder（RERANK_CASCADE_MODEL）先为全部候选打分，分数靠前的 M 个再由 bge-reranker 重排序；
+# M 为覆盖第一级 RERANK_CASCADE_MASS 比例概率质量的最少候选数，限制在 [RERANK_CASCADE_MIN, RERANK_CASCADE_MAX]。
+# 启用时每个知识库的检索数量乘以 RERANK_CASCADE_DEPTH（扩大送入重排序的候选池）
+RERANK_CASCADE_ENABLED = os.getenv("RERANK_CASCADE_ENABLED", "0") == "1"
+RERANK_CASCADE_MODEL = os.getenv("RERANK_CASCADE_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CASCADE_DEPTH = int(os.getenv("RERANK_CASCADE_DEPTH", "16"))
+RERANK_CASCADE_MIN = int(os.getenv("RERANK_CASCADE_MIN", "10"))
+RERANK_CASCADE_MAX = int(os.getenv("RERANK_CASCADE_MAX", "30"))
+RERANK_CASCADE_MASS = float(os.getenv("RERANK_CASCADE_MASS", "0.9"))
+# 按长度分桶批处理：重排序和批量嵌入按 token 长度分批，每批不超过 INFERENCE_MAX_BATCH_SIZE 个序列、
+# 填充比例不超过 INFERENCE_MAX_PADDING_RATIO；关闭时按输入顺序固定大小分批（旧行为）
+BUCKETED_BATCHING_ENABLED = os.getenv("BUCKETED_BATCHING_ENABLED", "1") == "1"
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "32"))
+INFERENCE_MAX_PADDING_RATIO = float(os.getenv("INFERENCE_MAX_PADDING_RATIO", "0.2"))
+# 抽取式上下文压缩：off / cross_encoder（复用重排序模型）/ embedding（复用嵌入模型）；只压缩 CONTEXT_COMPRESSION_KBS 中
+# 句子数不少于 CONTEXT_COMPRESSION_MIN_SENTENCES 的文档，每个文档按句子分数保留 CONTEXT_COMPRESSION_RATIO 比例的 token
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "off")
+CONTEXT_COMPRESSION_RATIO = float(os.getenv("CONTEXT_COMPRESSION_RATIO", "0.5"))
+CONTEXT_COMPRESSION_MIN_SENTENCES = int(os.getenv("CONTEXT_COMPRESSION_MIN_SENTENCES", "4"))
+CONTEXT_COMPRESSION_KBS = [kb.strip() for kb in os.getenv("CONTEXT_COMPRESSION_KBS", "case,judgement").split(",") if kb.strip()]
+# 提示词布局：prefix_cache 为固定指令在前、文档按（知识库, 文档块 ID）排列、问题在最后，检索到相同文档的请求
+# 共享提示词前缀，可复用 vLLM 的前缀缓存；ranked 为旧布局（文档按重排序分数排列，问题后还有指令）
+PROMPT_LAYOUTS = ("prefix_cache", "ranked")
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "prefix_cache")
+# 本地模型服务：设置 MODEL_SERVER_SOCKET 时嵌入和重排序由模型服务进程完成（见 src/core/model_server.py，每台机器加载一份
+# 模型，请求在服务端动态合批），worker 不加载模型；启动时最多等待 MODEL_SERVER_WAIT 秒，连接失败时在进程内加载模型
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+MODEL_SERVER_TIMEOUT = float(os.getenv("MODEL_SERVER_TIMEOUT", "30"))
+MODEL_SERVER_WAIT = float(os.getenv("MODEL_SERVER_WAIT", "30"))
+# 管理接口令牌（设置后 /admin 接口需在请求头 X-Admin-Token 中携带）
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 # LLM 服务的端口是 8000，CustomVLLM 默认指向这个地址
 VLLM_URL = os.getenv("VLLM_URL", "http://localhost:8000")
 
 # 初始化 LangChain 组件 (全局加载一次)
 app = FastAPI()
+
+
+@app.on_event("startup")
+async def configure_thread_pools():
+    """按线程预算设置线程池大小（asyncio.to_thread 的模型调用和流式响应的同步迭代器都在线程池中运行）"""
+    if thread_budget is not None:
+        configure_executors(thread_budget)
+
+
 llm = CustomVLLM() # 连接到你的 vLLM 服务
-embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+inference_bucketer = LengthBucketer(
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_padding_ratio=INFERENCE_MAX_PADDING_RATIO,
+    sort_by_length=BUCKETED_BATCHING_ENABLED,
+)
+model_client = None
+if MODEL_SERVER_SOCKET:
+    try:
+        model_client = connect_model_server(MODEL_SERVER_SOCKET, timeout=MODEL_SERVER_TIMEOUT, wait=MODEL_SERVER_WAIT)
+        embeddings = RemoteEmbeddings(model_client, EMBEDDING_MODEL_NAME)
+        print(f"✅ 已连接模型服务: {MODEL_SERVER_SOCKET}（pid {model_client.info()['pid']}）")
+    except ModelServerError as e:
+        print(f"⚠️  模型服务不可用: {e}，在进程内加载模型")
+        model_client = None
+if model_client is None:
+    embeddings = BucketedEmbeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME), inference_bucketer)
 
 # 初始化监控指标收集器
 metrics_collector = get_metrics_collector(vllm_url=VLLM_URL)
@@ -44,98 +182,148 @@ metrics_collector = get_metrics_collector(vllm_url=VLLM_URL)
 # 初始化 RAG 优化组件
 query_rewriter = None
 reranker = None
+query_router = None
 
 # 初始化 Query Rewriter（查询改写）
 try:
-    query_rewriter = create_query_rewriter(llm=llm)
-    print("✅ Query Rewriter 已初始化")
+    query_rewriter = create_query_rewriter(
+        llm=llm,
+        mode=QUERY_REWRITE_MODE,
+        lexicon_path=QUERY_REWRITE_LEXICON,
+        min_coverage=QUERY_REWRITE_MIN_COVERAGE,
+    )
+    print(f"✅ Query Rewriter 已初始化（模式: {QUERY_REWRITE_MODE}）")
 except Exception as e:
     print(f"⚠️  Query Rewriter 初始化失败: {e}，将跳过查询改写步骤")
 
-# 初始化 Reranker（重排序）
-try:
-    reranker = create_reranker(model_name="BAAI/bge-reranker-base")
-    print("✅ Reranker 已初始化")
-except Exception as e:
-    print(f"⚠️  Reranker 初始化失败: {e}，将跳过重排序步骤")
 
-# 初始化多个知识库（法条型 + 案例型 + 判决书型）
-law_vectordb: Optional[Chroma] = None
-case_vectordb: Optional[Chroma] = None
-judgement_vectordb: Optional[Chroma] = None
-law_retriever = None
-case_retriever = None
-judgement_retriever = None
-
-# 加载法条型知识库（如果存在）
-if Path(LAW_DB_DIR).exists() and any(Path(LAW_DB_DIR).iterdir()):
+def _load_reranker(model_name: str):
+    """使用模型服务中的重排序模型，未连接模型服务时在进程内加载"""
+    if model_client is not None:
+        return RemoteReranker(model_client, model_name)
+    return create_reranker(model_name=model_name, bucketer=inference_bucketer)
+
+
+# 初始化 Reranker（重排序）
+if RERANK_CASCADE_ENABLED:
     try:
-        law_vectordb = Chroma(persist_directory=LAW_DB_DIR, embedding_function=embeddings)
-        law_retriever = law_vectordb.as_retriever(search_kwargs={"k": 2})
-        print(f"✅ 法条型知识库已加载: {LAW_DB_DIR}")
+        reranker = CascadeReranker(
+            _load_reranker(RERANK_CASCADE_MODEL),
+            _load_reranker("BAAI/bge-reranker-base"),
+            min_candidates=RERANK_CASCADE_MIN,
+            max_candidates=RERANK_CASCADE_MAX,
+            mass=RERANK_CASCADE_MASS,
+        )
+        print(f"✅ 级联 Reranker 已初始化（第一级: {reranker.first.model_name}，第二级: {reranker.second.model_name}）")
     except Exception as e:
-        print(f"⚠️  法条型知识库加载失败: {e}")
-
-# 加载案例型知识库（如果存在）
-if Path(CASE_DB_DIR).exists() and any(Path(CASE_DB_DIR).iterdir()):
+        print(f"⚠️  级联 Reranker 初始化失败: {e}，使用单级重排序")
+if reranker is None:
     try:
-        case_vectordb = Chroma(persist_directory=CASE_DB_DIR, embedding_function=embeddings)
-        case_retriever = case_vectordb.as_retriever(search_kwargs={"k": 2})
-        print(f"✅ 案例型知识库已加载: {CASE_DB_DIR}")
+        reranker = _load_reranker("BAAI/bge-reranker-base")
+        print(f"✅ Reranker 已初始化{'（模型服务）' if model_client else ''}")
     except Exception as e:
-        print(f"⚠️  案例型知识库加载失败: {e}")
+        print(f"⚠️  Reranker 初始化失败: {e}，将跳过重排序步骤")
+# 级联重排序时扩大每个知识库的检索数量
+candidate_depth = RERANK_CASCADE_DEPTH if isinstance(reranker, CascadeReranker) else 1
+
+# 初始化自适应流水线控制器
+adaptive_controller = create_adaptive_controller(
+    skip_margin=ADAPTIVE_SKIP_MARGIN,
+    shrink_margin=ADAPTIVE_SHRINK_MARGIN,
+    shrink_pool=ADAPTIVE_SHRINK_POOL,
+    high_confidence=ADAPTIVE_HIGH_CONFIDENCE,
+)
 
-# 加载判决书型知识库（如果存在）
-if Path(JUDGEMENT_DB_DIR).exists() and any(Path(JUDGEMENT_DB_DIR).iterdir()):
+# 初始化抽取式上下文压缩器（可选，与重排序 / 检索共用模型）
+context_compressor = None
+if CONTEXT_COMPRESSION != "off":
     try:
-        judgement_vectordb = Chroma(persist_directory=JUDGEMENT_DB_DIR, embedding_function=embeddings)
-        judgement_retriever = judgement_vectordb.as_retriever(search_kwargs={"k": 1})
-        print(f"✅ 判决书型知识库已加载: {JUDGEMENT_DB_DIR}")
+        context_compressor = create_context_compressor(
+            CONTEXT_COMPRESSION,
+            reranker=reranker,
+            embeddings=embeddings,
+            ratio=CONTEXT_COMPRESSION_RATIO,
+            min_sentences=CONTEXT_COMPRESSION_MIN_SENTENCES,
+            kbs=CONTEXT_COMPRESSION_KBS,
+        )
+        print(f"✅ 上下文压缩已启用（打分: {CONTEXT_COMPRESSION}，保留比例: {CONTEXT_COMPRESSION_RATIO}）")
+    except ValueError as e:
+        print(f"⚠️  上下文压缩初始化失败: {e}，不压缩上下文")
+
+# 初始化上下文组装器（分词器与 vLLM 加载的模型一致）
+context_builder = create_context_builder(CONTEXT_TOKENIZER, token_budget=CONTEXT_TOKEN_BUDGET,
+                                         merge_chunks=CONTEXT_MERGE_CHUNKS, compressor=context_compressor)
+print(f"✅ 上下文组装器已初始化（token 预算: {CONTEXT_TOKEN_BUDGET or '不限制'}，计数: {context_builder.counter.name}）")
+
+# 初始化 Query Router（查询路由）
+if QUERY_ROUTER_ENABLED:
+    try:
+        query_router = create_query_router(QUERY_ROUTER_CENTROIDS, min_confidence=QUERY_ROUTER_MIN_CONFIDENCE)
+        mode = "规则 + 质心分类器" if query_router.centroids else "规则"
+        print(f"✅ Query Router 已初始化（{mode}）")
     except Exception as e:
-        print(f"⚠️  判决书型知识库加载失败: {e}")
+        print(f"⚠️  Query Router 初始化失败: {e}，将检索全部知识库")
 
-# 选择主要的知识库和检索器
-# 统计可用的知识库数量
-available_dbs = sum([
-    law_vectordb is not None,
-    case_vectordb is not None,
-    judgement_vectordb is not None
-])
+# 初始化多个知识库（法条型 + 案例型 + 判决书型）
+# 在线更新文档时的默认切分参数（与构建各知识库时保持一致）
+KB_CHUNK_PARAMS = {
+    "law": (500, 50),
+    "case": (1000, 100),
+    "judgement": (2000, 200),
+}
+# 知识库按版本目录加载（见 kb_registry），ingest 构建新版本后可在不重启的情况下热切换
+KNOWLEDGE_BASES = [
+    # (名称, 显示名称, 根目录, 检索数量)
+    ("law", "法条", LAW_DB_DIR, 2),
+    ("case", "案例", CASE_DB_DIR, 2),
+    ("judgement", "判决书", JUDGEMENT_DB_DIR, 1),
+]
+kb_registry = KnowledgeBaseRegistry(
+    loader=lambda path: load_vector_store(path, embeddings, **VECTOR_STORE_LOAD_KWARGS),
+    memory_budget_bytes=int(KB_MEMORY_BUDGET_MB * 1024 ** 2),
+    idle_timeout=KB_IDLE_TIMEOUT,
+)
+for kb_name, kb_label, kb_dir, kb_k in KNOWLEDGE_BASES:
+    try:
+        kb = kb_registry.register(kb_name, kb_dir, kb_k, label=kb_label, lazy=kb_name in KB_LAZY)
+        if kb:
+            print(f"✅ {kb_label}型知识库已加载: {kb.path}（版本: {kb.version or '未分版本'}）")
+        elif kb_name in kb_registry.available_names():
+            print(f"⏳ {kb_label}型知识库按需加载（第一次使用时加载）")
+    except Exception as e:
+        print(f"⚠️  {kb_label}型知识库加载失败: {e}")
 
-if available_dbs >= 2:
+if len(kb_registry) >= 2:
     # 多个知识库，使用混合检索
-    vectordb = law_vectordb or case_vectordb or judgement_vectordb
-    retriever = law_retriever or case_retriever or judgement_retriever
-    db_names = []
-    if law_vectordb:
-        db_names.append("法条型")
-    if case_vectordb:
-        db_names.append("案例型")
-    if judgement_vectordb:
-        db_names.append("判决书型")
+    db_names = [kb_registry.label(name) + "型" for name in kb_registry.available_names()]
     print(f"📚 混合检索模式：{' + '.join(db_names)}")
-elif judgement_vectordb:
-    vectordb = judgement_vectordb
-    retriever = judgement_retriever
-    print("📚 使用判决书型知识库")
-elif case_vectordb:
-    vectordb = case_vectordb
-    retriever = case_retriever
-    print("📚 使用案例型知识库")
-elif law_vectordb:
-    vectordb = law_vectordb
-    retriever = law_retriever
-    print("📚 使用法条型知识库")
+elif len(kb_registry) == 1:
+    print(f"📚 使用{kb_registry.label(kb_registry.available_names()[0])}型知识库")
 else:
-    # 如果都不存在，尝试使用默认路径
-    try:
-        vectordb = Chroma(persist_directory=LAW_DB_DIR, embedding_function=embeddings)
-        retriever = vectordb.as_retriever(search_kwargs={"k": 3})
-        print("📚 使用默认知识库路径")
-    except Exception as e:
-        print(f"❌ 错误: 无法加载任何知识库: {e}")
-        vectordb = None
-        retriever = None
+    print("❌ 错误: 无法加载任何知识库，构建知识库后可通过 /admin/kb/{name}/swap 加载")
+
+
+def _on_knowledge_base_swap(name: str, old_version: Optional[str], new_version: Optional[str]):
+    """知识库切换回调：记录切换 / 在线更新次数（检索用到的各类缓存随知识库快照一起替换，无需在此清空）"""
+    metrics_collector.increment("kb_swaps" if old_version != new_version else "kb_live_updates")
+
+
+def _on_knowledge_base_load(name: str, version: Optional[str], seconds: float):
+    """按需加载回调：记录首次访问代价（触发加载的请求多付出的加载耗时）"""
+    metrics_collector.record_stage("kb_first_touch", seconds)
+    metrics_collector.increment("kb_lazy_loads")
+
+
+def _on_knowledge_base_evict(name: str, version: Optional[str], reason: str):
+    """知识库释放回调：按原因（idle / budget）计数"""
+    metrics_collector.increment(f"kb_evictions_{reason}")
+
+
+kb_registry.add_swap_listener(_on_knowledge_base_swap)
+kb_registry.add_load_listener(_on_knowledge_base_load)
+kb_registry.add_evict_listener(_on_knowledge_base_evict)
+# 后台监视各知识库的 CURRENT 指针，多个 worker 自动跟随切换；空闲的按需加载知识库也由该线程释放
+kb_registry.start_watcher(KB_WATCH_INTERVAL)
 
 # 定义 RAG 提示词模板
 # 这部分很重要，它指导 LLM 如何使用检索到的知识
@@ -155,13 +343,25 @@ RAG_PROMPT = PromptTemplate(
     template=RAG_PROMPT_TEMPLATE, input_variables=["context", "question"]
 )
 
-# 封装 RAG 链 (Chain)
-rag_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    chain_type="stuff", # 将所有检索到的文档块填充到上下文
-    retriever=retriever,
-    chain_type_kwargs={"prompt": RAG_PROMPT}
+# 前缀缓存布局：所有固定指令在最前面，随后是按文档块 ID 排列的上下文，用户问题放在最后，
+# 使不同请求的提示词前缀尽可能长地保持一致
+PREFIX_CACHE_PROMPT_TEMPLATE = """你是一名专业的法律助手。请根据提供的【上下文】来回答用户的问题。
+上下文可能包含法律条文或相关案例。请结合这些信息给出准确、专业的回答。
+如果你找不到答案，请诚实地说明你无法找到相关信息，不要编造。
+请基于上下文中的法律条文和案例，给出详细、准确的法律建议。
+
+【上下文】：
+{context}
+
+用户问题：{question}
+"""
+PREFIX_CACHE_PROMPT = PromptTemplate(
+    template=PREFIX_CACHE_PROMPT_TEMPLATE, input_variables=["context", "question"]
 )
+PROMPTS = {"prefix_cache": PREFIX_CACHE_PROMPT, "ranked": RAG_PROMPT}
+if PROMPT_LAYOUT not in PROMPTS:
+    print(f"⚠️  未知的提示词布局: {PROMPT_LAYOUT}，使用 prefix_cache")
+    PROMPT_LAYOUT = "prefix_cache"
 
 # 定义 API 请求体
 class ChatRequest(BaseModel):
@@ -169,6 +369,10 @@ class ChatRequest(BaseModel):
     temperature: float = 0.1
     max_tokens: int = 1024
     stream: bool = False  # 是否启用流式输出
+    adaptive: Optional[bool] = None  # 是否启用自适应流水线（None 表示按 ADAPTIVE_PIPELINE_ENABLED，用于标注集对比）
+    speculative: Optional[bool] = None  # 是否推测检索（None 表示按 SPECULATIVE_RETRIEVAL_ENABLED）
+    prompt_layout: Optional[str] = None  # 提示词布局 prefix_cache / ranked（None 表示按 PROMPT_LAYOUT）
+    compress: Optional[bool] = None  # 是否压缩上下文（None 表示按 CONTEXT_COMPRESSION，未启用压缩时无效）
 
 # 定义 API 接口
 @app.post("/api/rag/chat")
@@ -176,110 +380,280 @@ async def chat_endpoint(request: ChatRequest):
     """
     RAG 聊天接口，完整的检索增强生成流程：
     1. Query Rewrite: 改写用户问题为专业检索关键词
-    2. Retrieve: 向量检索获取 Top 50 文档
+    2. Retrieve: 向量检索获取 Top 50 文档（有 BM25 索引时与 BM25 结果按倒数排名融合）
     3. Rerank: 使用 Cross-Encoder 重排序到 Top 5
     4. Generate: LLM 生成最终答案
+    明确的法条查询（如"民法典第577条"）命中法条索引时跳过 1-3 步，直接用对应条文生成
+    推测检索模式下第 1 步与原始问题的检索并行，改写返回后只补充检索改写后的问题
+
+    请求开始时取得知识库快照，整个请求使用同一版本；期间发生的热切换不影响本请求
     """
+    kb_snapshot = kb_registry.snapshot()
+    try:
+        return await _run_rag(request, kb_snapshot)
+    finally:
+        # 流式输出在此之前已拿到最终文档文本，生成阶段不再访问知识库
+        kb_snapshot.release()
+
+
+async def _run_rag(request: ChatRequest, kb_snapshot: KnowledgeBaseSnapshot):
+    """在指定知识库快照上执行 RAG 流程"""
     start_time = time.time()
     print(f"📥 收到查询: {request.query}")
     
-    if not retriever:
+    if len(kb_snapshot) == 0:
         latency = time.time() - start_time
         metrics_collector.record_request(latency, success=False)
         return {"response": "❌ 错误: 知识库未加载，请先运行 ingest.py 构建知识库"}
     
+    # 本请求的自适应决策（跳过改写 / 提前停止 / 跳过或缩小重排序）和各阶段耗时
+    adaptive = adaptive_controller if (ADAPTIVE_PIPELINE_ENABLED if request.adaptive is None else request.adaptive) else None
+    decisions = AdaptiveDecisions(enabled=adaptive is not None)
+    
+    # === 快速通道: 明确的法条查询直接按法条索引取文档块 ===
+    # 法条知识库可能需要按需加载，在线程池中进行
+    fast_path = await asyncio.to_thread(_statute_fast_path, request.query, kb_snapshot)
+    if fast_path is not None:
+        final_candidates, fetcher = fast_path
+        await asyncio.to_thread(fetcher.fetch, final_candidates)
+        final_docs = fetcher.texts(final_candidates)
+        final_metadatas = [doc.metadata if doc else {} for doc in fetcher.documents(final_candidates)]
+        metrics_collector.record_stage("retrieval_fastpath", time.time() - start_time)
+        decisions.path = "fastpath"
+        decisions.rewrite = "skipped"
+        decisions.rewrite_reason = "statute"
+        decisions.timed("retrieval", start_time)
+        return await _generate_answer(request, final_candidates, final_docs, final_metadatas, start_time,
+                                      f"法条快速通道({len(final_docs)}) → 生成", decisions)
+    
     # === 步骤 1: Query Rewrite (查询改写) ===
-    search_query = request.query
-    if query_rewriter:
-        try:
-            search_query = query_rewriter.rewrite(request.query)
-            print(f"📝 查询已改写: '{request.query}' -> '{search_query}'")
-        except Exception as e:
-            print(f"⚠️  查询改写失败，使用原查询: {e}")
-            search_query = request.query
+    search_queries = [request.query]  # 本次检索使用的查询（多变体改写时有多个）
+    stage_start = time.time()
+    rewrite_future = None
+    if not query_rewriter:
+        decisions.rewrite = "disabled"
+    elif adaptive is not None and adaptive.is_keyword_query(request.query)[0]:
+        # 问题本身已是专业检索关键词，不需要 LLM 改写
+        decisions.rewrite = "skipped"
+        decisions.rewrite_reason = "keywords"
+        metrics_collector.increment("adaptive_rewrite_skipped")
+        print("⏭️  问题已是检索关键词，跳过查询改写")
     else:
-        search_query = request.query
+        # 本地词典改写（微秒级），覆盖率不足时才需要 LLM 改写
+        local_rewrite = query_rewriter.rewrite_local(request.query)
+        if local_rewrite is not None:
+            search_queries = [local_rewrite]
+            decisions.rewrite = "lexicon"
+            metrics_collector.increment("rewrite_lexicon")
+            metrics_collector.record_stage("rewrite_lexicon", decisions.timed("rewrite", stage_start))
+            print(f"📝 查询已改写（词典）: '{request.query}' -> '{local_rewrite}'")
+        elif SPECULATIVE_RETRIEVAL_ENABLED if request.speculative is None else request.speculative:
+            # 推测检索：改写在线程池中进行（立即提交），同时用原始问题检索
+            rewrite_start = time.time()
+            rewrite_future = asyncio.get_running_loop().run_in_executor(None, _timed_rewrite, request.query)
+            decisions.rewrite = "speculative"
+            metrics_collector.increment("rewrite_llm")
+            metrics_collector.increment("speculative_requests")
+        else:
+            metrics_collector.increment("rewrite_llm")
+            try:
+                search_queries = _llm_rewrite(request.query)
+                print(f"📝 查询已改写: '{request.query}' -> {' | '.join(search_queries)}")
+            except Exception as e:
+                print(f"⚠️  查询改写失败，使用原查询: {e}")
+            metrics_collector.record_stage("rewrite", decisions.timed("rewrite", stage_start))
     
-    # === 步骤 2: Retrieve (向量检索) ===
-    # 如果多个知识库都存在，使用混合检索
-    available_retrievers = []
-    if law_retriever:
-        available_retrievers.append(("法条", law_retriever, 50))  # 先取 Top 50
-    if case_retriever:
-        available_retrievers.append(("案例", case_retriever, 50))
-    if judgement_retriever:
-        available_retrievers.append(("判决书", judgement_retriever, 50))
+    # === 步骤 2: Route + Retrieve (查询路由 + 向量检索) ===
+    stage_start = time.time()
+    try:
+        # 查询只嵌入一次（多个变体一次批量嵌入），路由分类器和各知识库复用同一组查询向量；
+        # 模型推理（或等待模型服务）在线程池中进行，不阻塞事件循环
+        query_vectors = await asyncio.to_thread(_embed_queries, search_queries)
+    except Exception as e:
+        print(f"❌ 查询嵌入失败: {e}")
+        return {"response": f"❌ 检索失败: {str(e)}"}
     
-    all_docs = []
-    retrieval_info = []
+    # 路由决定检索哪些知识库及各自的候选数量，跳过的按需加载知识库不会被加载；
+    # 按路由概率从高到低检索，自适应模式下高置信命中已足够时不再检索（也不加载）其余知识库
+    routing = _route_query(request.query, " ".join(search_queries), query_vectors[0], kb_snapshot)
+    plan = list(routing.budgets.items())
+    if adaptive is not None:
+        plan.sort(key=lambda item: -routing.probabilities.get(item[0], 0.0))
     
-    if len(available_retrievers) >= 2:
-        # 多知识库混合检索
-        try:
-            for name, ret, k in available_retrievers:
-                docs = ret.get_relevant_documents(search_query)
-                all_docs.extend(docs[:k])
-                retrieval_info.append(f"{name}: {len(docs)}")
-            print(f"🔍 向量检索完成（{', '.join(retrieval_info)}），共 {len(all_docs)} 个文档")
-        except Exception as e:
-            print(f"❌ 混合检索失败: {e}")
-            return {"response": f"❌ 检索失败: {str(e)}"}
-    else:
-        # 单个知识库检索
-        try:
-            if available_retrievers:
-                name, ret, k = available_retrievers[0]
-                docs = ret.get_relevant_documents(search_query)
-                all_docs = docs[:k]
-                retrieval_info.append(f"{name}: {len(docs)}")
-                print(f"🔍 向量检索完成，共 {len(all_docs)} 个文档")
+    # 检索、重排序阶段只传递候选（知识库 + 文档块 ID + 分数），文本按 ID 延迟读取且只读取一次
+    stores = {}  # 知识库名称 → 向量库，检索到哪个知识库再加入（ChunkFetcher 持有同一个字典）
+    fetcher = ChunkFetcher(stores)
+    origins = {}  # (知识库, 文档块 ID) → 检索到它的查询在 decisions.variants 中的下标
+    
+    try:
+        decisions.variants = list(search_queries)
+        # 检索（含按需加载知识库、等待远程分片）在线程池中进行，不阻塞事件循环
+        all_candidates, vector_candidates, retrieval_info, hybrid, skipped = await asyncio.to_thread(
+            _retrieve_plan, plan, query_vectors, search_queries, list(range(len(search_queries))), kb_snapshot,
+            stores, fetcher, adaptive, decisions, origins)
+        
+        if rewrite_future is not None:
+            # 等待改写结果（不超过截止时间，从改写开始计时），只用改写后的问题再检索一次，两路候选在重排序前合并
+            wait_start = time.time()
+            timeout = max(0.0, REWRITE_DEADLINE - (wait_start - rewrite_start))
+            rewritten_queries = []
+            try:
+                rewritten_queries, rewrite_seconds = await asyncio.wait_for(rewrite_future, timeout=timeout)
+                metrics_collector.record_stage("rewrite", rewrite_seconds)
+                decisions.timings["rewrite"] = round(rewrite_seconds, 4)
+            except asyncio.TimeoutError:
+                decisions.rewrite = "timeout"
+                metrics_collector.increment("speculative_rewrite_timeouts")
+                print(f"⏱️  查询改写超过截止时间（{REWRITE_DEADLINE}s），只使用原始问题的检索结果")
+            metrics_collector.record_stage("rewrite_wait", decisions.timed("rewrite_wait", wait_start))
+            
+            # 与原始问题相同的改写已经检索过
+            rewritten_queries = [query for query in rewritten_queries if query.strip() != request.query.strip()]
+            if not rewritten_queries:
+                metrics_collector.increment("speculative_raw_only")
             else:
-                # 降级到标准 RAG 链
-                try:
-                    result = rag_chain.invoke(request.query)
-                    return {"response": result['result']}
-                except Exception as e:
-                    return {"response": f"❌ 检索失败: {str(e)}"}
-        except Exception as e:
-            print(f"❌ 检索失败: {e}")
-            return {"response": f"❌ 检索失败: {str(e)}"}
+                print(f"📝 查询已改写: '{request.query}' -> {' | '.join(rewritten_queries)}")
+                variant_ids = list(range(len(decisions.variants), len(decisions.variants) + len(rewritten_queries)))
+                decisions.variants.extend(rewritten_queries)
+                rewritten_vectors = await asyncio.to_thread(_embed_queries, rewritten_queries)
+                rewritten = await asyncio.to_thread(_retrieve_plan, plan, rewritten_vectors, rewritten_queries,
+                                                    variant_ids, kb_snapshot, stores, fetcher, adaptive, decisions,
+                                                    origins)
+                seen = {(candidate.kb, candidate.chunk_id) for candidate in all_candidates}
+                metrics_collector.increment(
+                    "speculative_new_candidates",
+                    sum((candidate.kb, candidate.chunk_id) not in seen for candidate in rewritten[0]))
+                all_candidates = merge_candidate_lists(all_candidates, rewritten[0])
+                # 两次检索使用同一个嵌入模型，向量分数可以直接比较，同一文档块保留较高的分数
+                best = {}
+                for candidate in vector_candidates + rewritten[1]:
+                    key = (candidate.kb, candidate.chunk_id)
+                    if key not in best or candidate.score > best[key].score:
+                        best[key] = candidate
+                vector_candidates = list(best.values())
+                retrieval_info = [f"原始问题 {info}" for info in retrieval_info] + \
+                                 [f"改写后 {info}" for info in rewritten[2]]
+                hybrid = hybrid or rewritten[3]
+                skipped = [name for name in skipped if name in rewritten[4]]
+        if skipped:
+            decisions.kbs_skipped = skipped
+            metrics_collector.increment("adaptive_early_stops")
+            metrics_collector.increment("adaptive_kbs_skipped", len(skipped))
+        print(f"🔍 {'混合检索' if hybrid else '向量检索'}完成（{', '.join(retrieval_info)}），共 {len(all_candidates)} 个文档")
+    except Exception as e:
+        print(f"❌ 检索失败: {e}")
+        return {"response": f"❌ 检索失败: {str(e)}"}
+    decisions.timed("retrieve", stage_start)
     
-    if not all_docs:
+    if not all_candidates:
         return {"response": "❌ 未检索到相关文档，请尝试其他问题"}
     
     # === 步骤 3: Rerank (重排序) ===
-    # 将文档转换为字符串列表用于重排序
-    doc_contents = [doc.page_content for doc in all_docs]
-    doc_metadata = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in all_docs]
-    
-    if reranker and len(doc_contents) > 5:
+    rerank_mode, rerank_pool = "full", len(all_candidates)
+    if adaptive is not None:
+        # 向量分数第 1 名与第 5 名差距很大时跳过重排序，较大时只重排序排名靠前的候选
+        decisions.margin = adaptive.score_margin(vector_candidates, 5)
+        rerank_mode, rerank_pool = adaptive.rerank_plan(decisions.margin, len(all_candidates))
+        if rerank_mode == "shrink" and candidate_depth > 1:
+            # 级联重排序由第一级模型缩小候选，不再按向量排名截断
+            rerank_mode, rerank_pool = "full", len(all_candidates)
+    if reranker and len(all_candidates) > 5 and rerank_mode != "skip":
+        stage_start = time.time()
+        pool = interleave(all_candidates, rerank_pool) if rerank_mode == "shrink" else all_candidates
         try:
-            # 使用重排序器对文档进行精细排序
-            reranked_docs = reranker.rerank_with_metadata(
+            # 使用重排序器对候选进行精细排序（只返回候选和分数，不复制文档）
+            rerank_timings, cascade_info = {}, {}
+            token_ids = _rerank_token_ids(pool, kb_snapshot) if RERANK_TOKEN_CACHE_ENABLED else None
+            documents = await asyncio.to_thread(fetcher.texts, pool)
+            reranked = await asyncio.to_thread(
+                reranker.rerank_ids,
                 query=request.query,  # 使用原始查询进行重排序
-                documents_with_metadata=doc_metadata,
-                top_k=5
+                ids=pool,
+                documents=documents,
+                top_k=5,
+                token_ids=token_ids,
+                timings=rerank_timings,
+                info=cascade_info
             )
-            print(f"🎯 重排序完成，从 {len(doc_contents)} 个文档中选出 Top 5")
-            # 提取重排序后的文档内容
-            final_docs = [doc['page_content'] for doc in reranked_docs]
+            for stage, seconds in rerank_timings.items():
+                metrics_collector.record_stage(f"rerank_{stage}", seconds)
+            if cascade_info.get("first_stage"):
+                decisions.rerank_cascade = cascade_info["second_stage"]
+                metrics_collector.record_value("rerank_cascade_second_stage", cascade_info["second_stage"])
+                print(f"🎯 级联重排序完成，第一级 {len(pool)} 个文档 → 第二级 {cascade_info['second_stage']} 个 → Top 5")
+            else:
+                print(f"🎯 重排序完成，从 {len(pool)} 个文档中选出 Top 5")
+            final_candidates = [candidate for candidate, _ in reranked]
+            decisions.rerank, decisions.rerank_pool = rerank_mode, len(pool)
+            if rerank_mode == "shrink":
+                metrics_collector.increment("adaptive_rerank_shrunk")
         except Exception as e:
             print(f"⚠️  重排序失败，使用原始检索结果: {e}")
             # 重排序失败，使用原始 Top 5
-            final_docs = doc_contents[:5]
+            final_candidates = _top_candidates(all_candidates, 5)
+        metrics_collector.record_stage("rerank", decisions.timed("rerank", stage_start))
     else:
-        # 如果没有重排序器或文档数量较少，直接取 Top 5
-        final_docs = doc_contents[:5]
-        if reranker:
-            print(f"ℹ️  文档数量较少（{len(doc_contents)}），跳过重排序")
+        # 如果没有重排序器、文档数量较少或已有压倒性的命中，直接取 Top 5
+        final_candidates = _top_candidates(all_candidates, 5)
+        if reranker and len(all_candidates) > 5:
+            decisions.rerank = "skip"
+            metrics_collector.increment("adaptive_rerank_skipped")
+            print(f"⏭️  第 1 名优势明显（分差 {decisions.margin:.3f}），跳过重排序")
+        elif reranker:
+            print(f"ℹ️  文档数量较少（{len(all_candidates)}），跳过重排序")
+    
+    # 各查询变体对最终 Top 5 的贡献（检索到该文档块的变体都计入；unique 只计只有该变体检索到的）
+    final_origins = [origins.get((candidate.kb, candidate.chunk_id), set()) for candidate in final_candidates]
+    decisions.variant_hits = [sum(i in found for found in final_origins) for i in range(len(decisions.variants))]
+    decisions.variant_unique_hits = [sum(found == {i} for found in final_origins) for i in range(len(decisions.variants))]
+    if len(decisions.variants) > 1:
+        for i, hits in enumerate(decisions.variant_hits):
+            metrics_collector.increment(f"variant_{i}_top5", hits)
+            metrics_collector.increment(f"variant_{i}_unique_top5", decisions.variant_unique_hits[i])
+    
+    # 最终 Top K 的文本（已读取过的直接复用，提示词和 sources 共用同一份字符串；分片知识库需要远程读取，在线程池中进行）
+    await asyncio.to_thread(fetcher.fetch, final_candidates)
+    final_docs = fetcher.texts(final_candidates)
+    final_metadatas = [doc.metadata if doc else {} for doc in fetcher.documents(final_candidates)]
+    metrics_collector.record_stage("retrieval_full", time.time() - start_time)
+    decisions.timed("retrieval", start_time)
     
     # === 步骤 4: Generate (生成答案) ===
+    return await _generate_answer(request, final_candidates, final_docs, final_metadatas, start_time,
+                                  f"改写 → 检索({len(all_candidates)}) → 重排序({len(final_docs)}) → 生成", decisions)
+
+
+async def _generate_answer(request: ChatRequest, final_candidates: List[Candidate], final_docs: List[str],
+                           final_metadatas: List[dict], start_time: float, pipeline: str,
+                           decisions: AdaptiveDecisions):
+    """
+    根据最终文档生成答案（完整流程和法条快速通道共用）
+
+    Args:
+        request: 请求
+        final_candidates: 最终文档的候选（知识库 + 文档块 ID）
+        final_docs: 最终文档文本
+        final_metadatas: 最终文档的元数据（用于合并同一来源中相邻的文档块）
+        （以上三个列表按重排序分数排列；prefix_cache 布局下按文档块 ID 重新排列后送入提示词和 sources）
+        start_time: 请求开始时间
+        pipeline: 日志中显示的流程描述
+        decisions: 本请求的自适应决策（非流式响应中返回，并写入决策日志）
+    """
+    layout = request.prompt_layout if request.prompt_layout in PROMPTS else PROMPT_LAYOUT
+    ranked_candidates = final_candidates  # 决策日志按排名记录
+    ranks = list(range(len(final_candidates)))
+    if layout == "prefix_cache":
+        # 文档按（知识库, 文档块 ID）排列，与排名无关；sources 的顺序与提示词中的文档编号保持一致
+        ranks = sorted(ranks, key=lambda i: (final_candidates[i].kb, final_candidates[i].chunk_id))
+        final_candidates = [final_candidates[i] for i in ranks]
+        final_docs = [final_docs[i] for i in ranks]
+        final_metadatas = [final_metadatas[i] for i in ranks]
+    # 分词计数和压缩打分（模型前向）在线程池中进行，不阻塞事件循环
+    prompt = await asyncio.to_thread(_build_prompt, request, layout, final_candidates, final_docs, final_metadatas,
+                                     ranks, decisions)
+    print(f"🎛️  流水线决策: {decisions.describe()}")
+    _log_decisions(request, decisions, ranked_candidates)
     try:
-        # 构建上下文
-        context = "\n\n".join([f"[文档 {i+1}]\n{doc}" for i, doc in enumerate(final_docs)])
-        
-        # 使用提示词模板生成回答
-        prompt = RAG_PROMPT.format(context=context, question=request.query)
         
         # 如果启用流式输出
         if request.stream:
@@ -298,12 +672,19 @@ async def chat_endpoint(request: ChatRequest):
             # 非流式输出
             response = llm.invoke(prompt)
             
-            print(f"✅ RAG 流程完成: 改写 → 检索({len(all_docs)}) → 重排序({len(final_docs)}) → 生成")
+            print(f"✅ RAG 流程完成: {pipeline}")
             return {
                 "response": response,
+                "decisions": decisions.to_dict(),
                 "sources": [
-                    {"content": doc[:200] + "..." if len(doc) > 200 else doc, "index": i+1}
-                    for i, doc in enumerate(final_docs)
+                    {
+                        "content": doc[:200] + "..." if len(doc) > 200 else doc,
+                        "index": i+1,
+                        "rank": ranks[i] + 1,
+                        "id": candidate.chunk_id,
+                        "kb": candidate.kb,
+                    }
+                    for i, (candidate, doc) in enumerate(zip(final_candidates, final_docs))
                 ]
             }
     except Exception as e:
@@ -317,6 +698,271 @@ async def chat_endpoint(request: ChatRequest):
             return {"response": f"❌ 生成失败: {str(e)}", "sources": []}
 
 
+def _build_prompt(request: ChatRequest, layout: str, final_candidates: List[Candidate], final_docs: List[str],
+                  final_metadatas: List[dict], ranks: List[int], decisions: AdaptiveDecisions) -> str:
+    """按 token 预算组装上下文并填入提示词模板（组装失败时按原样拼接）"""
+    try:
+        # 按 token 预算构建上下文（合并相邻文档块，超出预算时裁剪或丢弃排名靠后的文档）
+        stage_start = time.time()
+        # 设置了压缩器时较长的案例 / 裁判文书只保留与问题最相关的句子
+        compress = request.compress if request.compress is not None else context_compressor is not None
+        built = context_builder.build(final_docs, final_metadatas, [candidate.kb for candidate in final_candidates],
+                                      ranks=ranks, query=request.query if compress else None)
+        
+        # 使用提示词模板生成回答
+        prompt = PROMPTS[layout].format(context=built.context, question=request.query)
+        prompt_tokens = context_builder.counter.count(prompt)
+        metrics_collector.record_stage("context_build", decisions.timed("context_build", stage_start))
+        metrics_collector.record_value("prompt_tokens", prompt_tokens)
+        metrics_collector.record_value("context_tokens_saved", built.original_tokens - built.tokens)
+        if built.compressed_sentences:
+            metrics_collector.increment("context_compressed_sentences", built.compressed_sentences)
+        decisions.context = {"layout": layout, "prompt_tokens": prompt_tokens, **built.to_dict()}
+        print(f"🧾 提示词 {prompt_tokens} tokens（上下文 {built.original_tokens} → {built.tokens}，"
+              f"合并 {built.merged} 个文档块，压缩 {built.compressed_sentences} 句，裁剪 {built.trimmed_sentences} 句）")
+    except Exception as e:
+        print(f"⚠️  上下文组装失败，按原样拼接: {e}")
+        prompt = PROMPTS[layout].format(
+            context="\n\n".join([f"[文档 {i+1}]\n{doc}" for i, doc in enumerate(final_docs)]),
+            question=request.query)
+    return prompt
+
+
+def _top_candidates(candidates: List[Candidate], n: int) -> List[Candidate]:
+    """不经重排序时的前 n 个候选（级联重排序扩大了每个知识库的检索数量时按各知识库内的排名交错选取）"""
+    return interleave(candidates, n) if candidate_depth > 1 else candidates[:n]
+
+
+def _rerank_token_ids(pool: List[Candidate], kb_snapshot: KnowledgeBaseSnapshot) -> Optional[List]:
+    """
+    从各知识库的重排序分词缓存中取出候选的 token ID（缓存的分词器与重排序模型不一致时不使用）
+
+    Returns:
+        与 pool 一一对应的 token ID 列表（不在缓存中的为 None），所有知识库都没有可用缓存时返回 None
+    """
+    caches = {}
+    for name in {candidate.kb for candidate in pool}:
+        kb = kb_snapshot.get(name)
+        cache = kb.rerank_tokens if kb is not None else None
+        if cache is not None and cache.tokenizer == reranker.model_name:
+            caches[name] = cache
+    if not caches:
+        return None
+    token_ids = [caches[c.kb].get(c.chunk_id) if c.kb in caches else None for c in pool]
+    hits = sum(ids is not None for ids in token_ids)
+    metrics_collector.increment("rerank_token_cache_hits", hits)
+    metrics_collector.increment("rerank_token_cache_misses", len(pool) - hits)
+    return token_ids
+
+
+_decision_log_lock = threading.Lock()
+
+
+def _log_decisions(request: ChatRequest, decisions: AdaptiveDecisions, final_candidates: List[Candidate]):
+    """按决策计数，并将本请求的决策追加到 ADAPTIVE_DECISION_LOG（未设置时不写入）"""
+    metrics_collector.increment(f"pipeline_{decisions.path}")
+    if not ADAPTIVE_DECISION_LOG:
+        return
+    record = {
+        "timestamp": datetime.now().isoformat(),
+        "query": request.query,
+        **decisions.to_dict(),
+        "sources": [{"kb": candidate.kb, "id": candidate.chunk_id} for candidate in final_candidates],
+    }
+    try:
+        with _decision_log_lock, open(ADAPTIVE_DECISION_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️  决策日志写入失败: {e}")
+
+
+def _statute_fast_path(query: str, kb_snapshot: KnowledgeBaseSnapshot) -> Optional[Tuple[List[Candidate], ChunkFetcher]]:
+    """
+    法条查询快速通道：查询中的每个"法律名称 + 第X条"都能在法条索引中找到文档块时，
+    直接返回这些文档块（不超过 5 个），否则返回 None 走完整流程
+
+    查询中没有"第X条"时不计入统计；命中 / 未命中分别计数，检索阶段耗时分别记录为
+    retrieval_fastpath / retrieval_full
+    """
+    if not STATUTE_FASTPATH_ENABLED:
+        return None
+    start = time.time()
+    checked = False
+    match = None
+    for name in STATUTE_FASTPATH_KBS:
+        if name not in kb_snapshot.names():
+            continue
+        kb = kb_snapshot.get(name)
+        if kb is None or not len(kb.statute_index):
+            continue
+        kb_match = kb.statute_index.match(query)
+        if not kb_match.articles:
+            return None
+        checked = True
+        if kb_match.resolved and kb_match.residual <= STATUTE_FASTPATH_MAX_RESIDUAL:
+            match = (name, kb, kb_match)
+            break
+    if not checked:
+        return None
+
+    metrics_collector.increment("statute_queries")
+    result = None
+    if match is not None:
+        name, kb, kb_match = match
+        candidates = [Candidate(name, chunk_id, 1.0) for chunk_id in kb_match.chunk_ids()[:5]]
+        fetcher = ChunkFetcher({name: kb.vectorstore})
+        # 在线更新删除的文档块读不到，视为未命中
+        if all(doc is not None for doc in fetcher.documents(candidates)):
+            result = (candidates, fetcher)
+    metrics_collector.record_stage("statute_lookup", time.time() - start)
+    if result is None:
+        metrics_collector.increment("statute_fastpath_misses")
+        print("📑 法条查询未命中法条索引，走完整流程")
+        return None
+    metrics_collector.increment("statute_fastpath_hits")
+    provisions = ", ".join(f"{ref.law}第{ref.article}条" for ref in match[2].provisions)
+    print(f"📑 法条快速通道命中: {provisions}（{len(result[0])} 个文档块，跳过改写 / 检索 / 重排序）")
+    return result
+
+
+def _llm_rewrite(query: str) -> List[str]:
+    """LLM 查询改写：QUERY_REWRITE_VARIANTS > 1 时一次调用生成多个变体"""
+    if QUERY_REWRITE_VARIANTS > 1:
+        return query_rewriter.rewrite_variants(query, QUERY_REWRITE_VARIANTS)
+    return [query_rewriter.rewrite_llm(query)]
+
+
+def _timed_rewrite(query: str) -> Tuple[List[str], float]:
+    """在线程池中执行 LLM 查询改写（推测检索模式），返回 (改写变体, 耗时)；改写失败时返回 [原查询]"""
+    start = time.time()
+    try:
+        rewritten = _llm_rewrite(query)
+    except Exception as e:
+        print(f"⚠️  查询改写失败，使用原查询: {e}")
+        rewritten = [query]
+    return rewritten, time.time() - start
+
+
+def _embed_queries(queries: List[str]) -> List[List[float]]:
+    """嵌入查询（多个变体时一次批量前向）"""
+    if len(queries) == 1:
+        return [embeddings.embed_query(queries[0])]
+    return embeddings.embed_documents(queries)
+
+
+def _retrieve_plan(plan: List[Tuple[str, int]], query_vectors: List[List[float]], search_queries: List[str],
+                   variant_ids: List[int], kb_snapshot: KnowledgeBaseSnapshot, stores: dict, fetcher: ChunkFetcher,
+                   adaptive: Optional[AdaptiveController], decisions: AdaptiveDecisions, origins: dict):
+    """
+    按路由计划依次检索各知识库（推测检索模式下原始问题和改写后的问题各调用一次）
+
+    多个查询变体在每个知识库上一次批量检索；自适应模式下高置信命中已足够时停止，其余知识库不检索（也不加载）
+
+    Returns:
+        (跨知识库拼接的候选, 其中的向量检索候选, 各知识库检索数量说明, 是否使用了混合检索, 提前停止而跳过的知识库)
+    """
+    all_candidates: List[Candidate] = []
+    vector_candidates: List[Candidate] = []
+    retrieval_info = []
+    hybrid = False
+    for position, (name, k) in enumerate(plan):
+        kb = kb_snapshot.get(name)
+        if kb is None:
+            continue
+        stores[name] = kb.vectorstore
+        candidates, vector_hits = _search_retriever(name, kb.retriever, query_vectors, fetcher, k * candidate_depth,
+                                                    lexical_index=kb.lexical_index, lexical_queries=search_queries,
+                                                    variant_ids=variant_ids, origins=origins)
+        all_candidates.extend(candidates)
+        vector_candidates.extend(vector_hits)
+        hybrid = hybrid or (kb.lexical_index is not None and HYBRID_SEARCH_ENABLED)
+        if name not in decisions.kbs_searched:
+            decisions.kbs_searched.append(name)
+        retrieval_info.append(f"{kb.label}: {len(candidates)}")
+        if adaptive is not None and position + 1 < len(plan) and adaptive.enough_hits(vector_candidates, 5):
+            return all_candidates, vector_candidates, retrieval_info, hybrid, [skipped for skipped, _ in plan[position + 1:]]
+    return all_candidates, vector_candidates, retrieval_info, hybrid, []
+
+
+def _route_query(query: str, search_query: str, query_vector: List[float],
+                 kb_snapshot: KnowledgeBaseSnapshot) -> RoutingDecision:
+    """
+    查询路由：决定检索哪些知识库，记录路由决策和节省的检索次数
+
+    未启用路由器时检索全部知识库（各知识库沿用默认检索数量）
+    """
+    default_budgets = {name: kb_registry.search_k(name) for name in kb_snapshot.names()}
+    if query_router is None:
+        return RoutingDecision(default_budgets, {}, 1.0, True, [])
+    start = time.time()
+    decision = query_router.route(query, default_budgets, query_vector=query_vector, rewritten_query=search_query)
+    metrics_collector.record_stage("route", time.time() - start)
+    metrics_collector.increment("router_requests")
+    if decision.fallback:
+        metrics_collector.increment("router_fallbacks")
+    metrics_collector.increment("router_searches_saved", len(decision.skipped))
+    for name in decision.budgets:
+        metrics_collector.increment(f"router_kb_{name}")
+    print(f"🧭 查询路由: {decision.describe()}")
+    return decision
+
+
+def _search_retriever(name: str, retriever, query_vectors: List[List[float]], fetcher: ChunkFetcher,
+                      k: Optional[int] = None, lexical_index: Optional[BM25Index] = None,
+                      lexical_queries: Optional[List[str]] = None, variant_ids: Optional[List[int]] = None,
+                      origins: Optional[dict] = None) -> Tuple[List[Candidate], List[Candidate]]:
+    """
+    按查询向量检索单个知识库；有 BM25 索引时与 BM25 检索结果按倒数排名融合
+
+    多个查询变体时所有查询向量一次批量检索（一次 ANN 调用），各变体的向量 / BM25 结果一起融合
+
+    Args:
+        name: 知识库名称
+        retriever: 知识库检索器（as_retriever 返回）
+        query_vectors: 已嵌入的查询向量（每个查询变体一个）
+        fetcher: 请求级文档块读取器
+        k: 检索数量（路由分配），None 表示沿用检索器的 search_kwargs["k"]
+        lexical_index: 知识库的 BM25 索引（None 表示只做向量检索）
+        lexical_queries: BM25 检索使用的查询（改写后的关键词，与 query_vectors 一一对应）
+        variant_ids: 各查询变体的编号（记录到 origins）
+        origins: (知识库, 文档块 ID) → 检索到它的变体编号集合（None 表示不记录）
+
+    Returns:
+        (检索候选列表（知识库 + 文档块 ID + 分数）, 其中向量检索的候选（分数为向量相似度）)，
+        只有一个查询且只做向量检索时两者是同一个列表
+    """
+    k = k or retriever.search_kwargs.get("k", 4)
+    hybrid = lexical_index is not None and bool(lexical_queries) and HYBRID_SEARCH_ENABLED
+    single = len(query_vectors) == 1 and not hybrid
+    depth = k if single else k * max(1, HYBRID_CANDIDATE_DEPTH)
+    vector_lists = retrieve_candidates(name, retriever.vectorstore, query_vectors, depth, fetcher)
+    lexical_lists = []
+    if hybrid:
+        start = time.time()
+        lexical_lists = [lexical_index.search_candidates(name, query, depth) for query in lexical_queries]
+        metrics_collector.record_stage("bm25", time.time() - start)
+    if origins is not None and variant_ids:
+        for variant_id, vector_list, lexical_list in zip(variant_ids, vector_lists, lexical_lists or [[]] * len(vector_lists)):
+            for candidate in vector_list + lexical_list:
+                origins.setdefault((candidate.kb, candidate.chunk_id), set()).add(variant_id)
+    if single:
+        return vector_lists[0], vector_lists[0]
+
+    fused = reciprocal_rank_fusion(vector_lists + lexical_lists, top_k=k)
+    # 同一文档块保留各变体中最高的向量相似度（自适应流水线按向量分数判断）
+    best = {}
+    for candidate in (candidate for vector_list in vector_lists for candidate in vector_list):
+        if candidate.chunk_id not in best or candidate.score > best[candidate.chunk_id].score:
+            best[candidate.chunk_id] = candidate
+    vector_candidates = sorted(best.values(), key=lambda candidate: -candidate.score)
+    if hybrid:
+        # BM25 索引不随在线删除更新，读不到的文档块（已删除）丢弃
+        fused = [candidate for candidate, doc in zip(fused, fetcher.documents(fused)) if doc is not None]
+        metrics_collector.increment("hybrid_searches")
+        metrics_collector.increment("bm25_only_candidates", sum(c.chunk_id not in best for c in fused))
+    return fused, vector_candidates
+
+
 def _stream_response(
     llm: CustomVLLM,
     prompt: str,
@@ -345,8 +991,13 @@ def _stream_response(
     # 流式生成
     full_response = ""
     success = True
+    first_chunk = True
     try:
         for chunk in llm.stream(prompt, temperature=temperature, max_tokens=max_tokens):
+            if first_chunk and start_time is not None:
+                # 首个 token 延迟（从收到请求开始计时，前缀缓存命中时预填充更快）
+                metrics_collector.record_stage("time_to_first_token", time.time() - start_time)
+                first_chunk = False
             full_response += chunk
             # 发送文本块
             yield f"data: {json.dumps({'type': 'chunk', 'text': chunk})}\n\n"
@@ -388,19 +1039,22 @@ async def health_check():
         "judgement": Path(JUDGEMENT_DB_DIR).exists() and any(Path(JUDGEMENT_DB_DIR).iterdir())
     }
     health_status["checks"]["knowledge_bases"] = knowledge_bases
-    health_status["checks"]["available_retrievers"] = sum([
-        law_retriever is not None,
-        case_retriever is not None,
-        judgement_retriever is not None
-    ])
+    health_status["checks"]["available_retrievers"] = len(kb_registry)
+    health_status["checks"]["knowledge_base_versions"] = {
+        name: kb_registry.get(name).version if kb_registry.get(name) else None
+        for name in kb_registry.names()
+    }
+    health_status["checks"]["knowledge_base_memory_mb"] = round(kb_registry.memory_bytes() / 1024 ** 2, 1)
     
     # 检查 RAG 组件
     health_status["checks"]["components"] = {
         "query_rewriter": query_rewriter is not None,
         "reranker": reranker is not None,
         "embeddings": embeddings is not None,
+        "model_server": MODEL_SERVER_SOCKET if model_client is not None else None,
         "llm": llm is not None
     }
+    health_status["checks"]["thread_budget"] = applied_thread_budget()
     
     # 如果 vLLM 不可用，标记为不健康
     if vllm_health["status"] != "healthy":
@@ -413,14 +1067,155 @@ async def health_check():
     return health_status
 
 
+def _check_admin_token(token: Optional[str]):
+    """校验管理接口令牌（未配置 ADMIN_TOKEN 时不校验）"""
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="管理接口令牌无效")
+
+
+class KnowledgeBaseSwapRequest(BaseModel):
+    version: Optional[str] = None  # 目标版本，None 表示切换到 CURRENT 指向的版本
+
+
+# 知识库管理端点
+@app.get("/admin/kb")
+async def knowledge_base_status(x_admin_token: Optional[str] = Header(None)):
+    """查看各知识库的当前版本、正在使用的请求数和可用版本"""
+    _check_admin_token(x_admin_token)
+    return kb_registry.status()
+
+
+@app.post("/admin/kb/{name}/swap")
+async def swap_knowledge_base(
+    name: str,
+    request: Optional[KnowledgeBaseSwapRequest] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    热切换知识库版本：加载新版本后原子替换，进行中的请求继续使用旧版本，
+    旧版本在这些请求结束后释放
+    """
+    _check_admin_token(x_admin_token)
+    if name not in kb_registry.names():
+        raise HTTPException(status_code=404, detail=f"未知的知识库: {name}")
+    version = request.version if request else None
+    try:
+        # 加载索引可能较慢，放到线程中执行，避免阻塞其他请求
+        return await asyncio.to_thread(kb_registry.swap, name, version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"知识库切换失败: {e}")
+
+
+class LiveDocument(BaseModel):
+    doc_id: str  # 文档 ID（写入元数据 source），再次提交同一 doc_id 会替换该文档之前的所有文档块
+    text: str
+    metadata: dict = {}
+
+
+class DocumentUpsertRequest(BaseModel):
+    documents: List[LiveDocument]
+    chunk_size: Optional[int] = None  # 默认使用该知识库构建时的切分参数
+    chunk_overlap: Optional[int] = None
+
+
+class DocumentDeleteRequest(BaseModel):
+    doc_ids: List[str] = []
+    chunk_ids: List[str] = []
+
+
+def _upsert_documents(name: str, request: DocumentUpsertRequest) -> dict:
+    """按 ingest 的切分规则切分、批量嵌入文档，写入更新日志并应用"""
+    default_size, default_overlap = KB_CHUNK_PARAMS.get(name, (500, 50))
+    documents = [
+        Document(page_content=doc.text, metadata={**doc.metadata, "source": doc.doc_id})
+        for doc in request.documents
+    ]
+    chunks = split_documents(
+        documents,
+        chunk_size=request.chunk_size or default_size,
+        chunk_overlap=request.chunk_overlap if request.chunk_overlap is not None else default_overlap
+    )
+    vectors = embeddings.embed_documents([chunk.page_content for chunk in chunks]) if chunks else []
+    record = make_upsert_record([doc.doc_id for doc in request.documents], chunks, vectors)
+    result = kb_registry.write_update(name, record)
+    return {**result, "chunks": len(chunks), "chunk_ids": [chunk.id for chunk in chunks]}
+
+
+@app.post("/admin/kb/{name}/documents")
+async def upsert_documents(
+    name: str,
+    request: DocumentUpsertRequest,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    在线新增 / 替换文档：切分、嵌入后写入知识库当前版本，
+    同一 doc_id 之前的文档块会被删除；整批更新原子生效，检索不会读到只应用了一半的更新
+    """
+    _check_admin_token(x_admin_token)
+    if name not in kb_registry.available_names():
+        raise HTTPException(status_code=404, detail=f"知识库未加载: {name}")
+    start = time.time()
+    try:
+        # 嵌入和写入放到线程中执行，不阻塞检索请求
+        result = await asyncio.to_thread(_upsert_documents, name, request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"文档写入失败: {e}")
+    metrics_collector.record_stage("kb_write", time.time() - start)
+    metrics_collector.increment("kb_write_batches")
+    metrics_collector.increment("kb_write_chunks", result["chunks"])
+    return result
+
+
+@app.post("/admin/kb/{name}/documents/delete")
+async def delete_documents(
+    name: str,
+    request: DocumentDeleteRequest,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """在线删除文档（按 doc_id）或文档块（按 chunk_id）"""
+    _check_admin_token(x_admin_token)
+    if name not in kb_registry.available_names():
+        raise HTTPException(status_code=404, detail=f"知识库未加载: {name}")
+    start = time.time()
+    try:
+        record = make_delete_record(request.doc_ids, request.chunk_ids)
+        result = await asyncio.to_thread(kb_registry.write_update, name, record)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"文档删除失败: {e}")
+    metrics_collector.record_stage("kb_write", time.time() - start)
+    metrics_collector.increment("kb_write_batches")
+    return result
+
+
 # 监控指标端点
 @app.get("/metrics")
 async def get_metrics():
     """
     获取系统监控指标
-    包括：GPU 使用率、延迟统计、吞吐量、CPU/内存使用情况
+    包括：GPU 使用率、延迟统计、吞吐量、CPU/内存使用情况、重排序 / 嵌入推理批次的填充比例和吞吐量
     """
-    return metrics_collector.get_all_metrics()
+    return {**metrics_collector.get_all_metrics(), "batching": _batching_metrics()}
+
+
+def _batching_metrics() -> dict:
+    """重排序和批量嵌入推理按长度区间汇总的填充比例和吞吐量"""
+    return {
+        "bucketed": BUCKETED_BATCHING_ENABLED,
+        "rerank": reranker.batch_stats.report() if reranker else {},
+        **({"rerank_first_stage": reranker.first.batch_stats.report()} if isinstance(reranker, CascadeReranker) else {}),
+        "embedding": embeddings.stats.report(),
+        **({"model_server": _model_server_batching()} if model_client is not None else {}),
+    }
+
+
+def _model_server_batching() -> dict:
+    """模型服务的动态批处理统计（每个合并批次包含的请求数）"""
+    try:
+        return model_client.stats()["dynamic_batching"]
+    except ModelServerError:
+        return {}
 
 
 # 监控指标端点（Prometheus 格式，可选）
@@ -449,6 +1244,24 @@ async def get_prometheus_metrics():
     throughput = metrics["throughput"]
     prometheus_lines.append(f'legalflash_rag_throughput_rps_1min {throughput["requests_per_second_1min"]}')
     
+    # 通用计数器、各阶段耗时与按请求统计的数值
+    for name, value in metrics["counters"].items():
+        prometheus_lines.append(f'legalflash_rag_{name}_total {value}')
+    for stage, stats in metrics["stages"].items():
+        prometheus_lines.append(f'legalflash_rag_stage_{stage}_avg_seconds {stats["avg"]}')
+        prometheus_lines.append(f'legalflash_rag_stage_{stage}_p95_seconds {stats["p95"]}')
+        prometheus_lines.append(f'legalflash_rag_stage_{stage}_p99_seconds {stats["p99"]}')
+    for name, stats in metrics["values"].items():
+        prometheus_lines.append(f'legalflash_rag_{name}_avg {stats["avg"]}')
+        prometheus_lines.append(f'legalflash_rag_{name}_p95 {stats["p95"]}')
+    
+    # 推理批次的填充比例和吞吐量（按长度区间）
+    batching = _batching_metrics()
+    for model in ("rerank", "rerank_first_stage", "embedding"):
+        for bucket, stats in batching.get(model, {}).items():
+            prometheus_lines.append(f'legalflash_rag_{model}_padding_ratio{{bucket="{bucket}"}} {stats["padding_ratio"]}')
+            prometheus_lines.append(f'legalflash_rag_{model}_tokens_per_second{{bucket="{bucket}"}} {stats["tokens_per_second"]}')
+    
     # GPU 指标
     for gpu in metrics["gpu"]:
         idx = gpu["index"]
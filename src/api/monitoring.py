@@ -2,7 +2,6 @@
 监控模块：GPU 使用率、延迟、吞吐量统计
 """
 import time
-import asyncio
 from typing import Dict, List, Optional
 from collections import deque
 from datetime import datetime
@@ -43,6 +42,15 @@ class MetricsCollector:
         # 总错误数
         self.total_errors = 0
         
+        # 通用计数器（如知识库切换次数），名称 → 累计值
+        self.counters: Dict[str, float] = {}
+        
+        # 各处理阶段的耗时历史记录（秒），阶段名称 → 最近 max_history 次
+        self.stage_history: Dict[str, deque] = {}
+        
+        # 按请求记录的数值历史（如提示词 token 数），名称 → 最近 max_history 次
+        self.value_history: Dict[str, deque] = {}
+        
         # 初始化 GPU 监控
         self.gpu_available = False
         if PYNVML_AVAILABLE:
@@ -71,9 +79,56 @@ class MetricsCollector:
         if not success:
             self.total_errors += 1
     
+    def increment(self, name: str, value: float = 1):
+        """
+        累加计数器
+        
+        Args:
+            name: 计数器名称（小写下划线，如 kb_swaps）
+            value: 增量
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    def record_stage(self, stage: str, seconds: float):
+        """
+        记录处理阶段耗时
+        
+        Args:
+            stage: 阶段名称（小写下划线，如 kb_swap_load）
+            seconds: 耗时（秒）
+        """
+        if stage not in self.stage_history:
+            self.stage_history[stage] = deque(maxlen=self.max_history)
+        self.stage_history[stage].append(seconds)
+    
+    def record_value(self, name: str, value: float):
+        """
+        记录按请求统计的数值（非耗时）
+        
+        Args:
+            name: 名称（小写下划线，如 prompt_tokens）
+            value: 数值
+        """
+        if name not in self.value_history:
+            self.value_history[name] = deque(maxlen=self.max_history)
+        self.value_history[name].append(value)
+    
+    def get_value_stats(self) -> Dict:
+        """获取按请求统计的数值分布"""
+        return {name: self._summarize(history) for name, history in self.value_history.items()}
+    
+    def get_stage_stats(self) -> Dict:
+        """获取各处理阶段的耗时统计"""
+        return {stage: self._summarize(history) for stage, history in self.stage_history.items()}
+    
     def get_latency_stats(self) -> Dict:
         """获取延迟统计"""
-        if not self.latency_history:
+        return self._summarize(self.latency_history)
+    
+    @staticmethod
+    def _summarize(values) -> Dict:
+        """计算平均值 / 最值 / 分位数"""
+        if not values:
             return {
                 "avg": 0.0,
                 "min": 0.0,
@@ -84,7 +139,7 @@ class MetricsCollector:
                 "count": 0
             }
         
-        sorted_latencies = sorted(self.latency_history)
+        sorted_latencies = sorted(values)
         n = len(sorted_latencies)
         
         return {
@@ -244,6 +299,9 @@ class MetricsCollector:
                 "requests_per_second_5min": round(self.get_throughput(300), 2),
                 "requests_per_second_15min": round(self.get_throughput(900), 2)
             },
+            "counters": dict(self.counters),
+            "stages": self.get_stage_stats(),
+            "values": self.get_value_stats(),
             "gpu": self.get_gpu_metrics(),
             "cpu": self.get_cpu_metrics(),
             "vllm": self.check_vllm_health()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+自适应流水线控制模块
+功能：按每个请求的具体情况决定跳过哪些昂贵的阶段
+  - 查询改写：问题本身已经是专业检索关键词（较短、由法律术语 / 法条引用组成、没有口语化疑问词）时跳过 LLM 改写
+  - 提前停止：按路由概率从高到低依次检索知识库，高置信命中（向量分数不低于阈值）已够 top_k 个时不再检索其余知识库
+  - 重排序：向量分数第 1 名与第 top_k 名的差距超过阈值（有一个压倒性的命中）时跳过重排序，
+    差距较大时只把排名靠前的少量候选送入 Cross-Encoder
+每个请求的决策和各阶段耗时记录在 AdaptiveDecisions 中，用于在标注集上对比节省的延迟和质量损失
+"""
+
+import re
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.core.retrieval import Candidate
+
+# 口语化表达（出现时需要 LLM 改写）
+COLLOQUIAL_PATTERN = re.compile(
+    r"[吗呢吧啊呀嘛？?！!]|怎么|咋|如何|为什么|为啥|能不能|可不可以|是不是|有没有|多少|什么|哪些|应该|需要|"
+    r"我|你|他|她|咱|老板|朋友|家里"
+)
+# 专业检索关键词的特征：法条引用、书名号、法律术语
+LEGAL_TERM_PATTERN = re.compile(
+    r"第[零〇一二两三四五六七八九十百千\d]+条|《[^》]+》|"
+    r"[一-龥]{1,8}(法|罪|权|责任|合同|义务|赔偿|补偿|纠纷|程序|认定|条例|规定|期限|效力|要件|保险|关系|继承|抚养|分割|诉讼|仲裁|处罚|时效)"
+)
+
+DEFAULT_MAX_KEYWORD_LENGTH = 24
+DEFAULT_SKIP_MARGIN = 0.2
+DEFAULT_SHRINK_MARGIN = 0.1
+DEFAULT_SHRINK_POOL = 8
+DEFAULT_HIGH_CONFIDENCE = 0.75
+
+
+class AdaptiveDecisions:
+    """一个请求的自适应决策和各阶段耗时"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.path = "full"              # full / fastpath（法条快速通道）
+        self.rewrite = "llm"            # llm / lexicon（本地词典）/ skipped / disabled / speculative（与原始问题检索并行）/ timeout（超过截止时间）
+        self.rewrite_reason = ""
+        self.kbs_searched: List[str] = []
+        self.kbs_skipped: List[str] = []  # 提前停止而未检索的知识库
+        self.rerank = "none"            # full / shrink / skip / none（候选不足或没有重排序器）
+        self.rerank_pool = 0
+        self.rerank_cascade = 0         # 级联重排序时送入第二级的候选数（0 表示单级）
+        self.margin: Optional[float] = None
+        self.variants: List[str] = []      # 检索使用的查询（原始问题 / 改写变体）
+        self.variant_hits: List[int] = []  # 各查询检索到的文档块进入最终 Top 5 的数量
+        self.variant_unique_hits: List[int] = []  # 其中只有该查询检索到的数量
+        self.context: Dict[str, int] = {}  # 上下文组装结果（提示词 token 数、合并 / 裁剪情况）
+        self.timings: Dict[str, float] = {}
+
+    def timed(self, stage: str, start: float) -> float:
+        """记录阶段耗时（秒），返回耗时"""
+        seconds = time.time() - start
+        self.timings[stage] = round(seconds, 4)
+        return seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "adaptive": self.enabled,
+            "path": self.path,
+            "rewrite": self.rewrite,
+            "rewrite_reason": self.rewrite_reason,
+            "kbs_searched": self.kbs_searched,
+            "kbs_skipped": self.kbs_skipped,
+            "rerank": self.rerank,
+            "rerank_pool": self.rerank_pool,
+            "rerank_cascade": self.rerank_cascade,
+            "margin": None if self.margin is None else round(self.margin, 4),
+            "variants": self.variants,
+            "variant_hits": self.variant_hits,
+            "variant_unique_hits": self.variant_unique_hits,
+            "context": self.context,
+            "timings": self.timings,
+        }
+
+    def describe(self) -> str:
+        parts = [f"改写={self.rewrite}", f"检索={'+'.join(self.kbs_searched) or '-'}"]
+        if self.kbs_skipped:
+            parts.append(f"提前停止(跳过 {'+'.join(self.kbs_skipped)})")
+        margin = f", 分差 {self.margin:.3f}" if self.margin is not None else ""
+        cascade = f"→{self.rerank_cascade}" if self.rerank_cascade else ""
+        parts.append(f"重排序={self.rerank}({self.rerank_pool}{cascade}{margin})")
+        if len(self.variants) > 1:
+            parts.append(f"变体贡献={self.variant_hits}")
+        return ", ".join(parts)
+
+
+class AdaptiveController:
+    """按请求决定是否改写、何时停止检索、重排序多少候选"""
+
+    def __init__(
+        self,
+        max_keyword_length: int = DEFAULT_MAX_KEYWORD_LENGTH,
+        skip_margin: float = DEFAULT_SKIP_MARGIN,
+        shrink_margin: float = DEFAULT_SHRINK_MARGIN,
+        shrink_pool: int = DEFAULT_SHRINK_POOL,
+        high_confidence: float = DEFAULT_HIGH_CONFIDENCE
+    ):
+        """
+        Args:
+            max_keyword_length: 视为关键词查询的最大字数
+            skip_margin: 第 1 名与第 top_k 名的向量分数差不低于该值时跳过重排序
+            shrink_margin: 分数差不低于该值时只重排序前 shrink_pool 个候选
+            shrink_pool: 缩小后的重排序候选数量
+            high_confidence: 高置信命中的向量分数阈值（提前停止）
+        """
+        self.max_keyword_length = max_keyword_length
+        self.skip_margin = skip_margin
+        self.shrink_margin = shrink_margin
+        self.shrink_pool = shrink_pool
+        self.high_confidence = high_confidence
+
+    def is_keyword_query(self, query: str) -> Tuple[bool, str]:
+        """
+        判断问题是否已经是专业检索关键词
+
+        Returns:
+            (是否跳过改写, 原因)
+        """
+        text = query.strip()
+        if len(text) > self.max_keyword_length:
+            return False, "too_long"
+        if COLLOQUIAL_PATTERN.search(text):
+            return False, "colloquial"
+        terms = [term for term in re.split(r"[\s,，、;；]+", text) if term]
+        legal_terms = [term for term in terms if LEGAL_TERM_PATTERN.search(term)]
+        # 大部分词都是法律术语（如"工伤赔偿 工伤认定"），或整个问题就是一个术语 / 法条引用
+        if legal_terms and len(legal_terms) * 2 >= len(terms):
+            return True, "keywords"
+        return False, "no_legal_terms"
+
+    def enough_hits(self, vector_candidates: Sequence[Candidate], top_k: int) -> bool:
+        """已检索的向量候选中高置信命中是否已够 top_k 个"""
+        return sum(candidate.score >= self.high_confidence for candidate in vector_candidates) >= top_k
+
+    def score_margin(self, vector_candidates: Sequence[Candidate], top_k: int) -> Optional[float]:
+        """向量分数第 1 名与第 top_k 名（候选不足时为最后一名）的差距"""
+        scores = sorted((candidate.score for candidate in vector_candidates), reverse=True)
+        if len(scores) < 2:
+            return None
+        return scores[0] - scores[min(top_k, len(scores)) - 1]
+
+    def rerank_plan(self, margin: Optional[float], pool_size: int) -> Tuple[str, int]:
+        """
+        决定重排序方式
+
+        Returns:
+            ("full" / "shrink" / "skip", 送入重排序的候选数量)
+        """
+        if margin is None:
+            return "full", pool_size
+        if margin >= self.skip_margin:
+            return "skip", 0
+        if margin >= self.shrink_margin and pool_size > self.shrink_pool:
+            return "shrink", self.shrink_pool
+        return "full", pool_size
+
+
+def interleave(candidates: Sequence[Candidate], n: int) -> List[Candidate]:
+    """
+    多个知识库依次拼接的候选按各自知识库内的排名交错排列后取前 n 个
+    （缩小重排序候选时避免只保留第一个知识库的结果）
+    """
+    ranks: Dict[str, int] = {}
+    ranked = []
+    for position, candidate in enumerate(candidates):
+        rank = ranks.get(candidate.kb, 0)
+        ranks[candidate.kb] = rank + 1
+        ranked.append((rank, position, candidate))
+    ranked.sort(key=lambda item: (item[0], item[1]))
+    return [candidate for _, _, candidate in ranked[:n]]
+
+
+def create_adaptive_controller(**kwargs) -> AdaptiveController:
+    """
+    创建自适应流水线控制器（工厂函数）
+
+    Args:
+        **kwargs: 见 AdaptiveController
+    """
+    return AdaptiveController(**kwargs)
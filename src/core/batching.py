@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+按长度分桶的批处理模块
+功能：Cross-Encoder 重排序和嵌入模型的推理按 token 长度分批，减少填充（padding）造成的浪费
+  - 输入按 token 长度降序排列，依次装入批次：批次大小不超过 max_batch_size、
+    填充比例（填充 token / 批次总 token）不超过 max_padding_ratio，否则开始新的批次
+  - 序列长度在分桶前按模型的最大输入长度截断（由调用方传入截断后的长度）
+  - 结果按原始顺序还原（调用方按 plan 返回的下标写回）
+每个批次的填充比例和吞吐量按填充后长度所在的区间（≤64 / ≤128 / ≤256 / ≤512 / >512）汇总，用于 /metrics 和评估脚本
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_PADDING_RATIO = 0.2
+# 汇总统计使用的填充后长度区间
+LENGTH_BUCKETS = (64, 128, 256, 512)
+
+
+def bucket_label(padded_length: int) -> str:
+    for limit in LENGTH_BUCKETS:
+        if padded_length <= limit:
+            return f"<={limit}"
+    return f">{LENGTH_BUCKETS[-1]}"
+
+
+class LengthBucketer:
+    """按 token 长度把输入分成填充浪费有上界的批次"""
+
+    def __init__(self, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_padding_ratio: float = DEFAULT_MAX_PADDING_RATIO, sort_by_length: bool = True):
+        """
+        Args:
+            max_batch_size: 每批最多的序列数
+            max_padding_ratio: 每批允许的最大填充比例（0-1）
+            sort_by_length: 是否按长度排序分桶（False 表示按输入顺序每 max_batch_size 个一批，即旧行为）
+        """
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_padding_ratio = max_padding_ratio
+        self.sort_by_length = sort_by_length
+
+    def plan(self, lengths: Sequence[int]) -> List[List[int]]:
+        """返回各批次包含的输入下标"""
+        if not self.sort_by_length:
+            return [list(range(start, min(start + self.max_batch_size, len(lengths))))
+                    for start in range(0, len(lengths), self.max_batch_size)]
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+        batches, batch, batch_tokens = [], [], 0
+        for i in order:
+            if batch:
+                # 降序排列，批次的填充后长度就是第一个序列的长度
+                padded = lengths[batch[0]] * (len(batch) + 1)
+                waste = 1 - (batch_tokens + lengths[i]) / max(padded, 1)
+                if len(batch) >= self.max_batch_size or waste > self.max_padding_ratio:
+                    batches.append(batch)
+                    batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += lengths[i]
+        if batch:
+            batches.append(batch)
+        return batches
+
+
+class BatchStats:
+    """按填充后长度区间汇总批次的填充比例和吞吐量（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, float]] = {}
+
+    def record(self, lengths: Sequence[int], seconds: float):
+        """记录一个批次：各序列的实际长度和推理耗时"""
+        if not lengths:
+            return
+        padded_length = max(lengths)
+        with self._lock:
+            bucket = self._buckets.setdefault(bucket_label(padded_length), {
+                "batches": 0, "sequences": 0, "tokens": 0, "padded_tokens": 0, "seconds": 0.0})
+            bucket["batches"] += 1
+            bucket["sequences"] += len(lengths)
+            bucket["tokens"] += sum(lengths)
+            bucket["padded_tokens"] += padded_length * len(lengths)
+            bucket["seconds"] += seconds
+
+    @contextmanager
+    def timed(self, lengths: Sequence[int]):
+        start = time.perf_counter()
+        yield
+        self.record(lengths, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._buckets = {}
+
+    def report(self) -> Dict[str, dict]:
+        """各区间的批次数、序列数、填充比例和吞吐量（序列 / 秒、有效 token / 秒），另有 all 为总计"""
+        with self._lock:
+            buckets = {label: dict(values) for label, values in self._buckets.items()}
+        if buckets:
+            buckets["all"] = {key: sum(values[key] for values in buckets.values())
+                              for key in ("batches", "sequences", "tokens", "padded_tokens", "seconds")}
+        report = {}
+        for label, values in buckets.items():
+            seconds = values["seconds"] or 1e-12
+            report[label] = {
+                "batches": values["batches"],
+                "sequences": values["sequences"],
+                "padding_ratio": round(1 - values["tokens"] / max(values["padded_tokens"], 1), 4),
+                "sequences_per_second": round(values["sequences"] / seconds, 1),
+                "tokens_per_second": round(values["tokens"] / seconds, 1),
+            }
+        return report
+
+
+class BucketedEmbeddings(Embeddings):
+    """
+    按长度分桶批量计算文档向量的嵌入模型包装（LangChain Embeddings 接口）
+
+    包装 HuggingFaceEmbeddings：用其 SentenceTransformer 的分词器计算长度（按模型的 max_seq_length 截断），
+    分桶后每个批次单独调用 encode；底层不是 SentenceTransformer 时直接转发
+    """
+
+    def __init__(self, base, bucketer: LengthBucketer = None):
+        """
+        Args:
+            base: 被包装的 Embeddings（通常是 HuggingFaceEmbeddings）
+            bucketer: 分桶器（默认参数见 LengthBucketer）
+        """
+        self.base = base
+        self.bucketer = bucketer or LengthBucketer()
+        self.stats = BatchStats()
+        client = getattr(base, "client", None)
+        self._client = client if hasattr(client, "tokenizer") and hasattr(client, "encode") else None
+
+    def __getattr__(self, name):
+        # 其余属性（如 model_name）转发给被包装的对象
+        if name == "base":
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    def token_lengths(self, texts: Sequence[str]) -> List[int]:
+        """按模型的最大输入长度截断后的 token 数（含特殊 token）"""
+        max_length = getattr(self._client, "max_seq_length", None) or 512
+        encoded = self._client.tokenizer(list(texts), truncation=True, max_length=max_length)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self._client is None or len(texts) <= 1:
+            return self.base.embed_documents(texts)
+        texts = [text.replace("\n", " ") for text in texts]  # 与 HuggingFaceEmbeddings 的预处理一致
+        lengths = self.token_lengths(texts)
+        encode_kwargs = dict(getattr(self.base, "encode_kwargs", {}) or {})
+        encode_kwargs.pop("batch_size", None)
+        encode_kwargs.pop("show_progress_bar", None)
+        vectors: List[List[float]] = [None] * len(texts)
+        for batch in self.bucketer.plan(lengths):
+            with self.stats.timed([lengths[i] for i in batch]):
+                encoded = self._client.encode([texts[i] for i in batch], batch_size=len(batch),
+                                              show_progress_bar=False, **encode_kwargs)
+            for i, vector in zip(batch, encoded):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
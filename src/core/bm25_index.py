@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+BM25 词法索引模块
+功能：为知识库文档块构建 BM25 倒排索引（ingest 时构建，服务时 mmap 打开），
+与向量检索结果按倒数排名融合（RRF），弥补 MiniLM 对中文法律术语区分度不足的问题，
+让更小、更准的候选集进入 Cross-Encoder 重排序
+
+分词：安装了 jieba 时使用 jieba 搜索引擎模式，否则中文按相邻两字（二元组）切分、英文数字按词切分；
+构建时使用的分词方式写入 bm25.json，服务时必须一致（不一致时不启用该索引）
+
+文件（与向量库同在版本目录下，均为顶层文件，快照可直接复制）：
+  bm25.json                                配置：文档块数量、平均长度、k1 / b、分词方式
+  bm25_terms.bin / .offsets.npy            按字典序排列的词表（字符串列，查词时在 mmap 上二分）
+  bm25_postings_offsets.npy                每个词的倒排表在下面两个数组中的区间（int64，长度 V+1）
+  bm25_postings_docs.npy                   倒排表：文档块行号（int32，每个词内递增）
+  bm25_postings_tf.npy                     倒排表：词频（uint16）
+  bm25_doc_lengths.npy                     各文档块的词数（int32）
+  bm25_chunk_ids.bin / .offsets.npy        行号 → 文档块 ID
+"""
+
+import bisect
+import copy
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.core.chunk_store import StringColumn, write_column
+from src.core.retrieval import Candidate
+
+try:
+    import jieba
+    jieba.setLogLevel(60)
+    JIEBA_AVAILABLE = True
+except ImportError:
+    JIEBA_AVAILABLE = False
+
+BM25_CONFIG_FILE = "bm25.json"
+TERMS_COLUMN = "bm25_terms"
+CHUNK_IDS_COLUMN = "bm25_chunk_ids"
+POSTINGS_OFFSETS_FILE = "bm25_postings_offsets.npy"
+POSTINGS_DOCS_FILE = "bm25_postings_docs.npy"
+POSTINGS_TF_FILE = "bm25_postings_tf.npy"
+DOC_LENGTHS_FILE = "bm25_doc_lengths.npy"
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"[一-龥]+|[A-Za-z]+|\d+")
+# 不参与检索的高频虚词
+STOPWORDS = {"的", "了", "和", "与", "及", "或", "是", "在", "对", "等", "之", "其", "该", "被", "由", "为",
+             "我", "你", "他", "吗", "呢", "吧", "啊"}
+
+
+def default_tokenizer() -> str:
+    return "jieba" if JIEBA_AVAILABLE else "bigram"
+
+
+def tokenize(text: str, tokenizer: str = "bigram") -> List[str]:
+    """
+    分词
+
+    Args:
+        text: 文本
+        tokenizer: "jieba"（jieba 搜索引擎模式）或 "bigram"（中文相邻两字切分）
+    """
+    if tokenizer == "jieba":
+        tokens = [token.strip().lower() for token in jieba.lcut_for_search(text)]
+        return [token for token in tokens if token and token not in STOPWORDS and _TOKEN_PATTERN.fullmatch(token)]
+    tokens = []
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece[0] >= "一":
+            if len(piece) == 1:
+                if piece not in STOPWORDS:
+                    tokens.append(piece)
+            else:
+                tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece.lower())
+    return tokens
+
+
+def is_bm25_index(directory) -> bool:
+    return (Path(directory) / BM25_CONFIG_FILE).exists()
+
+
+def build_bm25_index(directory, ids: Sequence[str], texts: Sequence[str], tokenizer: Optional[str] = None,
+                     k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> dict:
+    """
+    构建 BM25 索引并写入目录
+
+    Args:
+        directory: 知识库版本目录
+        ids: 文档块 ID
+        texts: 文档块文本
+        tokenizer: 分词方式（默认安装了 jieba 时使用 jieba）
+
+    Returns:
+        bm25.json 内容
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    tokenizer = tokenizer or default_tokenizer()
+    vocab: Dict[str, int] = {}
+    term_ids, doc_rows, tfs = [], [], []
+    lengths = np.zeros(len(texts), dtype=np.int32)
+    for row, text in enumerate(texts):
+        tokens = tokenize(text or "", tokenizer)
+        lengths[row] = len(tokens)
+        for term, tf in Counter(tokens).items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_rows.append(row)
+            tfs.append(min(tf, 65535))
+
+    # 词表按字典序重新编号，查词时在 mmap 词表上二分
+    terms = sorted(vocab)
+    remap = np.empty(len(vocab), dtype=np.int64)
+    for new_id, term in enumerate(terms):
+        remap[vocab[term]] = new_id
+    term_ids = remap[np.asarray(term_ids, dtype=np.int64)] if term_ids else np.zeros(0, dtype=np.int64)
+    # 稳定排序：同一个词内文档块行号保持递增
+    order = np.argsort(term_ids, kind="stable")
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=offsets[1:])
+
+    write_column(directory, TERMS_COLUMN, terms)
+    write_column(directory, CHUNK_IDS_COLUMN, list(ids))
+    np.save(directory / POSTINGS_OFFSETS_FILE, offsets)
+    np.save(directory / POSTINGS_DOCS_FILE, np.asarray(doc_rows, dtype=np.int32)[order])
+    np.save(directory / POSTINGS_TF_FILE, np.asarray(tfs, dtype=np.uint16)[order])
+    np.save(directory / DOC_LENGTHS_FILE, lengths)
+    config = {
+        "count": len(ids),
+        "terms": len(terms),
+        "postings": int(offsets[-1]),
+        "avgdl": float(lengths.mean()) if len(lengths) else 0.0,
+        "k1": k1,
+        "b": b,
+        "tokenizer": tokenizer,
+    }
+    with open(directory / BM25_CONFIG_FILE, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    return config
+
+
+class BM25Index:
+    """mmap 打开的只读 BM25 索引，另可叠加在线更新新增的文档块（内存中，使用基础索引的统计量）"""
+
+    def __init__(self, directory, use_mmap: bool = True):
+        directory = Path(directory)
+        with open(directory / BM25_CONFIG_FILE, "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        mode = "r" if use_mmap else None
+        self.tokenizer = self.config["tokenizer"]
+        self.k1 = self.config["k1"]
+        self.b = self.config["b"]
+        self.count = self.config["count"]
+        self.avgdl = self.config["avgdl"] or 1.0
+        self._terms = StringColumn(directory, TERMS_COLUMN, use_mmap)
+        self._chunk_ids = StringColumn(directory, CHUNK_IDS_COLUMN, use_mmap)
+        self._offsets = np.load(directory / POSTINGS_OFFSETS_FILE, mmap_mode=mode)
+        self._docs = np.load(directory / POSTINGS_DOCS_FILE, mmap_mode=mode)
+        self._tfs = np.load(directory / POSTINGS_TF_FILE, mmap_mode=mode)
+        self._lengths = np.load(directory / DOC_LENGTHS_FILE, mmap_mode=mode)
+        self._delta: Dict[str, Tuple[Counter, int]] = {}  # 在线更新新增的文档块 → (词频, 词数)
+
+    @classmethod
+    def load(cls, directory, use_mmap: bool = True) -> Optional["BM25Index"]:
+        """加载版本目录下的 BM25 索引（不存在或分词方式不可用时返回 None）"""
+        if not is_bm25_index(directory):
+            return None
+        index = cls(directory, use_mmap=use_mmap)
+        if index.tokenizer == "jieba" and not JIEBA_AVAILABLE:
+            print(f"⚠️  BM25 索引使用 jieba 分词构建，但 jieba 未安装，跳过词法检索: {directory}")
+            return None
+        return index
+
+    def __len__(self) -> int:
+        return self.count + len(self._delta)
+
+    def stats(self) -> dict:
+        return {"bm25_terms": self.config["terms"], "bm25_tokenizer": self.tokenizer, "bm25_delta": len(self._delta)}
+
+    def apply(self, records: Iterable[dict]) -> "BM25Index":
+        """
+        应用在线更新记录（见 live_updates）：返回叠加了新增文档块的新索引（共享 mmap 数组）
+
+        删除 / 被替换的文档块不从索引移除，读取时由叠加层的墓碑过滤
+        """
+        chunks = [chunk for record in records if record.get("op") == "upsert" for chunk in record["chunks"]]
+        if not chunks:
+            return self
+        index = copy.copy(self)
+        index._delta = dict(self._delta)
+        for chunk in chunks:
+            tokens = tokenize(chunk["text"] or "", self.tokenizer)
+            index._delta[chunk["id"]] = (Counter(tokens), len(tokens))
+        return index
+
+    def _term_id(self, term: str) -> Optional[int]:
+        position = bisect.bisect_left(self._terms, term)
+        if position < len(self._terms) and self._terms[position] == term:
+            return position
+        return None
+
+    def _idf(self, df: int) -> float:
+        n = len(self)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        BM25 检索
+
+        Returns:
+            [(文档块 ID, 分数)]，按分数降序，只包含至少命中一个词的文档块
+        """
+        terms = list(dict.fromkeys(tokenize(query, self.tokenizer)))
+        if not terms or k <= 0:
+            return []
+        scores = None
+        delta_scores: Dict[str, float] = {}
+        for term in terms:
+            term_id = self._term_id(term)
+            start, end = (int(self._offsets[term_id]), int(self._offsets[term_id + 1])) if term_id is not None else (0, 0)
+            delta_tf = {chunk_id: counts[term] for chunk_id, (counts, _) in self._delta.items() if term in counts}
+            df = end - start + len(delta_tf)
+            if df == 0:
+                continue
+            idf = self._idf(df)
+            if end > start:
+                docs = np.asarray(self._docs[start:end])
+                tf = np.asarray(self._tfs[start:end], dtype=np.float32)
+                norm = self.k1 * (1 - self.b + self.b * np.asarray(self._lengths[docs], dtype=np.float32) / self.avgdl)
+                if scores is None:
+                    scores = np.zeros(self.count, dtype=np.float32)
+                # 同一个词的倒排表内文档块不重复，可以直接按下标累加
+                scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+            for chunk_id, tf in delta_tf.items():
+                norm = self.k1 * (1 - self.b + self.b * self._delta[chunk_id][1] / self.avgdl)
+                delta_scores[chunk_id] = delta_scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        results: List[Tuple[str, float]] = []
+        if scores is not None:
+            top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+            results = [(self._chunk_ids[int(row)], float(scores[row])) for row in top if scores[row] > 0]
+        if delta_scores:
+            merged = dict(results)
+            for chunk_id, score in delta_scores.items():
+                merged[chunk_id] = max(score, merged.get(chunk_id, 0.0))
+            results = list(merged.items())
+        results.sort(key=lambda item: -item[1])
+        return results[:k]
+
+    def search_candidates(self, kb: str, query: str, k: int) -> List[Candidate]:
+        """BM25 检索，返回检索候选（与向量检索的候选格式一致）"""
+        return [Candidate(kb, chunk_id, score) for chunk_id, score in self.search(query, k)]
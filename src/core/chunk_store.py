@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+文档块存储模块
+功能：以只读列式格式保存文档块的 ID、文本和元数据，服务时通过 mmap 打开
+每一列由两个文件组成：
+  - <列名>.bin          所有值的 UTF-8 编码首尾相接
+  - <列名>.offsets.npy  int64 偏移数组（长度为 N+1），第 i 个值位于 [offsets[i], offsets[i+1])
+同一主机上的多个 API worker 打开同一组文件时共享同一份页缓存，不会各自复制一份
+
+另有 chunk_ids.order.npy 保存按 ID 排序后的位置，按 ID 查找时在 mmap 上二分，
+无需在每个 worker 中构建 ID → 位置的字典
+"""
+
+import bisect
+import json
+import mmap
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+# 列名
+ID_COLUMN = "chunk_ids"
+TEXT_COLUMN = "chunk_texts"
+METADATA_COLUMN = "chunk_metadata"
+COLUMNS = (ID_COLUMN, TEXT_COLUMN, METADATA_COLUMN)
+ID_ORDER_FILE = "chunk_ids.order.npy"
+
+
+def _column_paths(directory: Path, name: str):
+    return directory / f"{name}.bin", directory / f"{name}.offsets.npy"
+
+
+def write_column(directory: Path, name: str, values: Sequence[str]):
+    """将字符串列表写为一列（值 + 偏移）"""
+    data_path, offsets_path = _column_paths(directory, name)
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    with open(data_path, "wb") as f:
+        for item in encoded:
+            f.write(item)
+    np.save(offsets_path, offsets)
+
+
+class StringColumn(Sequence):
+    """内存映射的只读字符串列，按下标取值时才解码"""
+
+    def __init__(self, directory: Path, name: str, use_mmap: bool = True):
+        data_path, offsets_path = _column_paths(directory, name)
+        self.files = [data_path, offsets_path]
+        self._offsets = np.load(offsets_path, mmap_mode="r" if use_mmap else None)
+        if data_path.stat().st_size == 0:
+            self._data = b""
+        elif use_mmap:
+            with open(data_path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = data_path.read_bytes()
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return self._data[start:end].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class JsonColumn(StringColumn):
+    """内存映射的只读 JSON 列（用于元数据）"""
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return json.loads(super().__getitem__(index))
+
+
+class _SortedIds(Sequence):
+    """按 ID 排序后的只读视图（供 bisect 二分查找）"""
+
+    def __init__(self, ids: StringColumn, order: np.ndarray):
+        self._ids = ids
+        self._order = order
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __getitem__(self, index):
+        return self._ids[int(self._order[index])]
+
+
+class MmapChunkStore:
+    """只读文档块存储：位置（即向量索引内部 ID）→ ID / 文本 / 元数据"""
+
+    def __init__(self, directory, use_mmap: bool = True):
+        """
+        Args:
+            directory: 存储目录
+            use_mmap: 是否以 mmap 方式打开（False 时整体读入内存）
+        """
+        self.directory = Path(directory)
+        self.ids = StringColumn(self.directory, ID_COLUMN, use_mmap)
+        self.texts = StringColumn(self.directory, TEXT_COLUMN, use_mmap)
+        self.metadatas = JsonColumn(self.directory, METADATA_COLUMN, use_mmap)
+        self._order: Optional[np.ndarray] = None
+        self._positions: Optional[Dict[str, int]] = None
+        order_path = self.directory / ID_ORDER_FILE
+        if order_path.exists():
+            self._order = np.load(order_path, mmap_mode="r" if use_mmap else None)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def files(self) -> List[Path]:
+        files = self.ids.files + self.texts.files + self.metadatas.files
+        if self._order is not None:
+            files.append(self.directory / ID_ORDER_FILE)
+        return files
+
+    def position(self, chunk_id: str) -> Optional[int]:
+        """根据文档块 ID 查找位置（向量索引内部 ID），不存在时返回 None"""
+        if self._order is not None:
+            sorted_ids = _SortedIds(self.ids, self._order)
+            i = bisect.bisect_left(sorted_ids, chunk_id)
+            if i < len(sorted_ids) and sorted_ids[i] == chunk_id:
+                return int(self._order[i])
+            return None
+        # 旧版目录没有排序文件，退化为首次调用时构建字典
+        if self._positions is None:
+            self._positions = {value: i for i, value in enumerate(self.ids)}
+        return self._positions.get(chunk_id)
+
+    @staticmethod
+    def exists(directory) -> bool:
+        return all(path.exists() for name in COLUMNS for path in _column_paths(Path(directory), name))
+
+    @staticmethod
+    def write(directory, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[dict]):
+        """将文档块写入列式存储"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        write_column(directory, ID_COLUMN, ids)
+        write_column(directory, TEXT_COLUMN, texts)
+        write_column(directory, METADATA_COLUMN, [json.dumps(m or {}, ensure_ascii=False) for m in metadatas])
+        order = np.argsort(np.array(list(ids), dtype=str), kind="stable") if len(ids) else np.zeros(0, dtype=np.int64)
+        np.save(directory / ID_ORDER_FILE, order.astype(np.int64))
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+上下文组装模块
+功能：把最终文档块组装成提示词中的【上下文】，并控制其 token 数
+  - token 计数使用服务模型（vLLM 加载的模型）的分词器；transformers 不可用或分词器加载失败时按字数估算
+  - 同一来源中相邻 / 重叠的文档块（ingest 切分时有 chunk_overlap 个字的重叠）合并为一段，重叠部分只保留一次
+  - 设置了压缩器（context_compressor）时，较长文档只保留与问题最相关的句子（保持原文顺序，中间去掉的位置用省略号标出）
+  - 超出 token 预算时从排名最后的文档开始处理：裁剪句子（压缩过的文档去掉分数最低的句子，否则从末尾裁剪）
+    到保留一半句子以内即可满足预算时只裁剪，否则丢弃整个文档，再处理排名上一位的文档；
+    只剩一个文档仍超出时才继续裁剪到一句
+合并后的文档标签保留原编号（如 "[文档 2、4]"），与响应中 sources 的 index 对应
+文档可以按排名以外的顺序传入（如按文档块 ID 排列以复用 vLLM 的前缀缓存），此时通过 ranks 指定排名，
+合并和裁剪仍按排名进行，输出保持传入顺序
+"""
+
+import math
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+try:
+    from transformers import AutoTokenizer
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    TRANSFORMERS_AVAILABLE = False
+
+# 句子切分（保留句末标点）
+SENTENCE_PATTERN = re.compile(r"[^。！？；!?;\n]*[。！？；!?;\n]+|[^。！？；!?;\n]+$")
+_CJK_PATTERN = re.compile(r"[一-龥]")
+_CONTENT_PATTERN = re.compile(r"[0-9A-Za-z一-龥]")
+# 相邻文档块之间允许的最大间隔（切分时去掉的空白）
+MAX_ADJACENT_GAP = 2
+# 压缩 / 裁剪后文档中间被去掉句子的位置
+OMISSION = "……"
+
+DEFAULT_TOKEN_BUDGET = 2048
+# 超出预算时保留的文档至少保留的句子比例，裁剪到该下限仍超出则丢弃整个文档
+TRIM_FLOOR_RATIO = 0.5
+
+
+class TokenCounter:
+    """使用服务模型分词器的 token 计数器（不可用时按字数估算）"""
+
+    def __init__(self, tokenizer_path: Optional[str] = None):
+        """
+        Args:
+            tokenizer_path: 分词器路径（通常与 vLLM 加载的模型目录相同），None 表示按字数估算
+        """
+        self.tokenizer = None
+        self.name = "estimate"
+        if tokenizer_path and TRANSFORMERS_AVAILABLE:
+            try:
+                self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_path, trust_remote_code=True)
+                self.name = tokenizer_path
+            except Exception as e:
+                print(f"⚠️  分词器加载失败: {e}，token 数按字数估算")
+        elif tokenizer_path:
+            print("⚠️  transformers 未安装，token 数按字数估算")
+
+    def count(self, text: str) -> int:
+        return self.count_batch([text])[0]
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        """批量计数（分词器一次处理所有文本）"""
+        if not texts:
+            return []
+        if self.tokenizer is not None:
+            return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+        return [estimate_tokens(text) for text in texts]
+
+
+def estimate_tokens(text: str) -> int:
+    """估算 token 数：汉字约 1 个 token，其他字符约 3 个 1 个 token"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 2) // 3
+
+
+def split_sentences(text: str) -> List[str]:
+    """切分句子（拼接后与原文一致）；只有标点 / 空白的片段（如文档块开头的句号）并入下一句"""
+    sentences, pending = [], ""
+    for piece in SENTENCE_PATTERN.findall(text):
+        if _CONTENT_PATTERN.search(piece):
+            sentences.append(pending + piece)
+            pending = ""
+        else:
+            pending += piece
+    if pending:
+        if sentences:
+            sentences[-1] += pending
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+class ContextResult(NamedTuple):
+    """上下文组装结果"""
+    context: str            # 提示词中的上下文
+    tokens: int             # 上下文 token 数
+    original_tokens: int    # 原样拼接全部文档时的 token 数
+    merged: int             # 被合并进其他文档的文档块数量
+    trimmed_sentences: int  # 裁剪的句子数量
+    dropped: int            # 整个丢弃的文档数量
+    compressed_sentences: int = 0  # 抽取式压缩去掉的句子数量
+
+    def to_dict(self) -> dict:
+        return {
+            "context_tokens": self.tokens,
+            "original_context_tokens": self.original_tokens,
+            "merged_chunks": self.merged,
+            "trimmed_sentences": self.trimmed_sentences,
+            "dropped_docs": self.dropped,
+            "compressed_sentences": self.compressed_sentences,
+        }
+
+
+class ContextBuilder:
+    """按 token 预算组装上下文"""
+
+    def __init__(self, counter: TokenCounter, token_budget: int = DEFAULT_TOKEN_BUDGET, merge_chunks: bool = True,
+                 compressor=None):
+        """
+        Args:
+            counter: token 计数器
+            token_budget: 上下文 token 预算（0 表示不限制）
+            merge_chunks: 是否合并同一来源中相邻 / 重叠的文档块
+            compressor: 抽取式压缩器（ContextCompressor，None 表示不压缩）
+        """
+        self.counter = counter
+        self.token_budget = token_budget
+        self.merge_chunks = merge_chunks
+        self.compressor = compressor
+
+    def _sections(self, docs: Sequence[str], metadatas: Sequence[dict], kbs: Sequence[str],
+                  ranks: Sequence[int]) -> List[dict]:
+        """按传入顺序生成段落，同一来源中相邻 / 重叠的文档块合并为一段"""
+        sections = [{"numbers": [i + 1], "text": doc, "rank": ranks[i], "kb": kbs[i]} for i, doc in enumerate(docs)]
+        if not self.merge_chunks:
+            return sections
+        groups: Dict[tuple, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            metadata = metadata or {}
+            if metadata.get("source") and isinstance(metadata.get("start_index"), int) and docs[i]:
+                groups.setdefault((kbs[i], metadata["source"]), []).append(i)
+        merged_into: Dict[int, int] = {}
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=lambda i: metadatas[i]["start_index"])
+            head = members[0]
+            start, text = metadatas[head]["start_index"], docs[head]
+            chain = [head]
+            for i in members[1:] + [None]:
+                if i is not None:
+                    offset = metadatas[i]["start_index"] - start
+                    overlap = len(text) - offset
+                    shared = min(overlap, len(docs[i]))
+                    # 重叠部分内容一致（或间隔很小的相邻块）才合并
+                    if overlap >= 0 and docs[i][:shared] == text[offset:offset + shared]:
+                        text += docs[i][shared:]
+                        chain.append(i)
+                        continue
+                    if -MAX_ADJACENT_GAP <= overlap < 0:
+                        text += docs[i]
+                        chain.append(i)
+                        continue
+                if len(chain) > 1:
+                    # 合并后的段落放在链中最靠前的位置，排名取链中最高的排名
+                    target = min(chain)
+                    sections[target]["text"] = text
+                    sections[target]["rank"] = min(ranks[chain_i] for chain_i in chain)
+                    sections[target]["numbers"] = sorted(chain_i + 1 for chain_i in chain)
+                    for chain_i in chain:
+                        if chain_i != target:
+                            merged_into[chain_i] = target
+                if i is not None:
+                    start, text, chain = metadatas[i]["start_index"], docs[i], [i]
+        return [section for i, section in enumerate(sections) if i not in merged_into]
+
+    @staticmethod
+    def _label(section: dict) -> str:
+        return f"[文档 {'、'.join(str(n) for n in section['numbers'])}]"
+
+    @staticmethod
+    def _render(section: dict) -> str:
+        """保留的句子按原文顺序拼接，中间被去掉句子的位置用省略号标出（末尾裁剪不标出）"""
+        keep = section["keep"]
+        if len(keep) == len(section["sentences"]):
+            return section["text"]
+        parts = []
+        for position, i in enumerate(keep):
+            if position > 0 and i != keep[position - 1] + 1:
+                parts.append(OMISSION)
+            parts.append(section["sentences"][i])
+        return "".join(parts)
+
+    @staticmethod
+    def _trim_order(section: dict) -> List[int]:
+        """句子的裁剪顺序：有句子分数时先去掉分数最低的句子，否则从末尾开始"""
+        if "scores" in section:
+            return sorted(section["keep"], key=lambda i: section["scores"][i])
+        return list(reversed(section["keep"]))
+
+    def build(self, docs: Sequence[str], metadatas: Optional[Sequence[dict]] = None,
+              kbs: Optional[Sequence[str]] = None, ranks: Optional[Sequence[int]] = None,
+              query: Optional[str] = None) -> ContextResult:
+        """
+        组装上下文
+
+        Args:
+            docs: 最终文档文本（按输出顺序）
+            metadatas: 各文档的元数据（含 source / start_index 时可合并相邻文档块）
+            kbs: 各文档所在的知识库（不同知识库的文档块不合并）
+            ranks: 各文档的排名（0 为最相关），None 表示按传入顺序排名
+            query: 用户问题（设置了压缩器时用于句子打分，None 表示不压缩）
+        """
+        metadatas = metadatas or [{}] * len(docs)
+        kbs = kbs or [""] * len(docs)
+        ranks = list(ranks) if ranks is not None else list(range(len(docs)))
+        sections = self._sections(docs, metadatas, kbs, ranks)
+        merged = len(docs) - len(sections)
+
+        # 每个句子只计数一次（批量），段落的 token 数按句子之和计算
+        for section in sections:
+            section["sentences"] = split_sentences(section["text"])
+        flat = [sentence for section in sections for sentence in section["sentences"]]
+        labels = [self._label(section) + "\n" for section in sections]
+        counts = self.counter.count_batch(flat + labels)
+        position = 0
+        for section in sections:
+            section["tokens"] = counts[position:position + len(section["sentences"])]
+            position += len(section["sentences"])
+        for section, label_tokens in zip(sections, counts[position:]):
+            section["label_tokens"] = label_tokens
+        total = sum(sum(section["tokens"]) + section["label_tokens"] for section in sections)
+
+        # 抽取式压缩：较长文档的句子一次批量打分，按比例保留分数最高的句子
+        compressed = 0
+        for section in sections:
+            section["keep"] = list(range(len(section["sentences"])))
+        if self.compressor is not None and query:
+            eligible = [section for section in sections
+                        if self.compressor.eligible(section["kb"], section["sentences"])]
+            if eligible:
+                scores = self.compressor.score(query, [section["sentences"] for section in eligible])
+                for section, section_scores in zip(eligible, scores):
+                    section["scores"] = section_scores
+                    section["keep"] = self.compressor.select(section["tokens"], section_scores)
+                    total -= sum(section["tokens"]) - sum(section["tokens"][i] for i in section["keep"])
+                    compressed += len(section["sentences"]) - len(section["keep"])
+
+        trimmed = dropped = 0
+        if self.token_budget > 0 and total > self.token_budget:
+            by_rank = sorted(sections, key=lambda section: section["rank"])
+            # 从排名最后的文档开始：裁剪到下限以内就能满足预算时只裁剪句子，否则整个丢弃，
+            # 不会为了保住排名靠后的文档而把排名靠前的文档裁得只剩一句
+            while total > self.token_budget and len(by_rank) > 1:
+                section = by_rank[-1]
+                floor = max(1, math.ceil(len(section["keep"]) * TRIM_FLOOR_RATIO))
+                removable = self._trim_order(section)[:len(section["keep"]) - floor]
+                excess, cut = total - self.token_budget, []
+                for index in removable:
+                    if excess <= 0:
+                        break
+                    excess -= section["tokens"][index]
+                    cut.append(index)
+                if excess <= 0:
+                    for index in cut:
+                        section["keep"].remove(index)
+                    total -= sum(section["tokens"][index] for index in cut)
+                    trimmed += len(cut)
+                    break
+                by_rank.pop()
+                total -= sum(section["tokens"][i] for i in section["keep"]) + section["label_tokens"]
+                dropped += len(section["numbers"])
+                section["dropped"] = True
+            # 只剩一个文档仍超出时，继续裁剪到至少保留一句
+            if total > self.token_budget:
+                section = by_rank[0]
+                for index in self._trim_order(section)[:len(section["keep"]) - 1]:
+                    if total <= self.token_budget:
+                        break
+                    section["keep"].remove(index)
+                    total -= section["tokens"][index]
+                    trimmed += 1
+            sections = [section for section in sections if not section.get("dropped")]
+
+        context = "\n\n".join(f"{self._label(section)}\n{self._render(section)}" for section in sections)
+        # 按句子累加的 token 数只用于预算判断；报告的 token 数按完整文本重新计数
+        original = "\n\n".join(f"[文档 {i + 1}]\n{doc}" for i, doc in enumerate(docs))
+        tokens, original_tokens = self.counter.count_batch([context, original])
+        return ContextResult(context, tokens, original_tokens, merged, trimmed, dropped, compressed)
+
+
+def create_context_builder(tokenizer_path: Optional[str] = None, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                           merge_chunks: bool = True, compressor=None) -> ContextBuilder:
+    """
+    创建上下文组装器（工厂函数）
+
+    Args:
+        tokenizer_path: 服务模型的分词器路径（None 或加载失败时按字数估算 token 数）
+        token_budget: 上下文 token 预算（0 表示不限制）
+        merge_chunks: 是否合并同一来源中相邻 / 重叠的文档块
+        compressor: 抽取式压缩器（None 表示不压缩）
+    """
+    return ContextBuilder(TokenCounter(tokenizer_path), token_budget=token_budget, merge_chunks=merge_chunks,
+                          compressor=compressor)
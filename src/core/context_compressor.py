@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+上下文抽取式压缩模块
+功能：在重排序之后、生成之前，对较长的文档（默认只处理案例 / 裁判文书，法条保持原文）按句子打分，
+只保留与问题最相关的句子
+  - 打分：所有待压缩文档的句子一次批量打分，可复用重排序的 Cross-Encoder（cross_encoder）或嵌入模型（embedding，
+    句子向量与问题向量的余弦相似度）
+  - 选择：每个文档按分数从高到低保留句子，直到保留的 token 数达到原文的 ratio（至少保留一句），输出时保持原文顺序
+由 ContextBuilder 调用（句子切分、文档标签和 token 预算与上下文组装共用）；超出 token 预算时优先裁剪分数最低的句子
+"""
+
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+COMPRESSION_SCORERS = ("cross_encoder", "embedding")
+DEFAULT_COMPRESSION_RATIO = 0.5
+DEFAULT_MIN_SENTENCES = 4
+DEFAULT_COMPRESSION_KBS = ("case", "judgement")
+
+
+class CrossEncoderScorer:
+    """使用重排序的 Cross-Encoder 为句子打分"""
+
+    name = "cross_encoder"
+
+    def __init__(self, reranker):
+        """
+        Args:
+            reranker: Reranker 实例（与重排序共用同一个模型）
+        """
+        self.reranker = reranker
+
+    def score(self, query: str, sentences: Sequence[str]) -> List[float]:
+        return self.reranker.score(query, list(sentences))
+
+
+class EmbeddingScorer:
+    """使用嵌入模型为句子打分（与问题向量的余弦相似度）"""
+
+    name = "embedding"
+
+    def __init__(self, embeddings):
+        """
+        Args:
+            embeddings: LangChain Embeddings 实例（与检索共用同一个模型）
+        """
+        self.embeddings = embeddings
+
+    def score(self, query: str, sentences: Sequence[str]) -> List[float]:
+        vectors = np.asarray(self.embeddings.embed_documents(list(sentences)), dtype=np.float32)
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector)
+        return (vectors @ query_vector / np.maximum(norms, 1e-12)).tolist()
+
+
+class ContextCompressor:
+    """抽取式上下文压缩：为较长文档的句子打分并按比例保留"""
+
+    def __init__(self, scorer, ratio: float = DEFAULT_COMPRESSION_RATIO, min_sentences: int = DEFAULT_MIN_SENTENCES,
+                 kbs: Optional[Sequence[str]] = DEFAULT_COMPRESSION_KBS):
+        """
+        Args:
+            scorer: 句子打分器（CrossEncoderScorer / EmbeddingScorer）
+            ratio: 每个文档保留的 token 比例（0-1）
+            min_sentences: 句子数不少于该值的文档才压缩
+            kbs: 只压缩这些知识库的文档（None 表示全部）
+        """
+        self.scorer = scorer
+        self.ratio = ratio
+        self.min_sentences = min_sentences
+        self.kbs = set(kbs) if kbs is not None else None
+
+    def eligible(self, kb: str, sentences: Sequence[str]) -> bool:
+        """该文档是否需要压缩"""
+        return len(sentences) >= self.min_sentences and (self.kbs is None or kb in self.kbs)
+
+    def score(self, query: str, sentence_lists: Sequence[Sequence[str]]) -> List[List[float]]:
+        """所有文档的句子一次批量打分，按文档拆分返回"""
+        flat = [sentence.strip() for sentences in sentence_lists for sentence in sentences]
+        scores = self.scorer.score(query, flat) if flat else []
+        result, position = [], 0
+        for sentences in sentence_lists:
+            result.append(list(scores[position:position + len(sentences)]))
+            position += len(sentences)
+        return result
+
+    def select(self, tokens: Sequence[int], scores: Sequence[float]) -> List[int]:
+        """按分数从高到低保留句子，直到达到 ratio 比例的 token 数，返回保留句子的下标（原文顺序）"""
+        target = math.ceil(sum(tokens) * self.ratio)
+        keep, kept_tokens = [], 0
+        for i in sorted(range(len(scores)), key=lambda i: scores[i], reverse=True):
+            if keep and kept_tokens >= target:
+                break
+            keep.append(i)
+            kept_tokens += tokens[i]
+        return sorted(keep)
+
+
+def create_context_compressor(scorer: str = "cross_encoder", reranker=None, embeddings=None,
+                              ratio: float = DEFAULT_COMPRESSION_RATIO, min_sentences: int = DEFAULT_MIN_SENTENCES,
+                              kbs: Optional[Sequence[str]] = DEFAULT_COMPRESSION_KBS) -> ContextCompressor:
+    """
+    创建上下文压缩器（工厂函数）
+
+    Args:
+        scorer: 打分方式 cross_encoder（需要 reranker）/ embedding（需要 embeddings）
+        reranker: Reranker 实例
+        embeddings: Embeddings 实例
+        ratio: 每个文档保留的 token 比例
+        min_sentences: 句子数不少于该值的文档才压缩
+        kbs: 只压缩这些知识库的文档（None 表示全部）
+    """
+    if scorer not in COMPRESSION_SCORERS:
+        raise ValueError(f"未知的句子打分方式: {scorer}（可选: {', '.join(COMPRESSION_SCORERS)}）")
+    if scorer == "cross_encoder":
+        if reranker is None:
+            raise ValueError("cross_encoder 打分需要已加载的 Reranker")
+        sentence_scorer = CrossEncoderScorer(reranker)
+    else:
+        if embeddings is None:
+            raise ValueError("embedding 打分需要嵌入模型")
+        sentence_scorer = EmbeddingScorer(embeddings)
+    return ContextCompressor(sentence_scorer, ratio=ratio, min_sentences=min_sentences, kbs=kbs)
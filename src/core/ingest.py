@@ -1,21 +1,82 @@
+import hashlib
 import os
+import sys
 from pathlib import Path
 # 设置 HuggingFace 镜像环境变量（解决网络连接问题）
 os.environ["HF_ENDPOINT"] = "https://hf-mirror.com"
 from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 
 # 获取项目根目录
 project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.vector_store import build_vector_store, VECTOR_STORE_BACKENDS
+from src.core.thread_budget import apply_thread_budget_from_env
+from src.core.batching import BucketedEmbeddings
+from src.core.bm25_index import build_bm25_index
+from src.core.rerank_tokens import DEFAULT_RERANK_MODEL, build_rerank_tokens
+from src.core.kb_registry import activate_version, new_version_name, version_path
+from src.core.statute_index import write_statute_index
+from src.core.vector_index import (
+    COMPRESSION_TYPES,
+    INDEX_TYPES,
+    EXACT_SEARCH_THRESHOLD,
+    DEFAULT_HNSW_M,
+    DEFAULT_EF_CONSTRUCTION,
+    DEFAULT_EF_SEARCH,
+    DEFAULT_NPROBE,
+    DEFAULT_RESCORE_FACTOR,
+)
 
 # 定义向量库路径（支持多个知识库）
 DEFAULT_PERSIST_DIR = str(project_root / "chroma_db")
 # 定义用于嵌入的开源模型（需本地安装 sentence-transformers）
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2" # 这是一个常用的快速模型
 
-def run_ingestion(docs_path=None, chunk_size=500, chunk_overlap=50, persist_dir=None, knowledge_type="law"):
+def split_documents(documents, chunk_size=500, chunk_overlap=50):
+    """
+    按 ingest 的切分规则将文档切分为文档块
+
+    Args:
+        documents: LangChain Document 列表
+        chunk_size: 文档块大小
+        chunk_overlap: 块之间重叠大小
+
+    Returns:
+        切分后的 Document 列表（带确定性的文档块 ID，元数据含 chunk_id 与 start_index）
+    """
+    # 对于法律条文，适当增大 chunk_size 以保持完整性
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,        # 每个块最大字符数
+        chunk_overlap=chunk_overlap,  # 块之间重叠字符数，保持上下文
+        separators=["\n\n", "\n", "。", "；", "，", " ", ""],  # 优先按段落分割
+        add_start_index=True          # 记录文档块在原文中的起始位置
+    )
+    chunks = text_splitter.split_documents(documents)
+    for chunk in chunks:
+        chunk.id = make_chunk_id(chunk)
+        chunk.metadata["chunk_id"] = chunk.id
+    return chunks
+
+
+def make_chunk_id(chunk):
+    """
+    生成文档块 ID：由来源、起始位置和内容决定，重复导入同一文档得到相同的 ID
+
+    Chroma 检索结果不带 ID，因此 ID 同时写入元数据的 chunk_id 字段
+    """
+    key = f"{chunk.metadata.get('source', '')}\0{chunk.metadata.get('start_index', '')}\0{chunk.page_content}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def run_ingestion(docs_path=None, chunk_size=500, chunk_overlap=50, persist_dir=None, knowledge_type="law",
+                  backend="chroma", hnsw_m=DEFAULT_HNSW_M, ef_construction=DEFAULT_EF_CONSTRUCTION,
+                  ef_search=DEFAULT_EF_SEARCH, compression="none", pq_m=None, nprobe=DEFAULT_NPROBE,
+                  rescore_factor=DEFAULT_RESCORE_FACTOR, index_type="auto",
+                  exact_threshold=EXACT_SEARCH_THRESHOLD, version=None, activate=True,
+                  rerank_tokenizer=DEFAULT_RERANK_MODEL):
     """
     运行文档向量化处理
     
@@ -25,6 +86,19 @@ def run_ingestion(docs_path=None, chunk_size=500, chunk_overlap=50, persist_dir=
         chunk_overlap: 块之间重叠大小（默认: 50 字符）
         persist_dir: 向量库保存路径（默认根据 knowledge_type 自动生成）
         knowledge_type: 知识库类型 ("law"=法条型, "case"=案例型, "judgement"=判决书型, 默认: "law")
+        backend: 向量库后端 ("chroma" 或 "faiss", 默认: "chroma")
+        hnsw_m: faiss 后端 HNSW 每个节点的最大连接数
+        ef_construction: faiss 后端 HNSW 构建时的候选队列长度
+        ef_search: faiss 后端 HNSW 检索时的候选队列长度（API 加载时的默认值）
+        compression: faiss 后端向量压缩方式 ("none" / "fp16" / "pq" / "ivfpq", 默认: "none")
+        pq_m: 乘积量化子空间数（默认按每个子空间 8 维自动选择）
+        nprobe: ivfpq 压缩检索时访问的聚类数
+        rescore_factor: pq / ivfpq 压缩精排候选集相对 k 的放大倍数
+        index_type: faiss 后端索引类型 ("auto" / "exact" / "hnsw", 默认: "auto")
+        exact_threshold: auto 模式下使用暴力检索的最大文档块数量
+        version: 知识库版本名（默认按时间生成），写入 <persist_dir>/versions/<version>
+        activate: 构建完成后是否将 CURRENT 指向新版本（运行中的 API 会自动热切换）
+        rerank_tokenizer: 重排序模型名称（用其分词器预先切分文档块，None 表示不生成分词缓存）
     """
     # 1. 加载文档 (Load Documents)
     if docs_path is None:
@@ -45,19 +119,14 @@ def run_ingestion(docs_path=None, chunk_size=500, chunk_overlap=50, persist_dir=
     print(f"✅ 加载了 {len(documents)} 个文档")
     
     # 2. 文档切分 (Text Splitting)
-    # 对于法律条文，适当增大 chunk_size 以保持完整性
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,        # 每个块最大字符数
-        chunk_overlap=chunk_overlap,  # 块之间重叠字符数，保持上下文
-        separators=["\n\n", "\n", "。", "；", "，", " ", ""]  # 优先按段落分割
-    )
-    texts = text_splitter.split_documents(documents)
+    texts = split_documents(documents, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     print(f"✅ 切分为 {len(texts)} 个文档块")
 
     # 3. 创建嵌入模型 (Create Embeddings)
     # 这将负责将文本转换为高维向量
     print(f"🔄 初始化嵌入模型: {EMBEDDING_MODEL_NAME}")
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    # 文档块按 token 长度分桶批量编码，减少填充浪费
+    embeddings = BucketedEmbeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME))
     
     # 4. 存储到向量数据库 (Store in VectorDB)
     # 这是创建 RAG 知识库的核心步骤
@@ -73,16 +142,69 @@ def run_ingestion(docs_path=None, chunk_size=500, chunk_overlap=50, persist_dir=
     else:
         persist_dir = str(Path(persist_dir).resolve())
     
-    print(f"💾 构建向量数据库...")
-    print(f"📁 保存路径: {persist_dir}")
-    vectordb = Chroma.from_documents(
+    # 每次构建写入新的版本目录，不影响正在服务的版本
+    version = version or new_version_name()
+    version_dir = version_path(persist_dir, version)
+    if version_dir.exists() and any(version_dir.iterdir()):
+        print(f"❌ 错误: 知识库版本已存在: {version_dir}")
+        return None
+    
+    print(f"💾 构建向量数据库（后端: {backend}）...")
+    print(f"📁 保存路径: {version_dir}（版本: {version}）")
+    index_params = {}
+    if backend == "faiss":
+        index_params = {
+            "index_type": index_type,
+            "exact_threshold": exact_threshold,
+            "M": hnsw_m,
+            "ef_construction": ef_construction,
+            "ef_search": ef_search,
+            "compression": compression,
+            "pq_m": pq_m,
+            "nprobe": nprobe,
+            "rescore_factor": rescore_factor,
+        }
+        print(f"⚙️  索引类型: {index_type}（auto 模式下不超过 {exact_threshold} 个文档块时使用暴力检索）")
+        print(f"⚙️  HNSW 参数: M={hnsw_m}, ef_construction={ef_construction}, ef_search={ef_search}")
+        print(f"⚙️  向量压缩: {compression}")
+    vectordb = build_vector_store(
         documents=texts,
         embedding=embeddings,
-        persist_directory=persist_dir
+        persist_directory=str(version_dir),
+        backend=backend,
+        **index_params
     )
     # 注意：新版本的 Chroma 在使用 persist_directory 时会自动持久化，无需手动调用 persist()
-    print(f"✅ 向量化完成！知识库已保存到: {persist_dir}")
+    print(f"✅ 向量化完成！知识库已保存到: {version_dir}")
     print(f"📊 统计: {len(texts)} 个文档块已向量化")
+    batching = embeddings.stats.report().get("all")
+    if batching:
+        print(f"📦 分桶编码: {batching['batches']} 个批次，填充比例 {batching['padding_ratio']:.1%}，"
+              f"{batching['tokens_per_second']:.0f} token/s")
+    # 法条倒排索引（法律名称 + 条文序号 → 文档块），供 API 的法条查询快速通道使用
+    statute_index = write_statute_index(
+        version_dir,
+        [chunk.id for chunk in texts],
+        [chunk.page_content for chunk in texts],
+        [chunk.metadata for chunk in texts],
+    )
+    if statute_index:
+        print(f"📑 法条索引: {len(statute_index)} 条条文（{len(statute_index.laws)} 部法律）")
+    # BM25 词法索引（服务时与向量检索结果融合）
+    bm25 = build_bm25_index(version_dir, [chunk.id for chunk in texts], [chunk.page_content for chunk in texts])
+    print(f"🔤 BM25 索引: {bm25['terms']} 个词，{bm25['postings']} 条倒排记录（分词: {bm25['tokenizer']}）")
+    # 重排序分词缓存（服务时重排序只需对查询分词）
+    if rerank_tokenizer:
+        rerank_tokens = build_rerank_tokens(version_dir, [chunk.id for chunk in texts],
+                                            [chunk.page_content for chunk in texts], rerank_tokenizer)
+        if rerank_tokens:
+            print(f"🧩 重排序分词缓存: {rerank_tokens['count']} 个文档块，{rerank_tokens['tokens']} 个 token"
+                  f"（分词器: {rerank_tokens['tokenizer']}）")
+    if activate:
+        activate_version(persist_dir, version)
+        print(f"🔀 已切换到新版本: {version}（运行中的 API 将自动加载，也可调用 /admin/kb/{{name}}/swap）")
+    else:
+        print(f"ℹ️  未切换版本，可调用 /admin/kb/{{name}}/swap 并指定 version={version} 上线")
     return vectordb
 
 if __name__ == "__main__":
@@ -99,8 +221,39 @@ if __name__ == "__main__":
                        help='向量库保存路径（默认根据知识库类型自动生成）')
     parser.add_argument('--knowledge-type', type=str, choices=['law', 'case', 'judgement'], default='law',
                        help='知识库类型: law=法条型, case=案例型, judgement=判决书型（默认: law）')
+    parser.add_argument('--backend', type=str, choices=list(VECTOR_STORE_BACKENDS), default='chroma',
+                       help='向量库后端: chroma=Chroma, faiss=进程内 HNSW 索引（默认: chroma）')
+    parser.add_argument('--index-type', type=str, choices=list(INDEX_TYPES), default='auto',
+                       help='索引类型，仅 faiss 后端: auto=按规模自动选择, exact=NumPy 暴力检索, hnsw=HNSW 近似检索（默认: auto）')
+    parser.add_argument('--exact-threshold', type=int, default=EXACT_SEARCH_THRESHOLD,
+                       help=f'auto 模式下使用暴力检索的最大文档块数量（默认: {EXACT_SEARCH_THRESHOLD}）')
+    parser.add_argument('--hnsw-m', type=int, default=DEFAULT_HNSW_M,
+                       help=f'HNSW 每个节点的最大连接数，仅 faiss 后端（默认: {DEFAULT_HNSW_M}）')
+    parser.add_argument('--ef-construction', type=int, default=DEFAULT_EF_CONSTRUCTION,
+                       help=f'HNSW 构建时的候选队列长度，仅 faiss 后端（默认: {DEFAULT_EF_CONSTRUCTION}）')
+    parser.add_argument('--ef-search', type=int, default=DEFAULT_EF_SEARCH,
+                       help=f'HNSW 检索时的候选队列长度，仅 faiss 后端（默认: {DEFAULT_EF_SEARCH}）')
+    parser.add_argument('--compression', type=str, choices=list(COMPRESSION_TYPES), default='none',
+                       help='向量压缩方式，仅 faiss 后端: none / fp16 / pq / ivfpq（默认: none）')
+    parser.add_argument('--pq-m', type=int, default=None,
+                       help='乘积量化子空间数，仅 pq / ivfpq 压缩（默认: 维度 / 8）')
+    parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE,
+                       help=f'IVF 检索时访问的聚类数，仅 ivfpq 压缩（默认: {DEFAULT_NPROBE}）')
+    parser.add_argument('--rescore-factor', type=int, default=DEFAULT_RESCORE_FACTOR,
+                       help=f'精排候选集相对 k 的放大倍数，仅 pq / ivfpq 压缩（默认: {DEFAULT_RESCORE_FACTOR}）')
+    parser.add_argument('--version', type=str, default=None,
+                       help='知识库版本名（默认按构建时间生成）')
+    parser.add_argument('--no-activate', action='store_true',
+                       help='构建完成后不切换 CURRENT（之后通过管理接口上线）')
+    parser.add_argument('--rerank-tokenizer', type=str, default=DEFAULT_RERANK_MODEL,
+                       help=f'预先切分文档块使用的重排序模型分词器，需与 API 的重排序模型一致（默认: {DEFAULT_RERANK_MODEL}）')
+    parser.add_argument('--no-rerank-tokens', action='store_true',
+                       help='不生成重排序分词缓存')
     
     args = parser.parse_args()
+
+    # CPU 线程预算：离线构建按单个进程使用全部核心（须在首次推理之前应用）
+    apply_thread_budget_from_env(workers=1)
     
     # 根据知识库类型设置默认文档路径
     if args.docs_path is None:
@@ -116,5 +269,18 @@ if __name__ == "__main__":
         chunk_size=args.chunk_size,
         chunk_overlap=args.chunk_overlap,
         persist_dir=args.persist_dir,
-        knowledge_type=args.knowledge_type
+        knowledge_type=args.knowledge_type,
+        backend=args.backend,
+        hnsw_m=args.hnsw_m,
+        ef_construction=args.ef_construction,
+        ef_search=args.ef_search,
+        compression=args.compression,
+        pq_m=args.pq_m,
+        nprobe=args.nprobe,
+        rescore_factor=args.rescore_factor,
+        index_type=args.index_type,
+        exact_threshold=args.exact_threshold,
+        version=args.version,
+        activate=not args.no_activate,
+        rerank_tokenizer=None if args.no_rerank_tokens else args.rerank_tokenizer
     )
\ No newline at end of file
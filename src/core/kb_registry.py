@@ -0,0 +1,635 @@
+#!/usr/bin/env python3
+"""
+知识库版本管理模块
+功能：知识库按版本目录存放，API 在不重启的情况下原子切换到新版本（蓝绿切换）
+
+目录结构（以法条型知识库为例）：
+  chroma_db/
+    versions/
+      v20240101-120000/   ingest 每次构建写入一个新的版本目录
+      v20240102-090000/
+    CURRENT               当前版本名（原子替换写入）
+没有 CURRENT 文件的旧版目录视为单一版本，直接从该目录加载
+
+切换规则：
+  - 每个请求开始时取得所有知识库的快照（引用计数 +1），请求期间始终使用同一版本
+  - 切换时先在锁外加载新版本，再在锁内替换；旧版本在最后一个请求释放后才真正释放
+  - 切换后依次调用已注册的监听器，用于清空以知识库内容为键的缓存
+  - 在线更新（见 live_updates）写入当前版本的更新日志，每批更新生成新的叠加层并按同样方式原子替换
+
+按需加载（lazy）：
+  - 以 lazy=True 注册的知识库（如只被少量查询用到的判决书型知识库）在请求第一次使用时才加载，
+    首次加载耗时通过加载监听器上报（首次访问代价）
+  - 记录每个知识库的最后访问时间和占用（持久化目录大小，mmap / 进程内加载的上限估计），
+    超过空闲时间（idle_timeout）或总占用超过内存预算（memory_budget_bytes）时按最久未访问优先释放，
+    释放沿用切换的引用计数机制：进行中的请求结束后才真正释放，之后的请求重新按需加载
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.vectorstores import VectorStore
+
+from src.core.bm25_index import BM25Index
+from src.core.live_updates import OverlayVectorStore, UpdateLog, update_log_path
+from src.core.rerank_tokens import RerankTokenCache
+from src.core.statute_index import StatuteIndex
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+
+def new_version_name() -> str:
+    """生成新版本名（按时间排序）"""
+    return datetime.now().strftime("v%Y%m%d-%H%M%S")
+
+
+def version_path(base_dir, version: str) -> Path:
+    """版本目录路径"""
+    return Path(base_dir) / VERSIONS_DIR / version
+
+
+def list_versions(base_dir) -> List[str]:
+    """列出知识库的所有版本（按名称排序）"""
+    versions_dir = Path(base_dir) / VERSIONS_DIR
+    if not versions_dir.exists():
+        return []
+    return sorted(p.name for p in versions_dir.iterdir() if p.is_dir())
+
+
+def current_version(base_dir) -> Optional[str]:
+    """读取 CURRENT 指向的版本，不存在时返回 None（旧版单一目录）"""
+    current_file = Path(base_dir) / CURRENT_FILE
+    if not current_file.exists():
+        return None
+    version = current_file.read_text(encoding="utf-8").strip()
+    return version or None
+
+
+def resolve_kb_path(base_dir) -> Tuple[Path, Optional[str]]:
+    """
+    解析知识库当前版本的目录
+
+    Returns:
+        (目录, 版本名)，旧版单一目录的版本名为 None
+    """
+    version = current_version(base_dir)
+    if version is None:
+        return Path(base_dir), None
+    return version_path(base_dir, version), version
+
+
+def activate_version(base_dir, version: str):
+    """
+    将 CURRENT 原子地指向指定版本（先写临时文件再 rename）
+
+    同一主机上的所有 API worker 通过监视 CURRENT 跟随切换
+    """
+    if not version_path(base_dir, version).is_dir():
+        raise FileNotFoundError(f"知识库版本不存在: {version_path(base_dir, version)}")
+    current_file = Path(base_dir) / CURRENT_FILE
+    tmp_file = current_file.with_name(f".{CURRENT_FILE}.{os.getpid()}.tmp")
+    tmp_file.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp_file, current_file)
+
+
+def _has_data(path: Path) -> bool:
+    return path.exists() and any(path.iterdir())
+
+
+def _footprint(path: Path) -> int:
+    """知识库占用估计：持久化目录下所有文件的大小"""
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class KnowledgeBase:
+    """一个已加载的知识库版本（带引用计数）"""
+
+    def __init__(self, name: str, label: str, version: Optional[str], path: Path,
+                 vectorstore: VectorStore, search_k: int, lazy: bool = False,
+                 statute_index: Optional[StatuteIndex] = None, lexical_index: Optional[BM25Index] = None,
+                 rerank_tokens: Optional[RerankTokenCache] = None):
+        self.name = name
+        self.label = label
+        self.version = version
+        self.path = path
+        self.vectorstore = vectorstore
+        self.retriever = vectorstore.as_retriever(search_kwargs={"k": search_k})
+        self.statute_index = statute_index or StatuteIndex()  # 法条倒排索引（版本目录下没有时为空）
+        self.lexical_index = lexical_index  # BM25 词法索引（版本目录下没有时为 None，只做向量检索）
+        self.rerank_tokens = rerank_tokens  # 重排序分词缓存（版本目录下没有时为 None，重排序时现场分词）
+        self.lazy = lazy
+        self.loaded_at = time.time()
+        self.last_access = self.loaded_at
+        self.memory_bytes = _footprint(path)
+        self.refs = 0
+        self.retired = False
+        self.evicted = False
+        self.update_offset = 0  # 已应用的更新日志位置
+
+    def release(self):
+        """释放向量库（mmap 文件、索引）的引用"""
+        self.vectorstore = None
+        self.retriever = None
+
+    def info(self) -> dict:
+        return {
+            "label": self.label,
+            "version": self.version,
+            "path": str(self.path),
+            "loaded_at": datetime.fromtimestamp(self.loaded_at).isoformat(),
+            "last_access": datetime.fromtimestamp(self.last_access).isoformat(),
+            "memory_mb": round(self.memory_bytes / 1024 ** 2, 1),
+            "in_flight": self.refs,
+            "statute_provisions": len(self.statute_index),
+            **(self.vectorstore.stats() if hasattr(self.vectorstore, "stats") else {}),
+            **(self.lexical_index.stats() if self.lexical_index is not None else {}),
+            **(self.rerank_tokens.stats() if self.rerank_tokens is not None else {}),
+        }
+
+
+class KnowledgeBaseSnapshot:
+    """
+    请求级知识库快照：持有各知识库当前版本的引用，release 后旧版本才能释放
+
+    尚未加载的按需加载知识库在本请求第一次 get 时加载，之后整个请求使用同一句柄
+    （get 可能在线程池中执行：请求被取消时 release 可能先于加载完成，此时加载到的句柄立即归还）
+    """
+
+    def __init__(self, registry: "KnowledgeBaseRegistry", handles: Dict[str, KnowledgeBase], names: List[str]):
+        self._registry = registry
+        self._handles = handles
+        self._names = names
+        self._released = False
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[KnowledgeBase]:
+        kb = self._handles.get(name)
+        if kb is None and name in self._names and not self._released:
+            kb = self._registry._acquire(name)
+            if kb is not None:
+                with self._lock:
+                    if self._released:
+                        self._registry._release([kb])
+                        return None
+                    self._handles[name] = kb
+        if kb is not None:
+            kb.last_access = time.time()
+        return kb
+
+    def names(self) -> List[str]:
+        """本请求可用的知识库（包括尚未加载的按需加载知识库）"""
+        return list(self._names)
+
+    def items(self):
+        """(名称, 句柄)，遍历时按需加载"""
+        for name in self._names:
+            kb = self.get(name)
+            if kb is not None:
+                yield name, kb
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._registry._release(self._handles.values())
+
+    def __enter__(self) -> "KnowledgeBaseSnapshot":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class KnowledgeBaseRegistry:
+    """知识库注册表：加载、按请求快照、热切换版本"""
+
+    def __init__(self, loader: Callable[[str], VectorStore], memory_budget_bytes: int = 0, idle_timeout: float = 0):
+        """
+        Args:
+            loader: 根据目录加载向量库的函数
+            memory_budget_bytes: 已加载知识库的总占用预算，超出时释放最久未访问的按需加载知识库（0 表示不限制）
+            idle_timeout: 按需加载知识库空闲多少秒后释放（0 表示不释放，由后台监视线程检查）
+        """
+        self._loader = loader
+        self.memory_budget_bytes = memory_budget_bytes
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._swap_lock = threading.Lock()  # 串行化切换（管理接口与后台监视可能同时触发）
+        self._specs: Dict[str, dict] = {}
+        self._current: Dict[str, KnowledgeBase] = {}
+        self._listeners: List[Callable[[str, Optional[str], Optional[str]], None]] = []
+        self._load_listeners: List[Callable[[str, Optional[str], float], None]] = []
+        self._evict_listeners: List[Callable[[str, Optional[str], str], None]] = []
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    # ------------------------------------------------------------------
+    # 注册 / 加载
+    # ------------------------------------------------------------------
+    def register(self, name: str, base_dir: str, search_k: int, label: Optional[str] = None,
+                 lazy: bool = False) -> Optional[KnowledgeBase]:
+        """
+        注册知识库并加载当前版本（目录不存在或为空时只注册，之后可通过切换加载）
+
+        Args:
+            name: 知识库名称（law / case / judgement）
+            base_dir: 知识库根目录
+            search_k: 检索数量
+            label: 显示名称
+            lazy: 是否按需加载（注册时不加载，第一次使用时加载，空闲或超出内存预算时释放）
+
+        Returns:
+            已加载的句柄；按需加载或目录为空时返回 None
+        """
+        path, _ = resolve_kb_path(base_dir)
+        self._specs[name] = {
+            "base_dir": base_dir, "search_k": search_k, "label": label or name,
+            "lazy": lazy, "available": _has_data(path),
+        }
+        self._load_locks[name] = threading.Lock()
+        if lazy or not self._specs[name]["available"]:
+            return None
+        kb = self._load(name)
+        with self._lock:
+            self._current[name] = kb
+        return kb
+
+    def _load(self, name: str, version: Optional[str] = None) -> KnowledgeBase:
+        spec = self._specs[name]
+        if version is None:
+            path, version = resolve_kb_path(spec["base_dir"])
+        else:
+            path = version_path(spec["base_dir"], version)
+        if not _has_data(path):
+            raise FileNotFoundError(f"知识库目录不存在或为空: {path}")
+        vectorstore = self._loader(str(path))
+        statute_index = StatuteIndex.load(path)
+        lexical_index = BM25Index.load(path)
+        rerank_tokens = RerankTokenCache.load(path)
+        # 重放该版本的在线更新
+        records, offset = self._update_log(name, version).read(0)
+        if records:
+            vectorstore = OverlayVectorStore.wrap(vectorstore).apply(records)
+            statute_index = statute_index.apply(records)
+            lexical_index = lexical_index.apply(records) if lexical_index is not None else None
+            rerank_tokens = rerank_tokens.apply(records) if rerank_tokens is not None else None
+            print(f"📝 {spec['label']}知识库已重放 {len(records)} 条在线更新")
+        kb = KnowledgeBase(name, spec["label"], version, path, vectorstore, spec["search_k"],
+                           lazy=spec["lazy"], statute_index=statute_index, lexical_index=lexical_index,
+                           rerank_tokens=rerank_tokens)
+        kb.update_offset = offset
+        return kb
+
+    def _ensure_loaded(self, name: str) -> Optional[KnowledgeBase]:
+        """按需加载知识库当前版本（同一知识库只加载一次，其他请求等待加载完成）"""
+        kb = self._current.get(name)
+        if kb is not None or not self._specs[name]["available"]:
+            return kb
+        with self._load_locks[name]:
+            kb = self._current.get(name)
+            if kb is not None:
+                return kb
+            start = time.time()
+            loaded = self._load(name)
+            seconds = time.time() - start
+            with self._lock:
+                # 加载期间可能已被切换接口加载，以先装入的为准
+                kb = self._current.setdefault(name, loaded)
+        if kb is not loaded:
+            loaded.release()
+            return kb
+        print(f"📂 {kb.label}知识库按需加载完成: {kb.version or kb.path}（{seconds:.2f}s，{kb.memory_bytes / 1024 ** 2:.0f} MB）")
+        for listener in self._load_listeners:
+            try:
+                listener(name, kb.version, seconds)
+            except Exception as e:
+                print(f"⚠️  知识库加载监听器执行失败: {e}")
+        self.enforce_budget(keep=name)
+        return kb
+
+    def add_load_listener(self, listener: Callable[[str, Optional[str], float], None]):
+        """注册按需加载监听器：listener(知识库名称, 版本, 加载耗时秒数)，用于记录首次访问代价"""
+        self._load_listeners.append(listener)
+
+    def add_evict_listener(self, listener: Callable[[str, Optional[str], str], None]):
+        """注册释放监听器：listener(知识库名称, 版本, 原因 idle / budget)"""
+        self._evict_listeners.append(listener)
+
+    def _update_log(self, name: str, version: Optional[str]) -> UpdateLog:
+        return UpdateLog(update_log_path(self._specs[name]["base_dir"], version))
+
+    def add_swap_listener(self, listener: Callable[[str, Optional[str], Optional[str]], None]):
+        """注册切换监听器：listener(知识库名称, 旧版本, 新版本)，用于清空依赖知识库内容的缓存"""
+        self._listeners.append(listener)
+
+    # ------------------------------------------------------------------
+    # 请求快照
+    # ------------------------------------------------------------------
+    def snapshot(self) -> KnowledgeBaseSnapshot:
+        """取得所有已加载知识库当前版本的快照（请求结束时必须 release），未加载的按需加载知识库在第一次 get 时加载"""
+        with self._lock:
+            handles = dict(self._current)
+            for kb in handles.values():
+                kb.refs += 1
+        return KnowledgeBaseSnapshot(self, handles, self.available_names())
+
+    def _acquire(self, name: str) -> Optional[KnowledgeBase]:
+        """按需加载并取得知识库句柄的引用（加载后立即被释放时重试一次）"""
+        for _ in range(2):
+            if self._ensure_loaded(name) is None:
+                return None
+            with self._lock:
+                kb = self._current.get(name)
+                if kb is not None:
+                    kb.refs += 1
+                    return kb
+        return None
+
+    def _release(self, handles):
+        drained = []
+        with self._lock:
+            for kb in handles:
+                kb.refs -= 1
+                if kb.retired and kb.refs == 0:
+                    drained.append(kb)
+        for kb in drained:
+            self._drop(kb)
+
+    def _drop(self, kb: KnowledgeBase):
+        kb.release()
+        if kb.evicted:
+            return  # 最后一个引用释放后索引和 mmap 即归还，不在事件循环上同步 gc
+        current = self._current.get(kb.name)
+        if current is None or current.version != kb.version:
+            # 同一版本的旧叠加层（在线更新）释放时不打印
+            print(f"♻️  {kb.label}知识库旧版本已释放: {kb.version or kb.path}")
+
+    def get(self, name: str) -> Optional[KnowledgeBase]:
+        """当前版本（不增加引用计数，仅用于状态展示）"""
+        return self._current.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._specs)
+
+    def available_names(self) -> List[str]:
+        """可用的知识库：已加载的，以及有数据但尚未加载的按需加载知识库"""
+        return [
+            name for name, spec in self._specs.items()
+            if name in self._current or (spec["lazy"] and spec["available"])
+        ]
+
+    def label(self, name: str) -> str:
+        return self._specs[name]["label"]
+
+    def search_k(self, name: str) -> int:
+        """知识库的默认检索数量（不需要加载知识库）"""
+        return self._specs[name]["search_k"]
+
+    def __len__(self) -> int:
+        return len(self.available_names())
+
+    # ------------------------------------------------------------------
+    # 释放（空闲 / 内存预算）
+    # ------------------------------------------------------------------
+    def memory_bytes(self) -> int:
+        """已加载知识库的总占用"""
+        return sum(kb.memory_bytes for kb in list(self._current.values()))
+
+    def evict(self, name: str, reason: str = "manual") -> bool:
+        """释放已加载的按需加载知识库（进行中的请求结束后真正释放），下一次使用时重新加载"""
+        with self._lock:
+            kb = self._current.get(name)
+            if kb is None or not kb.lazy:
+                return False
+            del self._current[name]
+            kb.retired = True
+            kb.evicted = True
+            drained = kb.refs == 0
+        idle = time.time() - kb.last_access
+        print(f"💤 {kb.label}知识库已释放（{reason}，空闲 {idle:.0f}s，{kb.memory_bytes / 1024 ** 2:.0f} MB）")
+        if drained:
+            self._drop(kb)
+        for listener in self._evict_listeners:
+            try:
+                listener(name, kb.version, reason)
+            except Exception as e:
+                print(f"⚠️  知识库释放监听器执行失败: {e}")
+        return True
+
+    def enforce_budget(self, keep: Optional[str] = None) -> List[str]:
+        """总占用超出内存预算时，按最久未访问优先释放按需加载知识库（不释放 keep）"""
+        evicted = []
+        if self.memory_budget_bytes <= 0:
+            return evicted
+        while self.memory_bytes() > self.memory_budget_bytes:
+            candidates = [kb for kb in list(self._current.values()) if kb.lazy and kb.name != keep]
+            if not candidates:
+                break
+            victim = min(candidates, key=lambda kb: kb.last_access)
+            if self.evict(victim.name, reason="budget"):
+                evicted.append(victim.name)
+        return evicted
+
+    def evict_idle(self) -> List[str]:
+        """释放空闲超过 idle_timeout 的按需加载知识库"""
+        if self.idle_timeout <= 0:
+            return []
+        now = time.time()
+        idle = [
+            kb.name for kb in list(self._current.values())
+            if kb.lazy and now - kb.last_access > self.idle_timeout
+        ]
+        return [name for name in idle if self.evict(name, reason="idle")]
+
+    # ------------------------------------------------------------------
+    # 切换
+    # ------------------------------------------------------------------
+    def swap(self, name: str, version: Optional[str] = None) -> dict:
+        """
+        切换知识库版本
+
+        Args:
+            name: 知识库名称
+            version: 目标版本，None 表示切换到 CURRENT 指向的版本；
+                     指定版本时同时更新 CURRENT，其他 worker 通过监视跟随切换
+
+        Returns:
+            切换结果（旧版本、新版本、加载耗时）
+        """
+        if name not in self._specs:
+            raise KeyError(f"未知的知识库: {name}")
+        with self._swap_lock:
+            return self._swap(name, version)
+
+    def _swap(self, name: str, version: Optional[str]) -> dict:
+        if version is not None:
+            activate_version(self._specs[name]["base_dir"], version)
+
+        start = time.time()
+        new_kb = self._load(name)  # 在锁外加载，期间请求继续使用旧版本
+        old_kb = self._replace(name, new_kb)
+        old_version = old_kb.version if old_kb else None
+        print(f"🔀 {new_kb.label}知识库已切换: {old_version} -> {new_kb.version}")
+        return {
+            "name": name,
+            "old_version": old_version,
+            "new_version": new_kb.version,
+            "load_seconds": round(time.time() - start, 3),
+            "old_in_flight": old_kb.refs if old_kb else 0,
+        }
+
+    def _replace(self, name: str, new_kb: KnowledgeBase,
+                 expected: Optional[KnowledgeBase] = None) -> Optional[KnowledgeBase]:
+        """
+        原子替换知识库句柄，旧句柄在进行中的请求结束后释放，返回旧句柄
+
+        expected 不为 None 时只在当前句柄仍是 expected 时替换（期间被释放或切换则不替换，返回 None）
+        """
+        with self._lock:
+            old_kb = self._current.get(name)
+            if expected is not None and old_kb is not expected:
+                return None
+            self._current[name] = new_kb
+            drained = False
+            if old_kb is not None:
+                old_kb.retired = True
+                drained = old_kb.refs == 0
+        if drained:
+            self._drop(old_kb)
+
+        old_version = old_kb.version if old_kb else None
+        for listener in self._listeners:
+            try:
+                listener(name, old_version, new_kb.version)
+            except Exception as e:
+                print(f"⚠️  知识库切换监听器执行失败: {e}")
+        return old_kb
+
+    # ------------------------------------------------------------------
+    # 在线更新
+    # ------------------------------------------------------------------
+    def write_update(self, name: str, record: dict) -> dict:
+        """
+        将一条更新记录写入当前版本的更新日志并立即应用（其他 worker 由后台监视应用）
+
+        Args:
+            name: 知识库名称
+            record: 更新记录（见 live_updates.make_upsert_record / make_delete_record）
+        """
+        # 持有引用，写入期间知识库被释放也不会丢失版本信息（释放后下次加载时重放更新日志）
+        kb = self._acquire(name)
+        if kb is None:
+            raise KeyError(f"知识库未加载: {name}")
+        try:
+            self._update_log(name, kb.version).append(record)
+            return self.apply_updates(name) or {"name": name, "applied": 0}
+        finally:
+            self._release([kb])
+
+    def apply_updates(self, name: str) -> Optional[dict]:
+        """应用更新日志中尚未应用的记录（一批记录只替换一次叠加层），没有新记录时返回 None"""
+        with self._swap_lock:
+            # 持有引用：应用期间按需加载知识库可能被释放（内存预算 / 空闲），引用保证向量库不被置空
+            with self._lock:
+                kb = self._current.get(name)
+                if kb is None:
+                    return None
+                kb.refs += 1
+            try:
+                records, offset = self._update_log(name, kb.version).read(kb.update_offset)
+                if not records:
+                    return None
+                start = time.time()
+                vectorstore = OverlayVectorStore.wrap(kb.vectorstore).apply(records)
+                new_kb = KnowledgeBase(name, kb.label, kb.version, kb.path, vectorstore,
+                                       self._specs[name]["search_k"], lazy=kb.lazy,
+                                       statute_index=kb.statute_index.apply(records),
+                                       lexical_index=kb.lexical_index.apply(records) if kb.lexical_index else None,
+                                       rerank_tokens=kb.rerank_tokens.apply(records) if kb.rerank_tokens else None)
+                new_kb.loaded_at = kb.loaded_at
+                new_kb.last_access = kb.last_access
+                new_kb.update_offset = offset
+                if self._replace(name, new_kb, expected=kb) is None:
+                    # 应用期间已被释放：不再装回（否则绕过内存预算），下次加载时会重放更新日志
+                    new_kb.release()
+                    return None
+            finally:
+                self._release([kb])
+        return {
+            "name": name,
+            "version": kb.version,
+            "applied": len(records),
+            "apply_seconds": round(time.time() - start, 3),
+            **vectorstore.stats(),
+        }
+
+    def check_for_updates(self) -> List[dict]:
+        """检查各知识库的 CURRENT 是否指向了新版本（有变化则切换），以及是否有新的在线更新"""
+        results = []
+        for name, spec in self._specs.items():
+            path, version = resolve_kb_path(spec["base_dir"])
+            loaded = self._current.get(name)
+            if loaded is None and spec["lazy"]:
+                # 未加载的按需加载知识库不预先加载，下次使用时直接加载当前版本
+                spec["available"] = _has_data(path)
+                continue
+            if loaded is not None and loaded.version == version:
+                try:
+                    update = self.apply_updates(name)
+                except Exception as e:
+                    print(f"⚠️  {spec['label']}知识库在线更新应用失败: {e}")
+                    update = None
+                if update:
+                    results.append(update)
+                continue
+            if version is None and loaded is not None:
+                continue  # CURRENT 被删除时保持当前版本
+            if not _has_data(path):
+                continue
+            try:
+                results.append(self.swap(name))
+            except Exception as e:
+                print(f"⚠️  {spec['label']}知识库切换失败，继续使用当前版本: {e}")
+        return results
+
+    def start_watcher(self, interval: float):
+        """启动后台线程，每隔 interval 秒检查一次 CURRENT，并释放空闲的按需加载知识库"""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop_event.wait(interval):
+                self.check_for_updates()
+                self.evict_idle()
+
+        self._watcher = threading.Thread(target=watch, name="kb-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_event.set()
+
+    def status(self) -> dict:
+        """各知识库的当前版本和可用版本"""
+        return {
+            name: {
+                **(self._current[name].info() if name in self._current else {"label": spec["label"], "version": None}),
+                "lazy": spec["lazy"],
+                "loaded": name in self._current,
+                "current_pointer": current_version(spec["base_dir"]),
+                "versions": list_versions(spec["base_dir"]),
+            }
+            for name, spec in self._specs.items()
+        }
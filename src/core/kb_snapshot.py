@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+知识库快照模块
+功能：将知识库（Chroma 或 faiss 后端）导出为紧凑、自描述的快照，用于分发到其他 API 节点
+
+快照就是一个 faiss 后端持久化目录（可直接以 mmap 方式加载，无需解析步骤），另加：
+  - vectors.npy     连续的向量块（行号与索引内部 ID 对齐，便于在目标节点重建索引）
+  - snapshot.json   清单：格式版本、文档块数量、维度、嵌入模型、每个文件的大小与 SHA-256
+目录内容：
+  flash_store.json / index.faiss / vectors.npy       索引配置、预构建索引、向量块
+  chunk_ids.* / chunk_texts.* / chunk_metadata.*     列式文档块 ID、文本、元数据
+可选打包为不压缩的 .tar 便于传输，导入时解包并校验后写入知识库的新版本目录
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.core.bm25_index import build_bm25_index
+from src.core.rerank_tokens import build_rerank_tokens
+from src.core.chunk_store import MmapChunkStore
+from src.core.kb_registry import activate_version, new_version_name, resolve_kb_path, version_path
+from src.core.live_updates import OverlayVectorStore, UpdateLog, update_log_path
+from src.core.retrieval import document_chunk_id
+from src.core.statute_index import write_statute_index
+from src.core.vector_index import VECTORS_FILE, create_index, normalize_vectors
+from src.core.vector_store import STORE_CONFIG_FILE, FlashVectorStore, is_flash_store
+
+SNAPSHOT_FORMAT = "legalflash-kb-snapshot"
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "snapshot.json"
+# Chroma 分批读取的文档块数量
+CHROMA_EXPORT_BATCH = 5000
+
+
+def _sha256(path: Path, chunk_size: int = 8 * 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _index_vectors(index) -> np.ndarray:
+    """从已加载的索引中取出全部向量（float32）"""
+    if hasattr(index, "vectors"):
+        # ExactIndex（float32）或 RescoringIndex（float16 精排向量）
+        return np.asarray(index.vectors, dtype=np.float32)
+    # HNSW（none / fp16）可从存储中重建原始向量
+    return index.index.reconstruct_n(0, index.ntotal)
+
+
+def _read_chroma(directory: Path) -> Tuple[List[str], List[str], List[dict], np.ndarray]:
+    """分批读取 Chroma 知识库的全部文档块和向量"""
+    from langchain_community.vectorstores import Chroma
+
+    collection = Chroma(persist_directory=str(directory))._collection
+    total = collection.count()
+    ids, texts, metadatas, blocks = [], [], [], []
+    for offset in range(0, total, CHROMA_EXPORT_BATCH):
+        batch = collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=CHROMA_EXPORT_BATCH,
+            offset=offset,
+        )
+        for text, metadata in zip(batch["documents"], batch["metadatas"]):
+            metadata = metadata or {}
+            # 与检索阶段一致的文档块 ID（元数据 chunk_id，旧版知识库按内容生成）
+            ids.append(document_chunk_id(Document(page_content=text, metadata=metadata)))
+            texts.append(text)
+            metadatas.append(metadata)
+        blocks.append(np.asarray(batch["embeddings"], dtype=np.float32))
+    vectors = normalize_vectors(np.concatenate(blocks)) if blocks else np.zeros((0, 0), dtype=np.float32)
+    return ids, texts, metadatas, vectors
+
+
+def _read_flash(directory: Path) -> Tuple[List[str], List[str], List[dict], np.ndarray]:
+    store = FlashVectorStore.load(str(directory), embedding=None, mmap=True)
+    return list(store._ids), list(store._texts), list(store._metadatas), _index_vectors(store.index)
+
+
+def _apply_updates(ids, texts, metadatas, vectors, records):
+    """将在线更新合并进导出的数据（删除被替换的文档块，追加增量文档块）"""
+    base = FlashVectorStore(None, create_index(vectors.shape[1], len(ids), index_type="exact"))
+    base._add_vectors(vectors, texts, metadatas, ids)
+    overlay = OverlayVectorStore.wrap(base).apply(records)
+    keep = [i for i, chunk_id in enumerate(ids) if chunk_id not in overlay.tombstones]
+    ids = [ids[i] for i in keep] + list(overlay._ids)
+    texts = [texts[i] for i in keep] + list(overlay._texts)
+    metadatas = [metadatas[i] for i in keep] + list(overlay._metadatas)
+    if len(overlay._ids):
+        vectors = np.concatenate([vectors[keep], overlay._vectors])
+    else:
+        vectors = vectors[keep]
+    return ids, texts, metadatas, vectors
+
+
+def read_knowledge_base(source_dir, include_updates: bool = True) -> Tuple[List[str], List[str], List[dict], np.ndarray]:
+    """
+    读取知识库当前版本的全部文档块和已归一化的向量（Chroma 或 faiss 后端）
+
+    Args:
+        source_dir: 知识库根目录（按 CURRENT 解析当前版本）或某个版本目录
+        include_updates: 是否合并当前版本的在线更新
+
+    Returns:
+        (文档块 ID, 文本, 元数据, 向量)
+    """
+    path, version = resolve_kb_path(source_dir)
+    if (path / "shards.json").exists():
+        raise ValueError(f"分片知识库不能直接读取，请使用切分前的版本: {path}")
+    if is_flash_store(path):
+        ids, texts, metadatas, vectors = _read_flash(path)
+    else:
+        ids, texts, metadatas, vectors = _read_chroma(path)
+    if include_updates:
+        records, _ = UpdateLog(update_log_path(source_dir, version)).read(0)
+        if records:
+            ids, texts, metadatas, vectors = _apply_updates(ids, texts, metadatas, vectors, records)
+    return ids, texts, metadatas, vectors
+
+
+def export_snapshot(
+    source_dir,
+    output,
+    include_updates: bool = True,
+    rebuild: bool = False,
+    embedding_model: Optional[str] = None,
+    archive: bool = False,
+    **index_params
+) -> Path:
+    """
+    导出知识库快照
+
+    Args:
+        source_dir: 知识库根目录（按 CURRENT 解析当前版本）或某个版本目录
+        output: 快照输出目录（archive=True 时为 .tar 文件路径）
+        include_updates: 是否合并当前版本的在线更新
+        rebuild: faiss 知识库是否按 index_params 重建索引（默认直接复用预构建索引）
+        embedding_model: 写入清单的嵌入模型名称（导入节点据此检查兼容性）
+        archive: 是否打包为不压缩的 .tar
+        **index_params: 重建索引时的参数（index_type / compression / M / ef_construction 等；
+                        值为 None 或未指定的参数沿用 faiss 源知识库保存的配置）
+
+    Returns:
+        快照路径
+    """
+    source_dir = Path(source_dir)
+    path, version = resolve_kb_path(source_dir)
+    records = []
+    if include_updates:
+        records, _ = UpdateLog(update_log_path(source_dir, version)).read(0)
+
+    output = Path(output)
+    snapshot_dir = Path(tempfile.mkdtemp(prefix="kb-snapshot-")) if archive else output
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+    source_backend = "faiss" if is_flash_store(path) else "chroma"
+    if source_backend == "faiss" and not records and not rebuild:
+        # 直接复用预构建索引与列式文档块
+        for file_path in path.iterdir():
+            if file_path.is_file():
+                shutil.copy2(file_path, snapshot_dir / file_path.name)
+        if not (snapshot_dir / VECTORS_FILE).exists():
+            store = FlashVectorStore.load(str(path), embedding=None, mmap=True)
+            np.save(snapshot_dir / VECTORS_FILE, _index_vectors(store.index))
+    else:
+        # 未指定的参数（None）沿用源知识库保存的索引配置
+        index_params = {key: value for key, value in index_params.items() if value is not None}
+        if source_backend == "faiss":
+            ids, texts, metadatas, vectors = _read_flash(path)
+            with open(path / STORE_CONFIG_FILE, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            saved = {
+                key: config[key]
+                for key in ("index_type", "compression", "M", "ef_construction", "ef_search",
+                            "pq_m", "nprobe", "rescore_factor")
+                if config.get(key) is not None
+            }
+            index_params = {**saved, **index_params}
+        else:
+            ids, texts, metadatas, vectors = _read_chroma(path)
+        if records:
+            ids, texts, metadatas, vectors = _apply_updates(ids, texts, metadatas, vectors, records)
+        store = FlashVectorStore(None, create_index(vectors.shape[1], len(ids), **index_params))
+        store._add_vectors(vectors, texts, metadatas, ids)
+        store.persist(str(snapshot_dir))
+        if not (snapshot_dir / VECTORS_FILE).exists():
+            np.save(snapshot_dir / VECTORS_FILE, np.ascontiguousarray(vectors, dtype=np.float32))
+        write_statute_index(snapshot_dir, ids, texts, metadatas)
+        build_bm25_index(snapshot_dir, ids, texts)
+        build_rerank_tokens(snapshot_dir, ids, texts)
+
+    write_manifest(snapshot_dir, source=str(path), source_version=version,
+                   source_backend=source_backend, updates_applied=len(records),
+                   embedding_model=embedding_model)
+
+    if archive:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with tarfile.open(output, "w") as tar:
+            for file_path in sorted(snapshot_dir.iterdir()):
+                tar.add(file_path, arcname=file_path.name)
+        shutil.rmtree(snapshot_dir)
+    return output
+
+
+def write_manifest(snapshot_dir: Path, **info) -> dict:
+    """写入清单（各文件的大小与 SHA-256）"""
+    with open(snapshot_dir / STORE_CONFIG_FILE, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    vectors = np.load(snapshot_dir / VECTORS_FILE, mmap_mode="r")
+    files = {
+        file_path.name: {"size": file_path.stat().st_size, "sha256": _sha256(file_path)}
+        for file_path in sorted(snapshot_dir.iterdir())
+        if file_path.is_file() and file_path.name != MANIFEST_FILE
+    }
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "count": config["count"],
+        "dim": config["dim"],
+        "index": config,
+        "vectors": {"file": VECTORS_FILE, "dtype": str(vectors.dtype), "shape": list(vectors.shape)},
+        **info,
+        "files": files,
+    }
+    with open(snapshot_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def verify_snapshot(snapshot_dir) -> List[str]:
+    """
+    校验快照完整性
+
+    Returns:
+        错误列表，为空表示校验通过
+    """
+    snapshot_dir = Path(snapshot_dir)
+    manifest_path = snapshot_dir / MANIFEST_FILE
+    if not manifest_path.exists():
+        return [f"缺少清单文件: {manifest_path}"]
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    errors = []
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        errors.append(f"未知的快照格式: {manifest.get('format')}")
+    if manifest.get("format_version", 0) > SNAPSHOT_FORMAT_VERSION:
+        errors.append(f"快照格式版本过新: {manifest.get('format_version')}")
+    for name, expected in manifest.get("files", {}).items():
+        file_path = snapshot_dir / name
+        if not file_path.exists():
+            errors.append(f"缺少文件: {name}")
+        elif file_path.stat().st_size != expected["size"]:
+            errors.append(f"文件大小不一致: {name}")
+        elif _sha256(file_path) != expected["sha256"]:
+            errors.append(f"校验和不一致: {name}")
+    if not errors and not MmapChunkStore.exists(snapshot_dir):
+        errors.append("缺少列式文档块文件")
+    return errors
+
+
+def import_snapshot(snapshot, kb_dir, version: Optional[str] = None, activate: bool = True,
+                    verify: bool = True) -> Tuple[str, Path]:
+    """
+    将快照导入为知识库的新版本
+
+    Args:
+        snapshot: 快照目录或 .tar 文件
+        kb_dir: 目标知识库根目录（如 chroma_db_judgement）
+        version: 版本名（默认按时间生成）
+        activate: 导入后是否将 CURRENT 指向新版本（运行中的 API 会自动热切换）
+        verify: 是否校验清单中的校验和
+
+    Returns:
+        (版本名, 版本目录)
+    """
+    snapshot = Path(snapshot)
+    version = version or new_version_name()
+    target = version_path(kb_dir, version)
+    if target.exists():
+        raise FileExistsError(f"知识库版本已存在: {target}")
+    # 先写入同级临时目录，校验通过后再 rename，避免留下不完整的版本目录
+    staging = target.with_name(f".{version}.importing")
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if snapshot.is_dir():
+            shutil.copytree(snapshot, staging)
+        else:
+            staging.mkdir()
+            with tarfile.open(snapshot, "r") as tar:
+                for member in tar.getmembers():
+                    # 快照只包含顶层普通文件
+                    if not member.isfile() or Path(member.name).name != member.name:
+                        raise ValueError(f"快照包含非法条目: {member.name}")
+                    tar.extract(member, staging)
+        if verify:
+            errors = verify_snapshot(staging)
+            if errors:
+                raise ValueError("快照校验失败: " + "; ".join(errors))
+        os.rename(staging, target)
+    finally:
+        if staging.exists():
+            shutil.rmtree(staging)
+    if activate:
+        activate_version(kb_dir, version)
+    return version, target
+
+
+def measure_load(directory, backend: str, k: int = 10) -> dict:
+    """
+    测量加载知识库并完成第一次检索的耗时（应在新进程中调用，以包含冷启动开销）
+
+    Args:
+        directory: 知识库目录（版本目录或快照目录）
+        backend: "faiss" 或 "chroma"
+        k: 检索数量
+    """
+    start = time.perf_counter()
+    if backend == "faiss":
+        store = FlashVectorStore.load(str(directory), embedding=None, mmap=True)
+        loaded = time.perf_counter()
+        query = np.random.default_rng(0).standard_normal(store.index.dim).astype(np.float32)
+        store.similarity_search_by_vector(query.tolist(), k=k)
+        count = len(store)
+    else:
+        from langchain_community.vectorstores import Chroma
+
+        store = Chroma(persist_directory=str(directory))
+        collection = store._collection
+        sample = collection.get(limit=1, include=["embeddings"])
+        loaded = time.perf_counter()
+        store.similarity_search_by_vector(list(sample["embeddings"][0]), k=k)
+        count = collection.count()
+    end = time.perf_counter()
+    return {"backend": backend, "count": count, "load_seconds": loaded - start, "first_query_seconds": end - loaded}
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+词典查询改写模块
+功能：用人工整理的"口语表达 → 法律术语"词典在本地改写查询（微秒级），代替一次 vLLM 往返
+  - 去除口语虚词和疑问表达（"咋办"、"请问"、"吗"等）
+  - 按词典规则把口语表达映射为法律术语，问题中已有的法律术语原样保留；
+    法条引用连同法律名称作为一个单元保留（"刑法第二十条"），没有条文序号的法律名称保留但不计入覆盖率
+  - 同义词扩展（如"借款合同"补充"民间借贷"），扩展后不超过 max_terms 个词
+  - 覆盖率：去除虚词后的问题中被词典规则或法律术语覆盖的字数比例，
+    覆盖率低（词典不认识问题的大部分内容）时由调用方回退到 LLM 改写
+
+可以通过 JSON 文件补充词典（scripts/evaluate_rewriter.py 的报告中列出了覆盖率低的问题，便于补充）：
+    {"lexicon": [["正则", ["术语", ...]], ...], "synonyms": {"术语": ["同义词", ...]}}
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from src.core.statute_index import ARTICLE_NUMBER_REGEX, LAW_NAME_REGEX, normalize_law_name
+
+# 口语表达 → 法律术语：(正则, [术语])，按顺序匹配，已被前面规则覆盖的文字不再匹配
+REWRITE_LEXICON = [
+    # 借贷、债务
+    (r"借钱不还|欠钱不还|欠款不还|欠债不还|不还钱|欠.{0,3}钱|赖账|老赖|拖着不还|要不回(来)?钱?|催债|讨债|要债", ["债务违约", "违约责任", "还款义务"]),
+    (r"借条|欠条|打了?条子", ["借条", "借款合同", "债权凭证"]),
+    (r"高利贷|利息太高|利息过高|砍头息|利滚利", ["民间借贷", "借款利率", "利率上限"]),
+    (r"利息|利率", ["借款利息", "借款利率"]),
+    (r"担保人|保证人|作保|担保", ["保证责任", "保证合同"]),
+    (r"借钱|借款|借了?.{0,4}钱|借给", ["借款合同", "民间借贷"]),
+    # 劳动
+    (r"拖欠工资|不发工资|拖欠薪水|欠薪|工资不给|不给工资|克扣工资|扣工资", ["拖欠工资", "劳动报酬", "劳动争议"]),
+    (r"辞退|开除|炒鱿鱼|被裁|裁员|解雇|让我走人|不让我干了", ["解除劳动合同", "违法解除", "经济补偿"]),
+    (r"辞职|离职|不想干了", ["劳动者解除劳动合同", "辞职", "提前通知"]),
+    (r"加班费|加班不给钱|加班", ["加班费", "工作时间", "劳动报酬"]),
+    (r"没签(劳动)?合同|不签(劳动)?合同|没有签(劳动)?合同", ["未签订书面劳动合同", "二倍工资", "事实劳动关系"]),
+    (r"社保|五险一金|公积金|不交保险", ["社会保险", "社会保险费", "用人单位义务"]),
+    (r"试用期", ["试用期", "劳动合同"]),
+    (r"工伤|上班.{0,4}受伤|干活.{0,4}受伤", ["工伤认定", "工伤保险", "工伤赔偿"]),
+    (r"竞业限制|竞业协议|不让去同行", ["竞业限制", "违约金"]),
+    # 合同
+    (r"(合同)?到期.{0,4}续签|续签|续约", ["合同续签", "合同期限", "续约"]),
+    (r"押金", ["押金返还", "租赁合同"]),
+    (r"定金|订金", ["定金", "定金罚则", "合同解除"]),
+    (r"违约金", ["违约金", "违约责任"]),
+    (r"不履行合同|毁约|违约|反悔|不认账", ["违约责任", "合同履行"]),
+    (r"合同无效|合同作废|霸王条款|格式条款", ["合同效力", "格式条款", "无效合同"]),
+    (r"退货|退款|不给退", ["买卖合同", "退货", "消费者权益保护"]),
+    (r"假货|买到假的|假冒|以次充好|退一赔三|退一赔十|欺诈消费者", ["消费欺诈", "惩罚性赔偿", "消费者权益保护"]),
+    # 婚姻家庭、继承
+    (r"离婚", ["离婚", "婚姻关系解除"]),
+    (r"抚养权|孩子归谁|孩子跟谁|抚养费", ["子女抚养", "抚养权", "抚养费"]),
+    (r"彩礼", ["彩礼返还", "婚约财产"]),
+    (r"分财产|财产.{0,4}分|分割.{0,4}财产|房子归谁|共同财产|婚前财产", ["夫妻共同财产", "财产分割", "婚前个人财产"]),
+    (r"家暴|家庭暴力|打老婆|打老公", ["家庭暴力", "人身安全保护令"]),
+    (r"出轨|小三|外遇|婚外情", ["过错方", "离婚损害赔偿", "夫妻忠实义务"]),
+    (r"赡养|养老|不管父母|不养老人", ["赡养义务", "赡养费"]),
+    (r"遗产|分家产|继承", ["遗产继承", "法定继承", "继承顺序"]),
+    (r"遗嘱", ["遗嘱继承", "遗嘱效力"]),
+    # 房产、租赁、相邻关系
+    (r"房东|租房|租客|房租|退租|涨房租", ["房屋租赁合同", "租赁", "出租人义务"]),
+    (r"买房|卖房|二手房|过户|房产证|购房", ["房屋买卖合同", "不动产登记", "房屋过户"]),
+    (r"拆迁|征收|强拆", ["房屋征收", "征收补偿", "拆迁补偿"]),
+    (r"物业|物业费", ["物业服务合同", "物业费"]),
+    (r"漏水|噪音|太吵|扰民|采光|挡光|邻居", ["相邻关系", "排除妨害", "侵权责任"]),
+    # 侵权、人身损害
+    (r"车祸|撞车|撞人|被车撞|被撞|交通事故|追尾|肇事逃逸|逃逸|全责|主责", ["交通事故", "机动车交通事故责任", "损害赔偿"]),
+    (r"酒驾|醉驾|喝酒开车", ["危险驾驶罪", "醉酒驾驶"]),
+    (r"狗咬|被狗咬|宠物伤人", ["饲养动物损害责任", "侵权责任"]),
+    (r"医疗事故|医院.{0,4}(治坏|误诊|责任)|看病.{0,4}出事", ["医疗损害责任", "医疗过错", "损害赔偿"]),
+    (r"受伤|被打伤|赔医药费|医药费|误工费", ["人身损害赔偿", "医疗费", "误工费"]),
+    (r"精神损失|精神损害|精神赔偿", ["精神损害赔偿"]),
+    (r"造谣|诽谤|骂我|辱骂|侮辱|名誉", ["名誉权", "侵害名誉权", "诽谤"]),
+    (r"隐私|偷拍|泄露.{0,4}信息|个人信息", ["隐私权", "个人信息保护"]),
+    (r"抄袭|盗版|侵权使用|盗用.{0,4}(图片|作品|商标)", ["著作权侵权", "知识产权", "侵权责任"]),
+    # 刑事
+    (r"打人|打架|斗殴|被打", ["故意伤害", "寻衅滋事", "人身损害赔偿"]),
+    (r"被骗|骗钱|诈骗|骗子|电信诈骗|网络诈骗", ["诈骗罪", "财产损失", "刑事立案"]),
+    (r"偷东西|被偷|偷窃|盗窃|小偷", ["盗窃罪", "财产损失"]),
+    (r"正当防卫|还手|自卫", ["正当防卫", "防卫过当"]),
+    (r"自首|投案", ["自首", "从轻处罚"]),
+    (r"坐牢|判几年|判多久|会判刑|判刑", ["刑事责任", "量刑", "有期徒刑"]),
+    (r"取保候审|保释", ["取保候审", "强制措施"]),
+    # 公司、程序
+    (r"股东|股权|分红", ["股东权利", "股权", "公司法"]),
+    (r"公司倒闭|破产|跑路", ["企业破产", "债权申报", "清算"]),
+    (r"起诉|打官司|告他|告到法院|上法院", ["民事诉讼", "起诉条件", "管辖"]),
+    (r"诉讼时效|过了多久.{0,4}(不能|还能)告|时效", ["诉讼时效", "时效期间"]),
+    (r"上诉", ["上诉", "上诉期限", "二审程序"]),
+    (r"强制执行|执行不了|判了不给|不执行判决", ["强制执行", "失信被执行人"]),
+    (r"律师费|诉讼费|打官司.{0,4}钱", ["诉讼费用", "律师费"]),
+    (r"劳动仲裁|仲裁", ["劳动争议仲裁", "仲裁申请"]),
+    (r"法律援助|请不起律师", ["法律援助", "法律援助条件"]),
+    (r"行政复议", ["行政复议", "复议申请期限"]),
+    (r"告政府|告派出所|行政诉讼", ["行政诉讼", "起诉期限"]),
+    (r"财产保全|冻结.{0,4}(财产|账户)|查封", ["财产保全", "诉前保全"]),
+    (r"执行异议", ["执行异议", "案外人异议"]),
+    (r"不可抗力|天灾|疫情.{0,4}(违约|履行)", ["不可抗力", "免责事由"]),
+]
+
+# 同义词扩展：术语 → [同义词]
+LEGAL_SYNONYMS = {
+    "借款合同": ["民间借贷"],
+    "民间借贷": ["借款合同"],
+    "债务违约": ["逾期还款"],
+    "解除劳动合同": ["劳动合同解除"],
+    "经济补偿": ["经济补偿金"],
+    "工伤赔偿": ["工伤待遇"],
+    "离婚": ["离婚诉讼"],
+    "夫妻共同财产": ["共同财产分割"],
+    "遗产继承": ["继承纠纷"],
+    "损害赔偿": ["赔偿责任"],
+    "交通事故": ["交通事故责任"],
+    "名誉权": ["人格权"],
+    "诈骗罪": ["诈骗"],
+    "房屋租赁合同": ["租赁合同"],
+    "消费欺诈": ["经营者欺诈"],
+}
+
+# 口语虚词、疑问表达和人称（去除后不计入覆盖率）
+FILLER_PATTERN = re.compile(
+    r"请问一下|请问|想问一下|想问问|想咨询一下|想咨询|咨询一下|我想知道|想知道|帮我看看|帮忙看看|"
+    r"怎么办才好|该怎么办|怎么办|咋办|咋整|怎么处理|如何处理|怎么弄|怎么样|怎么|咋|如何|"
+    r"能不能|可不可以|可以吗|行不行|是不是|有没有|会不会|应不应该|应该|需要|"
+    r"为什么|为啥|什么|哪些|多少|"
+    r"我们|我|你们|你|他们|他|她|它|咱们|对方|别人|人家|"
+    r"现在|已经|一直|还是|还能|还|就|都|也|又|才|"
+    r"一个|这个|那个|这种|那种|这样|那样|一下|一些|有点|"
+    r"了|的|地|得|着|过|吗|呢|吧|啊|呀|嘛|哦|啦|么|"
+    r"能|要|想|可以|让|给|被|把|和|跟|与|在|是|有|没|不|会|去|来|说|人|谁|"
+    r"[\s,，。.!！?？、;；:：\"“”'‘’()（）]"
+)
+
+# 常见的通用词：计入覆盖（词典认识），但不单独产生检索术语
+GENERIC_PATTERN = re.compile(
+    r"法律|法院|法规|规定|责任|赔偿|补偿|权利|义务|违法|合法|犯法|犯罪|处理|解决|合同|协议|"
+    r"申请|认定|计算|情形|构成|条件|程序|流程|标准|"
+    r"公司|单位|老板|员工|朋友|家人|父母|孩子|老婆|老公|丈夫|妻子|对象|"
+    r"钱|时候|之后|以后|以前|期间|问题|情况|事情|事"
+)
+
+# 法条引用"第X条"，与前面的法律名称合为一个检索单元（如"刑法第二十条"）原样保留
+ARTICLE_PATTERN = re.compile(rf"第[ \t　]*{ARTICLE_NUMBER_REGEX}[ \t　]*条")
+# 紧接在"第X条"之前的法律名称（书名号中的名称，或以"法 / 条例 / 规定…"结尾的词，与 statute_index 相同）
+_LAW_BEFORE_PATTERN = re.compile(rf"(?:《([^》]+)》|({LAW_NAME_REGEX}))[ \t　]*$")
+# 没有条文序号、单独出现的法律名称（不含以"规定 / 办法"等常用词结尾的名称，避免把"相关规定"当作法律名称）
+_BARE_LAW_PATTERN = re.compile(r"《([^》]+)》|([一-龥]{1,30}?(?:法典|法|条例))(?![院律官庭]|规(?!定))")
+_LAW_NAME_PATTERN = re.compile(LAW_NAME_REGEX)
+# 以"法"结尾的常用词（"老板不发工资违法"不是法律名称）
+_NOT_LAW_PATTERN = re.compile(r"(?<!法)[违合犯非守执司方办说看想做无没设依手用算]法$")
+# 候选法律名称中最后一个此类词之前的部分不属于名称（"请问民法典""公司违反劳动法"）
+_LAW_PREFIX_PATTERN = re.compile(
+    r"请问|想问|请教|咨询|知道|看看|查查|一下|关于|根据|依据|按照|依照|违反|违背|触犯|适用|参照|相关|有关|具体|"
+    r"我们|你们|他们|现在|已经|如果|因为|是否|是不是|能不能|怎么|什么|哪些|这个|那个|按"
+)
+_LAW_LEADING_CHARS = set("我你他她被在对用说问看查")
+# 连续引用之间的连接词（"劳动合同法第三十九条和第四十条"中第二个引用沿用前一个法律名称）
+_REFERENCE_JOINER_PATTERN = re.compile(r"[和及与或、,，\s]*|以及")
+# 不带书名号的法律名称长度上限（更长的通常是误把前文当作名称）、允许的两字法律名称
+MAX_LAW_NAME_LENGTH = 12
+SHORT_LAW_NAMES = {"刑法", "民法", "宪法"}
+
+DEFAULT_MAX_TERMS = 6
+DEFAULT_MIN_COVERAGE = 0.6
+
+
+def _law_name(candidate: str, quoted: bool) -> Optional[Tuple[int, str]]:
+    """
+    从候选文字中取出法律名称
+
+    Returns:
+        (名称在候选文字中的起始位置, 规范化的名称)，不像法律名称时为 None
+    """
+    if quoted:
+        return 0, normalize_law_name(candidate)
+    start = 0
+    for match in _LAW_PREFIX_PATTERN.finditer(candidate):
+        start = match.end()
+    while start < len(candidate) and candidate[start] in _LAW_LEADING_CHARS:
+        start += 1
+    name = normalize_law_name(candidate[start:])
+    if not _LAW_NAME_PATTERN.fullmatch(name) or _NOT_LAW_PATTERN.search(name) or len(name) > MAX_LAW_NAME_LENGTH:
+        return None
+    if len(name) < 3 and name not in SHORT_LAW_NAMES:
+        return None
+    return start, name
+
+
+def find_law_references(query: str) -> List[Tuple[int, int, str, bool]]:
+    """
+    查找查询中的法律名称和法条引用
+
+    Returns:
+        [(起始位置, 结束位置, 规范化的引用文字, 是否含条文序号)]，如 "刑法第二十条"、"劳动合同法"
+    """
+    references = []
+    position = 0
+    law = None
+    for match in ARTICLE_PATTERN.finditer(query):
+        before = query[position:match.start()]
+        start = match.start()
+        found = _LAW_BEFORE_PATTERN.search(before)
+        name = _law_name(found.group(1) or found.group(2), bool(found.group(1))) if found else None
+        if name:
+            law = name[1]
+            start = position + found.start() + name[0]
+        elif not (law and _REFERENCE_JOINER_PATTERN.fullmatch(before)):
+            law = None
+        article = re.sub(r"[ \t　]", "", match.group(0))
+        references.append((start, match.end(), f"{law}{article}" if law else article, True))
+        position = match.end()
+
+    # 没有条文序号的法律名称
+    spans = [(start, end) for start, end, _, _ in references]
+    for match in _BARE_LAW_PATTERN.finditer(query):
+        if any(start < match.end() and match.start() < end for start, end in spans):
+            continue
+        quoted = match.group(1) is not None
+        name = _law_name(match.group(1) if quoted else match.group(2), quoted)
+        if name:
+            references.append((match.start() + (0 if quoted else name[0]), match.end(), name[1], False))
+    return sorted(references)
+
+
+class LexiconRewrite(NamedTuple):
+    """词典改写结果"""
+    text: str            # 改写后的关键词（空格分隔，没有识别出任何术语时为空字符串）
+    terms: List[str]     # 改写后的术语（含同义词扩展）
+    coverage: float      # 去除虚词后的问题被词典规则 / 法律术语覆盖的字数比例
+
+
+class LexiconRewriter:
+    """基于口语 → 法律术语词典的本地查询改写器"""
+
+    def __init__(
+        self,
+        lexicon: Sequence[tuple] = REWRITE_LEXICON,
+        synonyms: Optional[Dict[str, List[str]]] = None,
+        max_terms: int = DEFAULT_MAX_TERMS
+    ):
+        """
+        Args:
+            lexicon: 词典规则 (正则, [术语])
+            synonyms: 同义词表（None 表示使用 LEGAL_SYNONYMS）
+            max_terms: 改写结果最多包含的术语数量（同义词扩展不会超过该数量）
+        """
+        self.lexicon = [(re.compile(pattern), list(terms)) for pattern, terms in lexicon]
+        self.synonyms = LEGAL_SYNONYMS if synonyms is None else synonyms
+        self.max_terms = max_terms
+        # 问题中已经出现的术语（词典输出的术语和同义词）原样保留，长的优先
+        vocabulary = {term for _, terms in self.lexicon for term in terms}
+        vocabulary.update(term for terms in self.synonyms.values() for term in terms)
+        vocabulary.update(self.synonyms)
+        self.vocabulary_pattern = re.compile(
+            "|".join(re.escape(term) for term in sorted(vocabulary, key=len, reverse=True))) if vocabulary else None
+
+    @classmethod
+    def load(cls, path, **kwargs) -> "LexiconRewriter":
+        """内置词典 + JSON 文件中补充的规则（补充规则优先匹配）和同义词"""
+        with open(path, "r", encoding="utf-8") as f:
+            extra = json.load(f)
+        lexicon = [tuple(rule) for rule in extra.get("lexicon", [])] + list(REWRITE_LEXICON)
+        synonyms = {**LEGAL_SYNONYMS, **extra.get("synonyms", {})}
+        return cls(lexicon=lexicon, synonyms=synonyms, **kwargs)
+
+    def _match(self, query: str) -> Tuple[List[Tuple[int, str]], List[bool], List[bool]]:
+        """返回 [(位置, 术语)]、每个字是否被覆盖、每个字是否属于没有条文序号的法律名称"""
+        covered = [False] * len(query)
+        laws = [False] * len(query)
+        found: List[Tuple[int, str]] = []
+        # 法条引用（"刑法第二十条"）和法律名称作为一个单元原样保留；单独的法律名称不计入覆盖，
+        # 词典只认识问题的其余部分，是否有关该法律的问题交给 LLM 改写判断
+        for start, end, text, has_article in find_law_references(query):
+            found.append((start, text))
+            covered[start:end] = [True] * (end - start)
+            if not has_article:
+                laws[start:end] = [True] * (end - start)
+        # 问题中已有的法律术语原样保留（之后仍可由词典规则扩展）
+        if self.vocabulary_pattern:
+            for match in self.vocabulary_pattern.finditer(query):
+                if any(covered[match.start():match.end()]):
+                    continue
+                found.append((match.start(), match.group(0)))
+                covered[match.start():match.end()] = [True] * (match.end() - match.start())
+        claimed = [False] * len(query)  # 已被前面的词典规则匹配的字
+        for pattern, terms in self.lexicon:
+            for match in pattern.finditer(query):
+                if match.end() == match.start() or all(claimed[match.start():match.end()]):
+                    continue
+                if any(laws[match.start():match.end()]):
+                    continue  # 法律名称中的字（如"劳动合同法"中的"劳动合同"）不再匹配词典规则
+                found.extend((match.start(), term) for term in terms)
+                claimed[match.start():match.end()] = [True] * (match.end() - match.start())
+                covered[match.start():match.end()] = [True] * (match.end() - match.start())
+        for i, is_law in enumerate(laws):
+            if is_law:
+                covered[i] = False
+        return found, covered, laws
+
+    def rewrite(self, query: str) -> LexiconRewrite:
+        """
+        改写查询
+
+        Returns:
+            LexiconRewrite（调用方根据 coverage 决定是否回退到 LLM 改写）
+        """
+        found, covered, laws = self._match(query)
+        for match in GENERIC_PATTERN.finditer(query):
+            if not any(laws[match.start():match.end()]):
+                covered[match.start():match.end()] = [True] * (match.end() - match.start())
+        fillers = [False] * len(query)
+        for match in FILLER_PATTERN.finditer(query):
+            if not any(laws[match.start():match.end()]):
+                fillers[match.start():match.end()] = [True] * (match.end() - match.start())
+        # 覆盖率只统计实词：被虚词规则去除、又没有被术语覆盖的字不计入分母
+        content = [i for i in range(len(query)) if covered[i] or not fillers[i]]
+        coverage = sum(covered[i] for i in content) / len(content) if content else 0.0
+
+        terms: List[str] = []
+        for _, term in sorted(found, key=lambda item: item[0]):
+            if term not in terms:
+                terms.append(term)
+        terms = terms[:self.max_terms]
+        for term in list(terms):
+            for synonym in self.synonyms.get(term, []):
+                if len(terms) >= self.max_terms:
+                    break
+                if synonym not in terms:
+                    terms.append(synonym)
+        return LexiconRewrite(" ".join(terms), terms, coverage)
+
+
+def create_lexicon_rewriter(path: Optional[str] = None, **kwargs) -> LexiconRewriter:
+    """
+    创建词典改写器（工厂函数）
+
+    Args:
+        path: 补充词典 JSON 文件（不存在时只使用内置词典）
+        **kwargs: 见 LexiconRewriter
+    """
+    if path and Path(path).exists():
+        return LexiconRewriter.load(path, **kwargs)
+    return LexiconRewriter(**kwargs)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+知识库在线更新模块
+功能：在不重新构建知识库的情况下新增 / 替换 / 删除文档（如紧急的法条修订）
+
+  - 更新日志（UpdateLog）：每个知识库版本一个追加写的 JSONL 预写日志，
+    记录切分后的文档块和已归一化的向量（base64 编码的 float32），API 重启或其他 worker 通过重放日志得到相同状态
+  - 叠加层（OverlayVectorStore）：只读的基础向量库 + 内存中的增量文档块 + 删除标记（tombstone），
+    每批更新生成一个新的不可变叠加层，由 kb_registry 原子替换，
+    进行中的请求继续使用旧叠加层，不会读到只应用了一半的更新
+
+文档以 doc_id 标识（写入文档块元数据的 source 字段），
+更新同一 doc_id 时先删除该文档之前的所有文档块，再写入新的文档块
+"""
+
+import base64
+import fcntl
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.core.retrieval import Candidate, ChunkFetcher, document_chunk_id, retrieve_candidates
+from src.core.vector_index import ExactIndex, normalize_vectors
+from src.core.vector_store import FlashVectorStore
+
+UPDATES_DIR = "updates"
+# 基础向量库中被删除的文档块会占用检索名额，按删除数量多取候选（上限）
+MAX_TOMBSTONE_OVERFETCH = 200
+
+
+def update_log_path(base_dir, version: Optional[str]) -> Path:
+    """知识库版本对应的更新日志路径（旧版单一目录使用 default）"""
+    return Path(base_dir) / UPDATES_DIR / f"{version or 'default'}.jsonl"
+
+
+class UpdateLog:
+    """追加写的更新日志（JSONL），多个进程通过文件锁互斥写入"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def append(self, record: dict) -> int:
+        """追加一条更新记录，返回写入后的文件长度"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.write(line)
+                f.flush()
+                return f.tell()
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def read(self, offset: int = 0) -> Tuple[List[dict], int]:
+        """
+        从 offset 开始读取完整的更新记录
+
+        Returns:
+            (记录列表, 新的 offset)；未写完的最后一行留到下次读取
+        """
+        if not self.path.exists():
+            return [], offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        records = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return records, offset + end
+
+
+def _encode_vector(vector: np.ndarray) -> str:
+    """float32 向量编码为 base64（比 JSON 浮点数组更紧凑，编解码更快）"""
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+def make_upsert_record(doc_ids: List[str], chunks: List[Document], vectors) -> dict:
+    """
+    构建新增 / 替换文档的更新记录
+
+    Args:
+        doc_ids: 被替换的文档 ID（这些文档之前的文档块全部删除）
+        chunks: 切分后的文档块（带文档块 ID）
+        vectors: 文档块向量
+    """
+    vectors = normalize_vectors(vectors)
+    return {
+        "op": "upsert",
+        "timestamp": time.time(),
+        "doc_ids": list(doc_ids),
+        "chunks": [
+            {
+                "id": chunk.id,
+                "text": chunk.page_content,
+                "metadata": chunk.metadata,
+                "vector": _encode_vector(vector),
+            }
+            for chunk, vector in zip(chunks, vectors)
+        ],
+    }
+
+
+def make_delete_record(doc_ids: Sequence[str] = (), chunk_ids: Sequence[str] = ()) -> dict:
+    """构建删除文档 / 文档块的更新记录"""
+    return {
+        "op": "delete",
+        "timestamp": time.time(),
+        "doc_ids": list(doc_ids),
+        "chunk_ids": list(chunk_ids),
+    }
+
+
+class _SourceIndex:
+    """基础向量库的 doc_id（元数据 source）→ 文档块 ID 映射，首次使用时构建，同一基础库的所有叠加层共享"""
+
+    def __init__(self, base: VectorStore):
+        self._base = base
+        self._mapping: Optional[Dict[str, List[str]]] = None
+
+    def chunk_ids(self, source: str) -> List[str]:
+        if isinstance(self._base, FlashVectorStore):
+            if self._mapping is None:
+                mapping: Dict[str, List[str]] = {}
+                for chunk_id, metadata in zip(self._base._ids, self._base._metadatas):
+                    mapping.setdefault((metadata or {}).get("source", ""), []).append(chunk_id)
+                self._mapping = mapping
+            return self._mapping.get(source, [])
+        if hasattr(self._base, "source_chunk_ids"):
+            # 分片知识库：由各分片查询
+            return self._base.source_chunk_ids(source)
+        # Chroma：按元数据过滤查询，ID 与检索阶段的 document_chunk_id 保持一致
+        result = self._base.get(where={"source": source}, include=["metadatas", "documents"])
+        return [
+            document_chunk_id(Document(page_content=text, metadata=metadata or {}))
+            for text, metadata in zip(result["documents"], result["metadatas"])
+        ]
+
+
+class OverlayVectorStore(VectorStore):
+    """基础向量库 + 增量文档块 + 删除标记的不可变叠加层"""
+
+    def __init__(
+        self,
+        base: VectorStore,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[dict],
+        vectors: np.ndarray,
+        tombstones: frozenset,
+        source_index: Optional[_SourceIndex] = None
+    ):
+        """
+        Args:
+            base: 只读的基础向量库（faiss 或 Chroma）
+            ids / texts / metadatas / vectors: 增量文档块
+            tombstones: 基础向量库中已删除（或被替换）的文档块 ID
+            source_index: 基础向量库的 doc_id → 文档块 ID 映射
+        """
+        self.base = base
+        self.tombstones = tombstones
+        self._source_index = source_index or _SourceIndex(base)
+        self._ids, self._texts, self._metadatas, self._vectors = ids, texts, metadatas, vectors
+        self.delta = FlashVectorStore(
+            base.embeddings,
+            ExactIndex(vectors.shape[1], vectors),
+            texts, metadatas, ids,
+        ) if len(ids) else None
+
+    @classmethod
+    def wrap(cls, base: VectorStore) -> "OverlayVectorStore":
+        """以基础向量库创建空叠加层"""
+        if isinstance(base, OverlayVectorStore):
+            return base
+        return cls(base, [], [], [], np.zeros((0, 0), dtype=np.float32), frozenset())
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.base.embeddings
+
+    def stats(self) -> dict:
+        return {"delta_chunks": len(self._ids), "tombstones": len(self.tombstones)}
+
+    # ------------------------------------------------------------------
+    # 更新
+    # ------------------------------------------------------------------
+    def apply(self, records: List[dict]) -> "OverlayVectorStore":
+        """应用一批更新记录，返回新的叠加层（自身不变）"""
+        ids, texts, metadatas = list(self._ids), list(self._texts), list(self._metadatas)
+        rows = list(self._vectors) if len(self._ids) else []
+        tombstones = set(self.tombstones)
+
+        for record in records:
+            removed = set(record.get("chunk_ids", []))
+            doc_ids = set(record.get("doc_ids", []))
+            for doc_id in doc_ids:
+                tombstones.update(self._source_index.chunk_ids(doc_id))
+            tombstones.update(removed)
+            keep = [
+                i for i, (chunk_id, metadata) in enumerate(zip(ids, metadatas))
+                if chunk_id not in removed and metadata.get("source") not in doc_ids
+            ]
+            ids = [ids[i] for i in keep]
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            rows = [rows[i] for i in keep]
+            if record.get("op") == "upsert":
+                for chunk in record["chunks"]:
+                    ids.append(chunk["id"])
+                    texts.append(chunk["text"])
+                    metadatas.append(chunk.get("metadata") or {})
+                    rows.append(_decode_vector(chunk["vector"]))
+
+        vectors = np.ascontiguousarray(np.stack(rows)) if rows else np.zeros((0, 0), dtype=np.float32)
+        return OverlayVectorStore(
+            self.base, ids, texts, metadatas, vectors, frozenset(tombstones), self._source_index
+        )
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+    def retrieve_candidates(
+        self, kb: str, query_vectors: List[List[float]], k: int, fetcher: ChunkFetcher
+    ) -> List[List[Candidate]]:
+        """分别检索基础向量库（过滤删除标记）和增量文档块，按分数合并"""
+        overfetch = min(len(self.tombstones), MAX_TOMBSTONE_OVERFETCH)
+        base_rows = retrieve_candidates(kb, self.base, query_vectors, k + overfetch, fetcher)
+        if self.delta is not None:
+            delta_rows = retrieve_candidates(kb, self.delta, query_vectors, k, fetcher)
+        else:
+            delta_rows = [[] for _ in query_vectors]
+        results = []
+        for base_row, delta_row in zip(base_rows, delta_rows):
+            merged = [c for c in base_row if c.chunk_id not in self.tombstones] + delta_row
+            merged.sort(key=lambda c: c.score, reverse=True)
+            results.append(merged[:k])
+        return results
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        """按 ID 读取文档块：增量文档块优先，其余从基础向量库读取"""
+        found = {doc.id: doc for doc in self.delta.get_by_ids(ids)} if self.delta is not None else {}
+        rest = [chunk_id for chunk_id in ids if chunk_id not in found and chunk_id not in self.tombstones]
+        if rest:
+            for doc in self.base.get_by_ids(rest):
+                found[document_chunk_id(doc)] = doc
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        fetcher = ChunkFetcher({"_": self})
+        candidates = self.retrieve_candidates("_", [embedding], k, fetcher)[0]
+        return [
+            (doc, candidate.score)
+            for candidate, doc in zip(candidates, fetcher.documents(candidates))
+            if doc is not None
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def add_texts(self, texts, metadatas=None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("叠加层不可直接写入，请通过更新日志提交更新")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs: Any):
+        raise NotImplementedError("叠加层只能由 OverlayVectorStore.wrap 创建")
@@ -0,0 +1,672 @@
+#!/usr/bin/env python3
+"""
+本地模型服务模块
+功能：嵌入模型和 Cross-Encoder 重排序模型在独立进程中只加载一次，同一台机器上的所有 API worker 通过 Unix socket
+调用（worker 不再各自加载一份模型权重，模型推理也不再占用 worker 的 GIL 和事件循环）
+  - 协议：每条消息为 4 字节长度（大端）+ UTF-8 JSON；一个连接上请求-响应依次进行
+  - 数组（文档向量、预先切分的 token ID）不超过 INLINE_ARRAY_BYTES 时直接内联在 JSON 中（如单条查询的向量），
+    较大的放在共享内存（multiprocessing.shared_memory）中，消息里只传名称、形状和类型：
+    请求中的共享内存段由服务端复制后释放（unlink），客户端请求失败（超时 / 断开）时自行释放；
+    响应中的共享内存段归服务端所有，客户端复制后发送 release 通知（无响应），
+    未收到通知时在连接关闭或超过 --segment-ttl 秒后由服务端释放
+  - 动态批处理：每个模型一个后台线程，合并 --max-wait-ms 内到达的请求（最多 --max-batch-items 条文本 / 查询-文档对）
+    一次推理，推理内部仍按长度分桶（见 batching）
+客户端：RemoteEmbeddings（LangChain Embeddings 接口）/ RemoteReranker（与 Reranker 的 rerank_ids / score_tokens / score 相同）
+
+使用方法：
+    python src/core/model_server.py --socket /tmp/legalflash-models.sock \
+        --reranker BAAI/bge-reranker-base --reranker cross-encoder/ms-marco-MiniLM-L-6-v2
+    MODEL_SERVER_SOCKET=/tmp/legalflash-models.sock uvicorn src.api.main:app --workers 4
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.batching import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_PADDING_RATIO, LengthBucketer
+from src.core.thread_budget import apply_thread_budget_from_env
+
+DEFAULT_SOCKET_PATH = "/tmp/legalflash-models.sock"
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_RERANK_MODEL = "BAAI/bge-reranker-base"
+# 动态批处理：等待后续请求的最长时间（毫秒）和一次合并的最多文本 / 查询-文档对数
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_MAX_BATCH_ITEMS = 256
+# 不超过该字节数的数组内联在 JSON 中（base64），不创建共享内存段
+INLINE_ARRAY_BYTES = 64 * 1024
+# 响应中的共享内存段在客户端未发送 release 时最多保留的时间（秒）
+DEFAULT_SEGMENT_TTL = 60.0
+
+HEADER = struct.Struct("!I")
+
+
+class ModelServerError(RuntimeError):
+    """模型服务不可用或返回错误"""
+
+
+# ----------------------------------------------------------------------
+# 共享内存数组
+# ----------------------------------------------------------------------
+def put_array(array: np.ndarray) -> dict:
+    """把数组写入新的共享内存段，返回描述（由接收方 take_array 释放）"""
+    array = np.ascontiguousarray(array)
+    segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+    # 共享内存段由接收方释放，创建方的 resource_tracker 不再跟踪（否则进程退出时会提前删除并告警）
+    resource_tracker.unregister(segment._name, "shared_memory")
+    segment.close()
+    return {"shm": segment.name, "shape": list(array.shape), "dtype": array.dtype.str}
+
+
+def inline_array(array: np.ndarray) -> dict:
+    """把数组内联为 base64（与共享内存描述使用相同的 shape / dtype 字段）"""
+    array = np.ascontiguousarray(array)
+    return {"data": base64.b64encode(array.tobytes()).decode("ascii"), "shape": list(array.shape),
+            "dtype": array.dtype.str}
+
+
+def encode_array(array: np.ndarray) -> dict:
+    """小数组内联，较大的数组放入共享内存（由接收方释放）"""
+    if np.asarray(array).nbytes <= INLINE_ARRAY_BYTES:
+        return inline_array(array)
+    return put_array(array)
+
+
+def take_array(desc: dict, unlink: bool = True) -> np.ndarray:
+    """
+    复制出数组（内联或共享内存）
+
+    Args:
+        desc: encode_array / put_array 返回的描述
+        unlink: 是否释放共享内存段（False 表示该段归对方所有，复制后由对方释放）
+    """
+    shape, dtype = tuple(desc["shape"]), np.dtype(desc["dtype"])
+    if "data" in desc:
+        return np.frombuffer(base64.b64decode(desc["data"]), dtype=dtype).reshape(shape).copy()
+    segment = shared_memory.SharedMemory(name=desc["shm"])
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=segment.buf).copy()
+    finally:
+        segment.close()
+        if unlink:
+            segment.unlink()
+        else:
+            # 只是读取对方的共享内存段，本进程的 resource_tracker 不跟踪（否则退出时会误删）
+            resource_tracker.unregister(segment._name, "shared_memory")
+
+
+def discard_array(desc: Optional[dict]):
+    """释放尚未被接收方取走的共享内存段（已被取走或内联的忽略）"""
+    if not desc or "shm" not in desc:
+        return
+    try:
+        segment = shared_memory.SharedMemory(name=desc["shm"])
+    except FileNotFoundError:
+        return
+    segment.close()
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def pack_token_ids(token_ids: Sequence[Optional[Sequence[int]]]) -> Optional[dict]:
+    """预先切分的 token ID（可能有 None）打包为扁平数组 + 偏移（较大时放在共享内存中）"""
+    rows = [i for i, ids in enumerate(token_ids) if ids is not None]
+    if not rows:
+        return None
+    lengths = np.array([len(token_ids[i]) for i in rows], dtype=np.int64)
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    flat = np.concatenate([np.asarray(token_ids[i], dtype=np.int32) for i in rows])
+    return {"rows": rows, "ids": encode_array(flat), "offsets": encode_array(offsets)}
+
+
+def discard_token_ids(packed: Optional[dict]):
+    """请求失败时释放打包 token ID 用的共享内存段"""
+    if packed is not None:
+        discard_array(packed["ids"])
+        discard_array(packed["offsets"])
+
+
+def unpack_token_ids(packed: Optional[dict], count: int) -> Optional[List[Optional[np.ndarray]]]:
+    if packed is None:
+        return None
+    flat, offsets = take_array(packed["ids"]), take_array(packed["offsets"])
+    token_ids: List[Optional[np.ndarray]] = [None] * count
+    for position, row in enumerate(packed["rows"]):
+        token_ids[row] = flat[offsets[position]:offsets[position + 1]]
+    return token_ids
+
+
+# ----------------------------------------------------------------------
+# 消息收发
+# ----------------------------------------------------------------------
+def _encode(message: dict) -> bytes:
+    body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(len(body)) + body
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("模型服务连接已关闭")
+        data.extend(chunk)
+    return bytes(data)
+
+
+async def _read_message(reader: asyncio.StreamReader) -> Optional[dict]:
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    body = await reader.readexactly(HEADER.unpack(header)[0])
+    return json.loads(body.decode("utf-8"))
+
+
+# ----------------------------------------------------------------------
+# 服务端
+# ----------------------------------------------------------------------
+class DynamicBatcher:
+    """后台线程：合并等待时间内到达的请求，一次调用 handler（结果按请求拆分）"""
+
+    def __init__(self, name: str, handler: Callable[[List[Any]], List[Any]],
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS, max_items: int = DEFAULT_MAX_BATCH_ITEMS):
+        """
+        Args:
+            name: 名称（日志和统计使用）
+            handler: 批处理函数，输入各请求的 payload 列表，返回一一对应的结果列表
+            max_wait_ms: 第一个请求到达后等待后续请求的最长时间（毫秒）
+            max_items: 一次合并的最多条目数（各请求的 size 之和）
+        """
+        self.name = name
+        self.handler = handler
+        self.max_wait = max_wait_ms / 1000
+        self.max_items = max_items
+        self.batches = 0
+        self.requests = 0
+        self._queue: "queue.Queue[Tuple[Any, int, Future]]" = queue.Queue()
+        threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True).start()
+
+    def submit(self, payload: Any, size: int) -> Future:
+        future: Future = Future()
+        self._queue.put((payload, size, future))
+        return future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "requests_per_batch": round(self.requests / max(self.batches, 1), 2),
+        }
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            items = batch[0][1]
+            deadline = time.perf_counter() + self.max_wait
+            while items < self.max_items:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                items += batch[-1][1]
+            try:
+                results = self.handler([payload for payload, _, _ in batch])
+                for (_, _, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.requests += len(batch)
+
+
+class ModelServer:
+    """本地模型服务：加载一次嵌入模型和重排序模型，通过 Unix socket 提供批量嵌入 / 打分"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, embeddings=None, embedding_model: str = "",
+                 rerankers: Optional[Dict[str, Any]] = None, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS, segment_ttl: float = DEFAULT_SEGMENT_TTL):
+        """
+        Args:
+            socket_path: Unix socket 路径
+            embeddings: 嵌入模型（BucketedEmbeddings），None 表示不提供嵌入
+            embedding_model: 嵌入模型名称（客户端据此检查与知识库一致）
+            rerankers: 请求使用的模型名称 → Reranker
+            max_wait_ms: 动态批处理的最长等待时间（毫秒）
+            max_batch_items: 动态批处理一次合并的最多条目数
+            segment_ttl: 响应中的共享内存段在客户端未发送 release 时最多保留的时间（秒）
+        """
+        self.socket_path = socket_path
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+        self.rerankers = rerankers or {}
+        self.segment_ttl = segment_ttl
+        # 响应中尚未释放的共享内存段：名称 → (共享内存段, 截止时间)，只在事件循环线程中访问
+        self._segments: Dict[str, Tuple[shared_memory.SharedMemory, float]] = {}
+        self.batchers: Dict[str, DynamicBatcher] = {}
+        if embeddings is not None:
+            self.batchers["embed"] = DynamicBatcher("embed", self._embed, max_wait_ms, max_batch_items)
+        for name, reranker in self.rerankers.items():
+            self.batchers[f"score:{name}"] = DynamicBatcher(
+                f"score:{name}", self._scorer(reranker), max_wait_ms, max_batch_items)
+
+    def _embed(self, payloads: List[List[str]]) -> List[np.ndarray]:
+        texts = [text for texts in payloads for text in texts]
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        results, position = [], 0
+        for texts in payloads:
+            results.append(vectors[position:position + len(texts)])
+            position += len(texts)
+        return results
+
+    @staticmethod
+    def _scorer(reranker) -> Callable[[List[tuple]], List[tuple]]:
+        def score(payloads: List[tuple]) -> List[tuple]:
+            # 分词 / 推理耗时是整个合并批次的，随结果返回给批次中的每个请求
+            timings: Dict[str, float] = {}
+            return [(scores, timings) for scores in reranker.score_batch(payloads, timings)]
+        return score
+
+    def info(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "embedding": self.embedding_model if self.embeddings is not None else None,
+            "rerankers": {
+                name: {"model_name": reranker.model_name, "pretokenized": reranker.pretokenized}
+                for name, reranker in self.rerankers.items()
+            },
+        }
+
+    def stats(self) -> dict:
+        return {
+            "embedding": self.embeddings.stats.report() if self.embeddings is not None else {},
+            "rerankers": {name: reranker.batch_stats.report() for name, reranker in self.rerankers.items()},
+            "dynamic_batching": {name: batcher.stats() for name, batcher in self.batchers.items()},
+            "shared_memory_segments": len(self._segments),
+        }
+
+    def _put_result(self, array: np.ndarray, owned: set) -> dict:
+        """
+        响应中的数组：小数组内联；较大的放入服务端所有的共享内存段，
+        客户端 release、连接关闭或超过 segment_ttl 时释放（本进程的 resource_tracker 继续跟踪，服务退出时兜底删除）
+        """
+        array = np.ascontiguousarray(array)
+        if array.nbytes <= INLINE_ARRAY_BYTES:
+            return inline_array(array)
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+        self._segments[segment.name] = (segment, time.monotonic() + self.segment_ttl)
+        owned.add(segment.name)
+        return {"shm": segment.name, "shape": list(array.shape), "dtype": array.dtype.str}
+
+    def _release_segments(self, names) -> int:
+        released = 0
+        for name in list(names):
+            entry = self._segments.pop(name, None)
+            if entry is None:
+                continue
+            segment = entry[0]
+            segment.close()
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+            released += 1
+        return released
+
+    async def _expire_segments(self):
+        """定期释放超过 segment_ttl 仍未被客户端 release 的共享内存段"""
+        while True:
+            await asyncio.sleep(max(1.0, min(self.segment_ttl, 30.0) / 2))
+            now = time.monotonic()
+            expired = [name for name, (_, deadline) in self._segments.items() if deadline <= now]
+            if self._release_segments(expired):
+                print(f"⚠️  {len(expired)} 个共享内存段超过 {self.segment_ttl:.0f}s 未被客户端释放，已回收")
+
+    async def _dispatch(self, message: dict, owned: set) -> dict:
+        op = message.get("op")
+        if op == "info":
+            return self.info()
+        if op == "stats":
+            return self.stats()
+        if op == "embed":
+            if "embed" not in self.batchers:
+                raise ModelServerError("模型服务没有加载嵌入模型")
+            texts = message["texts"]
+            vectors = await asyncio.wrap_future(self.batchers["embed"].submit(texts, len(texts)))
+            return {"vectors": self._put_result(vectors, owned)}
+        if op == "score":
+            documents = message["documents"]
+            # 先取出共享内存中的 token ID（即使请求无效也要释放共享内存段）
+            token_ids = unpack_token_ids(message.get("token_ids"), len(documents))
+            batcher = self.batchers.get(f"score:{message['model']}")
+            if batcher is None:
+                raise ModelServerError(f"模型服务没有加载重排序模型: {message['model']}")
+            future = batcher.submit((message["query"], documents, token_ids), len(documents))
+            scores, timings = await asyncio.wrap_future(future)
+            return {"scores": scores, "timings": timings}
+        raise ModelServerError(f"未知的操作: {op}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        owned: set = set()  # 本连接的响应中尚未释放的共享内存段
+        try:
+            while True:
+                message = await _read_message(reader)
+                if message is None:
+                    break
+                if message.get("op") == "release":
+                    # 客户端已复制出响应中的数组（通知，不回复）
+                    self._release_segments(message.get("shm", []))
+                    owned.difference_update(message.get("shm", []))
+                    continue
+                try:
+                    response = await self._dispatch(message, owned)
+                except Exception as e:
+                    response = {"error": f"{type(e).__name__}: {e}"}
+                writer.write(_encode(response))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # 客户端超时 / 断开时不会再取走响应，释放本连接的共享内存段
+            self._release_segments(owned)
+            writer.close()
+
+    async def _serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        print(f"✅ 模型服务已启动: {self.socket_path}（pid {os.getpid()}）")
+        expire_task = asyncio.create_task(self._expire_segments())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            expire_task.cancel()
+
+    def serve_forever(self):
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._release_segments(list(self._segments))
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+# ----------------------------------------------------------------------
+# 客户端
+# ----------------------------------------------------------------------
+class ModelClient:
+    """模型服务客户端（线程安全：每个线程使用自己的连接）"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 30.0):
+        """
+        Args:
+            socket_path: 模型服务的 Unix socket 路径
+            timeout: 单次请求的超时时间（秒）
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise ModelServerError(f"无法连接模型服务 {self.socket_path}: {e}") from e
+            self._local.sock = sock
+        return sock
+
+    def _discard_connection(self, sock: socket.socket):
+        # 连接状态未知（可能读到一半），丢弃该连接，下次请求重新连接；服务端随之释放该连接的共享内存段
+        sock.close()
+        self._local.sock = None
+
+    def request(self, message: dict) -> dict:
+        sock = self._connection()
+        try:
+            sock.sendall(_encode(message))
+            size = HEADER.unpack(_recv_exactly(sock, HEADER.size))[0]
+            response = json.loads(_recv_exactly(sock, size).decode("utf-8"))
+        except (OSError, ConnectionError) as e:
+            self._discard_connection(sock)
+            raise ModelServerError(f"模型服务请求失败: {e}") from e
+        if "error" in response:
+            raise ModelServerError(response["error"])
+        return response
+
+    def notify(self, message: dict):
+        """发送不需要响应的通知（如 release），失败时只丢弃连接"""
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            return
+        try:
+            sock.sendall(_encode(message))
+        except OSError:
+            self._discard_connection(sock)
+
+    def take_result(self, desc: dict) -> np.ndarray:
+        """复制出响应中的数组；服务端共享内存段复制后通知服务端释放"""
+        array = take_array(desc, unlink=False)
+        if "shm" in desc:
+            self.notify({"op": "release", "shm": [desc["shm"]]})
+        return array
+
+    def info(self) -> dict:
+        return self.request({"op": "info"})
+
+    def stats(self) -> dict:
+        return self.request({"op": "stats"})
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self.take_result(self.request({"op": "embed", "texts": list(texts)})["vectors"])
+
+    def score(self, model: str, query: str, documents: List[str],
+              token_ids: Optional[Sequence[Optional[Sequence[int]]]] = None) -> Tuple[List[float], Dict[str, float]]:
+        """返回 (分数, 服务端所在合并批次的分词 / 推理耗时)"""
+        message = {"op": "score", "model": model, "query": query, "documents": list(documents)}
+        if token_ids is not None:
+            message["token_ids"] = pack_token_ids(token_ids)
+        try:
+            response = self.request(message)
+        except ModelServerError:
+            # 超时 / 断开时服务端可能还没有取走 token ID，由客户端释放（已取走的忽略）
+            discard_token_ids(message.get("token_ids"))
+            raise
+        return response["scores"], response.get("timings", {})
+
+
+class RemoteStats:
+    """模型服务中的批次统计（与 BatchStats.report 的格式相同，服务不可用时为空）"""
+
+    def __init__(self, client: ModelClient, *path: str):
+        self.client = client
+        self.path = path
+
+    def report(self) -> Dict[str, dict]:
+        try:
+            stats = self.client.stats()
+        except ModelServerError:
+            return {}
+        for key in self.path:
+            stats = stats.get(key, {})
+        return stats
+
+
+class RemoteEmbeddings(Embeddings):
+    """通过模型服务计算向量的 Embeddings（批量嵌入和单条查询都由服务端动态合批）"""
+
+    def __init__(self, client: ModelClient, model_name: str):
+        """
+        Args:
+            client: 模型服务客户端
+            model_name: 期望的嵌入模型名称（与服务端加载的模型不一致时报错，避免与知识库向量不匹配）
+        """
+        served = client.info().get("embedding")
+        if served != model_name:
+            raise ModelServerError(f"模型服务的嵌入模型 {served} 与 {model_name} 不一致")
+        self.client = client
+        self.model_name = model_name
+        self.stats = RemoteStats(client, "embedding")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        # HuggingFaceEmbeddings 的查询与文档编码方式相同，查询也走批量接口
+        return self.client.embed([text])[0].tolist()
+
+
+class RemoteReranker:
+    """通过模型服务打分的重排序器（接口与 Reranker 相同，可作为 CascadeReranker 的任一级）"""
+
+    def __init__(self, client: ModelClient, model_name: str = DEFAULT_RERANK_MODEL):
+        """
+        Args:
+            client: 模型服务客户端
+            model_name: 服务端加载时使用的模型名称
+        """
+        served = client.info()["rerankers"].get(model_name)
+        if served is None:
+            raise ModelServerError(f"模型服务没有加载重排序模型: {model_name}")
+        self.client = client
+        self.name = model_name
+        self.model_name = served["model_name"]  # 实际加载的模型（可能是备用模型），分词缓存按它匹配
+        self.pretokenized = served["pretokenized"]
+        self.batch_stats = RemoteStats(client, "rerankers", model_name)
+
+    def score_tokens(self, query: str, documents: List[str],
+                     token_ids: Optional[Sequence[Optional[Sequence[int]]]] = None,
+                     timings: Optional[Dict[str, float]] = None) -> List[float]:
+        if not documents:
+            return []
+        start = time.perf_counter()
+        scores, server_timings = self.client.score(self.name, query, documents,
+                                                   token_ids if self.pretokenized else None)
+        if timings is not None:
+            # tokenize / inference 为服务端合并批次的耗时，remote 为包含排队和传输的往返耗时
+            for key, seconds in server_timings.items():
+                timings[key] = timings.get(key, 0.0) + seconds
+            timings["remote"] = timings.get("remote", 0.0) + time.perf_counter() - start
+        return scores
+
+    def rerank_ids(self, query: str, ids: List[Any], documents: List[str], top_k: int = 5,
+                   token_ids: Optional[Sequence[Optional[Sequence[int]]]] = None,
+                   timings: Optional[Dict[str, float]] = None,
+                   info: Optional[Dict[str, int]] = None) -> List[Tuple[Any, float]]:
+        if info is not None:
+            info.update(first_stage=0, second_stage=len(documents))
+        if not documents:
+            return []
+        scores = self.score_tokens(query, documents, token_ids=token_ids, timings=timings)
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+        return [(ids[i], float(scores[i])) for i in order[:top_k]]
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        return self.score_tokens(query, documents)
+
+
+def connect_model_server(socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 30.0,
+                         wait: float = 0.0) -> ModelClient:
+    """
+    连接模型服务（工厂函数）
+
+    Args:
+        socket_path: Unix socket 路径
+        timeout: 单次请求的超时时间（秒）
+        wait: 服务尚未启动时最多等待的时间（秒）
+    """
+    client = ModelClient(socket_path, timeout=timeout)
+    deadline = time.time() + wait
+    while True:
+        try:
+            client.info()
+            return client
+        except ModelServerError:
+            if time.time() >= deadline:
+                raise
+            time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模型服务（嵌入 + 重排序，Unix socket + 共享内存）")
+    parser.add_argument("--socket", type=str, default=os.getenv("MODEL_SERVER_SOCKET") or DEFAULT_SOCKET_PATH)
+    parser.add_argument("--embedding-model", type=str, default=DEFAULT_EMBEDDING_MODEL,
+                        help="嵌入模型（需与构建知识库时一致），空字符串表示不加载")
+    parser.add_argument("--reranker", type=str, action="append", default=None,
+                        help=f"重排序模型，可重复指定（默认 {DEFAULT_RERANK_MODEL}；级联重排序时同时加载两级模型）")
+    parser.add_argument("--device", type=str, default=None, help="cuda / cpu（默认自动选择）")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS, help="动态批处理的最长等待时间")
+    parser.add_argument("--max-batch-items", type=int, default=DEFAULT_MAX_BATCH_ITEMS,
+                        help="动态批处理一次合并的最多文本 / 查询-文档对数")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE, help="每个推理批次的最多序列数")
+    parser.add_argument("--max-padding-ratio", type=float, default=DEFAULT_MAX_PADDING_RATIO)
+    parser.add_argument("--segment-ttl", type=float, default=DEFAULT_SEGMENT_TTL,
+                        help="响应中的共享内存段在客户端未释放时最多保留的秒数")
+    args = parser.parse_args()
+
+    # CPU 线程预算须在加载模型之前应用：使用 THREAD_BUDGET_RESERVED_CORES 预留的核心（见 thread_budget）
+    apply_thread_budget_from_env(role="server")
+    bucketer = LengthBucketer(max_batch_size=args.max_batch_size, max_padding_ratio=args.max_padding_ratio)
+    embeddings = None
+    if args.embedding_model:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from src.core.batching import BucketedEmbeddings
+
+        print(f"🔄 加载嵌入模型: {args.embedding_model}")
+        model_kwargs = {"device": args.device} if args.device else {}
+        embeddings = BucketedEmbeddings(
+            HuggingFaceEmbeddings(model_name=args.embedding_model, model_kwargs=model_kwargs), bucketer)
+    rerankers = {}
+    if args.reranker != [""]:
+        from src.core.reranker import create_reranker
+
+        for name in args.reranker or [DEFAULT_RERANK_MODEL]:
+            rerankers[name] = create_reranker(model_name=name, device=args.device, bucketer=bucketer)
+
+    ModelServer(
+        args.socket,
+        embeddings=embeddings,
+        embedding_model=args.embedding_model,
+        rerankers=rerankers,
+        max_wait_ms=args.max_wait_ms,
+        max_batch_items=args.max_batch_items,
+        segment_ttl=args.segment_ttl,
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,17 @@
 Query Rewrite (查询改写) 模块
 功能：将用户的口语化问题改写为专业的法律检索关键词
 提升检索准确率，特别是在法律术语匹配方面
+
+改写模式：
+  - llm：每次都调用 vLLM 改写
+  - lexicon：只用本地词典改写（见 lexicon_rewriter），词典识别不出术语时使用原查询
+  - auto：先用词典改写，词典覆盖率低于 min_coverage 时才调用 vLLM
 """
 
+import json
 import os
-from typing import Optional
+import re
+from typing import List, Optional, Tuple
 from pathlib import Path
 import sys
 
@@ -18,25 +25,38 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from src.core.CustomVLLM import CustomVLLM
+from src.core.lexicon_rewriter import DEFAULT_MIN_COVERAGE, LexiconRewriter, create_lexicon_rewriter
+
+REWRITE_MODES = ("llm", "lexicon", "auto")
 
 
 class QueryRewriter:
     """查询改写器，使用 LLM 将用户问题改写为专业检索关键词"""
     
-    def __init__(self, llm: Optional[CustomVLLM] = None, vllm_url: str = "http://localhost:8000"):
+    def __init__(self, llm: Optional[CustomVLLM] = None, vllm_url: str = "http://localhost:8000",
+                 mode: str = "llm", lexicon: Optional[LexiconRewriter] = None,
+                 min_coverage: float = DEFAULT_MIN_COVERAGE):
         """
         初始化查询改写器
         
         Args:
             llm: CustomVLLM 实例，如果为 None 则自动创建
             vllm_url: vLLM 服务地址
+            mode: 改写模式（llm / lexicon / auto）
+            lexicon: 词典改写器（None 表示使用内置词典）
+            min_coverage: auto 模式下使用词典改写结果的最低覆盖率
         """
+        if mode not in REWRITE_MODES:
+            raise ValueError(f"未知的改写模式: {mode}（可选: {', '.join(REWRITE_MODES)}）")
         if llm is None:
             self.llm = CustomVLLM(base_url=vllm_url)
         else:
             self.llm = llm
+        self.mode = mode
+        self.lexicon = lexicon if lexicon is not None or mode == "llm" else create_lexicon_rewriter()
+        self.min_coverage = min_coverage
         
-        # 查询改写提示词模板
+        # 查询改写提示词模板（固定的指令和示例在前、用户问题在最后，不同请求共享 vLLM 的前缀缓存）
         self.rewrite_prompt_template = """你是一个专业的法律检索助手。请将用户的问题改写为适合法律知识库检索的专业关键词或短语。
 
 改写要求：
@@ -61,10 +81,71 @@ class QueryRewriter:
 用户问题：{query}
 
 改写结果（只输出改写后的关键词，不要其他解释）："""
+        
+        # 多变体改写提示词模板：一次调用输出多个不同角度的改写（JSON 数组）；
+        # 变体数量只出现在问题之后，固定前缀与变体数量无关
+        self.multi_rewrite_prompt_template = """你是一个专业的法律检索助手。请将用户的问题从不同角度改写为多组适合法律知识库检索的专业关键词或短语。
+
+改写要求：
+1. 每组都保留原问题的核心法律概念，将口语化表达转换为法律术语
+2. 各组侧重不同：法律术语 / 可能适用的法律名称和条文 / 相关的法律关系或案由
+3. 每组保持简洁，通常不超过20个字
+4. 如果是法律条文查询，保留具体的法律名称和条款关键词
+
+示例：
+- 用户问题："他不还钱咋办？"
+- 改写结果：["债务违约 违约责任 还款义务", "民法典 借款合同 逾期还款", "民间借贷纠纷 债权追讨"]
+
+现在请改写以下问题：
+
+用户问题：{query}
+
+改写结果（只输出一个包含 {n} 个字符串的 JSON 数组，不要其他解释）："""
     
     def rewrite(self, query: str, max_retries: int = 2) -> str:
         """
-        改写用户查询
+        改写用户查询（按改写模式先尝试词典改写，需要时再调用 LLM）
+        
+        Args:
+            query: 原始用户查询
+            max_retries: 最大重试次数（如果改写失败，返回原查询）
+            
+        Returns:
+            改写后的查询关键词
+        """
+        return self.rewrite_with_source(query, max_retries)[0]
+    
+    def rewrite_with_source(self, query: str, max_retries: int = 2) -> Tuple[str, str]:
+        """
+        改写用户查询，同时返回改写来源
+        
+        Returns:
+            (改写后的查询关键词, 来源: "lexicon" / "llm")
+        """
+        local = self.rewrite_local(query)
+        if local is not None:
+            return local, "lexicon"
+        return self.rewrite_llm(query, max_retries), "llm"
+    
+    def rewrite_local(self, query: str) -> Optional[str]:
+        """
+        词典改写（微秒级，不调用 LLM）
+        
+        Returns:
+            改写结果；llm 模式、或 auto 模式下词典覆盖率不足时返回 None（需要 LLM 改写）
+        """
+        if self.mode == "llm" or not query or not query.strip():
+            return None
+        result = self.lexicon.rewrite(query)
+        if self.mode == "lexicon":
+            return result.text or query
+        if result.text and result.coverage >= self.min_coverage:
+            return result.text
+        return None
+    
+    def rewrite_llm(self, query: str, max_retries: int = 2) -> str:
+        """
+        使用 LLM 改写用户查询
         
         Args:
             query: 原始用户查询
@@ -117,6 +198,35 @@ class QueryRewriter:
         
         return query
     
+    def rewrite_variants(self, query: str, n: int = 3, max_retries: int = 2) -> List[str]:
+        """
+        一次 LLM 调用生成多个改写变体
+        
+        Args:
+            query: 原始用户查询
+            n: 变体数量
+            max_retries: 最大重试次数（解析不出任何变体时重试，都失败时返回 [原查询]）
+            
+        Returns:
+            去重后的改写变体（至少一个）
+        """
+        if not query or not query.strip():
+            return [query]
+        if n <= 1:
+            return [self.rewrite_llm(query, max_retries)]
+        
+        prompt = self.multi_rewrite_prompt_template.format(query=query, n=n)
+        for attempt in range(max_retries + 1):
+            try:
+                variants = parse_variants(self.llm(prompt), n)
+                if variants:
+                    print(f"📝 查询改写（{len(variants)} 个变体）: '{query}' -> {variants}")
+                    return variants
+            except Exception as e:
+                print(f"⚠️  多变体查询改写失败 (尝试 {attempt + 1}/{max_retries + 1}): {e}")
+        print(f"⚠️  多变体查询改写失败，使用原查询: '{query}'")
+        return [query]
+    
     def rewrite_batch(self, queries: list, max_retries: int = 2) -> list:
         """
         批量改写查询
@@ -131,16 +241,50 @@ class QueryRewriter:
         return [self.rewrite(query, max_retries) for query in queries]
 
 
-def create_query_rewriter(llm: Optional[CustomVLLM] = None, vllm_url: str = "http://localhost:8000") -> QueryRewriter:
+def parse_variants(response: str, n: int) -> List[str]:
+    """
+    解析多变体改写的输出：优先按 JSON 数组解析，否则按行解析（去掉序号、引号）
+
+    Returns:
+        去重后的变体（最多 n 个，过短或过长的丢弃）
+    """
+    text = response.strip()
+    items = None
+    start, end = text.find("["), text.rfind("]")
+    if start != -1 and end > start:
+        try:
+            parsed = json.loads(text[start:end + 1])
+            # 只接受字符串数组，否则（如 "第[667]条" 被解析成 [667]）按行解析
+            if isinstance(parsed, list) and all(isinstance(item, str) for item in parsed):
+                items = parsed
+        except json.JSONDecodeError:
+            items = None
+    if items is None:
+        items = [re.sub(r"^\s*(?:[-*•]|\d+[.、)）:：]|[（(]\d+[)）])\s*", "", line) for line in text.splitlines()]
+    variants = []
+    for item in items:
+        item = item.strip().strip('"').strip("'").strip("“”").strip()
+        if 3 <= len(item) <= 100 and item not in variants:
+            variants.append(item)
+    return variants[:n]
+
+
+def create_query_rewriter(llm: Optional[CustomVLLM] = None, vllm_url: str = "http://localhost:8000",
+                          mode: str = "llm", lexicon_path: Optional[str] = None,
+                          min_coverage: float = DEFAULT_MIN_COVERAGE) -> QueryRewriter:
     """
     创建查询改写器实例（工厂函数）
     
     Args:
         llm: CustomVLLM 实例
         vllm_url: vLLM 服务地址
+        mode: 改写模式（llm / lexicon / auto）
+        lexicon_path: 补充词典 JSON 文件（不存在时只使用内置词典）
+        min_coverage: auto 模式下使用词典改写结果的最低覆盖率
         
     Returns:
         QueryRewriter 实例
     """
-    return QueryRewriter(llm=llm, vllm_url=vllm_url)
+    lexicon = create_lexicon_rewriter(lexicon_path) if mode != "llm" else None
+    return QueryRewriter(llm=llm, vllm_url=vllm_url, mode=mode, lexicon=lexicon, min_coverage=min_coverage)
 
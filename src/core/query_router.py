@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+查询路由模块
+功能：在检索之前判断问题需要检索哪些知识库、每个知识库取多少候选，
+跳过无关的知识库以减少检索次数和重排序对数
+
+  - 规则特征：条文编号（第X条）、法律名称（《…法》）、案例 / 判决书等关键词
+  - 可选的质心分类器：对已经算好的查询向量，与各知识库的质心（scripts/build_router.py 生成）计算余弦相似度
+  - 两者的分数合并为各知识库的概率，最高概率低于置信度阈值时回退为检索所有知识库
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from src.core.vector_index import normalize_vectors
+
+# 规则特征：(知识库, 正则, 权重)
+ROUTING_RULES = [
+    ("law", r"第[零〇一二两三四五六七八九十百千\d]+条", 3.0),
+    ("law", r"《[^》]{2,30}》", 2.0),
+    ("law", r"[一-龥]{2,12}(法典|法|条例|规定|司法解释)(规定|中|里|的)", 1.5),
+    ("law", r"法条|条文|法律规定|哪条|哪一条|立法|规定了什么|是什么意思|定义|构成要件", 1.5),
+    ("case", r"案例|类似案件|类似的案子|判例|先例|一般怎么判|会怎么判|能赢|胜诉|败诉", 2.5),
+    ("case", r"我|我的|我们|朋友|家人|老板|公司拖欠|怎么办|该如何|能不能|可以吗|吗[？?]?$", 1.0),
+    ("judgement", r"判决书|裁判文书|裁定书|案号|判决结果|法院认为|本院认为", 3.0),
+    ("judgement", r"一审|二审|再审|上诉人|被上诉人|原告|被告|审理|判处|有期徒刑", 1.5),
+]
+# 质心分类器的余弦相似度温度（越大越接近 one-hot）
+DEFAULT_TEMPERATURE = 20.0
+# 规则与分类器同时可用时规则的权重
+DEFAULT_RULE_WEIGHT = 0.5
+# 概率低于最高概率的该比例的知识库不检索
+DEFAULT_SECONDARY_RATIO = 0.5
+
+
+class RoutingDecision(NamedTuple):
+    """路由决策"""
+    budgets: Dict[str, int]          # 要检索的知识库 → 候选数量
+    probabilities: Dict[str, float]  # 各知识库的概率
+    confidence: float                # 最高概率
+    fallback: bool                   # 是否因置信度不足回退为检索全部知识库
+    skipped: List[str]               # 跳过的知识库
+
+    def describe(self) -> str:
+        scores = ", ".join(f"{name}={p:.2f}" for name, p in self.probabilities.items())
+        plan = ", ".join(f"{name}:{k}" for name, k in self.budgets.items())
+        if self.fallback:
+            return f"置信度不足（{scores}），检索全部 {plan}"
+        skipped = f"，跳过 {', '.join(self.skipped)}" if self.skipped else ""
+        return f"{scores} → 检索 {plan}{skipped}"
+
+
+class QueryRouter:
+    """规则 + 可选质心分类器的知识库路由器"""
+
+    def __init__(
+        self,
+        centroids: Optional[Dict[str, np.ndarray]] = None,
+        min_confidence: float = 0.6,
+        temperature: float = DEFAULT_TEMPERATURE,
+        rule_weight: float = DEFAULT_RULE_WEIGHT,
+        secondary_ratio: float = DEFAULT_SECONDARY_RATIO,
+        rules: Sequence[tuple] = ROUTING_RULES
+    ):
+        """
+        Args:
+            centroids: 知识库名称 → 质心向量（None 表示只使用规则）
+            min_confidence: 最高概率低于该值时检索全部知识库
+            temperature: 质心分类器的温度
+            rule_weight: 规则与分类器同时可用时规则分数的权重
+            secondary_ratio: 概率不低于最高概率 × 该比例的知识库也会检索
+            rules: 规则特征 (知识库, 正则, 权重)
+        """
+        self.centroids = {name: normalize_vectors([vector])[0] for name, vector in (centroids or {}).items()}
+        self.min_confidence = min_confidence
+        self.temperature = temperature
+        self.rule_weight = rule_weight
+        self.secondary_ratio = secondary_ratio
+        self.rules = [(name, re.compile(pattern), weight) for name, pattern, weight in rules]
+
+    @classmethod
+    def load(cls, path, **kwargs) -> "QueryRouter":
+        """从 scripts/build_router.py 生成的 .npz 文件加载质心"""
+        data = np.load(path)
+        centroids = {str(name): vector for name, vector in zip(data["names"], data["centroids"])}
+        if "temperature" in data and "temperature" not in kwargs:
+            kwargs["temperature"] = float(data["temperature"])
+        return cls(centroids=centroids, **kwargs)
+
+    def rule_scores(self, texts: Sequence[str], names: Sequence[str]) -> Dict[str, float]:
+        """规则特征得分（命中的规则权重之和，同一规则只计一次）"""
+        scores = {name: 0.0 for name in names}
+        for name, pattern, weight in self.rules:
+            if name in scores and any(pattern.search(text) for text in texts if text):
+                scores[name] += weight
+        return scores
+
+    def classifier_probabilities(self, query_vector, names: Sequence[str]) -> Optional[Dict[str, float]]:
+        """质心分类器概率（没有质心或缺少某个知识库的质心时返回 None）"""
+        if query_vector is None or not all(name in self.centroids for name in names):
+            return None
+        query = normalize_vectors([query_vector])[0]
+        similarities = np.array([float(query @ self.centroids[name]) for name in names])
+        return dict(zip(names, _softmax(similarities * self.temperature)))
+
+    def route(
+        self,
+        query: str,
+        default_budgets: Dict[str, int],
+        query_vector=None,
+        rewritten_query: Optional[str] = None
+    ) -> RoutingDecision:
+        """
+        决定检索哪些知识库及各自的候选数量
+
+        Args:
+            query: 用户原始问题
+            default_budgets: 可用知识库 → 默认候选数量（回退时使用；路由后总数保持不变，按概率分配给选中的知识库）
+            query_vector: 已计算的查询向量（启用分类器时使用）
+            rewritten_query: 改写后的问题（规则同时匹配原问题和改写结果）
+        """
+        names = list(default_budgets)
+        if len(names) <= 1:
+            return RoutingDecision(dict(default_budgets), {name: 1.0 for name in names}, 1.0, False, [])
+
+        rule_scores = self.rule_scores([query, rewritten_query], names)
+        has_rules = any(score > 0 for score in rule_scores.values())
+        rule_probs = dict(zip(names, _softmax(np.array([rule_scores[name] for name in names]))))
+        classifier_probs = self.classifier_probabilities(query_vector, names)
+
+        if classifier_probs is None:
+            probabilities = rule_probs
+        elif not has_rules:
+            probabilities = classifier_probs
+        else:
+            probabilities = {
+                name: self.rule_weight * rule_probs[name] + (1 - self.rule_weight) * classifier_probs[name]
+                for name in names
+            }
+
+        confidence = max(probabilities.values())
+        if confidence < self.min_confidence or (classifier_probs is None and not has_rules):
+            return RoutingDecision(dict(default_budgets), probabilities, confidence, True, [])
+
+        selected = [name for name in names if probabilities[name] >= confidence * self.secondary_ratio]
+        total = sum(default_budgets.values())
+        mass = sum(probabilities[name] for name in selected)
+        budgets = {name: max(1, round(total * probabilities[name] / mass)) for name in selected}
+        skipped = [name for name in names if name not in budgets]
+        return RoutingDecision(budgets, probabilities, confidence, False, skipped)
+
+
+def _softmax(values: np.ndarray) -> List[float]:
+    exp = np.exp(values - values.max())
+    return (exp / exp.sum()).tolist()
+
+
+def create_query_router(centroids_path: Optional[str] = None, **kwargs) -> QueryRouter:
+    """
+    创建查询路由器（工厂函数）
+
+    Args:
+        centroids_path: 质心文件（.npz），不存在时只使用规则
+        **kwargs: 见 QueryRouter
+    """
+    if centroids_path and Path(centroids_path).exists():
+        return QueryRouter.load(centroids_path, **kwargs)
+    return QueryRouter(**kwargs)
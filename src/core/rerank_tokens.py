@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+重排序分词缓存模块
+功能：ingest 时用重排序模型（Cross-Encoder）的分词器预先切分每个文档块，保存 token ID（服务时 mmap 打开），
+重排序时只需对查询分词，查询-文档对直接由缓存的 token ID 拼接、截断，不再每个请求重复切分相同的文档块文本
+
+文件（与向量库同在版本目录下，均为顶层文件，快照可直接复制）：
+  rerank_tokens.json                       配置：分词器名称、每个文档块保存的最大 token 数、文档块数量
+  rerank_chunk_ids.bin / .offsets.npy      按字典序排列的文档块 ID（字符串列，按 ID 查找时在 mmap 上二分）
+  rerank_token_offsets.npy                 第 i 个文档块的 token ID 位于 [offsets[i], offsets[i+1])（int64，长度 N+1）
+  rerank_token_ids.npy                     所有文档块的 token ID 首尾相接（int32，不含特殊 token）
+
+缓存与分词器绑定：服务时加载的重排序模型（含备用模型）与构建时的分词器不一致时不使用缓存；
+在线更新新增 / 替换的文档块不在缓存中，重排序时现场分词
+"""
+
+import bisect
+import copy
+import json
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from src.core.chunk_store import StringColumn, write_column
+
+try:
+    from transformers import AutoTokenizer
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    TRANSFORMERS_AVAILABLE = False
+
+RERANK_TOKENS_CONFIG_FILE = "rerank_tokens.json"
+CHUNK_IDS_COLUMN = "rerank_chunk_ids"
+TOKEN_OFFSETS_FILE = "rerank_token_offsets.npy"
+TOKEN_IDS_FILE = "rerank_token_ids.npy"
+
+DEFAULT_RERANK_MODEL = "BAAI/bge-reranker-base"
+# 每个文档块最多保存的 token 数（Cross-Encoder 的最大输入长度，拼接查询后还会进一步截断）
+DEFAULT_MAX_CHUNK_TOKENS = 512
+
+
+def is_rerank_token_cache(directory) -> bool:
+    return (Path(directory) / RERANK_TOKENS_CONFIG_FILE).exists()
+
+
+def build_rerank_tokens(directory, ids: Sequence[str], texts: Sequence[str],
+                        tokenizer_name: str = DEFAULT_RERANK_MODEL, max_tokens: int = DEFAULT_MAX_CHUNK_TOKENS,
+                        batch_size: int = 256) -> Optional[dict]:
+    """
+    预先切分文档块并写入目录（transformers 不可用或分词器加载失败时跳过，返回 None）
+
+    Args:
+        directory: 知识库版本目录
+        ids: 文档块 ID
+        texts: 文档块文本
+        tokenizer_name: 重排序模型名称（使用其分词器）
+        max_tokens: 每个文档块最多保存的 token 数
+        batch_size: 每批分词的文档块数量
+
+    Returns:
+        rerank_tokens.json 内容
+    """
+    if not TRANSFORMERS_AVAILABLE:
+        print("⚠️  transformers 未安装，跳过重排序分词缓存")
+        return None
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    except Exception as e:
+        print(f"⚠️  重排序分词器加载失败: {e}，跳过重排序分词缓存")
+        return None
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # 按 ID 排序写入，服务时直接在 ID 列上二分
+    order = sorted(range(len(ids)), key=lambda i: ids[i])
+    lengths = np.zeros(len(order), dtype=np.int64)
+    pieces = []
+    for start in range(0, len(order), batch_size):
+        batch = [texts[i] or "" for i in order[start:start + batch_size]]
+        encoded = tokenizer(batch, add_special_tokens=False, truncation=True, max_length=max_tokens)["input_ids"]
+        for row, token_ids in enumerate(encoded, start):
+            lengths[row] = len(token_ids)
+            pieces.append(np.asarray(token_ids, dtype=np.int32))
+    offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    write_column(directory, CHUNK_IDS_COLUMN, [ids[i] for i in order])
+    np.save(directory / TOKEN_OFFSETS_FILE, offsets)
+    np.save(directory / TOKEN_IDS_FILE, np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int32))
+    config = {
+        "tokenizer": tokenizer_name,
+        "max_tokens": max_tokens,
+        "count": len(order),
+        "tokens": int(offsets[-1]),
+    }
+    with open(directory / RERANK_TOKENS_CONFIG_FILE, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    return config
+
+
+class RerankTokenCache:
+    """mmap 打开的只读文档块 token ID 缓存"""
+
+    def __init__(self, directory, use_mmap: bool = True):
+        directory = Path(directory)
+        with open(directory / RERANK_TOKENS_CONFIG_FILE, "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        mode = "r" if use_mmap else None
+        self.tokenizer = self.config["tokenizer"]
+        self.max_tokens = self.config["max_tokens"]
+        self._chunk_ids = StringColumn(directory, CHUNK_IDS_COLUMN, use_mmap)
+        self._offsets = np.load(directory / TOKEN_OFFSETS_FILE, mmap_mode=mode)
+        self._token_ids = np.load(directory / TOKEN_IDS_FILE, mmap_mode=mode)
+        self._stale = frozenset()  # 在线更新新增 / 替换的文档块（不使用缓存）
+
+    @classmethod
+    def load(cls, directory, use_mmap: bool = True) -> Optional["RerankTokenCache"]:
+        """加载版本目录下的分词缓存（不存在时返回 None）"""
+        if not is_rerank_token_cache(directory):
+            return None
+        return cls(directory, use_mmap=use_mmap)
+
+    def __len__(self) -> int:
+        return self.config["count"]
+
+    def stats(self) -> dict:
+        return {"rerank_token_cache": len(self), "rerank_tokenizer": self.tokenizer}
+
+    def apply(self, records: Iterable[dict]) -> "RerankTokenCache":
+        """应用在线更新记录（见 live_updates）：返回不再使用这些文档块缓存的新对象（共享 mmap 数组）"""
+        upserted = {chunk["id"] for record in records if record.get("op") == "upsert" for chunk in record["chunks"]}
+        if not upserted:
+            return self
+        cache = copy.copy(self)
+        cache._stale = self._stale | upserted
+        return cache
+
+    def get(self, chunk_id: str) -> Optional[np.ndarray]:
+        """文档块的 token ID（不含特殊 token），不在缓存中时返回 None"""
+        if chunk_id in self._stale:
+            return None
+        position = bisect.bisect_left(self._chunk_ids, chunk_id)
+        if position >= len(self._chunk_ids) or self._chunk_ids[position] != chunk_id:
+            return None
+        return self._token_ids[self._offsets[position]:self._offsets[position + 1]]
+
+    def lookup(self, chunk_ids: Sequence[str]) -> List[Optional[np.ndarray]]:
+        return [self.get(chunk_id) for chunk_id in chunk_ids]
@@ -5,10 +5,17 @@ Rerank (重排序) 模块
 提升检索精度，特别是在法律术语等专业领域
 """
 
+import math
 import os
+import time
 import torch
-from typing import List, Dict, Tuple
-from pathlib import Path
+from typing import Any, List, Dict, Optional, Sequence, Tuple
+
+from src.core.batching import BatchStats, LengthBucketer
+from src.core.thread_budget import apply_thread_budget_from_env
+
+# CPU 线程预算须在首次推理之前应用（已由 main.py / ingest.py / 模型服务应用时不重复设置）
+apply_thread_budget_from_env()
 
 # 设置 HuggingFace 镜像环境变量
 os.environ["HF_ENDPOINT"] = "https://hf-mirror.com"
@@ -25,13 +32,15 @@ except ImportError:
 class Reranker:
     """重排序器，使用 Cross-Encoder 模型对检索结果进行精细排序"""
     
-    def __init__(self, model_name: str = "BAAI/bge-reranker-base", device: str = None):
+    def __init__(self, model_name: str = "BAAI/bge-reranker-base", device: str = None,
+                 bucketer: Optional[LengthBucketer] = None):
         """
         初始化重排序器
         
         Args:
             model_name: Cross-Encoder 模型名称，默认使用 BGE-Reranker
             device: 设备（'cuda' 或 'cpu'），None 表示自动选择
+            bucketer: 推理批次的分桶器（按 token 长度分批，None 表示默认参数）
         """
         if not SENTENCE_TRANSFORMERS_AVAILABLE:
             raise ImportError("sentence-transformers 未安装，请运行: pip install sentence-transformers")
@@ -53,6 +62,14 @@ class Reranker:
                 print(f"✅ 备用 Rerank 模型加载成功")
             except Exception as e2:
                 raise RuntimeError(f"无法加载任何 Rerank 模型: {e2}")
+        # 能直接使用底层分词器和模型时，查询-文档对由 token ID 拼接（可使用 ingest 时预先切分的文档块）
+        self.tokenizer = getattr(self.model, "tokenizer", None)
+        self.pretokenized = self.tokenizer is not None and hasattr(self.model, "model") and \
+            getattr(self.model.model.config, "num_labels", 1) == 1
+        self.max_length = getattr(self.model, "max_length", None) or min(
+            getattr(self.tokenizer, "model_max_length", 512) or 512, 512)
+        self.bucketer = bucketer or LengthBucketer()
+        self.batch_stats = BatchStats()  # 各长度区间的填充比例和吞吐量
     
     def rerank(
         self, 
@@ -87,6 +104,160 @@ class Reranker:
         # 返回 Top K
         return scored_docs[:top_k]
     
+    def rerank_ids(
+        self,
+        query: str,
+        ids: List[Any],
+        documents: List[str],
+        top_k: int = 5,
+        token_ids: Optional[Sequence[Optional[Sequence[int]]]] = None,
+        timings: Optional[Dict[str, float]] = None,
+        info: Optional[Dict[str, int]] = None
+    ) -> List[Tuple[Any, float]]:
+        """
+        按 ID 重排序：只返回 (ID, 分数)，不复制文档内容和元数据
+
+        Args:
+            query: 查询文本
+            ids: 文档标识列表（如检索候选），与 documents 一一对应
+            documents: 文档文本列表
+            top_k: 返回前 K 个结果
+            token_ids: 各文档预先切分的 token ID（见 rerank_tokens），None 表示现场分词
+            timings: 累加分词 / 推理耗时（秒）的字典
+            info: 写入各级的候选数（单级时 first_stage 为 0，见 CascadeReranker）
+
+        Returns:
+            List[Tuple[Any, float]]: 排序后的 (ID, 分数) 列表，按分数降序排列
+        """
+        if info is not None:
+            info.update(first_stage=0, second_stage=len(documents))
+        if not documents:
+            return []
+        scores = self.score_tokens(query, documents, token_ids=token_ids, timings=timings)
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+        return [(ids[i], float(scores[i])) for i in order[:top_k]]
+
+    def score_tokens(
+        self,
+        query: str,
+        documents: List[str],
+        token_ids: Optional[Sequence[Optional[Sequence[int]]]] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[float]:
+        """
+        批量计算查询与文档的相关性分数：只对查询（和没有缓存的文档）分词，查询-文档对由 token ID 直接拼接、
+        截断（与 CrossEncoder.predict 相同的 longest_first 截断），与 predict 的分数一致
+
+        Args:
+            query: 查询文本
+            documents: 文档文本列表
+            token_ids: 各文档预先切分的 token ID（不含特殊 token，见 rerank_tokens），None 表示现场分词
+            timings: 累加分词 / 推理耗时（秒）的字典（键 tokenize / inference）
+        """
+        if not documents:
+            return []
+        if not self.pretokenized:
+            start = time.perf_counter()
+            scores = [float(score) for score in self.model.predict([[query, doc] for doc in documents])]
+            if timings is not None:
+                timings["inference"] = timings.get("inference", 0.0) + time.perf_counter() - start
+            return scores
+
+        start = time.perf_counter()
+        features = self._features(query, documents, token_ids)
+        tokenize_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        scores = self._infer(features)
+        if timings is not None:
+            timings["tokenize"] = timings.get("tokenize", 0.0) + tokenize_seconds
+            timings["inference"] = timings.get("inference", 0.0) + time.perf_counter() - start
+        return scores
+
+    def score_batch(
+        self,
+        requests: Sequence[Tuple[str, List[str], Optional[Sequence[Optional[Sequence[int]]]]]],
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[List[float]]:
+        """
+        多个请求（各自的查询和文档）的查询-文档对合在一起按长度分桶推理，按请求拆分返回（模型服务的动态批处理）
+
+        Args:
+            requests: (查询, 文档列表, 预先切分的 token ID 或 None) 列表
+            timings: 累加分词 / 推理耗时（秒）的字典
+        """
+        if not self.pretokenized:
+            return [self.score_tokens(query, documents, token_ids, timings) for query, documents, token_ids in requests]
+        start = time.perf_counter()
+        features = [self._features(query, documents, token_ids) if documents else []
+                    for query, documents, token_ids in requests]
+        tokenize_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        flat = self._infer([feature for request_features in features for feature in request_features])
+        if timings is not None:
+            timings["tokenize"] = timings.get("tokenize", 0.0) + tokenize_seconds
+            timings["inference"] = timings.get("inference", 0.0) + time.perf_counter() - start
+        results, position = [], 0
+        for request_features in features:
+            results.append(flat[position:position + len(request_features)])
+            position += len(request_features)
+        return results
+
+    def _features(self, query: str, documents: List[str],
+                  token_ids: Optional[Sequence[Optional[Sequence[int]]]] = None) -> List[dict]:
+        """查询-文档对的模型输入（input_ids / token_type_ids，未填充）"""
+        token_ids = list(token_ids) if token_ids is not None else [None] * len(documents)
+        missing = [i for i, ids in enumerate(token_ids) if ids is None]
+        texts = [query] + [documents[i] for i in missing]
+        encoded = self.tokenizer(texts, add_special_tokens=False, truncation=True, max_length=self.max_length)
+        query_ids = encoded["input_ids"][0]
+        for i, ids in zip(missing, encoded["input_ids"][1:]):
+            token_ids[i] = ids
+        limit = self.max_length - self.tokenizer.num_special_tokens_to_add(pair=True)
+        with_types = "token_type_ids" in self.tokenizer.model_input_names
+        fast = getattr(self.tokenizer, "is_fast", False)
+        features = []
+        for ids in token_ids:
+            first, second = _truncate_longest_first(query_ids, [int(t) for t in ids], limit, fast)
+            feature = {"input_ids": self.tokenizer.build_inputs_with_special_tokens(first, second)}
+            if with_types:
+                feature["token_type_ids"] = self.tokenizer.create_token_type_ids_from_sequences(first, second)
+            features.append(feature)
+        return features
+
+    def _infer(self, features: List[dict]) -> List[float]:
+        """按长度分桶推理（填充浪费有上界），分数按原始顺序写回"""
+        activation = self._activation()
+        lengths = [len(feature["input_ids"]) for feature in features]
+        scores = [0.0] * len(features)
+        with torch.no_grad():
+            for indices in self.bucketer.plan(lengths):
+                with self.batch_stats.timed([lengths[i] for i in indices]):
+                    batch = self.tokenizer.pad([features[i] for i in indices], return_tensors="pt")
+                    batch = {key: value.to(self.device) for key, value in batch.items()}
+                    logits = self.model.model(**batch, return_dict=True).logits
+                    batch_scores = activation(logits).view(-1).float().cpu().tolist()
+                for i, score in zip(indices, batch_scores):
+                    scores[i] = score
+        return scores
+
+    def _activation(self):
+        """与 CrossEncoder.predict 相同的输出激活函数（不同 sentence-transformers 版本的属性名不同）"""
+        for name in ("activation_fn", "activation_fct", "default_activation_function"):
+            activation = getattr(self.model, name, None)
+            if activation is not None:
+                return activation
+        return torch.sigmoid
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        """
+        批量计算查询与每个文本的相关性分数（不排序，与 documents 一一对应）
+
+        Args:
+            query: 查询文本
+            documents: 文本列表（如文档块或句子）
+        """
+        return self.score_tokens(query, documents)
+
     def rerank_with_metadata(
         self,
         query: str,
@@ -137,16 +308,162 @@ class Reranker:
         return results
 
 
-def create_reranker(model_name: str = "BAAI/bge-reranker-base", device: str = None) -> Reranker:
+class CascadeReranker:
+    """
+    两级级联重排序：小模型（第一级）为全部候选打分，只把分数靠前的 M 个候选送入大模型（第二级）
+
+    M 随第一级分数的分布变化：第一级分数（logit）做 softmax，取覆盖 mass 比例概率质量的最少候选数，
+    再限制在 [min_candidates, max_candidates]；分数集中在少数候选时 M 较小，分布平坦时 M 较大。
+    候选不超过 min_candidates 个时直接由第二级重排序（与单级相同）
+    """
+
+    def __init__(self, first: Reranker, second: Reranker, min_candidates: int = 10, max_candidates: int = 30,
+                 mass: float = 0.9, temperature: float = 1.0):
+        """
+        Args:
+            first: 第一级（小）重排序器
+            second: 第二级（大）重排序器，决定最终排序
+            min_candidates: 送入第二级的最少候选数
+            max_candidates: 送入第二级的最多候选数
+            mass: 送入第二级的候选需覆盖的第一级概率质量（0-1）
+            temperature: 第一级 logit 做 softmax 时的温度
+        """
+        self.first = first
+        self.second = second
+        self.min_candidates = min_candidates
+        self.max_candidates = max(max_candidates, min_candidates)
+        self.mass = mass
+        self.temperature = temperature
+
+    @property
+    def model_name(self) -> str:
+        # 分词缓存按第二级模型匹配（第一级现场分词）
+        return self.second.model_name
+
+    @property
+    def batch_stats(self) -> BatchStats:
+        return self.second.batch_stats
+
+    def cutoff(self, scores: Sequence[float]) -> int:
+        """按第一级分数的分布决定送入第二级的候选数 M"""
+        if len(scores) <= self.min_candidates:
+            return len(scores)
+        # 输出经过 sigmoid 时还原为 logit
+        if all(0.0 <= score <= 1.0 for score in scores):
+            scores = [math.log(max(score, 1e-7) / max(1 - score, 1e-7)) for score in scores]
+        ordered = sorted(scores, reverse=True)
+        weights = [math.exp((score - ordered[0]) / self.temperature) for score in ordered]
+        target, covered, keep = self.mass * sum(weights), 0.0, 0
+        for weight in weights:
+            covered += weight
+            keep += 1
+            if covered >= target:
+                break
+        return max(self.min_candidates, min(keep, self.max_candidates))
+
+    def rerank_ids(
+        self,
+        query: str,
+        ids: List[Any],
+        documents: List[str],
+        top_k: int = 5,
+        token_ids: Optional[Sequence[Optional[Sequence[int]]]] = None,
+        timings: Optional[Dict[str, float]] = None,
+        info: Optional[Dict[str, int]] = None
+    ) -> List[Tuple[Any, float]]:
+        """
+        级联重排序：参数与 Reranker.rerank_ids 相同（token_ids 为第二级模型的预切分 token ID）
+
+        Args:
+            timings: 另外累加第一级耗时（键 first_stage）
+            info: 写入第一级 / 第二级的候选数（键 first_stage / second_stage）
+        """
+        if len(documents) <= max(self.min_candidates, top_k):
+            return self.second.rerank_ids(query, ids, documents, top_k=top_k, token_ids=token_ids, timings=timings,
+                                          info=info)
+        start = time.perf_counter()
+        scores = self.first.score_tokens(query, documents)
+        if timings is not None:
+            timings["first_stage"] = timings.get("first_stage", 0.0) + time.perf_counter() - start
+        keep = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[:self.cutoff(scores)]
+        reranked = self.second.rerank_ids(
+            query,
+            [ids[i] for i in keep],
+            [documents[i] for i in keep],
+            top_k=top_k,
+            token_ids=[token_ids[i] for i in keep] if token_ids is not None else None,
+            timings=timings,
+            info=info,
+        )
+        if info is not None:
+            info["first_stage"] = len(documents)
+        return reranked
+
+    def score_tokens(self, query: str, documents: List[str], token_ids=None, timings=None) -> List[float]:
+        return self.second.score_tokens(query, documents, token_ids=token_ids, timings=timings)
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        # 句子打分（上下文压缩）使用第二级模型
+        return self.second.score(query, documents)
+
+
+def _truncate_longest_first(first: Sequence[int], second: Sequence[int], limit: int,
+                            fast: bool = True) -> Tuple[list, list]:
+    """
+    longest_first 截断：超出 limit 时每次从较长的序列末尾去掉一个 token，与 transformers 的结果一致
+
+    两个序列截到等长后剩余奇数个 token 要去掉时，Python 实现的分词器多去掉第二个序列的；
+    快速分词器（tokenizers）多去掉原本较短的序列的（等长时为第一个序列）
+    """
+    excess = len(first) + len(second) - limit
+    if excess <= 0:
+        return list(first), list(second)
+    first_length, second_length = len(first), len(second)
+    first_longer = first_length > second_length
+    removed = min(abs(first_length - second_length), excess)
+    if first_length > second_length:
+        first_length -= removed
+    else:
+        second_length -= removed
+    rest = excess - removed
+    if fast and not first_longer:
+        first_length -= (rest + 1) // 2
+        second_length -= rest // 2
+    else:
+        second_length -= (rest + 1) // 2
+        first_length -= rest // 2
+    return list(first[:max(first_length, 0)]), list(second[:max(second_length, 0)])
+
+
+def create_reranker(model_name: str = "BAAI/bge-reranker-base", device: str = None,
+                    bucketer: Optional[LengthBucketer] = None) -> Reranker:
     """
     创建重排序器实例（工厂函数）
     
     Args:
         model_name: Cross-Encoder 模型名称
         device: 设备
+        bucketer: 推理批次的分桶器（None 表示默认参数）
         
     Returns:
         Reranker 实例
     """
-    return Reranker(model_name=model_name, device=device)
+    return Reranker(model_name=model_name, device=device, bucketer=bucketer)
 
+
+def create_cascade_reranker(first_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                            second_model: str = "BAAI/bge-reranker-base", device: str = None,
+                            bucketer: Optional[LengthBucketer] = None, **kwargs) -> CascadeReranker:
+    """
+    创建两级级联重排序器（工厂函数）
+
+    Args:
+        first_model: 第一级（小）Cross-Encoder 模型名称
+        second_model: 第二级（大）Cross-Encoder 模型名称
+        device: 设备
+        bucketer: 推理批次的分桶器（两级共用）
+        **kwargs: 见 CascadeReranker（min_candidates / max_candidates / mass / temperature）
+    """
+    second = Reranker(model_name=second_model, device=device, bucketer=bucketer)
+    first = Reranker(model_name=first_model, device=device, bucketer=bucketer)
+    return CascadeReranker(first, second, **kwargs)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+检索候选模块
+功能：检索、融合（向量 + BM25 的倒数排名融合）、重排序阶段之间只传递 (知识库, 文档块 ID, 分数)，
+文档块文本和元数据由 ChunkFetcher 在真正需要时按 ID 读取，每个 ID 每个请求最多读取一次
+  - faiss 后端：检索只返回 ID（不解码文本），文本从 mmap 列式存储按 ID 读取
+  - chroma 后端：检索结果本身带有文本，直接登记到 ChunkFetcher，不再重复查询
+"""
+
+import hashlib
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from src.core.vector_store import FlashVectorStore, search_by_vectors
+
+
+class Candidate(NamedTuple):
+    """检索候选：只包含定位文档块所需的信息"""
+    kb: str          # 知识库名称
+    chunk_id: str    # 文档块 ID
+    score: float     # 检索（或融合 / 重排序）分数，越大越相关
+
+
+def document_chunk_id(doc: Document) -> str:
+    """
+    获取 Document 的文档块 ID
+
+    优先使用 Document.id，其次是 ingest 写入元数据的 chunk_id，
+    旧版知识库两者都没有时按内容生成
+    """
+    if doc.id:
+        return doc.id
+    chunk_id = (doc.metadata or {}).get("chunk_id")
+    if chunk_id:
+        return chunk_id
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()[:20]
+
+
+class ChunkFetcher:
+    """请求级文档块读取器：按 ID 延迟读取文本和元数据，并缓存到请求结束"""
+
+    def __init__(self, stores: Dict[str, VectorStore]):
+        """
+        Args:
+            stores: 知识库名称 → 向量库
+        """
+        self._stores = stores
+        self._documents: Dict[tuple, Document] = {}
+        self.fetched = 0  # 实际从存储读取的文档块数量
+
+    def remember(self, kb: str, doc: Document) -> str:
+        """登记检索结果中已带有的文档（chroma 后端），返回对应的 ID"""
+        chunk_id = document_chunk_id(doc)
+        self._documents.setdefault((kb, chunk_id), doc)
+        return chunk_id
+
+    def fetch(self, candidates: Sequence[Candidate]):
+        """批量读取尚未缓存的候选文档块（每个知识库一次 get_by_ids）"""
+        missing: Dict[str, List[str]] = {}
+        for candidate in candidates:
+            key = (candidate.kb, candidate.chunk_id)
+            if key not in self._documents:
+                missing.setdefault(candidate.kb, []).append(candidate.chunk_id)
+        for kb, chunk_ids in missing.items():
+            chunk_ids = list(dict.fromkeys(chunk_ids))
+            for doc in self._stores[kb].get_by_ids(chunk_ids):
+                self._documents[(kb, document_chunk_id(doc))] = doc
+            self.fetched += len(chunk_ids)
+
+    def document(self, candidate: Candidate) -> Optional[Document]:
+        """获取单个候选的文档（未缓存时读取）"""
+        key = (candidate.kb, candidate.chunk_id)
+        if key not in self._documents:
+            self.fetch([candidate])
+        return self._documents.get(key)
+
+    def documents(self, candidates: Sequence[Candidate]) -> List[Optional[Document]]:
+        self.fetch(candidates)
+        return [self._documents.get((c.kb, c.chunk_id)) for c in candidates]
+
+    def texts(self, candidates: Sequence[Candidate]) -> List[str]:
+        """获取候选的文本（找不到的文档块返回空字符串）"""
+        return [doc.page_content if doc else "" for doc in self.documents(candidates)]
+
+
+def retrieve_candidates(
+    kb: str,
+    vectorstore: VectorStore,
+    query_vectors: List[List[float]],
+    k: int,
+    fetcher: ChunkFetcher
+) -> List[List[Candidate]]:
+    """
+    按查询向量批量检索单个知识库，只返回候选（ID + 分数）
+
+    Args:
+        kb: 知识库名称
+        vectorstore: 向量库
+        query_vectors: 查询向量列表
+        k: 每个查询返回的结果数量
+        fetcher: 请求级文档块读取器（chroma 后端的检索结果会登记进去）
+
+    Returns:
+        每个查询的候选列表，按分数降序排列
+    """
+    if hasattr(vectorstore, "retrieve_candidates"):
+        # 自行组合候选的向量库（如在线更新叠加层）
+        return vectorstore.retrieve_candidates(kb, query_vectors, k, fetcher)
+    if isinstance(vectorstore, FlashVectorStore):
+        return [
+            [Candidate(kb, chunk_id, score) for chunk_id, score in row]
+            for row in vectorstore.search_ids_by_vectors(query_vectors, k)
+        ]
+    return [
+        [Candidate(kb, fetcher.remember(kb, doc), score) for doc, score in row]
+        for row in search_by_vectors(vectorstore, query_vectors, k)
+    ]
+
+
+# 倒数排名融合的平滑常数（常用取值 60）
+DEFAULT_RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[Sequence[Candidate]],
+    top_k: Optional[int] = None,
+    rrf_k: int = DEFAULT_RRF_K
+) -> List[Candidate]:
+    """
+    倒数排名融合（RRF）：各列表中排名为 r（从 1 开始）的候选得分 1 / (rrf_k + r)，同一文档块的得分相加
+
+    只使用排名，不需要把向量相似度和 BM25 分数归一化到同一尺度
+
+    Args:
+        result_lists: 多路检索的候选列表（各自按分数降序）
+        top_k: 返回数量（None 表示全部）
+        rrf_k: 平滑常数
+
+    Returns:
+        融合后的候选，分数为 RRF 得分
+    """
+    scores: Dict[tuple, float] = {}
+    for results in result_lists:
+        for rank, candidate in enumerate(results, start=1):
+            key = (candidate.kb, candidate.chunk_id)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    ordered = sorted(scores.items(), key=lambda item: -item[1])
+    if top_k is not None:
+        ordered = ordered[:top_k]
+    return [Candidate(kb, chunk_id, score) for (kb, chunk_id), score in ordered]
+
+
+def merge_candidate_lists(
+    primary: Sequence[Candidate],
+    secondary: Sequence[Candidate],
+    rrf_k: int = DEFAULT_RRF_K
+) -> List[Candidate]:
+    """
+    合并两次检索（如原始问题和改写后的问题）各自跨知识库拼接的候选列表
+
+    按知识库分组（知识库顺序以先出现的为准），每个知识库内对两路结果做倒数排名融合，
+    保留两路的并集再依次拼接，与单次检索的候选列表结构一致
+
+    Returns:
+        合并后的候选，分数为知识库内的 RRF 得分
+    """
+    groups: Dict[str, List[List[Candidate]]] = {}
+    for position, results in enumerate((primary, secondary)):
+        for candidate in results:
+            groups.setdefault(candidate.kb, [[], []])[position].append(candidate)
+    merged: List[Candidate] = []
+    for lists in groups.values():
+        merged.extend(reciprocal_rank_fusion(lists, rrf_k=rrf_k))
+    return merged
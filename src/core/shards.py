@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+分片检索模块
+功能：将知识库按文档块 ID 哈希切分为 N 个分片，每个分片由独立的检索进程提供服务，
+API 中的协调器（ShardedVectorStore）把查询向量并发分发到所有分片，用堆合并各分片的 Top K
+
+  - 分片目录：每个分片是一个 faiss 后端持久化目录（mmap 加载），根目录的 shards.json 记录分片数量和地址
+  - 检索进程：serve_shard 加载一个分片，通过 multiprocessing.connection 提供 search / get / source 请求，
+    默认监听分片目录下的 Unix socket，也可以在 shards.json 中配置 (host, port) 部署到其他节点
+  - 容错：某个分片超时或不可用时，只合并其余分片的结果（降级），并在下一次请求时重新连接
+
+目录结构：
+  <版本目录>/
+    shards.json
+    shard-00/   flash_store.json / index.faiss / chunk_* / shard.sock（检索进程运行时）
+    shard-01/
+"""
+
+import heapq
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.core.bm25_index import build_bm25_index
+from src.core.rerank_tokens import build_rerank_tokens
+from src.core.retrieval import Candidate, ChunkFetcher
+from src.core.statute_index import write_statute_index
+from src.core.vector_index import create_index
+from src.core.vector_store import FlashVectorStore
+
+SHARDS_FILE = "shards.json"
+SHARD_SOCKET = "shard.sock"
+# 检索进程的默认连接认证密钥：只用于本机的 Unix socket（socket 文件仅所有者可访问）。
+# multiprocessing.connection 会反序列化收到的 pickle，TCP 地址必须通过 KB_SHARD_AUTHKEY 设置私有密钥
+DEFAULT_SHARD_AUTHKEY = "legalflash-shard"
+# 单个分片的请求超时（秒），超时的分片按不可用处理
+DEFAULT_SHARD_TIMEOUT = 2.0
+
+
+def shard_of(chunk_id: str, num_shards: int) -> int:
+    """文档块所在分片（按 ID 的 CRC32 哈希，构建与按 ID 读取时保持一致）"""
+    return zlib.crc32(chunk_id.encode("utf-8")) % num_shards
+
+
+def is_sharded_store(persist_directory) -> bool:
+    """目录是否为分片知识库"""
+    return (Path(persist_directory) / SHARDS_FILE).exists()
+
+
+def read_manifest(persist_directory) -> dict:
+    with open(Path(persist_directory) / SHARDS_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def shard_address(persist_directory, shard: dict):
+    """分片地址：shards.json 中配置的 [host, port]，否则为分片目录下的 Unix socket"""
+    if shard.get("address"):
+        return tuple(shard["address"])
+    return str(Path(persist_directory) / shard["path"] / SHARD_SOCKET)
+
+
+def shard_authkey(address) -> bytes:
+    """
+    监听 / 连接 address 使用的认证密钥
+
+    Raises:
+        ValueError: TCP 地址（[host, port]）未设置 KB_SHARD_AUTHKEY（公开的默认密钥等于允许任何能访问端口的人执行代码）
+    """
+    authkey = os.getenv("KB_SHARD_AUTHKEY", "")
+    if authkey:
+        return authkey.encode("utf-8")
+    if not isinstance(address, str):
+        raise ValueError(f"分片使用 TCP 地址 {tuple(address)} 时必须通过 KB_SHARD_AUTHKEY 设置认证密钥")
+    return DEFAULT_SHARD_AUTHKEY.encode("utf-8")
+
+
+def build_shards(source_dir, output_dir, num_shards: int, include_updates: bool = True, **index_params) -> dict:
+    """
+    将知识库切分为 num_shards 个分片
+
+    Args:
+        source_dir: 知识库根目录（按 CURRENT 解析当前版本）或某个版本目录，Chroma / faiss 后端均可
+        output_dir: 分片知识库目录（可直接作为新版本目录）
+        num_shards: 分片数量
+        include_updates: 是否合并当前版本的在线更新
+        **index_params: 各分片的索引参数（index_type / compression / M / ef_construction 等）
+
+    Returns:
+        shards.json 内容
+    """
+    from src.core.kb_snapshot import read_knowledge_base
+
+    ids, texts, metadatas, vectors = read_knowledge_base(source_dir, include_updates=include_updates)
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    index_params = {key: value for key, value in index_params.items() if value is not None}
+
+    assignment = np.array([shard_of(chunk_id, num_shards) for chunk_id in ids], dtype=np.int64)
+    shards = []
+    for shard_id in range(num_shards):
+        rows = np.flatnonzero(assignment == shard_id)
+        store = FlashVectorStore(None, create_index(vectors.shape[1], len(rows), **index_params))
+        store._add_vectors(
+            np.ascontiguousarray(vectors[rows]),
+            [texts[i] for i in rows],
+            [metadatas[i] for i in rows],
+            [ids[i] for i in rows],
+        )
+        shard_path = f"shard-{shard_id:02d}"
+        store.persist(str(output / shard_path))
+        shards.append({"path": shard_path, "count": len(rows), "address": None})
+        print(f"  分片 {shard_id}: {len(rows)} 个文档块")
+
+    manifest = {
+        "backend": "sharded",
+        "num_shards": num_shards,
+        "dim": int(vectors.shape[1]),
+        "count": len(ids),
+        "shards": shards,
+    }
+    with open(output / SHARDS_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    # 法条索引、BM25 索引和重排序分词缓存与分片无关，整体保存在分片知识库目录下，由 API 进程直接使用
+    write_statute_index(output, ids, texts, metadatas)
+    build_bm25_index(output, ids, texts)
+    build_rerank_tokens(output, ids, texts)
+    return manifest
+
+
+# ----------------------------------------------------------------------
+# 检索进程
+# ----------------------------------------------------------------------
+def serve_shard(shard_dir, address=None, threads: Optional[int] = None):
+    """
+    加载一个分片并提供检索服务（阻塞运行，每个连接一个线程）
+
+    Args:
+        shard_dir: 分片目录
+        address: 监听地址，None 表示分片目录下的 Unix socket
+        threads: faiss 检索线程数（多个分片进程共用一台主机时建议设为 1）
+    """
+    if threads:
+        try:
+            import faiss
+            faiss.omp_set_num_threads(threads)
+        except ImportError:
+            pass
+    address = address or str(Path(shard_dir) / SHARD_SOCKET)
+    authkey = shard_authkey(address)
+    store = FlashVectorStore.load(str(shard_dir), embedding=None, mmap=True)
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)  # 上次异常退出遗留的 socket
+    listener = Listener(address, authkey=authkey)
+    if isinstance(address, str):
+        os.chmod(address, 0o600)
+    print(f"🧩 分片已启动: {shard_dir}（{len(store)} 个文档块，监听 {address}）", flush=True)
+
+    handlers = {
+        "ping": lambda: len(store),
+        "search": lambda vectors, k: store.search_ids_by_vectors(vectors, k),
+        "get": lambda ids: [(doc.id, doc.page_content, doc.metadata) for doc in store.get_by_ids(ids)],
+        "source": lambda source: [
+            chunk_id for chunk_id, metadata in zip(store._ids, store._metadatas)
+            if (metadata or {}).get("source") == source
+        ],
+    }
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    op, *args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(("ok", handlers[op](*args)))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    try:
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    finally:
+        listener.close()
+
+
+class ShardClient:
+    """单个分片的连接池（每个并发请求占用一个连接）"""
+
+    def __init__(self, address, timeout: float = DEFAULT_SHARD_TIMEOUT):
+        self.address = address
+        self.authkey = shard_authkey(address)
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue" = queue.LifoQueue()
+
+    def call(self, op: str, *args):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = Client(self.address, authkey=self.authkey)
+        try:
+            conn.send((op, *args))
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"分片响应超时（{self.timeout}s）: {self.address}")
+            status, result = conn.recv()
+        except BaseException:
+            conn.close()  # 超时的连接上可能还有迟到的响应，直接丢弃
+            raise
+        self._pool.put(conn)
+        if status != "ok":
+            raise RuntimeError(f"分片请求失败: {result}")
+        return result
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class ShardedVectorStore(VectorStore):
+    """分片知识库协调器：并发检索所有分片，按分数合并，容忍部分分片不可用"""
+
+    def __init__(self, embedding: Embeddings, clients: List[ShardClient], count: int = 0):
+        """
+        Args:
+            embedding: 嵌入模型
+            clients: 各分片的连接
+            count: 文档块总数
+        """
+        self._embedding = embedding
+        self.clients = clients
+        self.count = count
+        self._executor = ThreadPoolExecutor(max_workers=len(clients), thread_name_prefix="shard")
+        self._down: set = set()
+        self.degraded_requests = 0
+
+    @classmethod
+    def load(cls, persist_directory: str, embedding: Embeddings,
+             timeout: Optional[float] = None) -> "ShardedVectorStore":
+        """按 shards.json 连接各分片的检索进程（不加载数据，分片进程需单独启动）"""
+        manifest = read_manifest(persist_directory)
+        clients = [
+            ShardClient(shard_address(persist_directory, shard), timeout or DEFAULT_SHARD_TIMEOUT)
+            for shard in manifest["shards"]
+        ]
+        store = cls(embedding, clients, manifest.get("count", 0))
+        store.ping()
+        return store
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return self.count
+
+    def stats(self) -> dict:
+        return {
+            "shards": len(self.clients),
+            "shards_down": sorted(self._down),
+            "degraded_requests": self.degraded_requests,
+        }
+
+    # ------------------------------------------------------------------
+    # 分发
+    # ------------------------------------------------------------------
+    def _scatter(self, requests: Dict[int, tuple]) -> Dict[int, Any]:
+        """并发向多个分片发送请求，返回成功的分片结果；超时或不可用的分片不出现在结果中"""
+        futures = {
+            self._executor.submit(self.clients[shard_id].call, *request): shard_id
+            for shard_id, request in requests.items()
+        }
+        done, _ = wait(futures, timeout=max(client.timeout for client in self.clients) + 1)
+        results = {}
+        for future, shard_id in futures.items():
+            if future in done and future.exception() is None:
+                results[shard_id] = future.result()
+                if shard_id in self._down:
+                    self._down.discard(shard_id)
+                    print(f"✅ 分片 {shard_id} 已恢复: {self.clients[shard_id].address}")
+            elif shard_id not in self._down:
+                self._down.add(shard_id)
+                error = future.exception() if future in done else "超时"
+                print(f"⚠️  分片 {shard_id} 不可用，返回降级结果: {error}")
+        if len(results) < len(requests):
+            self.degraded_requests += 1
+        return results
+
+    def ping(self) -> Dict[int, int]:
+        """检查各分片，返回可用分片的文档块数量"""
+        return self._scatter({shard_id: ("ping",) for shard_id in range(len(self.clients))})
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+    def search_ids_by_vectors(self, embeddings: List[List[float]], k: int = 4) -> List[List[Tuple[str, float]]]:
+        """所有分片各取 Top K，用堆合并为全局 Top K"""
+        if not embeddings:
+            return []
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        results = self._scatter({shard_id: ("search", vectors, k) for shard_id in range(len(self.clients))})
+        merged = []
+        for row in range(len(vectors)):
+            rows = [shard_rows[row] for shard_rows in results.values()]
+            merged.append(heapq.nlargest(k, itertools.chain.from_iterable(rows), key=lambda item: item[1]))
+        return merged
+
+    def retrieve_candidates(
+        self, kb: str, query_vectors: List[List[float]], k: int, fetcher: ChunkFetcher
+    ) -> List[List[Candidate]]:
+        return [
+            [Candidate(kb, chunk_id, score) for chunk_id, score in row]
+            for row in self.search_ids_by_vectors(query_vectors, k)
+        ]
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        """按 ID 读取文档块（直接发往所在分片），按传入顺序返回，不存在或分片不可用的 ID 会被跳过"""
+        grouped: Dict[int, List[str]] = {}
+        for chunk_id in ids:
+            grouped.setdefault(shard_of(chunk_id, len(self.clients)), []).append(chunk_id)
+        results = self._scatter({shard_id: ("get", chunk_ids) for shard_id, chunk_ids in grouped.items()})
+        found = {
+            chunk_id: Document(id=chunk_id, page_content=text, metadata=metadata)
+            for rows in results.values()
+            for chunk_id, text, metadata in rows
+        }
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+    def source_chunk_ids(self, source: str) -> List[str]:
+        """某个文档（元数据 source）的所有文档块 ID（在线更新替换文档时使用）"""
+        results = self._scatter({shard_id: ("source", source) for shard_id in range(len(self.clients))})
+        return [chunk_id for rows in results.values() for chunk_id in rows]
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        row = self.search_ids_by_vectors([embedding], k)[0]
+        documents = {doc.id: doc for doc in self.get_by_ids([chunk_id for chunk_id, _ in row])}
+        return [(documents[chunk_id], score) for chunk_id, score in row if chunk_id in documents]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return lambda score: min(1.0, max(0.0, score))
+
+    def add_texts(self, texts, metadatas=None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("分片知识库只读，请通过 build_shards 重新切分或通过在线更新写入")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs: Any):
+        raise NotImplementedError("分片知识库请通过 build_shards 构建")
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+        self._executor.shutdown(wait=False)
+
+
+def start_shard_servers(persist_directory, shard_ids: Optional[Sequence[int]] = None,
+                        threads: Optional[int] = None) -> list:
+    """
+    在本机为分片知识库启动检索进程（每个分片一个进程）
+
+    Args:
+        persist_directory: 分片知识库目录
+        shard_ids: 要启动的分片（多节点部署时每个节点只启动一部分），None 表示全部
+        threads: 每个分片进程的检索线程数（faiss / BLAS），None 表示不限制
+
+    Returns:
+        启动的进程列表
+    """
+    import multiprocessing
+
+    manifest = read_manifest(persist_directory)
+    ctx = multiprocessing.get_context("spawn")
+    saved_env = {}
+    if threads:
+        # BLAS 线程数只能在子进程导入 numpy 之前通过环境变量设置
+        for key in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            saved_env[key] = os.environ.get(key)
+            os.environ[key] = str(threads)
+    processes = []
+    try:
+        for shard_id, shard in enumerate(manifest["shards"]):
+            if shard_ids is not None and shard_id not in shard_ids:
+                continue
+            address = shard_address(persist_directory, shard)
+            process = ctx.Process(
+                target=serve_shard,
+                args=(str(Path(persist_directory) / shard["path"]), address, threads),
+                name=f"shard-{shard_id:02d}",
+                daemon=True,
+            )
+            process.start()
+            processes.append(process)
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    return processes
+
+
+def wait_for_shards(persist_directory, timeout: float = 60.0) -> bool:
+    """等待所有分片的检索进程可连接（启动脚本和压测使用）"""
+    manifest = read_manifest(persist_directory)
+    deadline = time.time() + timeout
+    pending = [shard_address(persist_directory, shard) for shard in manifest["shards"]]
+    while pending and time.time() < deadline:
+        still = []
+        for address in pending:
+            client = ShardClient(address)
+            try:
+                client.call("ping")
+            except (OSError, EOFError, TimeoutError):
+                still.append(address)
+            finally:
+                client.close()
+        pending = still
+        if pending:
+            time.sleep(0.1)
+    return not pending
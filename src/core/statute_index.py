@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+法条倒排索引模块
+功能：为"民法典第577条""劳动合同法第三十九条"这类明确指向某部法律某一条的查询提供词法快速通道，
+直接按 (法律名称, 条文序号) 定位文档块，跳过查询改写、嵌入、向量检索和重排序
+
+  - 构建（ingest 时）：扫描文档块中位于行首的条文标题（如"《中华人民共和国劳动合同法》第三十九条："），
+    法律名称去掉书名号和"中华人民共和国"前缀，条文序号统一为阿拉伯数字；
+    文档块中只有"第X条"的行沿用本块中最近出现的法律标题行
+  - 行中间的引用（"依照刑法第二十条…"）不建索引，只索引条文本身所在的文档块
+  - 查询：识别"法律名称 + 第X条"（中文或阿拉伯数字），法律名称取索引中已有的最长后缀匹配
+索引保存为知识库版本目录下的 statute_index.json，在线更新新增的文档块由 extend 追加
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+STATUTE_INDEX_FILE = "statute_index.json"
+STATUTE_INDEX_VERSION = 1
+
+CHINESE_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+                  "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000, "万": 10000}
+NATIONAL_PREFIX = "中华人民共和国"
+
+# 条文序号与法律名称的正则（词典查询改写识别"法律名称 + 第X条"时复用）
+ARTICLE_NUMBER_REGEX = r"[零〇一二两三四五六七八九十百千万\d]+"
+LAW_NAME_REGEX = r"[一-龥]{1,30}?(?:法典|法|条例|规定|解释|办法|通则)"
+# 行首的条文标题：可选的【…】标记、可选的法律名称、第X条
+_HEADING_PATTERN = re.compile(
+    rf"^[ \t　]*(?:【[^】\n]*】[ \t　]*)?(?:《?((?:{NATIONAL_PREFIX})?{LAW_NAME_REGEX})》?)?[ \t　]*第({ARTICLE_NUMBER_REGEX})条",
+    re.MULTILINE,
+)
+# 单独成行的法律标题（整部法律切分后，后续条文行只有"第X条"）
+_TITLE_PATTERN = re.compile(rf"^[ \t　]*《?((?:{NATIONAL_PREFIX})?{LAW_NAME_REGEX})》?[ \t　]*$", re.MULTILINE)
+# 查询中的条文引用
+_ARTICLE_PATTERN = re.compile(rf"第\s*({ARTICLE_NUMBER_REGEX})\s*条")
+# 查询中除法条引用之外不影响意图的词（剩余字数用于判断是否为单纯的法条查询）
+_FILLER_PATTERN = re.compile(
+    r"请问|请|帮我|麻烦|查询|查一下|查看|查|告诉我|一下|是什么|是啥|什么|说了|怎么说|内容|规定|条文|原文|全文|"
+    r"具体|中华人民共和国|以及|和|及|与|的|了|吗|呢|[\s\W_]"
+)
+# 查询中法律名称前允许紧接的汉字（"请问民法典…""依照刑法…"）
+_LAW_BOUNDARY_CHARS = set("问看查找说道下据照依按于是在对和与及的")
+
+
+class ProvisionRef(NamedTuple):
+    """查询中的一条法条引用"""
+    law: str                # 规范化的法律名称
+    article: int            # 条文序号
+    chunk_ids: List[str]    # 索引中的文档块 ID（为空表示未收录）
+
+
+class StatuteMatch(NamedTuple):
+    """查询的法条解析结果"""
+    provisions: List[ProvisionRef]  # 识别出法律名称的引用
+    articles: int                   # 查询中"第X条"的总数（含无法识别法律名称的）
+    residual: int                   # 去掉法条引用和虚词后剩余的字数
+
+    @property
+    def resolved(self) -> bool:
+        """所有引用都识别出法律名称且在索引中找到了文档块"""
+        return bool(self.provisions) and len(self.provisions) == self.articles and all(
+            ref.chunk_ids for ref in self.provisions
+        )
+
+    def chunk_ids(self) -> List[str]:
+        """按引用顺序去重后的文档块 ID"""
+        return list(dict.fromkeys(chunk_id for ref in self.provisions for chunk_id in ref.chunk_ids))
+
+
+def chinese_to_int(text: str) -> Optional[int]:
+    """条文序号转换为整数（"五百七十七" / "577" / "一百零五"），无法识别时返回 None"""
+    text = text.strip()
+    if not text:
+        return None
+    if text.isdigit():
+        return int(text)
+    total = section = number = 0
+    for char in text:
+        if char in CHINESE_DIGITS:
+            number = CHINESE_DIGITS[char]
+        elif char in CHINESE_UNITS:
+            unit = CHINESE_UNITS[char]
+            if unit == 10000:
+                total += (section + number) * unit
+                section = 0
+            else:
+                # "十条" / "十一条" 省略了"一"
+                section += (number or 1) * unit
+            number = 0
+        else:
+            return None
+    return total + section + number
+
+
+def normalize_law_name(name: str) -> str:
+    """法律名称规范化：去掉书名号、空白和"中华人民共和国"前缀"""
+    name = re.sub(r"[《》\s　]", "", name)
+    if name.startswith(NATIONAL_PREFIX) and len(name) > len(NATIONAL_PREFIX):
+        name = name[len(NATIONAL_PREFIX):]
+    return name
+
+
+def provision_key(law: str, article: int) -> str:
+    return f"{law}#{article}"
+
+
+def extract_provisions(text: str, default_law: Optional[str] = None) -> List[tuple]:
+    """
+    提取文档块中条文本身（行首标题）的 (法律名称, 条文序号)
+
+    Args:
+        text: 文档块文本
+        default_law: 文档块中没有法律名称时使用的法律名称（如元数据中的 law）
+    """
+    titles = [(match.start(), normalize_law_name(match.group(1))) for match in _TITLE_PATTERN.finditer(text)]
+    provisions = []
+    for match in _HEADING_PATTERN.finditer(text):
+        article = chinese_to_int(match.group(2))
+        if article is None:
+            continue
+        if match.group(1):
+            law = normalize_law_name(match.group(1))
+        else:
+            preceding = [name for position, name in titles if position < match.start()]
+            law = preceding[-1] if preceding else default_law
+        if law:
+            provisions.append((law, article))
+    return list(dict.fromkeys(provisions))
+
+
+class StatuteIndex:
+    """(法律名称, 条文序号) → 文档块 ID 的倒排索引（构建后不修改，在线更新时生成新索引）"""
+
+    def __init__(self, entries: Optional[Dict[str, List[str]]] = None):
+        self.entries: Dict[str, List[str]] = entries or {}
+        self.laws = {key.rsplit("#", 1)[0] for key in self.entries}
+        self._max_law_length = max((len(law) for law in self.laws), default=0)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str],
+              metadatas: Optional[Sequence[dict]] = None) -> "StatuteIndex":
+        """从文档块构建索引（元数据中的 law 字段作为没有法律名称的条文行的默认法律）"""
+        return cls().extend(ids, texts, metadatas)
+
+    def extend(self, ids: Sequence[str], texts: Sequence[str],
+               metadatas: Optional[Sequence[dict]] = None) -> "StatuteIndex":
+        """返回追加了文档块的新索引（原索引不变，正在使用它的请求不受影响）"""
+        entries = {key: list(chunk_ids) for key, chunk_ids in self.entries.items()}
+        metadatas = metadatas or [None] * len(ids)
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            default_law = normalize_law_name((metadata or {}).get("law", "")) or None
+            for law, article in extract_provisions(text or "", default_law):
+                chunk_ids = entries.setdefault(provision_key(law, article), [])
+                if chunk_id not in chunk_ids:
+                    chunk_ids.append(chunk_id)
+        return StatuteIndex(entries)
+
+    def apply(self, records: Iterable[dict]) -> "StatuteIndex":
+        """
+        应用在线更新记录（见 live_updates）：新增的文档块追加到索引
+
+        删除的文档块不从索引移除，读取时由叠加层的墓碑过滤，查询时读不到文档块即视为未命中
+        """
+        chunks = [chunk for record in records if record.get("op") == "upsert" for chunk in record["chunks"]]
+        if not chunks:
+            return self
+        return self.extend(
+            [chunk["id"] for chunk in chunks],
+            [chunk["text"] for chunk in chunks],
+            [chunk.get("metadata") for chunk in chunks],
+        )
+
+    def lookup(self, law: str, article: int) -> List[str]:
+        return self.entries.get(provision_key(normalize_law_name(law), article), [])
+
+    def _law_before(self, text: str) -> Optional[str]:
+        """
+        text 末尾与索引中法律名称匹配的最长后缀
+
+        后缀前面紧接着其他汉字时（如索引只有"合同法"而查询是"劳动合同法"）视为无法识别，
+        常见的引导字（问 / 查 / 据 / 照 …）除外
+        """
+        text = re.sub(r"[《》\s　]+$", "", text)
+        for length in range(min(len(text), self._max_law_length + len(NATIONAL_PREFIX)), 0, -1):
+            law = normalize_law_name(text[-length:])
+            if law in self.laws:
+                before = text[:-length].rstrip("《 　")
+                if before and re.match(r"[一-龥]", before[-1]) and before[-1] not in _LAW_BOUNDARY_CHARS:
+                    return None
+                return law
+        return None
+
+    def match(self, query: str) -> StatuteMatch:
+        """
+        解析查询中的法条引用
+
+        "劳动合同法第三十九条和第四十条" 中第二个引用沿用前一个法律名称
+        """
+        provisions = []
+        articles = 0
+        law = None
+        position = 0
+        spans = []
+        for match in _ARTICLE_PATTERN.finditer(query):
+            articles += 1
+            article = chinese_to_int(match.group(1))
+            found = self._law_before(query[position:match.start()])
+            if found:
+                law = found
+                start = query.rfind(found, position, match.start())
+                spans.append((start if start >= 0 else match.start(), match.end()))
+            else:
+                spans.append((match.start(), match.end()))
+            position = match.end()
+            if law and article is not None:
+                provisions.append(ProvisionRef(law, article, list(self.lookup(law, article))))
+        rest = query
+        for start, end in reversed(spans):
+            rest = rest[:start] + rest[end:]
+        return StatuteMatch(provisions, articles, len(_FILLER_PATTERN.sub("", rest)))
+
+    def save(self, directory) -> Path:
+        path = Path(directory) / STATUTE_INDEX_FILE
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": STATUTE_INDEX_VERSION, "entries": self.entries}, f, ensure_ascii=False)
+        return path
+
+    @classmethod
+    def load(cls, directory) -> "StatuteIndex":
+        """加载版本目录下的索引（不存在时返回空索引）"""
+        path = Path(directory) / STATUTE_INDEX_FILE
+        if not path.exists():
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("entries", {}))
+
+
+def write_statute_index(directory, ids: Sequence[str], texts: Sequence[str],
+                        metadatas: Optional[Sequence[dict]] = None) -> Optional[StatuteIndex]:
+    """构建并写入知识库版本目录（没有任何条文时不写入文件），返回索引"""
+    index = StatuteIndex.build(ids, texts, metadatas)
+    if not len(index):
+        return None
+    index.save(directory)
+    return index
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+CPU 线程预算模块
+功能：CPU 节点上每个 uvicorn worker 同时有 torch 算子内线程、HF tokenizers 线程和 FastAPI 线程池，
+默认各自按全部核心数开线程，多个 worker 叠加后严重超额订阅（oversubscription），尾延迟升高。
+启动时按同一份配置（ThreadBudget）统一设置：
+  - torch 算子内 / 算子间线程数（torch.set_num_threads / set_num_interop_threads，及 OMP_NUM_THREADS / MKL_NUM_THREADS）
+  - HF tokenizers 是否并行（TOKENIZERS_PARALLELISM）
+  - asyncio 默认线程池（asyncio.to_thread / run_in_executor）和 Starlette 线程池（流式响应的同步迭代器）的大小
+  - 可选的 CPU 绑核：每个 worker 绑定到不重叠的核心区间（通过锁文件领取区间编号）
+默认把本机可用核心（减去为模型服务等进程预留的核心）平均分给 THREAD_BUDGET_WORKERS 个 worker。
+须在模型首次推理之前应用（torch 算子间线程池启动后不能再修改；OpenMP / MKL 的环境变量最好在导入 torch 之前设置）：
+main.py 和 reranker.py 在模块开头、ingest.py 和模型服务在解析命令行参数后调用 apply_thread_budget_from_env
+（同一进程内只生效一次）
+
+环境变量：
+  THREAD_BUDGET_ENABLED         是否启用（默认 1）
+  THREAD_BUDGET_CORES           可用核心总数（默认为进程可用的全部核心）
+  THREAD_BUDGET_RESERVED_CORES  预留给模型服务（src/core/model_server.py）的核心数（默认 0）
+  THREAD_BUDGET_WORKERS         共享核心的 worker 进程数（默认 WEB_CONCURRENCY 或 1）
+  TORCH_NUM_THREADS             每个 worker 的 torch 算子内线程数（默认 每个 worker 的核心数）
+  TORCH_INTEROP_THREADS         torch 算子间线程数（默认 1）
+  TOKENIZERS_PARALLELISM        true / false（默认只有单个 worker 时并行）
+  EXECUTOR_WORKERS              线程池大小（默认 min(32, 每个 worker 的核心数 + 4)，与 ThreadPoolExecutor 的默认公式相同）
+  CPU_PINNING                   是否绑核（默认 0）
+"""
+
+import fcntl
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+BUDGET_ROLES = ("worker", "server")
+
+_applied: Optional[dict] = None
+_slot_lock = None  # 领取的绑核区间锁文件（进程存活期间保持打开）
+
+
+class ThreadBudget(NamedTuple):
+    """一个进程的线程预算"""
+    torch_threads: int
+    interop_threads: int
+    tokenizers_parallelism: bool
+    executor_workers: int
+    cores_per_process: int
+    cpus: Optional[List[int]] = None  # 可绑定的核心（None 表示不绑核；worker 在其中领取自己的区间）
+
+    @classmethod
+    def from_env(cls, role: str = "worker", workers: Optional[int] = None) -> "ThreadBudget":
+        """
+        按环境变量计算线程预算
+
+        Args:
+            role: worker（API worker / ingest，平分未预留的核心）/ server（模型服务，使用预留的核心，未预留时使用全部核心）
+            workers: 共享核心的进程数（None 表示读取环境变量）
+        """
+        if role not in BUDGET_ROLES:
+            raise ValueError(f"未知的线程预算角色: {role}（可选: {', '.join(BUDGET_ROLES)}）")
+        available = available_cpus()
+        total = min(int(os.getenv("THREAD_BUDGET_CORES", "0")) or len(available), len(available))
+        reserved = min(int(os.getenv("THREAD_BUDGET_RESERVED_CORES", "0")), total - 1)
+        if role == "server":
+            workers = 1
+            cpus = available[:reserved] if reserved else available[:total]
+        else:
+            workers = workers or int(os.getenv("THREAD_BUDGET_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1")
+            cpus = available[reserved:total]
+        per_process = max(1, len(cpus) // max(workers, 1))
+        parallelism = os.getenv("TOKENIZERS_PARALLELISM")
+        return cls(
+            torch_threads=int(os.getenv("TORCH_NUM_THREADS", "0")) or per_process,
+            interop_threads=int(os.getenv("TORCH_INTEROP_THREADS", "0")) or 1,
+            tokenizers_parallelism=parallelism.lower() == "true" if parallelism else workers == 1,
+            executor_workers=int(os.getenv("EXECUTOR_WORKERS", "0")) or min(32, per_process + 4),
+            cores_per_process=per_process,
+            cpus=cpus if os.getenv("CPU_PINNING", "0") == "1" else None,
+        )
+
+
+def available_cpus() -> List[int]:
+    """进程可用的核心编号"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _claim_cpus(cpus: List[int], size: int) -> List[int]:
+    """在 cpus 中领取一个未被其他 worker 占用的区间（按区间编号加文件锁，进程退出时自动释放）"""
+    global _slot_lock
+    lock_dir = Path(os.getenv("THREAD_BUDGET_LOCK_DIR", tempfile.gettempdir()))
+    slots = max(1, len(cpus) // size)
+    for slot in range(slots):
+        handle = open(lock_dir / f"legalflash-cpu-slot-{cpus[0]}-{size}-{slot}.lock", "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _slot_lock = handle
+        return cpus[slot * size:(slot + 1) * size]
+    # worker 多于区间（如重启时旧进程尚未退出）：按 pid 选择区间
+    slot = os.getpid() % slots
+    return cpus[slot * size:(slot + 1) * size]
+
+
+def apply_thread_budget(budget: ThreadBudget) -> dict:
+    """
+    应用线程预算（同一进程内只生效一次，之后的调用返回第一次的结果）
+
+    Returns:
+        实际生效的设置（/health 中展示）
+    """
+    global _applied
+    if _applied is not None:
+        return _applied
+    pinned = None
+    if budget.cpus and hasattr(os, "sched_setaffinity"):
+        pinned = _claim_cpus(budget.cpus, budget.cores_per_process)
+        os.sched_setaffinity(0, pinned)
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(budget.torch_threads)
+    # tokenizers 每次并行分词时读取该环境变量，导入之后设置同样生效
+    os.environ["TOKENIZERS_PARALLELISM"] = "true" if budget.tokenizers_parallelism else "false"
+    interop = budget.interop_threads
+    try:
+        import torch
+        torch.set_num_threads(budget.torch_threads)
+        try:
+            torch.set_num_interop_threads(budget.interop_threads)
+        except RuntimeError:
+            # 算子间线程池已启动（torch 已执行过并行计算）后不能再修改
+            interop = torch.get_num_interop_threads()
+            print(f"⚠️  torch 算子间线程数已固定为 {interop}，线程预算未生效")
+    except ImportError:
+        pass
+    _applied = {
+        "pid": os.getpid(),
+        "torch_threads": budget.torch_threads,
+        "interop_threads": interop,
+        "tokenizers_parallelism": budget.tokenizers_parallelism,
+        "executor_workers": budget.executor_workers,
+        "cpus": pinned,
+    }
+    pinning = f"，绑定核心 {pinned}" if pinned else ""
+    print(f"🧮 CPU 线程预算: torch {budget.torch_threads}/{interop} 线程，tokenizers 并行 "
+          f"{'开' if budget.tokenizers_parallelism else '关'}，线程池 {budget.executor_workers}{pinning}")
+    return _applied
+
+
+def apply_thread_budget_from_env(role: str = "worker", workers: Optional[int] = None) -> Optional[ThreadBudget]:
+    """按环境变量计算并应用线程预算（THREAD_BUDGET_ENABLED=0 时不做任何设置，返回 None）"""
+    if os.getenv("THREAD_BUDGET_ENABLED", "1") != "1":
+        return None
+    budget = ThreadBudget.from_env(role=role, workers=workers)
+    apply_thread_budget(budget)
+    return budget
+
+
+def applied_thread_budget() -> Optional[dict]:
+    """本进程实际生效的线程预算（未应用时为 None）"""
+    return _applied
+
+
+def configure_executors(budget: ThreadBudget, loop=None) -> ThreadPoolExecutor:
+    """
+    按线程预算设置事件循环的默认线程池（asyncio.to_thread / run_in_executor(None)）和 Starlette 的线程池上限
+    （需在事件循环中调用，如 FastAPI 的 startup 事件）
+    """
+    import asyncio
+
+    loop = loop or asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=budget.executor_workers, thread_name_prefix="rag")
+    loop.set_default_executor(executor)
+    try:
+        from anyio import to_thread
+        to_thread.current_default_thread_limiter().total_tokens = budget.executor_workers
+    except (ImportError, RuntimeError):
+        pass
+    return executor
@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""
+向量索引模块
+功能：为进程内向量库提供近似最近邻（ANN）检索能力
+向量统一做 L2 归一化，使用内积（即余弦相似度）打分
+
+支持的索引类型（ingest 时选择，默认 auto 按规模自动切换）：
+  - exact: NumPy 暴力检索，向量保存在一个连续的 float32 矩阵中，
+           一批查询只做一次矩阵乘法 + argpartition，召回率 100%，适合中小规模知识库
+  - hnsw:  FAISS HNSW 近似检索
+  - ivfpq: FAISS IVF-PQ 近似检索（见下方压缩方式）
+
+支持的压缩方式（ingest 时选择）：
+  - none:  HNSW + float32 原始向量
+  - fp16:  HNSW + float16 标量量化（内存减半，精度几乎无损）
+  - pq:    HNSW + 乘积量化编码，检索后用 float16 原始向量对候选集精排
+  - ivfpq: IVF 倒排 + 乘积量化编码，检索后用 float16 原始向量对候选集精排
+"""
+
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+
+# HNSW 默认参数（兼顾构建速度与召回率）
+DEFAULT_HNSW_M = 32
+DEFAULT_EF_CONSTRUCTION = 200
+DEFAULT_EF_SEARCH = 128
+
+# 压缩相关默认参数
+COMPRESSION_TYPES = ("none", "fp16", "pq", "ivfpq")
+DEFAULT_PQ_NBITS = 8
+DEFAULT_NPROBE = 16
+DEFAULT_RESCORE_FACTOR = 4
+# 乘积量化训练所需的最少向量数，低于该值时回退为 fp16
+MIN_PQ_TRAIN_SIZE = 1000
+
+# 索引类型；auto 模式下不超过该规模（且未压缩）时使用暴力检索
+INDEX_TYPES = ("auto", "exact", "hnsw")
+EXACT_SEARCH_THRESHOLD = 50_000
+
+# 持久化文件
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.npy"
+
+
+def normalize_vectors(vectors) -> np.ndarray:
+    """
+    将向量转换为连续的 float32 矩阵并做 L2 归一化
+
+    Args:
+        vectors: 向量或向量列表，形状为 (d,) 或 (n, d)
+
+    Returns:
+        np.ndarray: 形状为 (n, d) 的归一化矩阵
+    """
+    matrix = np.ascontiguousarray(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def default_pq_m(dim: int) -> int:
+    """选择乘积量化子空间数：每个子空间约 8 维，且必须整除向量维度"""
+    target = max(1, dim // 8)
+    for m in range(target, 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _append_rows(buffer: np.ndarray, size: int, rows: np.ndarray) -> np.ndarray:
+    """
+    向预分配的行缓冲区追加向量，容量不足时按 2 倍扩容，
+    多次小批量 add 的总复制量为 O(n)（而不是每次整体拼接的 O(n²)）
+
+    Args:
+        buffer: 当前缓冲区，前 size 行有效（只读的内存映射数组会在首次追加时复制）
+        size: 有效行数
+        rows: 待追加的向量，形状为 (m, d)
+
+    Returns:
+        np.ndarray: 追加后的缓冲区（可能是新分配的数组）
+    """
+    needed = size + len(rows)
+    if needed > len(buffer):
+        grown = np.empty((max(needed, 2 * len(buffer)), buffer.shape[1]), dtype=buffer.dtype)
+        grown[:size] = buffer[:size]
+        buffer = grown
+    buffer[size:needed] = rows
+    return buffer
+
+
+def _require_faiss():
+    if not FAISS_AVAILABLE:
+        raise ImportError("faiss 未安装，请运行: pip install faiss-cpu")
+
+
+def _read_faiss_index(path: Path, mmap: bool = False):
+    """
+    读取 FAISS 索引
+
+    mmap=True 时以只读方式映射向量存储（IndexFlatCodes），多个进程共享页缓存；
+    HNSW 图结构与 IVF 倒排表仍读入进程内存。旧版 FAISS 不支持时回退为普通读取
+    """
+    if mmap:
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+        if flag is not None:
+            try:
+                return faiss.read_index(str(path), flag | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError as e:
+                print(f"⚠️  索引不支持 mmap 加载，回退为普通读取: {e}")
+    return faiss.read_index(str(path))
+
+
+class HNSWIndex:
+    """基于 FAISS 的 HNSW 索引，支持调节 M / ef_construction / ef_search"""
+
+    index_type = "hnsw"
+
+    def __init__(
+        self,
+        dim: int,
+        M: int = DEFAULT_HNSW_M,
+        ef_construction: int = DEFAULT_EF_CONSTRUCTION,
+        ef_search: int = DEFAULT_EF_SEARCH,
+        compression: str = "none",
+        pq_m: Optional[int] = None,
+        index=None
+    ):
+        """
+        初始化 HNSW 索引
+
+        Args:
+            dim: 向量维度
+            M: 每个节点的最大连接数（越大召回越高，内存占用越大）
+            ef_construction: 构建时的候选队列长度
+            ef_search: 检索时的候选队列长度（越大召回越高，延迟越高）
+            compression: 向量存储方式（"none" / "fp16" / "pq"）
+            pq_m: 乘积量化子空间数，仅 compression="pq" 时使用
+            index: 已存在的 FAISS 索引对象（从磁盘加载时使用）
+        """
+        _require_faiss()
+
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        self.compression = compression
+        self.pq_m = pq_m or default_pq_m(dim)
+        if index is None:
+            if compression == "fp16":
+                index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_fp16, M, faiss.METRIC_INNER_PRODUCT)
+            elif compression == "pq":
+                # HNSW-PQ 在内积度量下建图质量很差；向量已归一化，L2 排序与内积一致，
+                # 且候选集最终由 RescoringIndex 用精确内积重新打分
+                index = faiss.IndexHNSWPQ(dim, self.pq_m, M, DEFAULT_PQ_NBITS, faiss.METRIC_L2)
+            elif compression == "none":
+                index = faiss.IndexHNSWFlat(dim, M, faiss.METRIC_INNER_PRODUCT)
+            else:
+                raise ValueError(f"HNSW 索引不支持的压缩方式: {compression}")
+            index.hnsw.efConstruction = ef_construction
+        self.index = index
+        self.ef_search = ef_search
+
+    @property
+    def ef_search(self) -> int:
+        return self.index.hnsw.efSearch
+
+    @ef_search.setter
+    def ef_search(self, value: int):
+        self.index.hnsw.efSearch = int(value)
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def add(self, vectors: np.ndarray):
+        """添加已归一化的向量（位置即内部 ID），量化索引首次写入时自动训练"""
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add(vectors)
+
+    def search(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量检索
+
+        Args:
+            vectors: 已归一化的查询矩阵，形状为 (n, d)
+            k: 每个查询返回的结果数量
+
+        Returns:
+            (scores, ids): 形状均为 (n, k)，不足 k 个时 ids 以 -1 填充
+        """
+        # ef_search 必须不小于 k，否则 HNSW 无法返回足够的候选
+        if k > self.ef_search:
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = k
+            return self.index.search(vectors, k, params=params)
+        return self.index.search(vectors, k)
+
+    def params(self) -> dict:
+        """返回需要写入配置文件的索引参数"""
+        return {
+            "M": self.M,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search,
+            "compression": self.compression,
+            "pq_m": self.pq_m,
+        }
+
+    def memory_bytes(self) -> int:
+        """索引序列化后的字节数（近似常驻内存占用）"""
+        return int(faiss.serialize_index(self.index).nbytes)
+
+    def save(self, directory: Path):
+        faiss.write_index(self.index, str(Path(directory) / INDEX_FILE))
+
+    @classmethod
+    def load(cls, directory: Path, dim: int, M: int = DEFAULT_HNSW_M,
+             ef_construction: int = DEFAULT_EF_CONSTRUCTION,
+             ef_search: int = DEFAULT_EF_SEARCH,
+             compression: str = "none", pq_m: Optional[int] = None,
+             mmap: bool = False) -> "HNSWIndex":
+        _require_faiss()
+        index = _read_faiss_index(Path(directory) / INDEX_FILE, mmap)
+        return cls(dim, M=M, ef_construction=ef_construction, ef_search=ef_search,
+                   compression=compression, pq_m=pq_m, index=index)
+
+
+class IVFPQIndex:
+    """基于 FAISS 的 IVF-PQ 索引：倒排聚类 + 乘积量化编码，内存占用最小"""
+
+    index_type = "ivfpq"
+
+    def __init__(
+        self,
+        dim: int,
+        nlist: Optional[int] = None,
+        pq_m: Optional[int] = None,
+        nprobe: int = DEFAULT_NPROBE,
+        index=None
+    ):
+        """
+        初始化 IVF-PQ 索引
+
+        Args:
+            dim: 向量维度
+            nlist: 倒排聚类中心数，None 表示首次写入时按数据量自动选择（约 4·√N）
+            pq_m: 乘积量化子空间数
+            nprobe: 检索时访问的聚类数（越大召回越高，延迟越高）
+            index: 已存在的 FAISS 索引对象（从磁盘加载时使用）
+        """
+        _require_faiss()
+
+        self.dim = dim
+        self.nlist = nlist
+        self.pq_m = pq_m or default_pq_m(dim)
+        self.compression = "ivfpq"
+        self._nprobe = nprobe
+        self.index = index
+        if index is not None:
+            self.nlist = index.nlist
+            self.index.nprobe = nprobe
+
+    @property
+    def nprobe(self) -> int:
+        return self._nprobe
+
+    @nprobe.setter
+    def nprobe(self, value: int):
+        self._nprobe = int(value)
+        if self.index is not None:
+            self.index.nprobe = self._nprobe
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    def add(self, vectors: np.ndarray):
+        """添加已归一化的向量（位置即内部 ID），首次写入时用该批数据训练聚类与码本"""
+        if self.index is None:
+            if self.nlist is None:
+                self.nlist = int(min(max(4 * np.sqrt(len(vectors)), 1), len(vectors) // 39 or 1))
+            quantizer = faiss.IndexFlatIP(self.dim)
+            self.index = faiss.IndexIVFPQ(
+                quantizer, self.dim, self.nlist, self.pq_m, DEFAULT_PQ_NBITS, faiss.METRIC_INNER_PRODUCT
+            )
+            self.index.train(vectors)
+            self.index.nprobe = self._nprobe
+        self.index.add(vectors)
+
+    def search(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.index.search(vectors, k)
+
+    def params(self) -> dict:
+        return {
+            "nlist": self.nlist,
+            "pq_m": self.pq_m,
+            "nprobe": self.nprobe,
+            "compression": self.compression,
+        }
+
+    def memory_bytes(self) -> int:
+        return int(faiss.serialize_index(self.index).nbytes) if self.index is not None else 0
+
+    def save(self, directory: Path):
+        faiss.write_index(self.index, str(Path(directory) / INDEX_FILE))
+
+    @classmethod
+    def load(cls, directory: Path, dim: int, pq_m: Optional[int] = None,
+             nprobe: int = DEFAULT_NPROBE, mmap: bool = False, **kwargs) -> "IVFPQIndex":
+        _require_faiss()
+        index = _read_faiss_index(Path(directory) / INDEX_FILE, mmap)
+        return cls(dim, pq_m=pq_m, nprobe=nprobe, index=index)
+
+
+class RescoringIndex:
+    """
+    精排包装器：先在压缩索引中取 k × rescore_factor 个候选，
+    再用 float16 原始向量计算精确内积，只对候选集做一次小矩阵乘法
+    """
+
+    def __init__(self, base, vectors: Optional[np.ndarray] = None,
+                 rescore_factor: int = DEFAULT_RESCORE_FACTOR):
+        """
+        Args:
+            base: 压缩索引（HNSWIndex(pq) 或 IVFPQIndex）
+            vectors: float16 原始向量矩阵（可为内存映射数组），行号与索引内部 ID 对齐
+            rescore_factor: 候选集相对 k 的放大倍数
+        """
+        self.base = base
+        self._buffer = vectors if vectors is not None else np.empty((0, base.dim), dtype=np.float16)
+        self._size = len(self._buffer)
+        self.rescore_factor = rescore_factor
+
+    def __getattr__(self, name):
+        # 其余属性（dim / index_type / ef_search / nprobe 等）透传给底层索引
+        return getattr(self.base, name)
+
+    @property
+    def ntotal(self) -> int:
+        return self.base.ntotal
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._buffer[:self._size]
+
+    def add(self, vectors: np.ndarray):
+        self.base.add(vectors)
+        self._buffer = _append_rows(self._buffer, self._size, vectors.astype(np.float16))
+        self._size += len(vectors)
+
+    def search(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        shortlist_k = min(k * self.rescore_factor, self.ntotal)
+        _, candidates = self.base.search(vectors, shortlist_k)
+
+        scores = np.full((len(vectors), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(vectors), k), -1, dtype=np.int64)
+        for row, (query, cand) in enumerate(zip(vectors, candidates)):
+            cand = cand[cand >= 0]
+            if len(cand) == 0:
+                continue
+            # 按行号排序后读取，内存映射时顺序访问页面
+            cand = np.sort(cand)
+            exact = self.vectors[cand].astype(np.float32) @ query
+            top = min(k, len(cand))
+            order = np.argsort(-exact)[:top]
+            scores[row, :top] = exact[order]
+            ids[row, :top] = cand[order]
+        return scores, ids
+
+    def params(self) -> dict:
+        return {**self.base.params(), "rescore_factor": self.rescore_factor}
+
+    def memory_bytes(self) -> int:
+        """仅统计常驻的压缩索引，原始向量以内存映射方式按需读取"""
+        return self.base.memory_bytes()
+
+    def save(self, directory: Path):
+        self.base.save(directory)
+        np.save(Path(directory) / VECTORS_FILE, np.asarray(self.vectors, dtype=np.float16))
+
+
+class ExactIndex:
+    """
+    NumPy 暴力检索索引：所有向量保存在一个连续的 float32 矩阵中，
+    一批查询只做一次矩阵乘法，再用 argpartition 取 Top-K，召回率 100%
+    """
+
+    index_type = "exact"
+    compression = "none"
+
+    def __init__(self, dim: int, vectors: Optional[np.ndarray] = None):
+        """
+        Args:
+            dim: 向量维度
+            vectors: 已归一化的 float32 向量矩阵（可为内存映射数组）
+        """
+        self.dim = dim
+        self._buffer = vectors if vectors is not None else np.empty((0, dim), dtype=np.float32)
+        self._size = len(self._buffer)
+
+    @property
+    def ntotal(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        # 缓冲区按行连续分配，前 _size 行的切片仍是连续矩阵
+        return self._buffer[:self._size]
+
+    def add(self, vectors: np.ndarray):
+        self._buffer = _append_rows(self._buffer, self._size, vectors.astype(np.float32))
+        self._size += len(vectors)
+
+    def search(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量暴力检索
+
+        Args:
+            vectors: 已归一化的查询矩阵，形状为 (n, d)
+            k: 每个查询返回的结果数量
+
+        Returns:
+            (scores, ids): 形状均为 (n, k)，不足 k 个时 ids 以 -1 填充
+        """
+        n, total = len(vectors), self.ntotal
+        scores = np.full((n, k), -np.inf, dtype=np.float32)
+        ids = np.full((n, k), -1, dtype=np.int64)
+        top = min(k, total)
+        if top == 0:
+            return scores, ids
+
+        # 一次矩阵乘法得到 (n, N) 相似度矩阵
+        similarities = vectors @ self.vectors.T
+        if top < total:
+            candidates = np.argpartition(-similarities, top - 1, axis=1)[:, :top]
+        else:
+            candidates = np.broadcast_to(np.arange(total), (n, total))
+        candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+        scores[:, :top] = np.take_along_axis(candidate_scores, order, axis=1)
+        ids[:, :top] = np.take_along_axis(candidates, order, axis=1)
+        return scores, ids
+
+    def params(self) -> dict:
+        return {"compression": self.compression}
+
+    def memory_bytes(self) -> int:
+        return int(np.asarray(self.vectors).nbytes)
+
+    def save(self, directory: Path):
+        np.save(Path(directory) / VECTORS_FILE, np.ascontiguousarray(self.vectors, dtype=np.float32))
+
+    @classmethod
+    def load(cls, directory: Path, dim: int, mmap: bool = False, **kwargs) -> "ExactIndex":
+        vectors = np.load(Path(directory) / VECTORS_FILE, mmap_mode="r" if mmap else None)
+        return cls(dim, vectors)
+
+
+def create_index(
+    dim: int,
+    num_vectors: int,
+    index_type: str = "auto",
+    compression: str = "none",
+    M: int = DEFAULT_HNSW_M,
+    ef_construction: int = DEFAULT_EF_CONSTRUCTION,
+    ef_search: int = DEFAULT_EF_SEARCH,
+    pq_m: Optional[int] = None,
+    nlist: Optional[int] = None,
+    nprobe: int = DEFAULT_NPROBE,
+    rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+    exact_threshold: int = EXACT_SEARCH_THRESHOLD,
+    **kwargs
+):
+    """
+    根据索引类型与压缩方式创建索引（ingest 时调用）
+
+    Args:
+        dim: 向量维度
+        num_vectors: 待写入的向量数（用于自动选择索引类型、判断是否足以训练乘积量化）
+        index_type: 索引类型（"auto" / "exact" / "hnsw"），auto 时规模不超过
+                    exact_threshold 且未压缩则使用暴力检索，否则使用近似检索
+        compression: 压缩方式（"none" / "fp16" / "pq" / "ivfpq"），仅近似检索使用
+        exact_threshold: auto 模式下切换为近似检索的规模阈值
+        其余参数见 HNSWIndex / IVFPQIndex / RescoringIndex
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支持的索引类型: {index_type}，可选: {', '.join(INDEX_TYPES)}")
+    if compression not in COMPRESSION_TYPES:
+        raise ValueError(f"不支持的压缩方式: {compression}，可选: {', '.join(COMPRESSION_TYPES)}")
+    if index_type == "auto":
+        index_type = "exact" if compression == "none" and num_vectors <= exact_threshold else "hnsw"
+    if index_type == "exact":
+        if compression != "none":
+            print(f"⚠️  暴力检索不支持压缩，忽略 compression={compression}")
+        return ExactIndex(dim)
+
+    if compression in ("pq", "ivfpq") and num_vectors < MIN_PQ_TRAIN_SIZE:
+        print(f"⚠️  文档块数量 {num_vectors} 不足以训练乘积量化（至少 {MIN_PQ_TRAIN_SIZE}），回退为 fp16 压缩")
+        compression = "fp16"
+
+    if compression == "ivfpq":
+        return RescoringIndex(IVFPQIndex(dim, nlist=nlist, pq_m=pq_m, nprobe=nprobe), rescore_factor=rescore_factor)
+    index = HNSWIndex(dim, M=M, ef_construction=ef_construction, ef_search=ef_search,
+                      compression=compression, pq_m=pq_m)
+    if compression == "pq":
+        return RescoringIndex(index, rescore_factor=rescore_factor)
+    return index
+
+
+def load_index(directory: Path, config: dict, ef_search: Optional[int] = None,
+               nprobe: Optional[int] = None, mmap: bool = False):
+    """
+    根据配置文件加载索引（API 启动时调用）
+
+    Args:
+        directory: 持久化目录
+        config: 持久化目录中的索引配置
+        ef_search: 覆盖 HNSW 检索参数
+        nprobe: 覆盖 IVF 检索参数
+        mmap: 以只读 mmap 方式打开索引存储与向量文件
+    """
+    dim = config["dim"]
+    index_type = config.get("index_type", "hnsw")
+    compression = config.get("compression", "none")
+    if index_type == "exact":
+        return ExactIndex.load(directory, dim, mmap=mmap)
+    if index_type == "ivfpq":
+        index = IVFPQIndex.load(directory, dim, pq_m=config.get("pq_m"),
+                                nprobe=nprobe or config.get("nprobe", DEFAULT_NPROBE), mmap=mmap)
+    else:
+        index = HNSWIndex.load(
+            directory, dim,
+            M=config.get("M", DEFAULT_HNSW_M),
+            ef_construction=config.get("ef_construction", DEFAULT_EF_CONSTRUCTION),
+            ef_search=ef_search or config.get("ef_search", DEFAULT_EF_SEARCH),
+            compression=compression,
+            pq_m=config.get("pq_m"),
+            mmap=mmap,
+        )
+    if compression in ("pq", "ivfpq"):
+        vectors = np.load(Path(directory) / VECTORS_FILE, mmap_mode="r" if mmap else None)
+        return RescoringIndex(index, vectors, rescore_factor=config.get("rescore_factor", DEFAULT_RESCORE_FACTOR))
+    return index
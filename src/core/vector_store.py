@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+向量库抽象模块
+功能：统一 API 与 ingest 使用的向量库接口，支持两种后端
+  - chroma: LangChain Chroma（默认，兼容已有知识库）
+  - faiss:  进程内索引（FlashVectorStore，暴力检索 / HNSW / IVF-PQ），省去 sqlite 往返和元数据物化开销
+两种后端都实现 LangChain VectorStore 接口，检索器（as_retriever）用法保持不变
+
+faiss 后端的持久化目录同时也是只读服务格式：API 以 mmap 方式打开索引存储、
+精排向量和列式文档块，同一主机上的多个 worker 共享同一份页缓存
+"""
+
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Callable
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.core.chunk_store import MmapChunkStore
+from src.core.vector_index import (
+    create_index,
+    load_index,
+    normalize_vectors,
+)
+
+# 支持的向量库后端
+VECTOR_STORE_BACKENDS = ("chroma", "faiss")
+
+# FlashVectorStore 持久化文件
+STORE_CONFIG_FILE = "flash_store.json"
+# 旧版（逐行 JSON）文档载荷文件，仅用于兼容读取
+LEGACY_DOCSTORE_FILE = "docstore.jsonl"
+
+
+class FlashVectorStore(VectorStore):
+    """进程内向量库：FAISS 索引（HNSW / IVF-PQ，可压缩）+ 同目录存放的文档载荷"""
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        index,
+        texts: Optional[List[str]] = None,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        persist_directory: Optional[str] = None,
+        chunk_store: Optional[MmapChunkStore] = None
+    ):
+        """
+        初始化向量库
+
+        Args:
+            embedding: 嵌入模型
+            index: 向量索引（内部 ID 即文档在载荷列表中的位置），见 vector_index.create_index
+            texts: 文档块文本列表（只读加载时为内存映射列）
+            metadatas: 文档块元数据列表（只读加载时为内存映射列）
+            ids: 文档块 ID 列表（只读加载时为内存映射列）
+            persist_directory: 持久化目录，None 表示仅驻留内存
+            chunk_store: 只读加载时 texts / metadatas / ids 所属的列式存储（用于按 ID 查找）
+        """
+        self._embedding = embedding
+        self.index = index
+        self._texts = texts if texts is not None else []
+        self._metadatas = metadatas if metadatas is not None else [{} for _ in self._texts]
+        self._ids = ids if ids is not None else []
+        self.persist_directory = persist_directory
+        self._chunk_store = chunk_store
+        self._positions = None
+        # 从持久化目录加载的只读服务格式（列式文档块）不可写
+        self.read_only = not isinstance(self._texts, list)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """嵌入并写入文本，返回文档块 ID 列表"""
+        texts = list(texts)
+        if not texts:
+            return []
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if ids is None:
+            ids = [uuid.uuid4().hex for _ in texts]
+
+        vectors = normalize_vectors(self._embedding.embed_documents(texts))
+        self._add_vectors(vectors, texts, metadatas, ids)
+        return list(ids)
+
+    def _add_vectors(self, vectors, texts: List[str], metadatas: List[dict], ids: List[str]):
+        """写入已归一化的向量及对应载荷"""
+        if self.read_only:
+            raise RuntimeError(f"向量库以只读服务格式加载，无法写入: {self.persist_directory}")
+        self.index.add(vectors)
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas)
+        self._ids.extend(ids)
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+    def _search_positions(self, embeddings: List[List[float]], k: int):
+        """批量检索，返回每个查询的 (位置, 余弦相似度) 列表"""
+        if len(embeddings) == 0:
+            return []
+        if len(self._texts) == 0:
+            return [[] for _ in embeddings]
+        k = min(k, len(self._texts))
+        scores, positions = self.index.search(normalize_vectors(embeddings), k)
+        return [
+            [(int(pos), float(score)) for score, pos in zip(row_scores, row_positions) if pos >= 0]
+            for row_scores, row_positions in zip(scores, positions)
+        ]
+
+    def _document(self, pos: int) -> Document:
+        return Document(
+            page_content=self._texts[pos],
+            metadata=self._metadatas[pos],
+            id=self._ids[pos],
+        )
+
+    def similarity_search_by_vectors_with_score(
+        self, embeddings: List[List[float]], k: int = 4, **kwargs: Any
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        批量按向量检索：所有查询向量合并为一个矩阵，只调用一次索引检索
+
+        Args:
+            embeddings: 查询向量列表
+            k: 每个查询返回的结果数量
+
+        Returns:
+            每个查询的 (Document, 余弦相似度) 列表，按相似度降序排列
+        """
+        return [
+            [(self._document(pos), score) for pos, score in row]
+            for row in self._search_positions(embeddings, k)
+        ]
+
+    def search_ids_by_vectors(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        批量按向量检索，只返回 (文档块 ID, 余弦相似度)，不读取文本和元数据
+
+        文本由调用方在确定最终结果后通过 get_by_ids 按需读取
+        """
+        return [
+            [(self._ids[pos], score) for pos, score in row]
+            for row in self._search_positions(embeddings, k)
+        ]
+
+    def _position(self, chunk_id: str) -> Optional[int]:
+        """文档块 ID → 位置（只读格式在 mmap 上二分查找，内存格式使用字典）"""
+        if self._chunk_store is not None:
+            return self._chunk_store.position(chunk_id)
+        if self._positions is None or len(self._positions) != len(self._ids):
+            self._positions = {value: i for i, value in enumerate(self._ids)}
+        return self._positions.get(chunk_id)
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        """按 ID 读取文档块，按传入顺序返回，不存在的 ID 会被跳过"""
+        documents = []
+        for chunk_id in ids:
+            pos = self._position(chunk_id)
+            if pos is not None:
+                documents.append(self._document(pos))
+        return documents
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """按向量检索，分数为余弦相似度（越大越相关）"""
+        return self.similarity_search_by_vectors_with_score([embedding], k)[0]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # 归一化向量的内积即余弦相似度，截断到 [0, 1] 作为相关性分数
+        return lambda score: min(1.0, max(0.0, score))
+
+    # ------------------------------------------------------------------
+    # 构建 / 持久化
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        persist_directory: Optional[str] = None,
+        compression: str = "none",
+        **index_params: Any,
+    ) -> "FlashVectorStore":
+        """
+        从文本构建向量库，指定 persist_directory 时自动持久化
+
+        Args:
+            compression: 向量压缩方式（"none" / "fp16" / "pq" / "ivfpq"），构建后不可更改
+            **index_params: 索引参数（index_type / exact_threshold / M / ef_construction / ef_search /
+                            pq_m / nlist / nprobe / rescore_factor），见 vector_index.create_index
+        """
+        texts = list(texts)
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if ids is None:
+            ids = [uuid.uuid4().hex for _ in texts]
+        # 先完成嵌入，量化索引需要用全部向量训练码本
+        vectors = normalize_vectors(embedding.embed_documents(texts))
+        index = create_index(vectors.shape[1], len(vectors), compression=compression, **index_params)
+        store = cls(embedding, index, persist_directory=persist_directory)
+        store._add_vectors(vectors, texts, metadatas, ids)
+        if persist_directory:
+            store.persist()
+        return store
+
+    def persist(self, persist_directory: Optional[str] = None):
+        """将索引、文档载荷和配置写入持久化目录"""
+        persist_directory = persist_directory or self.persist_directory
+        if not persist_directory:
+            raise ValueError("未指定持久化目录")
+        path = Path(persist_directory)
+        path.mkdir(parents=True, exist_ok=True)
+
+        self.index.save(path)
+        MmapChunkStore.write(path, self._ids, self._texts, self._metadatas)
+        config = {
+            "backend": "faiss",
+            "index_type": self.index.index_type,
+            "dim": self.index.dim,
+            "count": len(self._texts),
+            **self.index.params(),
+        }
+        with open(path / STORE_CONFIG_FILE, "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        self.persist_directory = str(path)
+
+    @classmethod
+    def load(
+        cls,
+        persist_directory: str,
+        embedding: Embeddings,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        mmap: bool = True,
+        prefetch: bool = False
+    ) -> "FlashVectorStore":
+        """
+        从持久化目录加载向量库
+
+        Args:
+            persist_directory: 持久化目录
+            embedding: 嵌入模型（必须与构建时一致）
+            ef_search: 覆盖构建时保存的 HNSW ef_search，None 表示沿用
+            nprobe: 覆盖构建时保存的 IVF nprobe，None 表示沿用
+            mmap: 以只读 mmap 方式打开（多个 worker 共享页缓存），False 时整体读入内存
+            prefetch: 启动时预读所有文件到页缓存，避免首批请求触发缺页
+        """
+        path = Path(persist_directory)
+        with open(path / STORE_CONFIG_FILE, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+        if prefetch:
+            prefetch_directory(path)
+
+        index = load_index(path, config, ef_search=ef_search, nprobe=nprobe, mmap=mmap)
+
+        chunks = None
+        if MmapChunkStore.exists(path):
+            chunks = MmapChunkStore(path, use_mmap=mmap)
+            ids, texts, metadatas = chunks.ids, chunks.texts, chunks.metadatas
+        else:
+            ids, texts, metadatas = _load_legacy_docstore(path / LEGACY_DOCSTORE_FILE)
+
+        if len(texts) != index.ntotal:
+            raise ValueError(
+                f"向量库数据不一致: 索引 {index.ntotal} 条, 文档载荷 {len(texts)} 条 ({path})"
+            )
+        return cls(embedding, index, texts, metadatas, ids, persist_directory=str(path), chunk_store=chunks)
+
+
+def _load_legacy_docstore(docstore_path: Path):
+    """读取旧版逐行 JSON 文档载荷"""
+    texts, metadatas, ids = [], [], []
+    with open(docstore_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            ids.append(item["id"])
+            texts.append(item["page_content"])
+            metadatas.append(item.get("metadata") or {})
+    return ids, texts, metadatas
+
+
+def prefetch_directory(persist_directory, chunk_size: int = 16 * 1024 * 1024) -> int:
+    """
+    将目录下的所有文件预读到页缓存（多个 worker 只需一次磁盘读取）
+
+    Args:
+        persist_directory: 持久化目录
+        chunk_size: 不支持 posix_fadvise 时顺序读取的块大小
+
+    Returns:
+        预读的字节数
+    """
+    total = 0
+    for file_path in sorted(Path(persist_directory).rglob("*")):
+        if not file_path.is_file():
+            continue
+        size = file_path.stat().st_size
+        with open(file_path, "rb") as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+            else:
+                while f.read(chunk_size):
+                    pass
+        total += size
+    return total
+
+
+def is_flash_store(persist_directory) -> bool:
+    """判断目录是否为 FlashVectorStore 持久化目录"""
+    return (Path(persist_directory) / STORE_CONFIG_FILE).exists()
+
+
+def build_vector_store(
+    documents: List[Document],
+    embedding: Embeddings,
+    persist_directory: str,
+    backend: str = "chroma",
+    **index_params: Any
+) -> VectorStore:
+    """
+    构建并持久化向量库（ingest 使用）
+
+    Args:
+        documents: 切分后的文档块
+        embedding: 嵌入模型
+        persist_directory: 持久化目录
+        backend: 向量库后端（"chroma" 或 "faiss"）
+        **index_params: faiss 后端的索引参数（index_type / compression / M / ef_construction / ef_search 等）
+    """
+    if backend == "faiss":
+        return FlashVectorStore.from_documents(
+            documents=documents,
+            embedding=embedding,
+            persist_directory=persist_directory,
+            **index_params
+        )
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        return Chroma.from_documents(
+            documents=documents,
+            embedding=embedding,
+            ids=[doc.id for doc in documents] if all(doc.id for doc in documents) else None,
+            persist_directory=persist_directory
+        )
+    raise ValueError(f"不支持的向量库后端: {backend}，可选: {', '.join(VECTOR_STORE_BACKENDS)}")
+
+
+def search_by_vectors(
+    vectorstore: VectorStore,
+    embeddings: List[List[float]],
+    k: int = 4
+) -> List[List[Tuple[Document, float]]]:
+    """
+    按查询向量批量检索，返回 (Document, 相关性分数) 列表，分数越大越相关
+
+    faiss 后端一次索引调用完成整批检索；其他后端（Chroma）逐个查询向量检索，
+    分数统一为 LangChain 的相关性分数
+
+    Args:
+        vectorstore: 向量库
+        embeddings: 查询向量列表（调用方只需嵌入一次查询，即可在多个知识库中复用）
+        k: 每个查询返回的结果数量
+    """
+    if isinstance(vectorstore, FlashVectorStore):
+        return vectorstore.similarity_search_by_vectors_with_score(embeddings, k)
+    relevance_fn = vectorstore._select_relevance_score_fn()
+    results = []
+    for embedding in embeddings:
+        if hasattr(vectorstore, "similarity_search_by_vector_with_relevance_scores"):
+            # Chroma 返回距离，需转换为相关性分数
+            pairs = vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+            results.append([(doc, relevance_fn(score)) for doc, score in pairs])
+        else:
+            docs = vectorstore.similarity_search_by_vector(embedding, k=k)
+            results.append([(doc, 0.0) for doc in docs])
+    return results
+
+
+def load_vector_store(
+    persist_directory: str,
+    embedding: Embeddings,
+    backend: Optional[str] = None,
+    **index_params: Any
+) -> VectorStore:
+    """
+    加载向量库（API 使用），backend 为 None 时根据目录内容自动识别
+
+    Args:
+        persist_directory: 持久化目录
+        embedding: 嵌入模型
+        backend: 向量库后端，None 表示自动识别
+        **index_params: faiss 后端的加载参数（ef_search / nprobe / mmap / prefetch），chroma 后端忽略；
+                        shard_timeout 为分片知识库的单分片超时（秒）
+    """
+    from src.core.shards import ShardedVectorStore, is_sharded_store
+
+    shard_timeout = index_params.pop("shard_timeout", None)
+    if backend is None:
+        if is_sharded_store(persist_directory):
+            backend = "sharded"
+        else:
+            backend = "faiss" if is_flash_store(persist_directory) else "chroma"
+    if backend == "sharded":
+        # 分片知识库：数据由各分片检索进程加载，这里只建立连接
+        return ShardedVectorStore.load(persist_directory, embedding, timeout=shard_timeout)
+    if backend == "faiss":
+        return FlashVectorStore.load(persist_directory, embedding, **index_params)
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        return Chroma(persist_directory=persist_directory, embedding_function=embedding)
+    raise ValueError(f"不支持的向量库后端: {backend}，可选: {', '.join(VECTOR_STORE_BACKENDS)}")
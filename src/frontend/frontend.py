@@ -78,7 +78,8 @@ for message in st.session_state.messages:
             with st.expander("📄 查看参考来源", expanded=False):
                 for i, source in enumerate(message["sources"], 1):
                     st.markdown(f"**来源 {i}:**")
-                    st.text(source[:500] + "..." if len(source) > 500 else source)
+                    source_content = source.get('content', source) if isinstance(source, dict) else source
+                    st.text(source_content[:500] + "..." if len(source_content) > 500 else source_content)
                     st.divider()
 
 # === 处理用户输入 ===
@@ -0,0 +1,50 @@
+"""
+pytest 公共配置
+单元测试只使用合成向量和小型文本，不下载模型（HF_HUB_OFFLINE），也不需要 vLLM / Chroma 服务
+"""
+
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pytest
+
+# tests/ 下的手动脚本（需要运行中的服务）不作为测试收集
+collect_ignore = ["locustfile.py", "test_client.py"]
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(42)
+
+
+def make_chunks(rng, count: int, dim: int = 16, prefix: str = "chunk"):
+    """生成合成文档块：ID、文本、元数据和已归一化的向量"""
+    from src.core.vector_index import normalize_vectors
+
+    ids = [f"{prefix}-{i}" for i in range(count)]
+    texts = [f"文档块 {i} 借款合同 违约责任 第{i % 7}条" for i in range(count)]
+    metadatas = [{"source": f"doc-{i // 4}", "row": i} for i in range(count)]
+    vectors = normalize_vectors(rng.standard_normal((count, dim)).astype(np.float32))
+    return ids, texts, metadatas, vectors
+
+
+def build_flash_kb(base_dir, ids, texts, metadatas, vectors, version: str = "v1", **index_params):
+    """在 base_dir 下构建一个 faiss 后端知识库版本并激活"""
+    from src.core.kb_registry import activate_version, version_path
+    from src.core.vector_index import create_index
+    from src.core.vector_store import FlashVectorStore
+
+    store = FlashVectorStore(None, create_index(vectors.shape[1], len(ids), **index_params))
+    store._add_vectors(vectors, texts, metadatas, ids)
+    path = version_path(base_dir, version)
+    store.persist(str(path))
+    activate_version(base_dir, version)
+    return path
@@ -0,0 +1,71 @@
+import math
+from collections import Counter
+
+import pytest
+
+from src.core.bm25_index import BM25Index, build_bm25_index, tokenize
+
+IDS = ["loan", "labor", "tort", "loan-2"]
+TEXTS = [
+    "借款合同到期未还款，出借人可以要求支付逾期利息",
+    "用人单位解除劳动合同应当支付经济补偿",
+    "侵权责任的构成要件包括过错和损害",
+    "民间借贷的利息不得超过合同成立时一年期贷款市场报价利率四倍",
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    build_bm25_index(tmp_path, IDS, TEXTS, tokenizer="bigram")
+    return BM25Index.load(tmp_path)
+
+
+def _reference_scores(query, texts, k1=1.2, b=0.75):
+    """直接按定义计算的 BM25 分数"""
+    docs = [Counter(tokenize(text, "bigram")) for text in texts]
+    lengths = [sum(doc.values()) for doc in docs]
+    avgdl = sum(lengths) / len(lengths)
+    scores = [0.0] * len(docs)
+    for term in dict.fromkeys(tokenize(query, "bigram")):
+        df = sum(term in doc for doc in docs)
+        if df == 0:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, doc in enumerate(docs):
+            tf = doc[term]
+            scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[i] / avgdl))
+    return scores
+
+
+def test_tokenize_bigram_drops_stopwords():
+    assert tokenize("借款合同的违约责任", "bigram") == ["借款", "款合", "合同", "同的", "的违", "违约", "约责", "责任"]
+    assert tokenize("的", "bigram") == []
+
+
+def test_search_matches_reference_scores(index):
+    query = "借款利息怎么计算"
+    expected = _reference_scores(query, TEXTS)
+    results = index.search(query, k=10)
+    assert [chunk_id for chunk_id, _ in results] == [IDS[i] for i in sorted(
+        (i for i, score in enumerate(expected) if score > 0), key=lambda i: -expected[i])]
+    for chunk_id, score in results:
+        assert score == pytest.approx(expected[IDS.index(chunk_id)], rel=1e-5)
+
+
+def test_search_top_k_and_no_hits(index):
+    assert len(index.search("合同", k=1)) == 1
+    assert index.search("刑事诉讼", k=5) == []
+    candidates = index.search_candidates("law", "劳动合同", k=2)
+    assert candidates[0].kb == "law" and candidates[0].chunk_id == "labor"
+
+
+def test_apply_adds_live_chunks(index):
+    record = {"op": "upsert", "chunks": [{"id": "new", "text": "刑事诉讼中的取保候审"}]}
+    updated = index.apply([record])
+    assert len(updated) == len(index) + 1
+    assert updated.search("刑事诉讼", k=5)[0][0] == "new"
+    assert index.search("刑事诉讼", k=5) == []
+
+
+def test_load_missing_index_returns_none(tmp_path):
+    assert BM25Index.load(tmp_path) is None
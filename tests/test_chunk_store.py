@@ -0,0 +1,38 @@
+import pytest
+
+from src.core.chunk_store import ID_ORDER_FILE, MmapChunkStore
+
+IDS = ["c-10", "a-2", "b-1", "空文本", "a-10"]
+TEXTS = ["第十条 违约责任", "借款合同。\n第二条", "", "", "含有 emoji 🧾 的文本"]
+METADATAS = [{"source": "doc-1", "start_index": 0}, {"source": "doc-2"}, None, {}, {"law": "民法典"}]
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_round_trip(tmp_path, use_mmap):
+    MmapChunkStore.write(tmp_path, IDS, TEXTS, METADATAS)
+    assert MmapChunkStore.exists(tmp_path)
+
+    store = MmapChunkStore(tmp_path, use_mmap=use_mmap)
+    assert len(store) == len(IDS)
+    assert list(store.ids) == IDS
+    assert list(store.texts) == TEXTS
+    assert list(store.metadatas) == [metadata or {} for metadata in METADATAS]
+    assert store.texts[-1] == TEXTS[-1] and store.metadatas[0]["start_index"] == 0
+
+
+def test_position_lookup(tmp_path):
+    MmapChunkStore.write(tmp_path, IDS, TEXTS, METADATAS)
+    store = MmapChunkStore(tmp_path)
+    assert [store.position(chunk_id) for chunk_id in IDS] == list(range(len(IDS)))
+    assert store.position("missing") is None
+
+    # 旧版目录没有排序文件时按字典查找
+    (tmp_path / ID_ORDER_FILE).unlink()
+    legacy = MmapChunkStore(tmp_path)
+    assert legacy.position("b-1") == 2 and legacy.position("missing") is None
+
+
+def test_empty_store(tmp_path):
+    MmapChunkStore.write(tmp_path, [], [], [])
+    store = MmapChunkStore(tmp_path)
+    assert len(store) == 0 and store.position("a") is None
@@ -0,0 +1,55 @@
+from src.core.context_builder import ContextBuilder, TokenCounter, split_sentences
+
+DOC1 = "借款到期应当归还。逾期需支付利息。出借人可以起诉。"
+DOC2 = "保证人承担连带责任。保证期间为六个月。"
+
+
+def _builder(budget, **kwargs):
+    return ContextBuilder(TokenCounter(None), token_budget=budget, **kwargs)
+
+
+def test_split_sentences_round_trip():
+    text = "。第一句。第二句！没有句号"
+    sentences = split_sentences(text)
+    assert "".join(sentences) == text
+    assert sentences == ["。第一句。", "第二句！", "没有句号"]
+
+
+def test_within_budget_keeps_everything():
+    result = _builder(0).build([DOC1, DOC2])
+    assert result.context == f"[文档 1]\n{DOC1}\n\n[文档 2]\n{DOC2}"
+    assert (result.trimmed_sentences, result.dropped) == (0, 0)
+
+
+def test_over_budget_drops_lowest_rank_before_trimming_top():
+    # 预算只够第一个文档：第二个文档整个丢弃，第一个文档不被裁剪
+    result = _builder(30).build([DOC1, DOC2])
+    assert result.dropped == 1
+    assert result.trimmed_sentences == 0
+    assert result.context == f"[文档 1]\n{DOC1}"
+
+
+def test_small_overflow_trims_lowest_rank_only():
+    result = _builder(48).build([DOC1, DOC2])
+    assert result.dropped == 0
+    assert result.context == f"[文档 1]\n{DOC1}\n\n[文档 2]\n保证人承担连带责任。"
+
+
+def test_last_remaining_doc_is_trimmed_to_one_sentence():
+    result = _builder(5).build([DOC1, DOC2])
+    assert result.dropped == 1
+    assert result.context == "[文档 1]\n借款到期应当归还。"
+
+
+def test_ranks_decide_what_is_dropped():
+    # 传入顺序与排名不同时按排名丢弃，输出保持传入顺序
+    result = _builder(30).build([DOC1, DOC2], ranks=[1, 0])
+    assert result.context == f"[文档 2]\n{DOC2}"
+
+
+def test_overlapping_chunks_are_merged():
+    docs = ["甲方应当按期付款。乙方", "乙方应当按期交货。"]
+    metadatas = [{"source": "contract", "start_index": 0}, {"source": "contract", "start_index": 9}]
+    result = _builder(0).build(docs, metadatas=metadatas)
+    assert result.merged == 1
+    assert result.context == "[文档 1、2]\n甲方应当按期付款。乙方应当按期交货。"
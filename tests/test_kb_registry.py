@@ -0,0 +1,51 @@
+from langchain_core.documents import Document
+
+from conftest import build_flash_kb, make_chunks
+from src.core import kb_registry as kb_registry_module
+from src.core.kb_registry import KnowledgeBaseRegistry
+from src.core.live_updates import make_delete_record, make_upsert_record
+from src.core.vector_store import load_vector_store
+
+
+def _registry(tmp_path, rng):
+    ids, texts, metadatas, vectors = make_chunks(rng, 100)
+    build_flash_kb(tmp_path / "kb", ids, texts, metadatas, vectors, index_type="exact")
+    registry = KnowledgeBaseRegistry(loader=lambda path: load_vector_store(str(path), None))
+    registry.register("law", str(tmp_path / "kb"), 3, label="法律", lazy=True)
+    return registry, vectors.shape[1]
+
+
+def test_write_update_applies_overlay(tmp_path, rng):
+    registry, dim = _registry(tmp_path, rng)
+    chunk = Document(page_content="新增文档块", metadata={"source": "doc-new"}, id="new-0")
+    stats = registry.write_update("law", make_upsert_record(["doc-new"], [chunk], rng.standard_normal((1, dim))))
+    assert stats["applied"] == 1
+
+    snapshot = registry.snapshot()
+    try:
+        kb = snapshot.get("law")
+        assert [doc.id for doc in kb.vectorstore.get_by_ids(["new-0"])] == ["new-0"]
+    finally:
+        snapshot.release()
+
+
+def test_apply_updates_skips_kb_evicted_meanwhile(tmp_path, rng, monkeypatch):
+    registry, _ = _registry(tmp_path, rng)
+    wrap = kb_registry_module.OverlayVectorStore.wrap
+
+    def evict_then_wrap(vectorstore):
+        registry.evict("law")
+        return wrap(vectorstore)
+
+    monkeypatch.setattr(kb_registry_module.OverlayVectorStore, "wrap", staticmethod(evict_then_wrap))
+    # 应用期间被释放：不抛异常，也不把已释放的知识库装回
+    assert registry.write_update("law", make_delete_record(chunk_ids=["chunk-0"])) == {"name": "law", "applied": 0}
+    assert registry.get("law") is None
+
+    # 下次加载时重放更新日志
+    monkeypatch.setattr(kb_registry_module.OverlayVectorStore, "wrap", wrap)
+    snapshot = registry.snapshot()
+    try:
+        assert snapshot.get("law").vectorstore.get_by_ids(["chunk-0"]) == []
+    finally:
+        snapshot.release()
@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+from langchain_core.documents import Document
+
+from conftest import build_flash_kb, make_chunks
+from src.core.kb_registry import resolve_kb_path
+from src.core.kb_snapshot import export_snapshot, import_snapshot, read_knowledge_base, verify_snapshot
+from src.core.live_updates import UpdateLog, make_delete_record, make_upsert_record, update_log_path
+from src.core.vector_store import STORE_CONFIG_FILE
+
+
+def _store_config(directory):
+    with open(directory / STORE_CONFIG_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _kb_with_update(tmp_path, rng, **index_params):
+    kb_dir = tmp_path / "kb"
+    ids, texts, metadatas, vectors = make_chunks(rng, 300)
+    build_flash_kb(kb_dir, ids, texts, metadatas, vectors, **index_params)
+    log = UpdateLog(update_log_path(kb_dir, "v1"))
+    chunk = Document(page_content="新增文档块 民法典第五百七十七条", metadata={"source": "doc-new"}, id="new-0")
+    log.append(make_upsert_record(["doc-new"], [chunk], rng.standard_normal((1, vectors.shape[1]))))
+    log.append(make_delete_record(chunk_ids=["chunk-0"]))
+    return kb_dir
+
+
+def test_export_keeps_saved_index_config(tmp_path, rng):
+    kb_dir = _kb_with_update(tmp_path, rng, index_type="hnsw", compression="fp16", M=8, ef_search=40)
+    # 与命令行相同：未指定的参数以 None 传入
+    output = export_snapshot(kb_dir, tmp_path / "snapshot", index_type=None, compression=None, M=None,
+                             ef_construction=None, ef_search=None)
+
+    config = _store_config(output)
+    assert config["index_type"] == "hnsw"
+    assert config["compression"] == "fp16"
+    assert config["M"] == 8
+    assert config["ef_search"] == 40
+    assert verify_snapshot(output) == []
+
+
+def test_export_overrides_only_given_params(tmp_path, rng):
+    kb_dir = _kb_with_update(tmp_path, rng, index_type="hnsw", compression="fp16", M=8)
+    output = export_snapshot(kb_dir, tmp_path / "snapshot", ef_search=80)
+
+    config = _store_config(output)
+    assert (config["index_type"], config["compression"], config["M"], config["ef_search"]) == ("hnsw", "fp16", 8, 80)
+
+
+def test_snapshot_round_trip(tmp_path, rng):
+    kb_dir = _kb_with_update(tmp_path, rng, index_type="exact")
+    ids, texts, metadatas, vectors = read_knowledge_base(kb_dir)
+    assert "new-0" in ids and "chunk-0" not in ids
+
+    archive = export_snapshot(kb_dir, tmp_path / "kb.tar", archive=True)
+    target_dir = tmp_path / "imported"
+    version, _ = import_snapshot(archive, target_dir, version="v-imported")
+    assert resolve_kb_path(target_dir)[1] == version
+
+    imported = read_knowledge_base(target_dir)
+    assert imported[0] == ids
+    assert imported[1] == texts
+    assert imported[2] == metadatas
+    np.testing.assert_allclose(imported[3], vectors, atol=1e-6)
@@ -0,0 +1,49 @@
+import pytest
+
+from src.core.lexicon_rewriter import DEFAULT_MIN_COVERAGE, create_lexicon_rewriter, find_law_references
+
+
+@pytest.fixture(scope="module")
+def rewriter():
+    return create_lexicon_rewriter()
+
+
+def test_colloquial_query_maps_to_terms(rewriter):
+    result = rewriter.rewrite("借钱不还怎么办")
+    assert result.terms[:3] == ["债务违约", "违约责任", "还款义务"]
+    assert result.coverage == 1.0
+
+
+@pytest.mark.parametrize("query, unit", [
+    ("刑法第二十条正当防卫怎么认定", "刑法第二十条"),
+    ("民法典第1079条离婚", "民法典第1079条"),
+    ("劳动合同法第三十九条是什么", "劳动合同法第三十九条"),
+    ("请问中华人民共和国民法典第五百七十七条", "民法典第五百七十七条"),
+    ("《工伤保险条例》第十四条", "工伤保险条例第十四条"),
+])
+def test_article_reference_keeps_law_name(rewriter, query, unit):
+    result = rewriter.rewrite(query)
+    assert result.terms[0] == unit
+    assert result.coverage >= DEFAULT_MIN_COVERAGE
+
+
+def test_following_articles_inherit_law_name():
+    texts = [text for _, _, text, _ in find_law_references("劳动合同法第三十九条和第四十条")]
+    assert texts == ["劳动合同法第三十九条", "劳动合同法第四十条"]
+
+
+@pytest.mark.parametrize("query, law", [
+    ("我想咨询劳动合同法试用期多久", "劳动合同法"),
+    ("劳动合同法规定试用期多久", "劳动合同法"),
+    ("公司违反劳动法怎么办", "劳动法"),
+    ("《消费者权益保护法》退一赔三", "消费者权益保护法"),
+])
+def test_bare_law_name_is_kept_but_not_covered(rewriter, query, law):
+    result = rewriter.rewrite(query)
+    assert law in result.terms
+    assert result.coverage < DEFAULT_MIN_COVERAGE  # 交给 LLM 改写
+
+
+@pytest.mark.parametrize("query", ["老板不发工资违法吗", "这样做合法吗", "去法院起诉要多少钱", "相关规定是什么"])
+def test_common_words_are_not_law_names(query):
+    assert find_law_references(query) == []
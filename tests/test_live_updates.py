@@ -0,0 +1,82 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from conftest import make_chunks
+from src.core.kb_snapshot import _apply_updates
+from src.core.live_updates import OverlayVectorStore, make_delete_record, make_upsert_record
+from src.core.retrieval import ChunkFetcher
+from src.core.vector_index import create_index
+from src.core.vector_store import FlashVectorStore
+
+
+def _base_store(rng):
+    ids, texts, metadatas, vectors = make_chunks(rng, 40)
+    store = FlashVectorStore(None, create_index(vectors.shape[1], len(ids), index_type="exact"))
+    store._add_vectors(vectors, texts, metadatas, ids)
+    return store, (ids, texts, metadatas, vectors)
+
+
+def _upsert_doc_0(vectors):
+    # doc-0 原有 chunk-0 ~ chunk-3，替换为一个与 chunk-0 向量相同的新文档块
+    chunk = Document(page_content="修订后的文档块", metadata={"source": "doc-0"}, id="doc-0-new")
+    return make_upsert_record(["doc-0"], [chunk], vectors[:1])
+
+
+def _chunk_ids(candidates):
+    return [candidate.chunk_id for candidate in candidates]
+
+
+def test_upsert_tombstones_base_chunks(rng):
+    base, (_, _, _, vectors) = _base_store(rng)
+    overlay = OverlayVectorStore.wrap(base).apply([_upsert_doc_0(vectors)])
+
+    assert overlay.tombstones == {"chunk-0", "chunk-1", "chunk-2", "chunk-3"}
+    assert overlay.stats() == {"delta_chunks": 1, "tombstones": 4}
+    candidates = overlay.retrieve_candidates("law", [vectors[0].tolist()], 5, ChunkFetcher({"law": overlay}))[0]
+    assert _chunk_ids(candidates)[0] == "doc-0-new"
+    assert len(candidates) == 5
+    assert not overlay.tombstones & set(_chunk_ids(candidates))
+
+
+def test_delete_empties_delta(rng):
+    base, (_, _, _, vectors) = _base_store(rng)
+    upserted = OverlayVectorStore.wrap(base).apply([_upsert_doc_0(vectors)])
+    deleted = upserted.apply([make_delete_record(doc_ids=["doc-0"])])
+
+    assert deleted.delta is None
+    assert deleted.stats() == {"delta_chunks": 0, "tombstones": 4}
+    candidates = deleted.retrieve_candidates("law", [vectors[0].tolist()], 5, ChunkFetcher({"law": deleted}))[0]
+    assert not {"doc-0-new", "chunk-0"} & set(_chunk_ids(candidates))
+    # 叠加层不可变：之前的叠加层不受影响
+    assert upserted.stats()["delta_chunks"] == 1
+
+    # 按文档块 ID 删除同样作用于增量文档块
+    assert upserted.apply([make_delete_record(chunk_ids=["doc-0-new"])]).delta is None
+
+
+def test_get_by_ids_skips_tombstones(rng):
+    base, (_, _, _, vectors) = _base_store(rng)
+    overlay = OverlayVectorStore.wrap(base).apply([
+        _upsert_doc_0(vectors),
+        make_delete_record(chunk_ids=["chunk-5"]),
+    ])
+
+    docs = overlay.get_by_ids(["chunk-0", "doc-0-new", "chunk-4", "chunk-5", "missing"])
+    assert [doc.id for doc in docs] == ["doc-0-new", "chunk-4"]
+    assert docs[0].page_content == "修订后的文档块"
+
+
+def test_snapshot_apply_updates_merges_overlay(rng):
+    _, (ids, texts, metadatas, vectors) = _base_store(rng)
+    records = [_upsert_doc_0(vectors), make_delete_record(chunk_ids=["chunk-5"])]
+    merged_ids, merged_texts, merged_metadatas, merged_vectors = _apply_updates(ids, texts, metadatas, vectors, records)
+
+    assert merged_ids == ids[4:5] + ids[6:] + ["doc-0-new"]
+    assert merged_texts[-1] == "修订后的文档块"
+    assert merged_metadatas[-1] == {"source": "doc-0"}
+    np.testing.assert_allclose(merged_vectors[:-1], np.concatenate([vectors[4:5], vectors[6:]]))
+    np.testing.assert_allclose(merged_vectors[-1], vectors[0], atol=1e-6)
+
+    # 之后删除整个文档：增量文档块不再导出
+    records.append(make_delete_record(doc_ids=["doc-0"]))
+    assert _apply_updates(ids, texts, metadatas, vectors, records)[0] == ids[4:5] + ids[6:]
@@ -0,0 +1,102 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from src.core.model_server import (
+    INLINE_ARRAY_BYTES,
+    ModelClient,
+    ModelServer,
+    ModelServerError,
+    connect_model_server,
+    pack_token_ids,
+    unpack_token_ids,
+)
+
+pytestmark = pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="需要 /dev/shm")
+
+
+class FakeEmbeddings:
+    """按文本长度生成向量的嵌入模型（可设置推理延迟）"""
+
+    def __init__(self, dim=64, delay=0.0):
+        self.dim = dim
+        self.delay = delay
+
+    def embed_documents(self, texts):
+        time.sleep(self.delay)
+        return [[len(text) + i for i in range(self.dim)] for text in texts]
+
+
+def _segments():
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def _start_server(tmp_path, **kwargs):
+    server = ModelServer(str(tmp_path / "models.sock"), embeddings=FakeEmbeddings(**kwargs), embedding_model="fake",
+                         max_wait_ms=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, connect_model_server(server.socket_path, wait=5)
+
+
+def test_small_arrays_are_inlined(tmp_path):
+    server, client = _start_server(tmp_path)
+    before = _segments()
+    vectors = client.embed(["借款合同"])
+    assert vectors.shape == (1, 64) and vectors[0, 0] == 4
+    packed = pack_token_ids([[1, 2, 3], None, [4]])
+    assert "data" in packed["ids"]
+    restored = unpack_token_ids(packed, 3)
+    assert restored[0].tolist() == [1, 2, 3] and restored[1] is None and restored[2].tolist() == [4]
+    assert _segments() == before
+
+
+def test_large_result_segment_released_after_copy(tmp_path):
+    server, client = _start_server(tmp_path)
+    before = _segments()
+    texts = [f"文本{i}" for i in range(INLINE_ARRAY_BYTES // (64 * 4) + 10)]
+    vectors = client.embed(texts)
+    assert vectors.shape == (len(texts), 64)
+    assert vectors[:, 0].tolist() == [len(text) for text in texts]
+    assert _wait_until(lambda: not server._segments)
+    assert _segments() == before
+
+
+def test_result_segment_released_when_client_times_out(tmp_path):
+    server, _ = _start_server(tmp_path, delay=0.5)
+    client = ModelClient(server.socket_path, timeout=0.1)
+    before = _segments()
+    with pytest.raises(ModelServerError):
+        client.embed([f"文本{i}" for i in range(500)])
+    # 服务端推理结束后发现连接已关闭，释放为该请求创建的共享内存段
+    time.sleep(0.6)
+    assert _wait_until(lambda: not server._segments)
+    assert _segments() == before
+
+
+def test_request_segments_released_when_request_fails(tmp_path):
+    # 服务端接受连接但从不读取：客户端超时后自行释放 token ID 的共享内存段
+    path = str(tmp_path / "stuck.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+    try:
+        client = ModelClient(path, timeout=0.1)
+        before = _segments()
+        token_ids = [list(range(2000)) for _ in range(20)]
+        with pytest.raises(ModelServerError):
+            client.score("reranker", "问题", ["文档"] * 20, token_ids=token_ids)
+        assert _segments() == before
+    finally:
+        listener.close()
@@ -0,0 +1,18 @@
+import pytest
+
+from src.core.query_rewriter import parse_variants
+
+
+@pytest.mark.parametrize("response, expected", [
+    ('["借款合同 违约责任", "民间借贷 逾期还款"]', ["借款合同 违约责任", "民间借贷 逾期还款"]),
+    ('改写结果：\n["借款合同 违约责任", "借款合同 违约责任"]', ["借款合同 违约责任"]),
+    ("1. 借款合同 违约责任\n2、民间借贷 逾期还款\n(3) “债务 清偿”", ["借款合同 违约责任", "民间借贷 逾期还款", "债务 清偿"]),
+    ("根据民法典第[667]条：借款合同", ["根据民法典第[667]条：借款合同"]),
+    ("[1, 2]\n借款合同 违约责任", ["[1, 2]", "借款合同 违约责任"]),
+])
+def test_parse_variants(response, expected):
+    assert parse_variants(response, 5) == expected
+
+
+def test_parse_variants_limits_count():
+    assert parse_variants('["变体一号", "变体二号", "变体三号"]', 2) == ["变体一号", "变体二号"]
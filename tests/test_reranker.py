@@ -0,0 +1,31 @@
+import itertools
+
+import pytest
+
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("torch")
+
+from src.core.reranker import _truncate_longest_first
+
+CHARS = [chr(code) for code in range(0x4E00, 0x4E00 + 64)]
+
+
+@pytest.fixture(scope="module", params=["BertTokenizer", "BertTokenizerFast"])
+def tokenizer(request, tmp_path_factory):
+    # 本地词表构造的分词器（不下载模型）：每个汉字一个 token
+    vocab = tmp_path_factory.mktemp("vocab") / "vocab.txt"
+    vocab.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + CHARS), encoding="utf-8")
+    return getattr(transformers, request.param)(str(vocab))
+
+
+def test_truncation_matches_tokenizer(tokenizer):
+    special = tokenizer.num_special_tokens_to_add(pair=True)
+    for query_length, doc_length, max_length in itertools.product(range(1, 12), range(1, 12), range(special + 1, 24)):
+        query, doc = "".join(CHARS[:query_length]), "".join(CHARS[32:32 + doc_length])
+        expected = tokenizer(query, doc, truncation="longest_first", max_length=max_length)["input_ids"]
+        first, second = _truncate_longest_first(
+            tokenizer(query, add_special_tokens=False)["input_ids"],
+            tokenizer(doc, add_special_tokens=False)["input_ids"],
+            max_length - special, tokenizer.is_fast)
+        assert tokenizer.build_inputs_with_special_tokens(first, second) == expected, \
+            (query_length, doc_length, max_length)
@@ -0,0 +1,65 @@
+import pytest
+from langchain_core.documents import Document
+
+from src.core.retrieval import Candidate, ChunkFetcher, merge_candidate_lists, reciprocal_rank_fusion
+
+
+class _Store:
+    """只实现 get_by_ids 的向量库，记录每次读取的 ID"""
+
+    def __init__(self, ids):
+        self.documents = {chunk_id: Document(page_content=f"正文 {chunk_id}", id=chunk_id) for chunk_id in ids}
+        self.calls = []
+
+    def get_by_ids(self, ids):
+        self.calls.append(list(ids))
+        return [self.documents[chunk_id] for chunk_id in ids if chunk_id in self.documents]
+
+
+def _ids(candidates):
+    return [(candidate.kb, candidate.chunk_id) for candidate in candidates]
+
+
+def test_rrf_sums_reciprocal_ranks():
+    vector = [Candidate("law", "a", 0.9), Candidate("law", "b", 0.8), Candidate("law", "c", 0.7)]
+    lexical = [Candidate("law", "c", 12.0), Candidate("law", "a", 8.0), Candidate("law", "d", 3.0)]
+    fused = reciprocal_rank_fusion([vector, lexical], rrf_k=60)
+
+    assert _ids(fused) == [("law", "a"), ("law", "c"), ("law", "b"), ("law", "d")]
+    assert fused[0].score == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[-1].score == pytest.approx(1 / 63)
+    assert _ids(reciprocal_rank_fusion([vector, lexical], top_k=2)) == [("law", "a"), ("law", "c")]
+
+
+def test_rrf_keeps_knowledge_bases_apart():
+    fused = reciprocal_rank_fusion([[Candidate("law", "a", 1.0)], [Candidate("case", "a", 1.0)]])
+    assert sorted(_ids(fused)) == [("case", "a"), ("law", "a")]
+
+
+def test_merge_candidate_lists_fuses_per_knowledge_base():
+    primary = [Candidate("law", "a", 0.9), Candidate("law", "b", 0.8), Candidate("case", "x", 0.7)]
+    secondary = [Candidate("case", "y", 0.9), Candidate("law", "b", 0.95), Candidate("law", "c", 0.5)]
+    merged = merge_candidate_lists(primary, secondary)
+
+    # 知识库顺序以先出现的为准，各知识库内按 RRF 得分排列，保留两路的并集
+    assert _ids(merged) == [("law", "b"), ("law", "a"), ("law", "c"), ("case", "x"), ("case", "y")]
+    assert merged[0].score == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_chunk_fetcher_reads_each_chunk_once():
+    stores = {"law": _Store(["a", "b"]), "case": _Store(["a"])}
+    fetcher = ChunkFetcher(stores)
+    candidates = [Candidate("law", "a", 0.9), Candidate("case", "a", 0.8), Candidate("law", "a", 0.7),
+                  Candidate("law", "missing", 0.5)]
+
+    # 每个知识库一次批量读取，同一 ID 只读一次；找不到的文档块返回空字符串
+    assert fetcher.texts(candidates) == ["正文 a", "正文 a", "正文 a", ""]
+    assert stores["law"].calls == [["a", "missing"]]
+    assert stores["case"].calls == [["a"]]
+    assert fetcher.fetched == 3
+
+    # 已缓存的文档块不再读取
+    assert fetcher.document(Candidate("law", "a", 0.1)).page_content == "正文 a"
+    assert fetcher.texts([Candidate("law", "b", 0.1)]) == ["正文 b"]
+    assert stores["law"].calls == [["a", "missing"], ["b"]]
+    assert fetcher.fetched == 4
@@ -0,0 +1,57 @@
+import os
+import stat
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import build_flash_kb, make_chunks
+from src.core.shards import (
+    SHARD_SOCKET,
+    ShardClient,
+    ShardedVectorStore,
+    build_shards,
+    read_manifest,
+    serve_shard,
+    shard_address,
+    shard_authkey,
+    wait_for_shards,
+)
+
+
+def test_tcp_address_requires_authkey(monkeypatch):
+    monkeypatch.delenv("KB_SHARD_AUTHKEY", raising=False)
+    with pytest.raises(ValueError):
+        shard_authkey(("10.0.0.2", 7000))
+    with pytest.raises(ValueError):
+        ShardClient(("10.0.0.2", 7000))
+    with pytest.raises(ValueError):
+        serve_shard("/nonexistent", address=("127.0.0.1", 0))
+    assert shard_authkey("/tmp/shard.sock")
+
+    monkeypatch.setenv("KB_SHARD_AUTHKEY", "private-key")
+    assert shard_authkey(("10.0.0.2", 7000)) == b"private-key"
+
+
+def test_sharded_search_matches_single_index(tmp_path, rng, monkeypatch):
+    monkeypatch.delenv("KB_SHARD_AUTHKEY", raising=False)
+    ids, texts, metadatas, vectors = make_chunks(rng, 200)
+    build_flash_kb(tmp_path / "kb", ids, texts, metadatas, vectors, index_type="exact")
+    sharded = tmp_path / "sharded"
+    build_shards(tmp_path / "kb", sharded, num_shards=3, index_type="exact")
+
+    for shard in read_manifest(sharded)["shards"]:
+        threading.Thread(target=serve_shard, args=(sharded / shard["path"],), daemon=True).start()
+    assert wait_for_shards(sharded, timeout=30)
+    for shard in read_manifest(sharded)["shards"]:
+        address = shard_address(sharded, shard)
+        assert address.endswith(SHARD_SOCKET)
+        assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+
+    store = ShardedVectorStore.load(str(sharded), embedding=None)
+    queries = vectors[:5]
+    results = store.search_ids_by_vectors(queries.tolist(), k=10)
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+    for row, hits in enumerate(results):
+        assert [chunk_id for chunk_id, _ in hits] == [ids[i] for i in expected[row]]
+    assert store.stats()["shards_down"] == []
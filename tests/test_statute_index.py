@@ -0,0 +1,53 @@
+import pytest
+
+from src.core.statute_index import StatuteIndex, chinese_to_int, extract_provisions, write_statute_index
+
+TEXTS = [
+    "中华人民共和国民法典\n第五百七十七条 当事人一方不履行合同义务的，应当承担违约责任。\n第五百七十八条 当事人一方明确表示",
+    "劳动合同法\n第三十九条 劳动者有下列情形之一的，用人单位可以解除劳动合同",
+    "第四十条 有下列情形之一的，用人单位提前三十日以书面形式通知劳动者本人",
+]
+METADATAS = [None, None, {"law": "劳动合同法"}]
+
+
+@pytest.fixture
+def index():
+    return StatuteIndex.build(["civil-1", "labor-1", "labor-2"], TEXTS, METADATAS)
+
+
+@pytest.mark.parametrize("text, number", [("二十", 20), ("十", 10), ("一百零三", 103), ("五百七十七", 577),
+                                          ("两千", 2000), ("1079", 1079)])
+def test_chinese_to_int(text, number):
+    assert chinese_to_int(text) == number
+
+
+def test_extract_provisions_uses_title_and_default_law():
+    assert extract_provisions(TEXTS[0]) == [("民法典", 577), ("民法典", 578)]
+    assert extract_provisions(TEXTS[2], default_law="劳动合同法") == [("劳动合同法", 40)]
+    assert extract_provisions(TEXTS[2]) == []
+
+
+def test_match_resolves_articles(index):
+    match = index.match("中华人民共和国民法典第577条违约怎么办")
+    assert [(p.law, p.article, p.chunk_ids) for p in match.provisions] == [("民法典", 577, ["civil-1"])]
+    assert match.residual > 0
+
+    # 第二个引用沿用前一个法律名称
+    match = index.match("劳动合同法第三十九条和第四十条")
+    assert match.resolved and match.chunk_ids() == ["labor-1", "labor-2"]
+    assert match.residual == 0
+
+
+def test_unknown_law_is_not_matched(index):
+    assert index.match("合同法第三十九条").provisions == []
+
+
+def test_apply_upsert_and_round_trip(index, tmp_path):
+    record = {"op": "upsert", "chunks": [{"id": "civil-2", "text": "第五百七十八条 预期违约", "metadata": {"law": "民法典"}}]}
+    updated = index.apply([record])
+    assert updated.lookup("民法典", 578) == ["civil-1", "civil-2"]
+    assert index.lookup("民法典", 578) == ["civil-1"]  # 原索引不变
+
+    write_statute_index(tmp_path, ["civil-1", "labor-1", "labor-2"], TEXTS, METADATAS)
+    assert StatuteIndex.load(tmp_path).entries == index.entries
+    assert len(StatuteIndex.load(tmp_path / "missing")) == 0
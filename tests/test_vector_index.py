@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from src.core.vector_index import MIN_PQ_TRAIN_SIZE, ExactIndex, RescoringIndex, create_index, normalize_vectors
+
+
+def test_rescoring_index_incremental_add(rng):
+    vectors = normalize_vectors(rng.standard_normal((300, 16)))
+    index = RescoringIndex(ExactIndex(16), rescore_factor=2)
+    for start in range(0, len(vectors), 7):
+        index.add(vectors[start:start + 7])
+
+    assert index.ntotal == len(index.vectors) == 300
+    np.testing.assert_array_equal(index.vectors, vectors.astype(np.float16))
+    _, ids = index.search(vectors[:3], k=1)
+    assert ids[:, 0].tolist() == [0, 1, 2]
+
+
+def test_exact_index_incremental_add_matches_brute_force(rng):
+    vectors = normalize_vectors(rng.standard_normal((500, 16)))
+    index = ExactIndex(16)
+    for start in range(0, len(vectors), 13):
+        index.add(vectors[start:start + 13])
+
+    assert index.ntotal == 500
+    assert index.vectors.flags["C_CONTIGUOUS"]
+    queries = vectors[:4]
+    scores, ids = index.search(queries, k=10)
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+    np.testing.assert_array_equal(ids, expected)
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_pq_index_rescoring_recall(rng):
+    pytest.importorskip("faiss")
+    vectors = normalize_vectors(rng.standard_normal((MIN_PQ_TRAIN_SIZE * 2, 32)))
+    index = create_index(32, len(vectors), index_type="hnsw", compression="pq", ef_search=128, rescore_factor=10)
+    index.add(vectors)
+    assert isinstance(index, RescoringIndex)
+
+    queries = vectors[:20]
+    scores, ids = index.search(queries, k=10)
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+    recall = np.mean([len(set(ids[row]) & set(expected[row])) / 10 for row in range(len(queries))])
+    assert recall >= 0.8
+    # 精排后的分数是 float16 原始向量的精确内积
+    assert ids[:, 0].tolist() == list(range(20))
+    np.testing.assert_allclose(scores[:, 0], 1.0, atol=1e-2)
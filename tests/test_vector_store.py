@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from conftest import build_flash_kb, make_chunks
+from src.core.vector_store import FlashVectorStore, load_vector_store
+
+
+class SyntheticEmbeddings:
+    """按文本查表返回预先生成的向量（不加载模型）"""
+
+    def __init__(self, texts, vectors):
+        self.table = dict(zip(texts, vectors.tolist()))
+
+    def embed_documents(self, texts):
+        return [self.table[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.table[text]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_persist_and_load_round_trip(tmp_path, rng, mmap):
+    ids, texts, metadatas, vectors = make_chunks(rng, 120)
+    path = build_flash_kb(tmp_path, ids, texts, metadatas, vectors, index_type="exact")
+
+    store = FlashVectorStore.load(str(path), embedding=None, mmap=mmap)
+    assert len(store) == 120
+    results = store.search_ids_by_vectors(vectors[:3].tolist(), k=5)
+    expected = np.argsort(-(vectors[:3] @ vectors.T), axis=1)[:, :5]
+    for row, hits in enumerate(results):
+        assert [chunk_id for chunk_id, _ in hits] == [ids[i] for i in expected[row]]
+        assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
+
+    documents = store.get_by_ids(["chunk-7", "missing", "chunk-3"])
+    assert [doc.id for doc in documents] == ["chunk-7", "chunk-3"]
+    assert documents[0].page_content == texts[7] and documents[0].metadata == metadatas[7]
+
+
+def test_from_texts_and_similarity_search(tmp_path, rng):
+    ids, texts, metadatas, vectors = make_chunks(rng, 50)
+    embeddings = SyntheticEmbeddings(texts, vectors)
+    FlashVectorStore.from_texts(texts, embeddings, metadatas=metadatas, ids=ids,
+                                persist_directory=str(tmp_path / "store"), index_type="exact")
+
+    store = FlashVectorStore.load(str(tmp_path / "store"), embeddings)
+    docs_and_scores = store.similarity_search_with_score(texts[10], k=3)
+    assert docs_and_scores[0][0].id == "chunk-10"
+    assert [score for _, score in docs_and_scores] == sorted((score for _, score in docs_and_scores), reverse=True)
+
+
+def test_hnsw_store_recall(tmp_path, rng):
+    pytest.importorskip("faiss")
+    ids, texts, metadatas, vectors = make_chunks(rng, 2000, dim=32)
+    path = build_flash_kb(tmp_path, ids, texts, metadatas, vectors, index_type="hnsw", M=16, ef_search=64)
+
+    store = load_vector_store(str(path), embedding=None)
+    assert store.index.index_type == "hnsw"
+    queries = vectors[:50] + 0.1 * rng.standard_normal((50, 32)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+    results = store.search_ids_by_vectors(queries.tolist(), k=10)
+    recall = np.mean([len({ids[i] for i in expected[row]} & {chunk_id for chunk_id, _ in hits}) / 10
+                      for row, hits in enumerate(results)])
+    assert recall >= 0.95